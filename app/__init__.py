@@ -28,6 +28,9 @@ def _is_tenant_subscription_blocked(tenant: dict) -> bool:
 
 from app.config import Config
 from app.extensions import init_mongo, get_master_db
+from app.utils.assets import AssetResolver
+from app.utils.metrics import init_metrics
+from app.utils.profiling import init_profiling
 from app.utils.auth import SESSION_USER_ID, SESSION_TENANT_ID
 from app.blueprints.reports.audit.journal import build_request_id, write_audit_journal
 
@@ -71,13 +74,23 @@ def create_app():
     from app.utils.sessions import HostAwareSessionInterface
     app.session_interface = HostAwareSessionInterface()
 
-    init_mongo(app)
+    # Mongo query accounting per request (GET /admin/profiling). Registered
+    # before the other before_request hooks so their queries count too.
+    query_profiler = init_profiling(app)
+    # Prometheus metrics (GET /metrics on the admin host) + pool listener.
+    pool_metrics = init_metrics(app)
+    init_mongo(app, event_listeners=[x for x in (query_profiler, pool_metrics) if x is not None])
+
+    # url_for('static', ...) → хешированный файл из dist/manifest.json
+    # (собирается `python -m app.scripts.build_assets`), иначе ?v=<хеш файла>.
+    # ASSET_VERSION остаётся запасным вариантом для статики блюпринтов.
+    asset_resolver = AssetResolver(app.static_folder)
 
-    # Автоматически добавляем ?v=<ASSET_VERSION> ко всем url_for('static', ...)
-    # — единый cache-buster, чтобы не плодить ручные ?v=... в шаблонах.
     @app.url_defaults
     def _add_static_version(endpoint, values):
-        if endpoint == "static" or endpoint.endswith(".static"):
+        if endpoint == "static":
+            asset_resolver.url_defaults(values, ASSET_VERSION)
+        elif endpoint.endswith(".static"):
             values.setdefault("v", ASSET_VERSION)
 
     # Expose selected config keys to all templates.
@@ -259,7 +272,9 @@ def create_app():
         elapsed = (time.perf_counter() - getattr(g, '_request_start_time', time.perf_counter())) * 1000
         from flask import request as _req
         if elapsed > 50:
-            app.logger.info(f"[PERF] {_req.method} {_req.path} → {response.status_code} in {elapsed:.0f}ms")
+            profile = getattr(g, "_query_profile", None)
+            queries = f" ({profile.summary()})" if profile is not None else ""
+            app.logger.info(f"[PERF] {_req.method} {_req.path} → {response.status_code} in {elapsed:.0f}ms{queries}")
         write_audit_journal(response=response)
 
         # Запрещаем браузеру кешировать динамический HTML, иначе после
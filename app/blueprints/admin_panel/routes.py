@@ -1,8 +1,9 @@
+import hmac
 from datetime import datetime, timedelta, timezone
 
 from bson import ObjectId
 from bson.errors import InvalidId
-from flask import render_template, request, redirect, url_for, flash, abort
+from flask import Response, current_app, render_template, request, redirect, url_for, flash, abort, jsonify
 from werkzeug.security import check_password_hash
 
 from app.extensions import get_master_db
@@ -13,6 +14,18 @@ from app.utils.admin_auth import (
     get_current_admin,
 )
 from app.utils.admin_audit import log_admin_action
+from app.utils.admin_stats import (
+    get_admin_stats,
+    rebuild_admin_stats,
+    record_active_change,
+    tenant_member_counts,
+)
+from app.utils.billing_usage import record_shop_change, record_user_change
+from app.utils.cache import cache_stats
+from app.utils.layout import invalidate_shop_switcher
+from app.utils.metrics import metrics_enabled, render_metrics
+from app.utils.pagination import get_pagination_params
+from app.utils.profiling import profiling_report, reset_profiling
 from . import admin_panel_bp
 
 
@@ -78,18 +91,29 @@ def logout():
 @admin_required
 def dashboard():
     admin = get_current_admin()
-    master = get_master_db()
-    stats = {
-        "tenants_total": master.tenants.count_documents({}),
-        "tenants_active": master.tenants.count_documents({"status": "active"}),
-        "shops_total": master.shops.count_documents({}),
-        "shops_active": master.shops.count_documents({"is_active": True}),
-        "users_total": master.users.count_documents({}),
-        "users_active": master.users.count_documents({"is_active": True}),
-    }
+    stats = get_admin_stats(get_master_db())
     return render_template("admin_panel/dashboard.html", admin=admin, stats=stats)
 
 
+@admin_panel_bp.post("/admin/stats/rebuild")
+@admin_required
+def stats_rebuild():
+    admin = get_current_admin()
+    master = get_master_db()
+    before = get_admin_stats(master)
+    after = rebuild_admin_stats(master)
+    log_admin_action(
+        admin,
+        action="admin_stats.rebuild",
+        target_type="admin_stats",
+        target_id=None,
+        before={k: before.get(k) for k in after if k.endswith(("_total", "_active"))},
+        after={k: v for k, v in after.items() if k.endswith(("_total", "_active"))},
+    )
+    flash("Dashboard counters recounted.", "success")
+    return redirect(url_for("admin_panel.dashboard"))
+
+
 # ---------------------------------------------------------------------------
 # Tenants
 # ---------------------------------------------------------------------------
@@ -114,18 +138,43 @@ def tenants_list():
     elif status_filter == "inactive":
         query["status"] = {"$ne": "active"}
 
-    tenants = list(master.tenants.find(query).sort("created_at", -1))
+    page, per_page = get_pagination_params(request.args, default_per_page=50, max_per_page=200)
+
+    # One round trip for the page and the match count, then one $group per
+    # collection for the page's location / user counts.
+    facet = next(master.tenants.aggregate([
+        {"$match": query},
+        {"$facet": {
+            "rows": [
+                {"$sort": {"created_at": -1, "_id": -1}},
+                {"$skip": (page - 1) * per_page},
+                {"$limit": per_page},
+            ],
+            "total": [{"$count": "n"}],
+        }},
+    ]), {"rows": [], "total": []})
+    tenants = facet["rows"]
+    total = facet["total"][0]["n"] if facet["total"] else 0
 
-    # Annotate counts (cheap: indexed by tenant_id).
+    counts = tenant_member_counts(master, [t["_id"] for t in tenants])
     for t in tenants:
-        tid = t["_id"]
-        t["shops_count"] = master.shops.count_documents({"tenant_id": tid})
-        t["users_count"] = master.users.count_documents({"tenant_id": tid})
+        t.update(counts[t["_id"]])
+
+    pages = max(1, -(-total // per_page))
+    meta = {
+        "page": page,
+        "per_page": per_page,
+        "total": total,
+        "pages": pages,
+        "has_prev": page > 1,
+        "has_next": page < pages,
+    }
 
     return render_template(
         "admin_panel/tenants_list.html",
         admin=admin,
         tenants=tenants,
+        meta=meta,
         q=q,
         status_filter=status_filter,
     )
@@ -247,6 +296,7 @@ def tenant_detail(tenant_id: str):
         billing=billing,
         subscription=subscription,
         stripe_info=stripe_info,
+        audit_retention_months=__import__("flask").current_app.config.get("AUDIT_JOURNAL_RETENTION_MONTHS"),
     )
 
 
@@ -265,6 +315,7 @@ def tenant_toggle_active(tenant_id: str):
         {"_id": tid},
         {"$set": {"status": new_status, "updated_at": datetime.utcnow()}},
     )
+    record_active_change(master, "tenants", tenant.get("status") == "active", new_status == "active")
     log_admin_action(
         admin,
         action="tenant.toggle_active",
@@ -413,6 +464,52 @@ def tenant_clear_subscription(tenant_id: str):
     return redirect(url_for("admin_panel.tenant_detail", tenant_id=tenant_id))
 
 
+@admin_panel_bp.post("/admin/tenants/<tenant_id>/audit-retention")
+@admin_required
+def tenant_set_audit_retention(tenant_id: str):
+    """
+    Per-tenant activity journal retention. New journal entries get
+    `expire_at = created_at + days` (TTL index on each monthly partition);
+    empty input falls back to the global monthly archive window.
+    """
+    admin = get_current_admin()
+    master = get_master_db()
+    tid = _oid(tenant_id)
+    tenant = master.tenants.find_one({"_id": tid})
+    if not tenant:
+        abort(404)
+
+    raw = (request.form.get("days") or "").strip()
+    days = None
+    if raw:
+        try:
+            days = int(raw)
+        except ValueError:
+            days = 0
+        if days <= 0 or days > 3650:
+            flash("Retention must be between 1 and 3650 days.", "error")
+            return redirect(url_for("admin_panel.tenant_detail", tenant_id=tenant_id))
+
+    before = tenant.get("audit_retention_days")
+    if days:
+        update = {"$set": {"audit_retention_days": days, "updated_at": datetime.utcnow()}}
+    else:
+        update = {"$set": {"updated_at": datetime.utcnow()}, "$unset": {"audit_retention_days": ""}}
+    master.tenants.update_one({"_id": tid}, update)
+
+    log_admin_action(
+        admin,
+        action="tenant.set_audit_retention",
+        target_type="tenant",
+        target_id=tid,
+        before={"audit_retention_days": before},
+        after={"audit_retention_days": days},
+        extra={"tenant_name": tenant.get("name")},
+    )
+    flash("Activity journal retention saved.", "success")
+    return redirect(url_for("admin_panel.tenant_detail", tenant_id=tenant_id))
+
+
 # ---------------------------------------------------------------------------
 # Shops (locations)
 # ---------------------------------------------------------------------------
@@ -436,6 +533,8 @@ def shop_toggle_active(shop_id: str):
             "updated_at": datetime.utcnow(),
         }},
     )
+    record_active_change(master, "shops", shop.get("is_active") is True, new_active)
+    record_shop_change(master, shop.get("tenant_id"), shop.get("is_active") is True, new_active)
     log_admin_action(
         admin,
         action="shop.toggle_active",
@@ -445,6 +544,7 @@ def shop_toggle_active(shop_id: str):
         after={"is_active": new_active},
         extra={"shop_name": shop.get("name"), "tenant_id": shop.get("tenant_id")},
     )
+    invalidate_shop_switcher(shop.get("tenant_id"))
     flash(
         f"Location '{shop.get('name')}' is now {'active' if new_active else 'inactive'}.",
         "success",
@@ -474,6 +574,8 @@ def user_toggle_active(user_id: str):
         {"_id": uid},
         {"$set": {"is_active": new_active, "updated_at": datetime.utcnow()}},
     )
+    record_active_change(master, "users", user.get("is_active") is True, new_active)
+    record_user_change(master, user.get("tenant_id"), user, {**user, "is_active": new_active})
     log_admin_action(
         admin,
         action="user.toggle_active",
@@ -495,3 +597,45 @@ def user_toggle_active(user_id: str):
         return redirect(url_for("admin_panel.tenant_detail", tenant_id=str(tenant_id)))
     return redirect(url_for("admin_panel.tenants_list"))
 
+
+# ---------------------------------------------------------------------------
+# Diagnostics
+# ---------------------------------------------------------------------------
+
+@admin_panel_bp.get("/admin/cache/stats")
+@admin_required
+def cache_stats_json():
+    # Counters are per worker process; the response carries its pid.
+    return jsonify(cache_stats())
+
+
+@admin_panel_bp.get("/admin/profiling")
+@admin_required
+def profiling_json():
+    # ?captures=1 adds the sampled cProfile captures; ?sort=avg_queries etc.
+    return jsonify(profiling_report(
+        include_captures=request.args.get("captures") in ("1", "true"),
+        sort=request.args.get("sort") or "total_db_ms",
+    ))
+
+
+@admin_panel_bp.post("/admin/profiling/reset")
+@admin_required
+def profiling_reset():
+    admin = get_current_admin()
+    reset_profiling()
+    log_admin_action(admin, action="profiling.reset", target_type="profiling", target_id=None)
+    return jsonify({"ok": True})
+
+
+@admin_panel_bp.get("/metrics")
+def metrics():
+    # Scrapers send the bearer token; admins can open it in the browser.
+    token = current_app.config.get("METRICS_TOKEN") or ""
+    auth = request.headers.get("Authorization") or ""
+    if not (token and hmac.compare_digest(auth, f"Bearer {token}")) and not get_current_admin():
+        abort(401)
+    if not metrics_enabled():
+        abort(404)
+    body, content_type = render_metrics()
+    return Response(body, mimetype=None, content_type=content_type)
@@ -10,8 +10,8 @@ from bson import ObjectId
 from flask import request, jsonify, session, make_response
 
 from app.blueprints.attachments import attachments_bp
-from app.extensions import get_master_db, get_mongo_client
-from app.utils.auth import login_required, SESSION_TENANT_ID, SESSION_USER_ID
+from app.extensions import get_master_db
+from app.utils.auth import login_required, SESSION_USER_ID
 from app.utils.permissions import permission_required
 from app.utils.attachments import (
     ENTITY_TYPES,
@@ -21,6 +21,7 @@ from app.utils.attachments import (
     get_attachment,
     delete_attachment,
 )
+from app.utils.tenant_context import get_active_shop_db
 
 
 def _oid(value):
@@ -32,47 +33,6 @@ def _oid(value):
         return None
 
 
-def _tenant_id_variants():
-    raw = session.get(SESSION_TENANT_ID)
-    out = set()
-    if raw is None:
-        return []
-    out.add(raw)
-    out.add(str(raw))
-    oid = _oid(raw)
-    if oid:
-        out.add(oid)
-    return list(out)
-
-
-def _get_shop_db(master):
-    shop_id_raw = session.get("shop_id")
-    shop_oid = _oid(shop_id_raw)
-    if not shop_oid:
-        return None, None
-
-    tenant_variants = _tenant_id_variants()
-    if not tenant_variants:
-        return None, None
-
-    shop = master.shops.find_one({"_id": shop_oid, "tenant_id": {"$in": tenant_variants}})
-    if not shop:
-        return None, None
-
-    db_name = (
-        shop.get("db_name")
-        or shop.get("database")
-        or shop.get("db")
-        or shop.get("mongo_db")
-        or shop.get("shop_db")
-    )
-    if not db_name:
-        return None, shop
-
-    client = get_mongo_client()
-    return client[str(db_name)], shop
-
-
 # ── Upload (one or many) ─────────────────────────────────────────────
 @attachments_bp.route("/api/upload", methods=["POST"])
 @login_required
@@ -86,7 +46,7 @@ def api_upload():
       files         — one or more files (field name "files")
     """
     master = get_master_db()
-    db, shop = _get_shop_db(master)
+    db, shop = get_active_shop_db(master)
     if db is None:
         return jsonify(ok=False, error="No active shop selected."), 400
 
@@ -141,7 +101,7 @@ def api_list():
     Returns JSON list of attachment metadata (no binary).
     """
     master = get_master_db()
-    db, shop = _get_shop_db(master)
+    db, shop = get_active_shop_db(master)
     if db is None:
         return jsonify(ok=False, error="No active shop selected."), 400
 
@@ -165,7 +125,7 @@ def api_list():
 def api_download(attachment_id):
     """Serve the raw file with proper Content-Type for inline viewing."""
     master = get_master_db()
-    db, shop = _get_shop_db(master)
+    db, shop = get_active_shop_db(master)
     if db is None:
         return jsonify(ok=False, error="No active shop selected."), 404
 
@@ -195,7 +155,7 @@ def api_download(attachment_id):
 @permission_required("attachments.delete")
 def api_delete(attachment_id):
     master = get_master_db()
-    db, shop = _get_shop_db(master)
+    db, shop = get_active_shop_db(master)
     if db is None:
         return jsonify(ok=False, error="No active shop selected."), 400
 
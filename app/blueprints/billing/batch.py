@@ -0,0 +1,222 @@
+"""Billing run: invoice every tenant due for renewal in one pass.
+
+    summary = run_billing("2026-10", client=stripe_like, workers=4)
+
+1. Snapshot. One aggregation over `tenants` (active, subscription ending
+   before `due_before`) joined with their `billing_usage` counters writes a
+   `billing_run_items` document per tenant and billing period:
+
+       {"_id": "<tenant_id>:<subscription_until>", "run_id", "tenant_id",
+        "period_end", "tenant_name", "counts", "amount_cents", "auto_charge",
+        "idempotency_key",
+        "status": pending|invoiced|skipped|failed, "invoice_id", "error",
+        "attempts", "stripe": {"invoice_item_id", "invoice_id", "invoice_sent"},
+        "created_at", "updated_at"}
+
+   `subscription_until` only moves when the invoice is paid, so a tenant
+   whose invoice is still open is picked up again by later runs (e.g. the
+   next month's); keying items by the period instead of the run means those
+   runs find the same item. Items already invoiced for the period are left
+   alone, and items whose Stripe invoice already exists keep their
+   snapshotted counts, so re-running (after a crash or to retry failures)
+   only touches the rest. `run_id` is the run that last snapshotted the item.
+2. Submit. Pending and failed items go through a bounded thread pool. Each
+   attempt bills the snapshotted counts under its own idempotency key
+   (`<idempotency_key>:<attempt>`), and every Stripe object it creates is
+   recorded under `stripe` and reused by the next attempt, so a retry (even
+   after the 24-hour key expiry) never creates a second invoice item or
+   invoice. Tenants with a saved card
+   (`stripe_default_card`, cached by the customer.updated webhook) go through
+   `charge_saved_card`; the rest get an invoice email.
+
+`client` is anything shaped like the `stripe` module (default: the configured
+stripe module); pass a stub to test.
+"""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from pymongo import ReturnDocument, UpdateOne
+
+from app.extensions import get_master_db
+from app.utils.billing_usage import USAGE_FIELDS, rebuild_billing_usage
+from app.utils.stripe_client import charge_saved_card, compute_amount_cents, create_billing_invoice
+
+
+RUNS_COLLECTION = "billing_runs"
+ITEMS_COLLECTION = "billing_run_items"
+
+STATUS_PENDING = "pending"
+STATUS_INVOICED = "invoiced"
+STATUS_SKIPPED = "skipped"
+STATUS_FAILED = "failed"
+
+DEFAULT_WORKERS = 4
+DEFAULT_DUE_WITHIN = timedelta(days=3)
+
+
+def item_id(tenant_id, period_end: datetime) -> str:
+    return f"{tenant_id}:{period_end.isoformat()}"
+
+
+def _tenants_due(master, due_before: datetime, tenant_ids=None) -> list[dict]:
+    match: dict = {"status": "active", "subscription_until": {"$type": "date", "$lt": due_before}}
+    if tenant_ids:
+        match["_id"] = {"$in": list(tenant_ids)}
+    return list(master.tenants.aggregate([
+        {"$match": match},
+        {"$lookup": {"from": "billing_usage", "localField": "_id", "foreignField": "_id", "as": "usage"}},
+        {"$project": {
+            "name": 1, "slug": 1, "email": 1, "phone": 1, "billing_email": 1, "billing_phone": 1,
+            "stripe_customer_id": 1, "stripe_default_card": 1, "subscription_until": 1,
+            "usage": {"$arrayElemAt": ["$usage", 0]},
+        }},
+    ]))
+
+
+def snapshot_run(run_id: str, *, due_before: datetime, tenant_ids=None, master=None) -> dict:
+    """Write the run's items; returns {"tenants", "new", "already_invoiced"}."""
+    master = master if master is not None else get_master_db()
+    tenants = _tenants_due(master, due_before, tenant_ids)
+
+    # Tenants that never got counters (created before they existed): recount just those.
+    missing = [t["_id"] for t in tenants if not t.get("usage")]
+    if missing:
+        rebuild_billing_usage(master, missing)
+        usage = {u["_id"]: u for u in master.billing_usage.find({"_id": {"$in": missing}})}
+        for t in tenants:
+            t["usage"] = t.get("usage") or usage.get(t["_id"]) or {}
+
+    ids = [item_id(t["_id"], t["subscription_until"]) for t in tenants]
+    done, locked = set(), set()
+    for d in master[ITEMS_COLLECTION].find(
+        {"_id": {"$in": ids}, "$or": [{"status": STATUS_INVOICED}, {"stripe.invoice_id": {"$exists": True}}]},
+        {"status": 1},
+    ):
+        # An invoice exists for the snapshotted counts: keep them so a retry finishes that invoice.
+        (done if d.get("status") == STATUS_INVOICED else locked).add(d["_id"])
+
+    now = datetime.utcnow()
+    ops = []
+    for tenant in tenants:
+        iid = item_id(tenant["_id"], tenant["subscription_until"])
+        if iid in done:
+            continue
+        if iid in locked:
+            ops.append(UpdateOne({"_id": iid}, {"$set": {"run_id": run_id, "updated_at": now}}))
+            continue
+        counts = {f: max(0, int((tenant.get("usage") or {}).get(f) or 0)) for f in USAGE_FIELDS}
+        amount = compute_amount_cents(counts)
+        ops.append(UpdateOne(
+            {"_id": iid, "status": {"$ne": STATUS_INVOICED}},
+            {
+                "$set": {
+                    "run_id": run_id,
+                    "tenant_name": tenant.get("name") or "",
+                    "counts": counts,
+                    "amount_cents": amount,
+                    "auto_charge": bool((tenant.get("stripe_default_card") or {}).get("pm_id")),
+                    "status": STATUS_PENDING if amount > 0 else STATUS_SKIPPED,
+                    "error": "" if amount > 0 else "no billable units",
+                    "updated_at": now,
+                },
+                "$setOnInsert": {
+                    "tenant_id": tenant["_id"],
+                    "period_end": tenant["subscription_until"],
+                    "idempotency_key": f"roobico-billing:{iid}",
+                    "attempts": 0,
+                    "created_at": now,
+                },
+            },
+            upsert=True,
+        ))
+    if ops:
+        master[ITEMS_COLLECTION].bulk_write(ops, ordered=False)
+
+    master[RUNS_COLLECTION].update_one(
+        {"_id": run_id},
+        {"$set": {"due_before": due_before, "snapshot_at": now, "tenants": len(tenants)},
+         "$setOnInsert": {"created_at": now}},
+        upsert=True,
+    )
+    return {"tenants": len(tenants), "new": len(ops) - len(locked), "already_invoiced": len(done)}
+
+
+def _submit_item(app, item: dict, client, period_label: str) -> str:
+    with app.app_context():
+        master = get_master_db()
+        items = master[ITEMS_COLLECTION]
+        tenant = master.tenants.find_one({"_id": item["tenant_id"]})
+        attempt = items.find_one_and_update(
+            {"_id": item["_id"]}, {"$inc": {"attempts": 1}}, {"attempts": 1}, return_document=ReturnDocument.AFTER,
+        )["attempts"]
+        if not tenant:
+            items.update_one({"_id": item["_id"]}, {"$set": {
+                "status": STATUS_SKIPPED, "error": "tenant not found", "updated_at": datetime.utcnow()}})
+            return STATUS_SKIPPED
+        try:
+            kwargs = {
+                "counts": item["counts"],
+                "client": client,
+                "idempotency_key": f"{item['idempotency_key']}:{attempt}",
+                "resume": item.get("stripe") or {},
+                "on_progress": lambda fields: items.update_one(
+                    {"_id": item["_id"]}, {"$set": {f"stripe.{k}": v for k, v in fields.items()}}),
+            }
+            if item.get("auto_charge"):
+                result = charge_saved_card(tenant, period_label, **kwargs)
+            else:
+                result = create_billing_invoice(tenant, auto_charge=False, period_label=period_label, **kwargs)
+        except Exception as exc:
+            app.logger.warning("Billing run item %s failed: %r", item["_id"], exc)
+            items.update_one({"_id": item["_id"]}, {"$set": {
+                "status": STATUS_FAILED, "error": str(exc)[:500], "updated_at": datetime.utcnow()}})
+            return STATUS_FAILED
+        items.update_one({"_id": item["_id"]}, {"$set": {
+            "status": STATUS_INVOICED,
+            "invoice_id": result["invoice_id"],
+            "invoice_status": result.get("status"),
+            "hosted_url": result.get("hosted_url"),
+            "error": "",
+            "updated_at": datetime.utcnow(),
+        }})
+        return STATUS_INVOICED
+
+
+def submit_run(run_id: str, *, client=None, workers: int = DEFAULT_WORKERS, period_label: str = "30 days",
+               master=None) -> dict:
+    """Invoice the run's pending / failed items on `workers` threads; returns counts per outcome."""
+    master = master if master is not None else get_master_db()
+    app = current_app._get_current_object()
+    todo = list(master[ITEMS_COLLECTION].find({"run_id": run_id, "status": {"$in": [STATUS_PENDING, STATUS_FAILED]}}))
+    outcomes = dict.fromkeys((STATUS_INVOICED, STATUS_FAILED, STATUS_SKIPPED), 0)
+    if todo:
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="billing-run") as pool:
+            for status in pool.map(lambda item: _submit_item(app, item, client, period_label), todo):
+                outcomes[status] += 1
+    master[RUNS_COLLECTION].update_one(
+        {"_id": run_id},
+        {"$set": {"submitted_at": datetime.utcnow(), "last_outcomes": outcomes}},
+    )
+    return outcomes
+
+
+def run_summary(run_id: str, master=None) -> dict:
+    """{status: {"tenants", "amount_cents"}} over the run's items."""
+    master = master if master is not None else get_master_db()
+    rows = master[ITEMS_COLLECTION].aggregate([
+        {"$match": {"run_id": run_id}},
+        {"$group": {"_id": "$status", "tenants": {"$sum": 1}, "amount_cents": {"$sum": "$amount_cents"}}},
+    ])
+    return {row["_id"]: {"tenants": row["tenants"], "amount_cents": row["amount_cents"]} for row in rows}
+
+
+def run_billing(run_id: str, *, client=None, due_before: datetime | None = None, tenant_ids=None,
+                workers: int = DEFAULT_WORKERS, dry_run: bool = False, period_label: str = "30 days") -> dict:
+    """Snapshot then (unless `dry_run`) submit. Safe to call again for the same `run_id`."""
+    due_before = due_before or datetime.utcnow() + DEFAULT_DUE_WITHIN
+    snapshot = snapshot_run(run_id, due_before=due_before, tenant_ids=tenant_ids)
+    outcomes = None if dry_run else submit_run(run_id, client=client, workers=workers, period_label=period_label)
+    return {"run_id": run_id, "snapshot": snapshot, "outcomes": outcomes, "summary": run_summary(run_id)}
@@ -1,16 +1,29 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone
+import hashlib
+from datetime import datetime, timedelta, timezone
 
 from bson import ObjectId
-from flask import request, session, jsonify
+from flask import request, session, jsonify, make_response
 
 from app.blueprints.calendar import calendar_bp
+from app.blueprints.calendar.scheduling import (
+    NON_BLOCKING_STATUSES,
+    events_window_query,
+    find_conflicts,
+    mechanic_utilization,
+    next_free_slots,
+    record_event_span,
+    shop_now,
+    to_wall_time,
+    workday_capacity,
+)
 from app.blueprints.main.routes import NAV_ITEMS
-from app.extensions import get_master_db, get_mongo_client
+from app.extensions import get_master_db
 from app.utils.auth import login_required, SESSION_TENANT_ID, SESSION_USER_ID
 from app.utils.layout import render_internal_page
 from app.utils.permissions import filter_nav_items, permission_required
+from app.utils.tenant_context import get_active_shop_db, shop_members_filter
 
 
 # ── helpers ──────────────────────────────────────────────────
@@ -28,53 +41,16 @@ def _oid(v):
         return None
 
 
-def _tenant_variants():
-    raw = session.get(SESSION_TENANT_ID)
-    if raw is None:
-        return []
-    out = {raw, str(raw)}
-    o = _oid(raw)
-    if o:
-        out.add(o)
-    return list(out)
-
-
-def _get_shop_db():
-    master = get_master_db()
-    shop_id = _oid(session.get("shop_id"))
-    if not shop_id:
-        return None, None
-    tv = _tenant_variants()
-    if not tv:
-        return None, None
-    shop = master.shops.find_one({"_id": shop_id, "tenant_id": {"$in": tv}})
-    if not shop:
-        return None, None
-    db_name = shop.get("db_name")
-    if not db_name:
-        return None, shop
-    client = get_mongo_client()
-    return client[str(db_name)], shop
-
-
 def _get_assignable_mechanics(shop):
-    shop_id = shop.get("_id")
-    if not shop_id:
-        return []
-    tv = _tenant_variants()
-    if not tv:
+    if not shop.get("_id") or not shop.get("tenant_id"):
         return []
     master = get_master_db()
     rows = list(
         master.users.find(
             {
-                "tenant_id": {"$in": tv},
+                **shop_members_filter(shop),
                 "is_active": True,
                 "role": {"$in": ["senior_mechanic", "mechanic"]},
-                "$or": [
-                    {"shop_ids": {"$in": [shop_id, str(shop_id)]}},
-                    {"shop_id": {"$in": [shop_id, str(shop_id)]}},
-                ],
             },
             {"first_name": 1, "last_name": 1, "name": 1, "email": 1, "role": 1},
         ).sort([("first_name", 1), ("last_name", 1)])
@@ -131,6 +107,64 @@ APPOINTMENT_STATUSES = [
 ]
 
 
+# ── event serialization / versioning ─────────────────────────
+
+# Only the fields the calendar grid renders.
+EVENT_PROJECTION = {
+    "title": 1,
+    "start_time": 1,
+    "end_time": 1,
+    "status": 1,
+    "customer_id": 1,
+    "customer_label": 1,
+    "unit_id": 1,
+    "unit_label": 1,
+    "mechanic_id": 1,
+    "mechanic_name": 1,
+    "presets": 1,
+}
+
+CALENDAR_VERSION_KEY = "events_version"
+
+
+def _serialize_event(r):
+    return {
+        "id": str(r["_id"]),
+        "title": r.get("title") or "",
+        "start_time": r["start_time"].isoformat() if r.get("start_time") else "",
+        "end_time": r["end_time"].isoformat() if r.get("end_time") else "",
+        "status": r.get("status", "scheduled"),
+        "customer_id": str(r["customer_id"]) if r.get("customer_id") else "",
+        "customer_label": r.get("customer_label") or "",
+        "unit_id": str(r["unit_id"]) if r.get("unit_id") else "",
+        "unit_label": r.get("unit_label") or "",
+        "mechanic_id": str(r["mechanic_id"]) if r.get("mechanic_id") else "",
+        "mechanic_name": r.get("mechanic_name") or "",
+        "presets": r.get("presets") or [],
+    }
+
+
+def _get_calendar_version(db) -> int:
+    doc = db.calendar_settings.find_one({"key": CALENDAR_VERSION_KEY}, {"version": 1})
+    return int((doc or {}).get("version") or 0)
+
+
+def _bump_calendar_version(db) -> None:
+    """Invalidates every cached events window (ETag) of this shop."""
+    db.calendar_settings.update_one(
+        {"key": CALENDAR_VERSION_KEY},
+        {"$inc": {"version": 1}, "$set": {"updated_at": _utcnow()}},
+        upsert=True,
+    )
+
+
+def _parse_iso(value):
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except Exception:
+        return None
+
+
 def _get_statuses(db):
     """Return statuses from DB settings, or default list."""
     if db is None:
@@ -141,6 +175,17 @@ def _get_statuses(db):
     return list(APPOINTMENT_STATUSES)
 
 
+def _double_booking_response(conflicts):
+    """409 the calendar answers with a "book anyway?" prompt (resent with allow_double_booking)."""
+    first = conflicts[0]
+    return jsonify({
+        "error": f"Mechanic is already booked: {first['title'] or 'appointment'} "
+                 f"{first['start_time'][11:16]}–{first['end_time'][11:16]}.",
+        "code": "double_booking",
+        "conflicts": conflicts,
+    }), 409
+
+
 # ── page ─────────────────────────────────────────────────────
 
 @calendar_bp.get("/calendar")
@@ -162,7 +207,7 @@ def calendar_page():
 @permission_required("calendar.view")
 def api_customers():
     try:
-        db, shop = _get_shop_db()
+        db, shop = get_active_shop_db()
         if db is None:
             return jsonify([])
         rows = list(
@@ -181,7 +226,7 @@ def api_customers():
 @permission_required("calendar.view")
 def api_units(customer_id):
     try:
-        db, shop = _get_shop_db()
+        db, shop = get_active_shop_db()
         cid = _oid(customer_id)
         if db is None or not cid:
             return jsonify([])
@@ -201,7 +246,7 @@ def api_units(customer_id):
 @permission_required("calendar.view")
 def api_mechanics():
     try:
-        _, shop = _get_shop_db()
+        _, shop = get_active_shop_db()
         if not shop:
             return jsonify([])
         return jsonify(_get_assignable_mechanics(shop))
@@ -213,7 +258,7 @@ def api_mechanics():
 @login_required
 @permission_required("calendar.view")
 def api_statuses():
-    db, _ = _get_shop_db()
+    db, _ = get_active_shop_db()
     return jsonify(_get_statuses(db))
 
 
@@ -221,7 +266,7 @@ def api_statuses():
 @login_required
 @permission_required("calendar.view")
 def api_presets():
-    db, shop = _get_shop_db()
+    db, shop = get_active_shop_db()
     if db is None:
         return jsonify([])
     rows = list(
@@ -238,7 +283,7 @@ def api_presets():
 @permission_required("calendar.manage_settings")
 def api_save_statuses():
     import re
-    db, _ = _get_shop_db()
+    db, _ = get_active_shop_db()
     if db is None:
         return jsonify({"error": "Shop not configured"}), 400
 
@@ -279,53 +324,43 @@ def api_save_statuses():
 @login_required
 @permission_required("calendar.view")
 def api_events():
-    db, shop = _get_shop_db()
+    """
+    Events overlapping [start, end): start_time < end AND end_time > start,
+    so multi-day events that began before the window are included.
+    Responses carry a weak ETag built from the per-shop calendar version, so
+    revalidating an unchanged window costs one settings read and a 304.
+    """
+    db, shop = get_active_shop_db()
     if db is None:
         return jsonify([])
 
-    start = request.args.get("start", "")
-    end = request.args.get("end", "")
-    query = {"shop_id": shop["_id"]}
-
-    if start:
-        try:
-            query["start_time"] = {"$gte": datetime.fromisoformat(start.replace("Z", "+00:00"))}
-        except Exception:
-            pass
-    if end:
-        try:
-            query.setdefault("start_time", {})
-            query["start_time"]["$lt"] = datetime.fromisoformat(end.replace("Z", "+00:00"))
-        except Exception:
-            pass
-
-    rows = list(db.calendar_events.find(query).sort("start_time", 1))
-
-    events = []
-    for r in rows:
-        events.append({
-            "id": str(r["_id"]),
-            "title": r.get("title") or "",
-            "start_time": r["start_time"].isoformat() if r.get("start_time") else "",
-            "end_time": r["end_time"].isoformat() if r.get("end_time") else "",
-            "status": r.get("status", "scheduled"),
-            "customer_id": str(r["customer_id"]) if r.get("customer_id") else "",
-            "customer_label": r.get("customer_label") or "",
-            "unit_id": str(r["unit_id"]) if r.get("unit_id") else "",
-            "unit_label": r.get("unit_label") or "",
-            "mechanic_id": str(r["mechanic_id"]) if r.get("mechanic_id") else "",
-            "mechanic_name": r.get("mechanic_name") or "",
-            "presets": r.get("presets") or [],
-        })
+    start = _parse_iso(request.args.get("start", "")) if request.args.get("start") else None
+    end = _parse_iso(request.args.get("end", "")) if request.args.get("end") else None
+
+    version = _get_calendar_version(db)
+    etag_src = f"{shop['_id']}:{version}:{start.isoformat() if start else ''}:{end.isoformat() if end else ''}"
+    etag = hashlib.sha1(etag_src.encode("utf-8")).hexdigest()
+
+    if request.if_none_match.contains_weak(etag):
+        response = make_response("", 304)
+        response.set_etag(etag, weak=True)
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
 
-    return jsonify(events)
+    query = events_window_query(db, shop["_id"], start, end)
+    rows = db.calendar_events.find(query, EVENT_PROJECTION).sort("start_time", 1)
+
+    response = jsonify([_serialize_event(r) for r in rows])
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
 
 
 @calendar_bp.post("/calendar/api/events")
 @login_required
 @permission_required("calendar.create")
 def api_create_event():
-    db, shop = _get_shop_db()
+    db, shop = get_active_shop_db()
     if db is None:
         return jsonify({"error": "Shop not configured"}), 400
 
@@ -370,6 +405,12 @@ def api_create_event():
     if status not in valid_statuses:
         status = "scheduled"
 
+    mechanic_id = _oid(mechanic_id_raw)
+    if mechanic_id and status not in NON_BLOCKING_STATUSES and not data.get("allow_double_booking"):
+        conflicts = find_conflicts(db, shop["_id"], mechanic_id, start_time, end_time)
+        if conflicts:
+            return _double_booking_response(conflicts)
+
     user_id = _oid(session.get(SESSION_USER_ID))
     now = _utcnow()
 
@@ -382,7 +423,7 @@ def api_create_event():
         "customer_label": customer_label_val,
         "unit_id": _oid(unit_id_raw),
         "unit_label": unit_label_val,
-        "mechanic_id": _oid(mechanic_id_raw),
+        "mechanic_id": mechanic_id,
         "mechanic_name": mechanic_name_val,
         "presets": presets,
         "shop_id": shop["_id"],
@@ -395,28 +436,17 @@ def api_create_event():
 
     result = db.calendar_events.insert_one(doc)
     doc["_id"] = result.inserted_id
+    record_event_span(db, start_time, end_time)
+    _bump_calendar_version(db)
 
-    return jsonify({
-        "id": str(doc["_id"]),
-        "title": doc["title"],
-        "start_time": doc["start_time"].isoformat(),
-        "end_time": doc["end_time"].isoformat(),
-        "status": doc["status"],
-        "customer_id": str(doc["customer_id"]) if doc["customer_id"] else "",
-        "customer_label": doc["customer_label"],
-        "unit_id": str(doc["unit_id"]) if doc["unit_id"] else "",
-        "unit_label": doc["unit_label"],
-        "mechanic_id": str(doc["mechanic_id"]) if doc["mechanic_id"] else "",
-        "mechanic_name": doc["mechanic_name"],
-        "presets": doc.get("presets") or [],
-    }), 201
+    return jsonify(_serialize_event(doc)), 201
 
 
 @calendar_bp.put("/calendar/api/events/<event_id>")
 @login_required
 @permission_required("calendar.edit")
 def api_update_event(event_id):
-    db, shop = _get_shop_db()
+    db, shop = get_active_shop_db()
     eid = _oid(event_id)
     if db is None or not eid:
         return jsonify({"error": "Not found"}), 404
@@ -460,33 +490,111 @@ def api_update_event(event_id):
     if "status" in updates and updates["status"] not in valid_statuses:
         updates["status"] = existing.get("status", "scheduled")
 
+    merged = {**existing, **updates}
+    start_time, end_time = merged.get("start_time"), merged.get("end_time")
+    rescheduled = any(f in updates for f in ("start_time", "end_time", "mechanic_id", "status"))
+    if rescheduled and start_time and end_time:
+        if to_wall_time(end_time) <= to_wall_time(start_time):
+            return jsonify({"error": "End time must be after start time"}), 400
+        if (
+            merged.get("mechanic_id")
+            and merged.get("status") not in NON_BLOCKING_STATUSES
+            and not data.get("allow_double_booking")
+        ):
+            conflicts = find_conflicts(db, shop["_id"], merged["mechanic_id"], start_time, end_time, exclude_id=eid)
+            if conflicts:
+                return _double_booking_response(conflicts)
+
     db.calendar_events.update_one({"_id": eid}, {"$set": updates})
+    if start_time and end_time:
+        record_event_span(db, start_time, end_time)
+    _bump_calendar_version(db)
 
-    updated = db.calendar_events.find_one({"_id": eid})
-    return jsonify({
-        "id": str(updated["_id"]),
-        "title": updated.get("title") or "",
-        "start_time": updated["start_time"].isoformat() if updated.get("start_time") else "",
-        "end_time": updated["end_time"].isoformat() if updated.get("end_time") else "",
-        "status": updated.get("status", "scheduled"),
-        "customer_id": str(updated["customer_id"]) if updated.get("customer_id") else "",
-        "customer_label": updated.get("customer_label") or "",
-        "unit_id": str(updated["unit_id"]) if updated.get("unit_id") else "",
-        "unit_label": updated.get("unit_label") or "",
-        "mechanic_id": str(updated["mechanic_id"]) if updated.get("mechanic_id") else "",
-        "mechanic_name": updated.get("mechanic_name") or "",
-        "presets": updated.get("presets") or [],
-    })
+    updated = db.calendar_events.find_one({"_id": eid}, EVENT_PROJECTION)
+    return jsonify(_serialize_event(updated))
 
 
 @calendar_bp.delete("/calendar/api/events/<event_id>")
 @login_required
 @permission_required("calendar.delete")
 def api_delete_event(event_id):
-    db, shop = _get_shop_db()
+    db, shop = get_active_shop_db()
     eid = _oid(event_id)
     if db is None or not eid:
         return jsonify({"error": "Not found"}), 404
 
-    db.calendar_events.delete_one({"_id": eid, "shop_id": shop["_id"]})
+    res = db.calendar_events.delete_one({"_id": eid, "shop_id": shop["_id"]})
+    if res.deleted_count:
+        _bump_calendar_version(db)
     return jsonify({"ok": True})
+
+
+# ── API: scheduling ──────────────────────────────────────────
+
+@calendar_bp.get("/calendar/api/mechanics/<mechanic_id>/free-slots")
+@login_required
+@permission_required("calendar.view")
+def api_mechanic_free_slots(mechanic_id):
+    """Next free slots of ?duration= minutes (default 60) from ?after= (default now), ?limit= (max 20)."""
+    db, shop = get_active_shop_db()
+    mid = _oid(mechanic_id)
+    if db is None or not mid:
+        return jsonify({"error": "Not found"}), 404
+
+    try:
+        duration_min = int(request.args.get("duration") or 60)
+        limit = max(1, min(20, int(request.args.get("limit") or 1)))
+    except ValueError:
+        return jsonify({"error": "duration and limit must be integers"}), 400
+    if duration_min <= 0:
+        return jsonify({"error": "duration must be positive"}), 400
+
+    after = _parse_iso(request.args.get("after", "")) if request.args.get("after") else None
+    slots = next_free_slots(
+        db, shop["_id"], mid, timedelta(minutes=duration_min), after=after or shop_now(), limit=limit
+    )
+    return jsonify({
+        "mechanic_id": str(mid),
+        "duration": duration_min,
+        "slots": [{"start_time": s.isoformat(), "end_time": e.isoformat()} for s, e in slots],
+    })
+
+
+@calendar_bp.get("/calendar/api/utilization")
+@login_required
+@permission_required("calendar.view")
+def api_utilization():
+    """Booked vs. working hours per assignable mechanic for ?start=&end= (default: this week)."""
+    db, shop = get_active_shop_db()
+    if db is None:
+        return jsonify({"error": "Shop not configured"}), 400
+
+    start = _parse_iso(request.args.get("start", "")) if request.args.get("start") else None
+    end = _parse_iso(request.args.get("end", "")) if request.args.get("end") else None
+    if start is None:
+        today = shop_now().replace(hour=0, minute=0, second=0, microsecond=0)
+        start = today - timedelta(days=today.weekday())
+    if end is None:
+        end = start + timedelta(days=7)
+    if end <= start:
+        return jsonify({"error": "end must be after start"}), 400
+
+    rows = mechanic_utilization(db, shop["_id"], start, end)
+    seen = {r["mechanic_id"] for r in rows}
+    capacity = round(workday_capacity(to_wall_time(start), to_wall_time(end)).total_seconds() / 3600, 2)
+    for m in _get_assignable_mechanics(shop):
+        if m["id"] in seen:
+            continue
+        rows.append({
+            "mechanic_id": m["id"],
+            "mechanic_name": m["name"],
+            "events": 0,
+            "booked_hours": 0.0,
+            "capacity_hours": capacity,
+            "utilization_percent": 0.0,
+        })
+    return jsonify({
+        "start": to_wall_time(start).isoformat(),
+        "end": to_wall_time(end).isoformat(),
+        "mechanics": rows,
+    })
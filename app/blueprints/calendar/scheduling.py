@@ -0,0 +1,292 @@
+"""Mechanic scheduling: double-booking checks, free-slot search, utilization.
+
+Calendar times are wall-clock times of the shop (the calendar posts local ISO
+strings without an offset), so everything here works on naive datetimes.
+
+Overlap lookups are bounded range scans. `calendar_settings.max_event_span`
+keeps the longest event length ever written (`$max` on every write), so every
+event that overlaps [start, end) has start_time in [start - max_span, end):
+
+    {"shop_id", "mechanic_id", "start_time": {"$gte": start - max_span, "$lt": end},
+     "end_time": {"$gt": start}}
+
+which walks idx_calendar_events_shop_mechanic_start (shop migration 6) instead
+of every future event. Within a window the events go into an `IntervalIndex`
+(sorted starts + bisect) for gap search and busy-time sums.
+"""
+from __future__ import annotations
+
+from bisect import bisect_left
+from datetime import datetime, time as dt_time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from app.utils.display_datetime import get_active_shop_timezone_name
+
+
+MAX_SPAN_KEY = "max_event_span"
+DEFAULT_MAX_SPAN = timedelta(days=1)
+
+# Statuses that don't occupy the mechanic.
+NON_BLOCKING_STATUSES = ("cancelled",)
+
+# Bookable hours per day (matches the calendar grid, HOURS_START / HOURS_END in calendar.js).
+WORKDAY_START_HOUR = 6
+WORKDAY_END_HOUR = 21
+
+FREE_SLOT_HORIZON_DAYS = 31
+FREE_SLOT_STEP = timedelta(minutes=15)
+
+
+def to_wall_time(value: datetime | None) -> datetime | None:
+    """Naive datetime; aware values are converted to UTC first (how Mongo stores them)."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def shop_now() -> datetime:
+    """Current wall-clock time in the active shop's timezone."""
+    try:
+        tz = ZoneInfo(get_active_shop_timezone_name())
+    except Exception:
+        tz = timezone.utc
+    return datetime.now(tz).replace(tzinfo=None)
+
+
+# ── max span bookkeeping ─────────────────────────────────────
+
+
+def get_max_span(db) -> timedelta:
+    doc = db.calendar_settings.find_one({"key": MAX_SPAN_KEY}, {"seconds": 1})
+    if not doc or not doc.get("seconds"):
+        return DEFAULT_MAX_SPAN
+    return max(DEFAULT_MAX_SPAN, timedelta(seconds=float(doc["seconds"])))
+
+
+def record_event_span(db, start_time: datetime, end_time: datetime) -> None:
+    """Call on every event write so overlap scans stay complete."""
+    seconds = (to_wall_time(end_time) - to_wall_time(start_time)).total_seconds()
+    if seconds <= 0:
+        return
+    db.calendar_settings.update_one(
+        {"key": MAX_SPAN_KEY},
+        {"$max": {"seconds": seconds}},
+        upsert=True,
+    )
+
+
+def _overlap_query(shop_id, start: datetime, end: datetime, max_span: timedelta) -> dict:
+    return {
+        "shop_id": shop_id,
+        "start_time": {"$gte": start - max_span, "$lt": end},
+        "end_time": {"$gt": start},
+    }
+
+
+def events_window_query(db, shop_id, start: datetime | None, end: datetime | None) -> dict:
+    """Events overlapping [start, end) (either bound optional) for api_events."""
+    query = {"shop_id": shop_id}
+    if start and end:
+        return _overlap_query(shop_id, to_wall_time(start), to_wall_time(end), get_max_span(db))
+    if end:
+        query["start_time"] = {"$lt": to_wall_time(end)}
+    if start:
+        query["end_time"] = {"$gt": to_wall_time(start)}
+    return query
+
+
+# ── interval index ───────────────────────────────────────────
+
+
+class IntervalIndex:
+    """
+    Static index over [start, end) intervals of one mechanic, sorted by start.
+    `overlapping` bisects on starts and only looks back `max_span`, so lookups
+    cost O(log n + k).
+    """
+
+    def __init__(self, intervals, max_span: timedelta | None = None):
+        self._items = sorted(intervals, key=lambda item: item[0])
+        self._starts = [item[0] for item in self._items]
+        longest = max((item[1] - item[0] for item in self._items), default=timedelta(0))
+        self.max_span = max(longest, max_span or timedelta(0))
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def overlapping(self, start: datetime, end: datetime) -> list[tuple]:
+        lo = bisect_left(self._starts, start - self.max_span)
+        hi = bisect_left(self._starts, end)
+        return [item for item in self._items[lo:hi] if item[1] > start]
+
+    def merged(self, start: datetime | None = None, end: datetime | None = None) -> list[tuple[datetime, datetime]]:
+        """Union of the intervals as disjoint (start, end) pairs, clipped to [start, end)."""
+        items = self._items if start is None or end is None else self.overlapping(start, end)
+        out: list[list] = []
+        for item in items:
+            s, e = item[0], item[1]
+            if start is not None:
+                s, e = max(s, start), min(e, end)
+            if e <= s:
+                continue
+            if out and s <= out[-1][1]:
+                out[-1][1] = max(out[-1][1], e)
+            else:
+                out.append([s, e])
+        return [(s, e) for s, e in out]
+
+    def busy(self, start: datetime, end: datetime) -> timedelta:
+        return sum((e - s for s, e in self.merged(start, end)), timedelta(0))
+
+    def gaps(self, start: datetime, end: datetime) -> list[tuple[datetime, datetime]]:
+        out = []
+        cursor = start
+        for s, e in self.merged(start, end):
+            if s > cursor:
+                out.append((cursor, s))
+            cursor = max(cursor, e)
+        if cursor < end:
+            out.append((cursor, end))
+        return out
+
+
+def _blocking(query: dict) -> dict:
+    return {**query, "status": {"$nin": list(NON_BLOCKING_STATUSES)}}
+
+
+def load_mechanic_index(db, shop_id, mechanic_id, start: datetime, end: datetime) -> IntervalIndex:
+    max_span = get_max_span(db)
+    query = _blocking({**_overlap_query(shop_id, start, end, max_span), "mechanic_id": mechanic_id})
+    rows = db.calendar_events.find(query, {"start_time": 1, "end_time": 1}).sort("start_time", 1)
+    return IntervalIndex(
+        ((to_wall_time(r["start_time"]), to_wall_time(r["end_time"]), r["_id"]) for r in rows),
+        max_span,
+    )
+
+
+# ── conflicts ────────────────────────────────────────────────
+
+
+def find_conflicts(db, shop_id, mechanic_id, start: datetime, end: datetime, *, exclude_id=None, limit: int = 5) -> list[dict]:
+    """Events of `mechanic_id` overlapping [start, end), cancelled ones excepted."""
+    if not mechanic_id:
+        return []
+    start, end = to_wall_time(start), to_wall_time(end)
+    query = _blocking({**_overlap_query(shop_id, start, end, get_max_span(db)), "mechanic_id": mechanic_id})
+    if exclude_id is not None:
+        query["_id"] = {"$ne": exclude_id}
+    rows = db.calendar_events.find(
+        query, {"title": 1, "start_time": 1, "end_time": 1, "customer_label": 1}
+    ).sort("start_time", 1).limit(limit)
+    return [
+        {
+            "id": str(r["_id"]),
+            "title": r.get("title") or r.get("customer_label") or "",
+            "start_time": r["start_time"].isoformat(),
+            "end_time": r["end_time"].isoformat(),
+        }
+        for r in rows
+    ]
+
+
+# ── free slots ───────────────────────────────────────────────
+
+
+def _workday_windows(start: datetime, end: datetime):
+    day = start.date()
+    while datetime.combine(day, dt_time()) < end:
+        open_at = datetime.combine(day, dt_time(WORKDAY_START_HOUR))
+        close_at = datetime.combine(day, dt_time(WORKDAY_END_HOUR))
+        lo, hi = max(open_at, start), min(close_at, end)
+        if lo < hi:
+            yield lo, hi
+        day += timedelta(days=1)
+
+
+def _round_up(value: datetime, step: timedelta) -> datetime:
+    midnight = datetime.combine(value.date(), dt_time())
+    steps = -(-(value - midnight) // step)
+    return midnight + steps * step
+
+
+def next_free_slots(db, shop_id, mechanic_id, duration: timedelta, *, after: datetime,
+                    horizon_days: int = FREE_SLOT_HORIZON_DAYS, limit: int = 1) -> list[tuple[datetime, datetime]]:
+    """
+    The first `limit` slots of `duration` within working hours where
+    `mechanic_id` is free, starting at `after` (rounded up to FREE_SLOT_STEP).
+    Slots never span two days.
+    """
+    if duration <= timedelta(0) or duration > timedelta(hours=WORKDAY_END_HOUR - WORKDAY_START_HOUR):
+        return []
+    start = _round_up(to_wall_time(after), FREE_SLOT_STEP)
+    end = datetime.combine(start.date() + timedelta(days=horizon_days), dt_time())
+    index = load_mechanic_index(db, shop_id, mechanic_id, start, end)
+
+    out = []
+    for day_start, day_end in _workday_windows(start, end):
+        for gap_start, gap_end in index.gaps(day_start, day_end):
+            slot_start = _round_up(gap_start, FREE_SLOT_STEP)
+            if slot_start + duration <= gap_end:
+                out.append((slot_start, slot_start + duration))
+                if len(out) >= limit:
+                    return out
+    return out
+
+
+# ── utilization ──────────────────────────────────────────────
+
+
+def workday_capacity(start: datetime, end: datetime) -> timedelta:
+    return sum((hi - lo for lo, hi in _workday_windows(start, end)), timedelta(0))
+
+
+def mechanic_utilization(db, shop_id, start: datetime, end: datetime, mechanic_ids=None) -> list[dict]:
+    """
+    Booked working hours per mechanic in [start, end) against working-hours
+    capacity. One range scan over the window sorted by start_time; overlapping
+    bookings of one mechanic count once.
+    """
+    start, end = to_wall_time(start), to_wall_time(end)
+    query = _blocking(_overlap_query(shop_id, start, end, get_max_span(db)))
+    query["mechanic_id"] = {"$in": list(mechanic_ids)} if mechanic_ids else {"$ne": None}
+
+    # Sweep: rows arrive sorted by start, so each mechanic's merged busy
+    # intervals can be extended in place.
+    per_mechanic: dict = {}
+    rows = db.calendar_events.find(
+        query, {"start_time": 1, "end_time": 1, "mechanic_id": 1, "mechanic_name": 1}
+    ).sort("start_time", 1)
+    for r in rows:
+        s = max(to_wall_time(r["start_time"]), start)
+        e = min(to_wall_time(r["end_time"]), end)
+        if e <= s:
+            continue
+        entry = per_mechanic.setdefault(r["mechanic_id"], {
+            "name": r.get("mechanic_name") or "", "events": 0, "busy": timedelta(0), "open": None,
+        })
+        entry["events"] += 1
+        current = entry["open"]
+        if current and s <= current[1]:
+            current[1] = max(current[1], e)
+        else:
+            if current:
+                entry["busy"] += workday_capacity(*current)
+            entry["open"] = [s, e]
+
+    capacity = workday_capacity(start, end)
+    out = []
+    for mechanic_id, entry in per_mechanic.items():
+        if entry["open"]:
+            entry["busy"] += workday_capacity(*entry["open"])
+        busy_hours = entry["busy"].total_seconds() / 3600
+        capacity_hours = capacity.total_seconds() / 3600
+        out.append({
+            "mechanic_id": str(mechanic_id),
+            "mechanic_name": entry["name"],
+            "events": entry["events"],
+            "booked_hours": round(busy_hours, 2),
+            "capacity_hours": round(capacity_hours, 2),
+            "utilization_percent": round(busy_hours / capacity_hours * 100, 1) if capacity_hours else 0.0,
+        })
+    out.sort(key=lambda row: row["booked_hours"], reverse=True)
+    return out
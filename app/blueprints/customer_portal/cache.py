@@ -0,0 +1,69 @@
+"""Per-token response cache for the public customer portal tabs.
+
+Every customer doc carries `portal_data_version`; anything that changes what
+the portal shows for that customer (work orders, payments, units,
+authorizations) calls `bump_portal_data_version`. The customer doc is already
+loaded to resolve the token, so checking freshness costs no extra query.
+Rendered tab fragments are kept per worker keyed on
+(token, tab, args) and served while the version matches; browsers get a weak
+ETag built from the same version.
+"""
+from __future__ import annotations
+
+import hashlib
+import time
+
+from flask import request
+
+from app.utils.cache import MISSING, TTLCache
+
+
+PORTAL_CACHE_MAX_ENTRIES = 512
+# Safety net for writes that don't bump the version (bulk imports, scripts).
+PORTAL_CACHE_TTL = 600.0
+
+# Values are (portal_data_version, body); the version check is ours.
+_cache = TTLCache("portal_fragments", maxsize=PORTAL_CACHE_MAX_ENTRIES, ttl=PORTAL_CACHE_TTL, versioned=False)
+
+
+def portal_data_version(customer: dict) -> int:
+    try:
+        return int((customer or {}).get("portal_data_version") or 0)
+    except Exception:
+        return 0
+
+
+def bump_portal_data_version(shop_db, *customer_ids) -> None:
+    ids = list({c for c in customer_ids if c})
+    if shop_db is None or not ids:
+        return
+    try:
+        shop_db.customers.update_many({"_id": {"$in": ids}}, {"$inc": {"portal_data_version": 1}})
+    except Exception:
+        pass
+
+
+def portal_cache_key(token: str, tab: str) -> tuple:
+    return (token, tab, request.args.get("unit_id") or "", request.args.get("offset") or "0")
+
+
+def portal_etag(customer: dict, key: tuple) -> str:
+    # The time bucket makes browsers revalidate at least every PORTAL_CACHE_TTL too.
+    bucket = int(time.time() // PORTAL_CACHE_TTL)
+    digest = hashlib.sha1("\x1f".join(str(part) for part in (*key, bucket)).encode("utf-8")).hexdigest()[:12]
+    return f"p{portal_data_version(customer)}-{digest}"
+
+
+def get_cached_fragment(key: tuple, version: int) -> str | None:
+    entry = _cache.get(key)
+    if entry is MISSING:
+        return None
+    cached_version, body = entry
+    if cached_version != version:
+        _cache.discard(key)
+        return None
+    return body
+
+
+def store_cached_fragment(key: tuple, version: int, body: str) -> None:
+    _cache.set(key, (version, body))
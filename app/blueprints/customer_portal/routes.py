@@ -9,6 +9,7 @@ from flask import (
     abort,
     g,
     jsonify,
+    make_response,
     render_template,
     request,
     send_file,
@@ -16,16 +17,26 @@ from flask import (
 )
 
 from app.blueprints.customer_portal import customer_portal_bp
+from app.blueprints.customer_portal.cache import (
+    get_cached_fragment,
+    portal_cache_key,
+    portal_data_version,
+    portal_etag,
+    store_cached_fragment,
+)
 from app.extensions import get_master_db, get_mongo_client
 from app.utils.auth import login_required
 from app.utils.email_sender import send_email
 from app.utils.permissions import permission_required
 from app.utils.pdf_utils import render_html_to_pdf
+from app.utils.tenant_context import get_active_shop_db
 
 
 # ──────────────────────── helpers ────────────────────────
 
 PORTAL_TOKEN_TTL_DAYS = 30
+# last_used_at is informational; don't write it on every tab fetch.
+PORTAL_TOUCH_INTERVAL = timedelta(minutes=5)
 
 
 def _utcnow():
@@ -144,6 +155,9 @@ def _resolve_portal_token(token: str):
 
 
 def _touch_token(doc):
+    last_used = _as_naive_utc(doc.get("last_used_at"))
+    if isinstance(last_used, datetime) and _utcnow() - last_used < PORTAL_TOUCH_INTERVAL:
+        return
     try:
         _portal_tokens_collection().update_one(
             {"_id": doc["_id"]},
@@ -217,21 +231,24 @@ def _list_customer_units(shop_db, customer_id):
 PORTAL_PAGE_SIZE = 30
 
 
-def _unit_wo_ids(shop_db, customer_id, unit_oid):
-    """Return list of WO _ids for a customer's specific unit."""
-    if not unit_oid:
-        return None
-    return [w["_id"] for w in shop_db.work_orders.find(
-        {"customer_id": customer_id, "unit_id": unit_oid, "is_active": True},
-        {"_id": 1},
-    )]
+def _paid_totals_by_work_order(shop_db, wo_ids):
+    """{wo_id: sum of active payments} for a page of WOs in one aggregation."""
+    if not wo_ids:
+        return {}
+    return {
+        row["_id"]: float(row.get("paid") or 0)
+        for row in shop_db.work_order_payments.aggregate([
+            {"$match": {"work_order_id": {"$in": list(wo_ids)}, "is_active": True}},
+            {"$group": {"_id": "$work_order_id", "paid": {"$sum": "$amount"}}},
+        ])
+    }
 
 
 def _list_customer_work_orders(shop_db, customer_id, unit_oid=None,
                                limit=PORTAL_PAGE_SIZE, offset=0):
     from app.blueprints.work_orders.routes import (
-        _sum_active_work_order_payments,
         _work_order_grand_total,
+        round2,
         unit_label,
     )
     q = {"customer_id": customer_id, "is_active": True}
@@ -245,11 +262,17 @@ def _list_customer_work_orders(shop_db, customer_id, unit_oid=None,
     has_more = len(rows) > limit
     rows = rows[:limit]
 
+    unit_ids = list({wo.get("unit_id") for wo in rows if wo.get("unit_id")})
+    units_by_id = {}
+    if unit_ids:
+        units_by_id = {u["_id"]: u for u in shop_db.units.find({"_id": {"$in": unit_ids}})}
+    paid_by_wo = _paid_totals_by_work_order(shop_db, [wo["_id"] for wo in rows])
+
     out = []
     for wo in rows:
-        unit = shop_db.units.find_one({"_id": wo.get("unit_id")}) or {}
+        unit = units_by_id.get(wo.get("unit_id")) or {}
         grand = _work_order_grand_total(wo)
-        paid = _sum_active_work_order_payments(shop_db, wo["_id"])
+        paid = round2(paid_by_wo.get(wo["_id"], 0))
         out.append({
             "id": str(wo["_id"]),
             "wo_number": str(wo.get("wo_number") or ""),
@@ -266,31 +289,39 @@ def _list_customer_work_orders(shop_db, customer_id, unit_oid=None,
 
 def _list_customer_payments(shop_db, customer_id, unit_oid=None,
                             limit=PORTAL_PAGE_SIZE, offset=0):
-    q = {"customer_id": customer_id, "is_active": True}
+    # One round trip: payments joined to their WO. With a unit filter the join
+    # has to happen before paging; otherwise only the page is joined.
+    paging = [{"$skip": int(offset)}, {"$limit": int(limit) + 1}]
+    lookup = [
+        {"$lookup": {
+            "from": "work_orders",
+            "localField": "work_order_id",
+            "foreignField": "_id",
+            "as": "wo",
+        }},
+        {"$unwind": {"path": "$wo", "preserveNullAndEmptyArrays": True}},
+    ]
+    pipeline = [
+        {"$match": {"customer_id": customer_id, "is_active": True}},
+        {"$sort": {"payment_date": -1}},
+    ]
     if unit_oid:
-        wo_ids = _unit_wo_ids(shop_db, customer_id, unit_oid)
-        if not wo_ids:
-            return [], False
-        q["work_order_id"] = {"$in": wo_ids}
+        pipeline += lookup + [{"$match": {"wo.unit_id": unit_oid, "wo.is_active": True}}] + paging
+    else:
+        pipeline += paging + lookup
+    pipeline.append({"$project": {"wo.labors": 0, "wo.totals": 0, "wo.authorizations": 0}})
 
-    cursor = (shop_db.work_order_payments.find(q)
-              .sort("payment_date", -1)
-              .skip(int(offset)).limit(int(limit) + 1))
-    rows = list(cursor)
+    rows = list(shop_db.work_order_payments.aggregate(pipeline))
     has_more = len(rows) > limit
     rows = rows[:limit]
 
-    wo_numbers = {}
     out = []
     for p in rows:
         wo_id = p.get("work_order_id")
-        if wo_id and wo_id not in wo_numbers:
-            wo = shop_db.work_orders.find_one({"_id": wo_id}, {"wo_number": 1}) or {}
-            wo_numbers[wo_id] = str(wo.get("wo_number") or "")
         out.append({
             "id": str(p["_id"]),
             "wo_id": str(wo_id) if wo_id else "",
-            "wo_number": wo_numbers.get(wo_id, ""),
+            "wo_number": str((p.get("wo") or {}).get("wo_number") or ""),
             "amount": round(float(p.get("amount") or 0), 2),
             "method": str(p.get("payment_method") or "").replace("_", " ").title(),
             "date_label": _format_date(p.get("payment_date") or p.get("created_at")),
@@ -374,73 +405,100 @@ def _parse_unit_filter():
     return _oid(request.args.get("unit_id"))
 
 
+def _cached_tab(token, tab, render):
+    """
+    Serve a tab fragment from the per-token cache; `render(shop_db, customer)`
+    builds the HTML on a miss. Revalidation is keyed on the customer's
+    portal_data_version (see cache.py).
+    """
+    _doc, shop_db, _shop, customer = _portal_fragment_or_404(token)
+    key = portal_cache_key(token, tab)
+    version = portal_data_version(customer)
+    etag = portal_etag(customer, key)
+    if request.if_none_match.contains_weak(etag):
+        resp = make_response("", 304)
+    else:
+        body = get_cached_fragment(key, version)
+        if body is None:
+            body = render(shop_db, customer)
+            store_cached_fragment(key, version, body)
+        resp = make_response(body)
+    resp.set_etag(etag, weak=True)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+
 @customer_portal_bp.get("/portal/<token>/tab/units")
 def tab_units(token):
-    _doc, shop_db, _shop, customer = _portal_fragment_or_404(token)
-    units = _list_customer_units(shop_db, customer["_id"])
-    return render_template(
-        "public/customer_portal/_tab_units.html", units=units,
-    )
+    def render(shop_db, customer):
+        units = _list_customer_units(shop_db, customer["_id"])
+        return render_template(
+            "public/customer_portal/_tab_units.html", units=units,
+        )
+    return _cached_tab(token, "units", render)
 
 
 @customer_portal_bp.get("/portal/<token>/tab/work-orders")
 def tab_work_orders(token):
-    _doc, shop_db, _shop, customer = _portal_fragment_or_404(token)
-    offset, limit = _parse_paging()
-    unit_oid = _parse_unit_filter()
-    work_orders, has_more = _list_customer_work_orders(
-        shop_db, customer["_id"], unit_oid=unit_oid,
-        limit=limit, offset=offset,
-    )
-    unit_label_filter = _unit_label_for(shop_db, unit_oid) if unit_oid else ""
-    return render_template(
-        "public/customer_portal/_tab_work_orders.html",
-        work_orders=work_orders, token=token,
-        offset=offset, page_size=limit, has_more=has_more,
-        unit_id=request.args.get("unit_id") or "",
-        unit_label_filter=unit_label_filter,
-        is_append=offset > 0,
-    )
+    def render(shop_db, customer):
+        offset, limit = _parse_paging()
+        unit_oid = _parse_unit_filter()
+        work_orders, has_more = _list_customer_work_orders(
+            shop_db, customer["_id"], unit_oid=unit_oid,
+            limit=limit, offset=offset,
+        )
+        unit_label_filter = _unit_label_for(shop_db, unit_oid) if unit_oid else ""
+        return render_template(
+            "public/customer_portal/_tab_work_orders.html",
+            work_orders=work_orders, token=token,
+            offset=offset, page_size=limit, has_more=has_more,
+            unit_id=request.args.get("unit_id") or "",
+            unit_label_filter=unit_label_filter,
+            is_append=offset > 0,
+        )
+    return _cached_tab(token, "work_orders", render)
 
 
 @customer_portal_bp.get("/portal/<token>/tab/payments")
 def tab_payments(token):
-    _doc, shop_db, _shop, customer = _portal_fragment_or_404(token)
-    offset, limit = _parse_paging()
-    unit_oid = _parse_unit_filter()
-    payments, has_more = _list_customer_payments(
-        shop_db, customer["_id"], unit_oid=unit_oid,
-        limit=limit, offset=offset,
-    )
-    unit_label_filter = _unit_label_for(shop_db, unit_oid) if unit_oid else ""
-    return render_template(
-        "public/customer_portal/_tab_payments.html",
-        payments=payments,
-        offset=offset, page_size=limit, has_more=has_more,
-        unit_id=request.args.get("unit_id") or "",
-        unit_label_filter=unit_label_filter,
-        is_append=offset > 0,
-    )
+    def render(shop_db, customer):
+        offset, limit = _parse_paging()
+        unit_oid = _parse_unit_filter()
+        payments, has_more = _list_customer_payments(
+            shop_db, customer["_id"], unit_oid=unit_oid,
+            limit=limit, offset=offset,
+        )
+        unit_label_filter = _unit_label_for(shop_db, unit_oid) if unit_oid else ""
+        return render_template(
+            "public/customer_portal/_tab_payments.html",
+            payments=payments,
+            offset=offset, page_size=limit, has_more=has_more,
+            unit_id=request.args.get("unit_id") or "",
+            unit_label_filter=unit_label_filter,
+            is_append=offset > 0,
+        )
+    return _cached_tab(token, "payments", render)
 
 
 @customer_portal_bp.get("/portal/<token>/tab/authorizations")
 def tab_authorizations(token):
-    _doc, shop_db, _shop, customer = _portal_fragment_or_404(token)
-    offset, limit = _parse_paging()
-    unit_oid = _parse_unit_filter()
-    authorizations, has_more = _list_customer_authorizations(
-        shop_db, customer["_id"], unit_oid=unit_oid,
-        limit=limit, offset=offset,
-    )
-    unit_label_filter = _unit_label_for(shop_db, unit_oid) if unit_oid else ""
-    return render_template(
-        "public/customer_portal/_tab_authorizations.html",
-        authorizations=authorizations,
-        offset=offset, page_size=limit, has_more=has_more,
-        unit_id=request.args.get("unit_id") or "",
-        unit_label_filter=unit_label_filter,
-        is_append=offset > 0,
-    )
+    def render(shop_db, customer):
+        offset, limit = _parse_paging()
+        unit_oid = _parse_unit_filter()
+        authorizations, has_more = _list_customer_authorizations(
+            shop_db, customer["_id"], unit_oid=unit_oid,
+            limit=limit, offset=offset,
+        )
+        unit_label_filter = _unit_label_for(shop_db, unit_oid) if unit_oid else ""
+        return render_template(
+            "public/customer_portal/_tab_authorizations.html",
+            authorizations=authorizations,
+            offset=offset, page_size=limit, has_more=has_more,
+            unit_id=request.args.get("unit_id") or "",
+            unit_label_filter=unit_label_filter,
+            is_append=offset > 0,
+        )
+    return _cached_tab(token, "authorizations", render)
 
 
 def _unit_label_for(shop_db, unit_oid):
@@ -471,39 +529,47 @@ def _quarter_range(year: int, quarter: int):
 
 
 def _maintenance_rows(shop_db, customer_id, unit_oid, year, quarter):
-    """Return WO rows for the given unit + quarter as maintenance entries."""
-    from app.blueprints.work_orders.routes import _work_order_grand_total
+    """Return one maintenance entry per WO of the given unit + quarter, from the unit's history rows."""
+    from app.blueprints.work_orders.maintenance_history import HISTORY_COLLECTION
     start, end = _quarter_range(year, quarter)
-    cursor = shop_db.work_orders.find({
-        "customer_id": customer_id,
+    cursor = shop_db[HISTORY_COLLECTION].find({
         "unit_id": unit_oid,
-        "is_active": True,
-        "work_order_date": {"$gte": start, "$lte": end},
-    }).sort("work_order_date", 1)
+        "customer_id": customer_id,
+        "date": {"$gte": start, "$lte": end},
+    }).sort([("date", 1), ("work_order_id", 1), ("line_index", 1)])
+
+    # History rows are per labor line; group them back into one entry per WO.
+    entries = {}
+    for line in cursor:
+        entry = entries.get(line["work_order_id"])
+        if entry is None:
+            entry = entries[line["work_order_id"]] = {
+                "date": line.get("date"),
+                "wo_number": line.get("wo_number") or "",
+                "mileage": line.get("mileage"),
+                "cost": float(line.get("wo_total") or 0),
+                "descs": [],
+            }
+        if line.get("description"):
+            entry["descs"].append(line["description"])
 
     rows = []
     total = 0.0
-    for wo in cursor:
-        # Description = "Work Order #N, labor1, labor2, ..."
-        descs = []
-        for block in (wo.get("labors") or []):
-            d = str(block.get("description")
-                    or block.get("labor_desc")
-                    or block.get("name") or "").strip()
-            if d:
-                descs.append(d)
-        wo_num = str(wo.get("wo_number") or "").strip()
+    for entry in entries.values():
+        # Description = "Work Order #N (123,456 mi), labor1, labor2, ..."
+        wo_num = entry["wo_number"]
         prefix = f"Work Order #{wo_num}" if wo_num else "Work Order"
-        description = (prefix + ", " + ", ".join(descs)) if descs else prefix
-        cost = float(_work_order_grand_total(wo) or 0)
-        total += cost
+        if entry["mileage"] is not None:
+            prefix += f" ({entry['mileage']:,} mi)"
+        description = (prefix + ", " + ", ".join(entry["descs"])) if entry["descs"] else prefix
+        total += entry["cost"]
         rows.append({
-            "date": wo.get("work_order_date") or wo.get("created_at"),
-            "date_label": _format_date(wo.get("work_order_date")
-                                       or wo.get("created_at")),
+            "date": entry["date"],
+            "date_label": _format_date(entry["date"]),
             "description": description,
             "wo_number": wo_num,
-            "cost": round(cost, 2),
+            "mileage": entry["mileage"],
+            "cost": round(entry["cost"], 2),
         })
     return rows, round(total, 2)
 
@@ -521,14 +587,21 @@ def _maintenance_unit_view(unit):
 
 @customer_portal_bp.get("/portal/<token>/tab/maintenance")
 def tab_maintenance(token):
-    _doc, shop_db, _shop, customer = _portal_fragment_or_404(token)
-    units = _list_customer_units(shop_db, customer["_id"])
-    current_year = datetime.utcnow().year
-    years = list(range(current_year - 4, current_year + 1))
-    return render_template(
-        "public/customer_portal/_tab_maintenance.html",
-        units=units, years=years, current_year=current_year, token=token,
-    )
+    def render(shop_db, customer):
+        from app.blueprints.work_orders.maintenance_history import last_service_by_unit
+        units = _list_customer_units(shop_db, customer["_id"])
+        last = last_service_by_unit(shop_db, [ObjectId(u["id"]) for u in units])
+        for u in units:
+            svc = last.get(ObjectId(u["id"])) or {}
+            u["last_service_label"] = _format_date(svc.get("date")) if svc.get("date") else ""
+            u["last_service_mileage"] = svc.get("mileage")
+        current_year = datetime.utcnow().year
+        years = list(range(current_year - 4, current_year + 1))
+        return render_template(
+            "public/customer_portal/_tab_maintenance.html",
+            units=units, years=years, current_year=current_year, token=token,
+        )
+    return _cached_tab(token, "maintenance", render)
 
 
 @customer_portal_bp.get("/portal/<token>/maintenance/<unit_id>/pdf")
@@ -741,8 +814,8 @@ def attachment_download(token, attachment_id):
 @login_required
 @permission_required("customers.update")
 def api_send_portal_link(customer_id):
-    from app.blueprints.work_orders.routes import get_shop_db, customer_label
-    shop_db, shop = get_shop_db()
+    from app.blueprints.work_orders.routes import customer_label
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         return jsonify({"ok": False, "error": "Shop not found"}), 404
 
@@ -7,7 +7,7 @@ from flask import request, redirect, url_for, flash, session, jsonify
 
 from app.blueprints.customers import customers_bp
 from app.blueprints.main.routes import _render_app_page
-from app.extensions import get_master_db, get_mongo_client
+from app.extensions import get_master_db
 from app.utils.auth import (
     login_required,
     SESSION_TENANT_ID,
@@ -15,6 +15,8 @@ from app.utils.auth import (
 )
 from app.utils.pagination import get_pagination_params, get_sort_params, paginate_find
 from app.utils.mongo_search import build_regex_search_filter
+from app.blueprints.customer_portal.cache import bump_portal_data_version
+from app.blueprints.work_orders.maintenance_history import HISTORY_COLLECTION, history_lines, labors_payload, work_order_lines
 from app.utils.permissions import permission_required
 from app.utils.display_datetime import format_date_mmddyyyy, format_preferred_shop_date
 from app.utils.date_filters import build_date_range_filters
@@ -29,6 +31,7 @@ from app.utils.contacts import (
     get_main_contact_phone,
     has_contact_name,
 )
+from app.utils.tenant_context import get_active_shop_db
 
 
 def utcnow():
@@ -508,54 +511,9 @@ def _oid(value):
         return None
 
 
-def _tenant_id_variants():
-    raw = session.get(SESSION_TENANT_ID)
-    out = set()
-    if raw is None:
-        return []
-    out.add(raw)
-    out.add(str(raw))
-    oid = _oid(raw)
-    if oid:
-        out.add(oid)
-    return list(out)
-
-
-def _get_active_shop(master):
-    shop_id_raw = session.get("shop_id")
-    shop_oid = _oid(shop_id_raw)
-    if not shop_oid:
-        return None
-
-    tenant_variants = _tenant_id_variants()
-    if not tenant_variants:
-        return None
-
-    return master.shops.find_one({"_id": shop_oid, "tenant_id": {"$in": tenant_variants}})
-
-
-def _get_shop_db(master):
-    shop = _get_active_shop(master)
-    if not shop:
-        return None, None
-
-    db_name = (
-        shop.get("db_name")
-        or shop.get("database")
-        or shop.get("db")
-        or shop.get("mongo_db")
-        or shop.get("shop_db")
-    )
-    if not db_name:
-        return None, shop
-
-    client = get_mongo_client()
-    return client[str(db_name)], shop
-
-
 def _customers_collection():
     master = get_master_db()
-    db, shop = _get_shop_db(master)
+    db, shop = get_active_shop_db(master)
     if db is None:
         return None, None, None
     return db.customers, shop, master
@@ -1082,7 +1040,7 @@ def customer_unit_details_page(customer_id, unit_id):
         return redirect(url_for("customers.customer_details_page", customer_id=str(cid), tab="units"))
 
     tab = (request.args.get("tab") or "work_orders").strip().lower()
-    if tab not in {"work_orders", "details"}:
+    if tab not in {"work_orders", "history", "details"}:
         tab = "work_orders"
 
     q = (request.args.get("q") or "").strip()
@@ -1163,6 +1121,36 @@ def customer_unit_details_page(customer_id, unit_id):
                 }
             )
 
+    elif tab == "history":
+        history_query = {"unit_id": uid, "customer_id": cid}
+        if created_from or created_to_exclusive:
+            history_query["date"] = {}
+            if created_from:
+                history_query["date"]["$gte"] = created_from
+            if created_to_exclusive:
+                history_query["date"]["$lt"] = created_to_exclusive
+
+        rows, pagination = paginate_find(
+            shop_db[HISTORY_COLLECTION],
+            history_query,
+            [("date", -1), ("work_order_id", -1), ("line_index", 1)],
+            page,
+            per_page,
+        )
+        for row in rows:
+            tab_items.append(
+                {
+                    "work_order_id": str(row.get("work_order_id")),
+                    "wo_number": row.get("wo_number") or "-",
+                    "date": _fmt_dt_label(row.get("date")),
+                    "mileage": row.get("mileage"),
+                    "description": row.get("description") or "-",
+                    "hours": row.get("hours") or "",
+                    "parts_summary": row.get("parts_summary") or "",
+                    "line_total": row.get("line_total") or 0.0,
+                }
+            )
+
     else:
         pagination = _empty_pagination(page, per_page)
 
@@ -1259,6 +1247,7 @@ def customer_unit_update(customer_id, unit_id):
     }
 
     shop_db.units.update_one({"_id": uid}, {"$set": update_fields})
+    bump_portal_data_version(shop_db, cid)
     flash("Unit updated.", "success")
     return redirect(url_for("customers.customer_unit_details_page", customer_id=str(cid), unit_id=str(uid), tab="details"))
 
@@ -1299,6 +1288,7 @@ def customer_unit_deactivate(customer_id, unit_id):
             "deactivated_by": user_oid,
         }},
     )
+    bump_portal_data_version(shop_db, cid)
 
     flash("Unit deactivated.", "success")
     return redirect(url_for("customers.customer_details_page", customer_id=str(cid), tab="units"))
@@ -1641,42 +1631,22 @@ def customers_api_wo_labors(wo_id):
     if not woid:
         return jsonify({"ok": False, "error": "Invalid work order id"}), 400
 
-    db, _ = _get_shop_db(master)
+    db, _ = get_active_shop_db(master)
     if db is None:
         return jsonify({"ok": False, "error": "Database not configured"}), 400
 
-    wo = db.work_orders.find_one(
-        {"_id": woid, "shop_id": shop["_id"], "is_active": {"$ne": False}},
-        {"labors": 1},
-    )
-    if not wo:
-        return jsonify({"ok": False, "error": "Work order not found"}), 404
-
-    labors_out = []
-    for labor_block in wo.get("labors") or []:
-        if not isinstance(labor_block, dict):
-            continue
-        labor_info = labor_block.get("labor") or {}
-        parts_list = labor_block.get("parts") or []
-
-        parts_out = []
-        for p in parts_list:
-            if not isinstance(p, dict):
-                continue
-            parts_out.append({
-                "part_number": str(p.get("part_number") or ""),
-                "description": str(p.get("description") or ""),
-                "qty": p.get("qty") or 0,
-                "price": float(p.get("price") or 0),
-            })
-
-        labors_out.append({
-            "description": str(labor_info.get("description") or ""),
-            "hours": str(labor_info.get("hours") or ""),
-            "labor_total": float(labor_info.get("labor_full_total") or 0),
-            "parts": parts_out,
-        })
+    # Work orders with a unit have their lines in the maintenance history;
+    # both branches shape them with the same code (maintenance_history.history_lines).
+    lines = [x for x in work_order_lines(db, woid) if x.get("shop_id") == shop["_id"]]
+    if not lines:
+        wo = db.work_orders.find_one(
+            {"_id": woid, "shop_id": shop["_id"], "is_active": {"$ne": False}},
+            {"labors": 1, "totals": 1},
+        )
+        if not wo:
+            return jsonify({"ok": False, "error": "Work order not found"}), 404
+        lines = history_lines(wo)
 
-    return jsonify({"ok": True, "labors": labors_out})
+    return jsonify({"ok": True, "labors": labors_payload(lines)})
 
 
@@ -2,57 +2,17 @@ from __future__ import annotations
 
 from datetime import datetime, timedelta, timezone
 
-from bson import ObjectId
-from flask import request, redirect, url_for, flash, session, jsonify
+from flask import request, redirect, url_for, flash, jsonify
 
 from app.blueprints.dashboard import dashboard_bp
+from app.blueprints.dashboard.snapshots import get_block_snapshot, merge_snapshot_meta, peek_block_snapshot
 from app.blueprints.main.routes import _render_app_page
-from app.extensions import get_master_db, get_mongo_client
-from app.utils.auth import login_required, SESSION_TENANT_ID
+from app.extensions import get_master_db
+from app.utils.auth import login_required
 from app.utils.date_filters import build_date_range_filters
 from app.utils.permissions import permission_required
-
-
-def _maybe_object_id(value):
-    if not value:
-        return None
-    try:
-        return ObjectId(str(value))
-    except Exception:
-        return str(value)
-
-
-def _tenant_id_variants():
-    raw = session.get(SESSION_TENANT_ID)
-    out = set()
-    if raw is None:
-        return []
-    out.add(raw)
-    out.add(str(raw))
-    try:
-        out.add(ObjectId(str(raw)))
-    except Exception:
-        pass
-    return list(out)
-
-
-def _get_active_shop_db():
-    master = get_master_db()
-    shop_oid = _maybe_object_id(session.get("shop_id"))
-    tenant_variants = _tenant_id_variants()
-    if not shop_oid or not tenant_variants:
-        return None, None
-
-    shop = master.shops.find_one({"_id": shop_oid, "tenant_id": {"$in": tenant_variants}})
-    if not shop:
-        return None, None
-
-    db_name = shop.get("db_name")
-    if not db_name:
-        return None, shop
-
-    client = get_mongo_client()
-    return client[str(db_name)], shop
+from app.utils.shop_fanout import fan_out_shops, merge_keyed_rows, ratio, sum_fields
+from app.utils.tenant_context import get_accessible_shops, get_active_shop_db
 
 
 def _parse_iso_date_utc(value: str):
@@ -532,13 +492,14 @@ def _compute_parts_orders_metrics(shop_db, shop, created_from, created_to_exclus
     }
 
 
-def _compute_goal_progress_metrics(shop_db, shop, created_from, created_to_exclusive, date_preset: str):
+def _compute_goal_progress_metrics(shop_db, shop, created_from, created_to_exclusive, date_preset: str, wo_money=None):
     monthly = _get_dashboard_goals(shop)
     labor_goal = _round2(_prorate_monthly_goal(monthly["labor"], date_preset, created_from, created_to_exclusive))
     parts_goal = _round2(_prorate_monthly_goal(monthly["parts_sales"], date_preset, created_from, created_to_exclusive))
     total_goal = _round2(_prorate_monthly_goal(monthly["total"], date_preset, created_from, created_to_exclusive))
 
-    wo_money = _compute_wo_money_metrics(shop_db, shop, created_from, created_to_exclusive)
+    if wo_money is None:
+        wo_money = _compute_wo_money_metrics(shop_db, shop, created_from, created_to_exclusive)
     labor_actual = _round2(wo_money.get("period_labor_total") or 0)
     parts_actual = _round2(wo_money.get("period_parts_total") or 0)
     total_actual = _round2(wo_money.get("period_grand_total") or 0)
@@ -624,13 +585,13 @@ def _compute_outstanding_balance_metrics(shop_db, shop):
     return {"outstanding_balance": outstanding_balance}
 
 
-def _compute_dashboard_block_metrics(block_name, shop_db, shop, created_from, created_to_exclusive, date_preset: str):
+def _compute_dashboard_block_metrics(block_name, shop_db, shop, created_from, created_to_exclusive, date_preset: str, wo_money=None):
     if block_name == "wo-money":
         return _compute_wo_money_metrics(shop_db, shop, created_from, created_to_exclusive)
     if block_name == "parts-orders":
         return _compute_parts_orders_metrics(shop_db, shop, created_from, created_to_exclusive)
     if block_name == "goal-progress":
-        return _compute_goal_progress_metrics(shop_db, shop, created_from, created_to_exclusive, date_preset)
+        return _compute_goal_progress_metrics(shop_db, shop, created_from, created_to_exclusive, date_preset, wo_money=wo_money)
     if block_name == "outstanding-balance":
         return _compute_outstanding_balance_metrics(shop_db, shop)
     if block_name == "mechanic-hours":
@@ -647,11 +608,134 @@ DASHBOARD_BLOCK_NAMES = (
 )
 
 
+def _snapshot_range_key(block_name: str, shop, created_from, created_to_exclusive, date_preset: str) -> str:
+    """The inputs a block's result depends on, as part of its snapshot id."""
+    if block_name == "outstanding-balance":
+        return "all"
+    key = f"{created_from.isoformat() if created_from else '-'}..{created_to_exclusive.isoformat() if created_to_exclusive else '-'}"
+    if block_name == "goal-progress":
+        goals = _get_dashboard_goals(shop)
+        key += f"|{date_preset}|{goals['labor']},{goals['parts_sales']},{goals['total']}"
+    return key
+
+
+def _dashboard_block_snapshot(block_name, shop_db, shop, created_from, created_to_exclusive, date_preset: str, *, force: bool = False):
+    """(metrics, snapshot meta) for one block, answered from the snapshot store."""
+
+    def compute():
+        wo_money = None
+        if block_name == "goal-progress":
+            # Same period totals as the wo-money card; reuse them while fresh.
+            wo_money = peek_block_snapshot(
+                shop_db, shop["_id"], "wo-money",
+                _snapshot_range_key("wo-money", shop, created_from, created_to_exclusive, date_preset),
+            )
+        return _compute_dashboard_block_metrics(
+            block_name, shop_db, shop, created_from, created_to_exclusive, date_preset, wo_money=wo_money
+        )
+
+    range_key = _snapshot_range_key(block_name, shop, created_from, created_to_exclusive, date_preset)
+    return get_block_snapshot(shop_db, shop, block_name, range_key, compute, force=force)
+
+
+def _wants_refresh(args) -> bool:
+    return str(args.get("refresh") or "").strip().lower() in ("1", "true", "yes")
+
+
+_WO_MONEY_SUMS = (
+    "period_paid_amount", "period_unpaid_amount", "period_labor_total", "period_parts_total",
+    "period_grand_total", "period_money_total", "period_total",
+)
+_PARTS_ORDERS_SUMS = (
+    "period_parts_orders_total", "period_parts_orders_received", "period_parts_orders_ordered",
+    "period_parts_orders_paid_count", "period_parts_orders_unpaid_count",
+    "period_parts_orders_paid_amount", "period_parts_orders_unpaid_amount",
+    "period_parts_orders_items_amount", "period_parts_orders_non_inventory_amount",
+    "period_parts_orders_total_amount",
+)
+_GOAL_KEYS = ("labor", "parts_sales", "total")
+
+
+def _merge_dashboard_block_metrics(block_name: str, parts: list[dict]) -> dict:
+    """Combine one block's per-shop metrics; percentages are recomputed from the sums."""
+    if block_name == "wo-money":
+        out = sum_fields(parts, _WO_MONEY_SUMS)
+        out["paid_percent"] = ratio(out["period_paid_amount"], out["period_money_total"], 100.0)
+        return out
+    if block_name == "parts-orders":
+        out = sum_fields(parts, _PARTS_ORDERS_SUMS)
+        total = out["period_parts_orders_total"]
+        out["parts_orders_received_percent"] = ratio(out["period_parts_orders_received"], total, 100.0)
+        out["parts_orders_paid_percent"] = ratio(out["period_parts_orders_paid_count"], total, 100.0)
+        out["parts_orders_paid_percent_by_amount"] = ratio(
+            out["period_parts_orders_paid_amount"],
+            out["period_parts_orders_paid_amount"] + out["period_parts_orders_unpaid_amount"],
+            100.0,
+        )
+        return out
+    if block_name == "goal-progress":
+        monthly = sum_fields([p.get("goals_monthly") or {} for p in parts], _GOAL_KEYS)
+        period = sum_fields([p.get("goals_period") or {} for p in parts], _GOAL_KEYS)
+        actual = sum_fields([p.get("goals_actual") or {} for p in parts], _GOAL_KEYS)
+        return {
+            "goals_monthly": monthly,
+            "goals_period": period,
+            "goals_actual": actual,
+            "goals_percent": {k: min(100.0, ratio(actual[k], period[k], 100.0)) for k in _GOAL_KEYS},
+            "goals_period_label": parts[0].get("goals_period_label") if parts else "",
+        }
+    if block_name == "outstanding-balance":
+        return sum_fields(parts, ("outstanding_balance",))
+    if block_name == "mechanic-hours":
+        rows = merge_keyed_rows(
+            [p.get("mechanic_hours_rows") or [] for p in parts],
+            lambda r: r.get("user_id") or str(r.get("name") or "").lower(),
+            ("hours",),
+        )
+        rows.sort(key=lambda r: _to_float(r.get("hours")), reverse=True)
+        return {"mechanic_hours_rows": rows}
+    raise KeyError(block_name)
+
+
+def _consolidated_shops(args) -> list[dict] | None:
+    """Shops for scope=all, or None for the active shop only."""
+    if str(args.get("scope") or "").strip().lower() != "all":
+        return None
+    shops = get_accessible_shops()
+    return shops if len(shops) > 1 else None
+
+
+def _compute_consolidated_metrics(shops, block_names, created_from, created_to_exclusive, date_preset: str, *, force: bool = False):
+    """
+    ({block: merged metrics}, partial-result marker, {block: snapshot meta})
+    over `shops`, one task per shop, each answered from that shop's snapshots.
+    """
+
+    def compute_shop(shop_db, shop):
+        return {
+            block_name: _dashboard_block_snapshot(
+                block_name, shop_db, shop, created_from, created_to_exclusive, date_preset, force=force
+            )
+            for block_name in block_names
+        }
+
+    fanout = fan_out_shops(shops, compute_shop)
+    merged = {
+        block_name: _merge_dashboard_block_metrics(block_name, [v[block_name][0] for v in fanout.values])
+        for block_name in block_names
+    }
+    metas = {
+        block_name: merge_snapshot_meta([v[block_name][1] for v in fanout.values])
+        for block_name in block_names
+    }
+    return merged, fanout.marker(), metas
+
+
 @dashboard_bp.get("/dashboard")
 @login_required
 @permission_required("dashboard.view")
 def dashboard():
-    shop_db, shop = _get_active_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         flash("Shop database not configured for this shop.", "error")
         return redirect(url_for("main.settings"))
@@ -664,6 +748,7 @@ def dashboard():
     created_to_exclusive = date_filters["created_to_exclusive"]
 
     monthly_goals = _get_dashboard_goals(shop)
+    can_consolidate = len(get_accessible_shops()) > 1
 
     return _render_app_page(
         "public/dashboard.html",
@@ -697,30 +782,33 @@ def dashboard():
         outstanding_balance=0.0,
         dashboard_metrics_api_url=url_for("dashboard.dashboard_metrics_api"),
         dashboard_goals_save_url=url_for("dashboard.dashboard_goals_save_api"),
+        can_consolidate=can_consolidate,
+        dashboard_scope="all" if can_consolidate and request.args.get("scope") == "all" else "shop",
     )
 
 
-def _compute_dashboard_metrics(shop_db, shop, created_from, created_to_exclusive, date_preset: str):
-    metrics = {}
+def _compute_dashboard_metrics(shop_db, shop, created_from, created_to_exclusive, date_preset: str, *, force: bool = False):
+    # wo-money comes first, so goal-progress can reuse its fresh snapshot.
+    metrics, metas = {}, {}
     for block_name in DASHBOARD_BLOCK_NAMES:
-        metrics.update(
-            _compute_dashboard_block_metrics(
-                block_name,
-                shop_db=shop_db,
-                shop=shop,
-                created_from=created_from,
-                created_to_exclusive=created_to_exclusive,
-                date_preset=date_preset,
-            )
+        data, metas[block_name] = _dashboard_block_snapshot(
+            block_name,
+            shop_db=shop_db,
+            shop=shop,
+            created_from=created_from,
+            created_to_exclusive=created_to_exclusive,
+            date_preset=date_preset,
+            force=force,
         )
-    return metrics
+        metrics.update(data)
+    return metrics, metas
 
 
 @dashboard_bp.get("/dashboard/api/metrics")
 @login_required
 @permission_required("dashboard.view")
 def dashboard_metrics_api():
-    shop_db, shop = _get_active_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         return jsonify({"ok": False, "error": "Shop database not configured for this shop."}), 400
 
@@ -729,22 +817,35 @@ def dashboard_metrics_api():
     created_to_exclusive = date_filters["created_to_exclusive"]
     date_preset = date_filters["date_preset"]
 
-    metrics = _compute_dashboard_metrics(
+    force = _wants_refresh(request.args)
+
+    shops = _consolidated_shops(request.args)
+    if shops:
+        by_block, marker, metas = _compute_consolidated_metrics(
+            shops, DASHBOARD_BLOCK_NAMES, created_from, created_to_exclusive, date_preset, force=force
+        )
+        metrics = {}
+        for block_metrics in by_block.values():
+            metrics.update(block_metrics)
+        return jsonify({"ok": True, **metrics, "consolidated": marker, "snapshots": metas})
+
+    metrics, metas = _compute_dashboard_metrics(
         shop_db=shop_db,
         shop=shop,
         created_from=created_from,
         created_to_exclusive=created_to_exclusive,
         date_preset=date_preset,
+        force=force,
     )
 
-    return jsonify({"ok": True, **metrics})
+    return jsonify({"ok": True, **metrics, "snapshots": metas})
 
 
 @dashboard_bp.get("/dashboard/api/metrics/<block_name>")
 @login_required
 @permission_required("dashboard.view")
 def dashboard_metrics_block_api(block_name: str):
-    shop_db, shop = _get_active_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         return jsonify({"ok": False, "error": "Shop database not configured for this shop."}), 400
 
@@ -756,22 +857,35 @@ def dashboard_metrics_block_api(block_name: str):
     created_to_exclusive = date_filters["created_to_exclusive"]
     date_preset = date_filters["date_preset"]
 
-    metrics = _compute_dashboard_block_metrics(
+    force = _wants_refresh(request.args)
+
+    shops = _consolidated_shops(request.args)
+    if shops:
+        by_block, marker, metas = _compute_consolidated_metrics(
+            shops, (block_name,), created_from, created_to_exclusive, date_preset, force=force
+        )
+        return jsonify({
+            "ok": True, "block": block_name, "data": by_block[block_name],
+            "consolidated": marker, "snapshot": metas[block_name],
+        })
+
+    metrics, meta = _dashboard_block_snapshot(
         block_name,
         shop_db=shop_db,
         shop=shop,
         created_from=created_from,
         created_to_exclusive=created_to_exclusive,
         date_preset=date_preset,
+        force=force,
     )
-    return jsonify({"ok": True, "block": block_name, "data": metrics})
+    return jsonify({"ok": True, "block": block_name, "data": metrics, "snapshot": meta})
 
 
 @dashboard_bp.post("/dashboard/api/goals")
 @login_required
 @permission_required("dashboard.view")
 def dashboard_goals_save_api():
-    shop_db, shop = _get_active_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop is None:
         return jsonify({"ok": False, "error": "Shop database not configured for this shop."}), 400
 
@@ -0,0 +1,210 @@
+"""Stale-while-revalidate store for dashboard block results.
+
+Each block result lives in the shop DB's `dashboard_snapshots`:
+
+    {"_id": "<shop_id>|<block>|<range key>", "shop_id", "block", "data",
+     "computed_at", "compute_ms", "expire_at", "refreshing_until"}
+
+`get_block_snapshot` answers from the stored result right away, with its age.
+A result older than DASHBOARD_SNAPSHOT_FRESH_SECONDS is recomputed on a small
+background pool. Only the caller that takes the lease (`refreshing_until`,
+claimed with a conditional update) starts that computation, so several tabs
+or workers opening the same dashboard run it once. A key with no result yet
+is computed inline by the lease holder; other callers wait for that result
+(up to COLD_WAIT_SECONDS, or what is left of a shop fan-out task's deadline)
+instead of computing it again.
+
+Snapshots of ranges nobody opens any more expire after SNAPSHOT_RETENTION
+(TTL index, shop migration 7).
+"""
+from __future__ import annotations
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+
+from flask import current_app
+from pymongo.errors import DuplicateKeyError
+
+from app.utils.shop_fanout import fanout_seconds_left
+
+
+SNAPSHOTS_COLLECTION = "dashboard_snapshots"
+SNAPSHOT_RETENTION = timedelta(days=14)
+
+# A refresh that hasn't finished after this long is presumed dead and can be retaken.
+LEASE_SECONDS = 120
+COLD_WAIT_SECONDS = 30
+COLD_POLL_SECONDS = 0.25
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = int(current_app.config.get("DASHBOARD_REFRESH_WORKERS") or 2)
+            _executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="dashboard-refresh")
+        return _executor
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(value: datetime | None) -> datetime | None:
+    if value is None or value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=timezone.utc)
+
+
+def fresh_seconds() -> float:
+    return float(current_app.config.get("DASHBOARD_SNAPSHOT_FRESH_SECONDS") or 120)
+
+
+def snapshot_id(shop_id, block: str, range_key: str) -> str:
+    return f"{shop_id}|{block}|{range_key}"
+
+
+def _age_seconds(doc: dict, now: datetime) -> float:
+    computed_at = _as_utc(doc.get("computed_at"))
+    return max(0.0, (now - computed_at).total_seconds()) if computed_at else float("inf")
+
+
+def _lease_active(doc: dict, now: datetime) -> bool:
+    until = _as_utc(doc.get("refreshing_until"))
+    return bool(until and until > now)
+
+
+def _meta(doc: dict, now: datetime, *, refreshing: bool) -> dict:
+    age = _age_seconds(doc, now)
+    computed_at = _as_utc(doc.get("computed_at"))
+    return {
+        "computed_at": computed_at.isoformat() if computed_at else None,
+        "age_seconds": round(age, 1),
+        "stale": age >= fresh_seconds(),
+        "refreshing": refreshing,
+    }
+
+
+def _take_lease(coll, snap_id: str, shop_id, block: str) -> bool:
+    """Claim the refresh of `snap_id`; False while another caller holds it."""
+    now = utcnow()
+    try:
+        result = coll.update_one(
+            {"_id": snap_id, "$or": [{"refreshing_until": None}, {"refreshing_until": {"$lte": now}}]},
+            {
+                "$set": {"refreshing_until": now + timedelta(seconds=LEASE_SECONDS)},
+                "$setOnInsert": {"shop_id": shop_id, "block": block, "expire_at": now + SNAPSHOT_RETENTION},
+            },
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        return False  # exists with a live lease
+    return bool(result.modified_count or result.upserted_id is not None)
+
+
+def _compute_and_store(coll, snap_id: str, shop_id, block: str, compute) -> dict:
+    """Run `compute()`, store the result and drop the lease (also when it fails)."""
+    started = time.perf_counter()
+    try:
+        data = compute()
+    except Exception:
+        coll.update_one({"_id": snap_id}, {"$unset": {"refreshing_until": ""}})
+        raise
+    now = utcnow()
+    doc = {
+        "shop_id": shop_id,
+        "block": block,
+        "data": data,
+        "computed_at": now,
+        "compute_ms": round((time.perf_counter() - started) * 1000, 1),
+        "expire_at": now + SNAPSHOT_RETENTION,
+    }
+    coll.update_one({"_id": snap_id}, {"$set": doc, "$unset": {"refreshing_until": ""}}, upsert=True)
+    return doc
+
+
+def _refresh_in_background(coll, snap_id: str, shop_id, block: str, compute) -> bool:
+    if not _take_lease(coll, snap_id, shop_id, block):
+        return False
+    app = current_app._get_current_object()
+
+    def _run():
+        with app.app_context():
+            try:
+                _compute_and_store(coll, snap_id, shop_id, block, compute)
+            except Exception as exc:
+                app.logger.warning("Dashboard snapshot refresh failed for %s: %r", snap_id, exc)
+
+    _get_executor().submit(_run)
+    return True
+
+
+def _wait_for_result(coll, snap_id: str) -> dict | None:
+    # Inside a shop fan-out (scope=all) the task's own deadline is shorter.
+    wait_seconds = COLD_WAIT_SECONDS
+    left = fanout_seconds_left()
+    if left is not None:
+        wait_seconds = min(wait_seconds, left)
+    deadline = time.monotonic() + wait_seconds
+    while time.monotonic() < deadline:
+        time.sleep(COLD_POLL_SECONDS)
+        doc = coll.find_one({"_id": snap_id, "data": {"$exists": True}})
+        if doc is not None:
+            return doc
+        holder = coll.find_one({"_id": snap_id}, {"refreshing_until": 1})
+        if holder is None or not _lease_active(holder, utcnow()):
+            return None  # the lease holder gave up
+    return None
+
+
+def get_block_snapshot(shop_db, shop, block: str, range_key: str, compute, *, force: bool = False) -> tuple[dict, dict]:
+    """
+    (data, meta) for one dashboard block of `shop`. `compute()` must not need
+    the request: it may run on the background pool. `force` recomputes inline.
+    meta: {"computed_at", "age_seconds", "stale", "refreshing"}.
+    """
+    coll = shop_db[SNAPSHOTS_COLLECTION]
+    shop_id = shop["_id"]
+    snap_id = snapshot_id(shop_id, block, range_key)
+
+    if not force:
+        doc = coll.find_one({"_id": snap_id})
+        if doc is not None and "data" in doc:
+            now = utcnow()
+            refreshing = _lease_active(doc, now)
+            if not refreshing and _age_seconds(doc, now) >= fresh_seconds():
+                refreshing = _refresh_in_background(coll, snap_id, shop_id, block, compute)
+            return doc["data"], _meta(doc, now, refreshing=refreshing)
+
+        if not _take_lease(coll, snap_id, shop_id, block):
+            doc = _wait_for_result(coll, snap_id)
+            if doc is not None:
+                return doc["data"], _meta(doc, utcnow(), refreshing=False)
+
+    doc = _compute_and_store(coll, snap_id, shop_id, block, compute)
+    return doc["data"], _meta(doc, utcnow(), refreshing=False)
+
+
+def peek_block_snapshot(shop_db, shop_id, block: str, range_key: str) -> dict | None:
+    """Stored data of a block if it is still fresh, else None. Never computes."""
+    doc = shop_db[SNAPSHOTS_COLLECTION].find_one(
+        {"_id": snapshot_id(shop_id, block, range_key), "data": {"$exists": True}},
+        {"data": 1, "computed_at": 1},
+    )
+    if doc is None or _age_seconds(doc, utcnow()) >= fresh_seconds():
+        return None
+    return doc["data"]
+
+
+def merge_snapshot_meta(metas: list[dict]) -> dict | None:
+    """One meta for a result assembled from several snapshots: the oldest one wins."""
+    metas = [m for m in metas if m]
+    if not metas:
+        return None
+    oldest = max(metas, key=lambda m: m.get("age_seconds") or 0)
+    return {**oldest, "stale": any(m.get("stale") for m in metas), "refreshing": any(m.get("refreshing") for m in metas)}
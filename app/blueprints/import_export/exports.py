@@ -0,0 +1,457 @@
+from __future__ import annotations
+
+import csv
+import io
+import os
+from datetime import datetime
+
+from bson import json_util
+from flask import Response, jsonify, request, send_file, session, stream_with_context, url_for
+
+from app.blueprints.import_export import import_export_bp
+from app.blueprints.import_export.routes import (
+    ENTITY_FIELDS,
+    _get_current_shop_job,
+    _get_shop_db,
+    _get_shop_db_by_ids,
+    _oid,
+)
+from app.utils.auth import SESSION_USER_ID, login_required
+from app.utils.background_jobs import (
+    create_job,
+    job_file_path,
+    serialize_job,
+    submit_job,
+    update_job_progress,
+)
+from app.utils.contacts import contact_full_name, get_main_contact
+from app.utils.permissions import permission_required
+
+
+EXPORT_JOB_KIND = "export"
+EXPORT_FORMATS = {
+    "csv": {"suffix": ".csv", "mimetype": "text/csv"},
+    "xlsx": {"suffix": ".xlsx", "mimetype": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"},
+    "ndjson": {"suffix": ".ndjson", "mimetype": "application/x-ndjson"},
+}
+
+# Server-side cursor batch; also the unit for batched $in lookups.
+EXPORT_BATCH_SIZE = 1000
+# Above this many rows the UI runs the export as a background job.
+EXPORT_SYNC_MAX_ROWS = 5000
+
+WORK_ORDER_EXPORT_FIELDS = [
+    {"key": "wo_number", "label": "WO Number"},
+    {"key": "work_order_date", "label": "Date"},
+    {"key": "status", "label": "Status"},
+    {"key": "customer", "label": "Customer"},
+    {"key": "unit_number", "label": "Unit Number"},
+    {"key": "vin", "label": "VIN"},
+    {"key": "labor_total", "label": "Labor Total"},
+    {"key": "parts_total", "label": "Parts Total"},
+    {"key": "sales_tax_total", "label": "Sales Tax"},
+    {"key": "grand_total", "label": "Grand Total"},
+    {"key": "paid_amount", "label": "Paid"},
+    {"key": "remaining_balance", "label": "Balance"},
+]
+
+PAYMENT_EXPORT_FIELDS = [
+    {"key": "payment_date", "label": "Payment Date"},
+    {"key": "wo_number", "label": "WO Number"},
+    {"key": "customer", "label": "Customer"},
+    {"key": "amount", "label": "Amount"},
+    {"key": "payment_method", "label": "Payment Method"},
+    {"key": "notes", "label": "Notes"},
+]
+
+# entity -> (collection, columns). Importable entities reuse the importer's
+# ENTITY_FIELDS labels so an exported CSV/XLSX maps 1:1 on re-import.
+EXPORT_ENTITIES = {
+    "customers": ("customers", ENTITY_FIELDS["customers"]),
+    "units": ("units", ENTITY_FIELDS["units"]),
+    "vendors": ("vendors", ENTITY_FIELDS["vendors"]),
+    "parts": ("parts", ENTITY_FIELDS["parts"]),
+    "work_orders": ("work_orders", WORK_ORDER_EXPORT_FIELDS),
+    "payments": ("work_order_payments", PAYMENT_EXPORT_FIELDS),
+}
+
+EXPORT_LABELS = {
+    "customers": "Customers",
+    "units": "Units",
+    "vendors": "Vendors",
+    "parts": "Parts",
+    "work_orders": "Work Orders",
+    "payments": "Payments",
+}
+
+
+def _round2(value) -> float:
+    try:
+        return round(float(value or 0) + 1e-12, 2)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _cell(value):
+    """Normalize a value for CSV/XLSX cells."""
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S") if (value.hour or value.minute or value.second) else value.strftime("%Y-%m-%d")
+    return value
+
+
+def _customer_name(doc: dict) -> str:
+    company = (doc.get("company_name") or "").strip()
+    if company:
+        return company
+    return contact_full_name(get_main_contact(doc, entity_type="customer"))
+
+
+# ── row mappers (inverse of the importer's _build_*_doc) ────────────
+
+
+def _customer_rows(shop_db, shop, docs):
+    pricing_names = {
+        s["_id"]: s.get("name") or ""
+        for s in shop_db.parts_pricing_rules.find({"shop_id": shop["_id"]}, {"name": 1})
+    }
+    for doc in docs:
+        contact = get_main_contact(doc, entity_type="customer") or {}
+        yield {
+            "company_name": doc.get("company_name"),
+            "first_name": contact.get("first_name") or doc.get("first_name"),
+            "last_name": contact.get("last_name") or doc.get("last_name"),
+            "phone": contact.get("phone") or doc.get("phone"),
+            "email": contact.get("email") or doc.get("email"),
+            "address": doc.get("address"),
+            "pricing_rule_name": pricing_names.get(doc.get("pricing_rule_id")),
+        }
+
+
+def _unit_rows(shop_db, shop, docs):
+    for doc in docs:
+        yield {f["key"]: doc.get(f["key"]) for f in ENTITY_FIELDS["units"]}
+
+
+def _vendor_rows(shop_db, shop, docs):
+    for doc in docs:
+        contact = get_main_contact(doc, entity_type="vendor") or {}
+        yield {
+            "name": doc.get("name"),
+            "first_name": contact.get("first_name") or doc.get("primary_contact_first_name"),
+            "last_name": contact.get("last_name") or doc.get("primary_contact_last_name"),
+            "phone": contact.get("phone") or doc.get("phone"),
+            "email": contact.get("email") or doc.get("email"),
+            "website": doc.get("website"),
+            "address": doc.get("address"),
+            "notes": doc.get("notes"),
+        }
+
+
+def _part_rows(shop_db, shop, docs):
+    for doc in docs:
+        yield {
+            "part_number": doc.get("part_number"),
+            "description": doc.get("description"),
+            "reference": doc.get("reference"),
+            "in_stock": doc.get("in_stock"),
+            "average_cost": doc.get("average_cost"),
+            "selling_price": doc.get("selling_price") if doc.get("has_selling_price") else None,
+        }
+
+
+def _lookup_by_ids(collection, ids, projection):
+    ids = [x for x in set(ids) if x]
+    if not ids:
+        return {}
+    return {d["_id"]: d for d in collection.find({"_id": {"$in": ids}}, projection)}
+
+
+def _work_order_rows(shop_db, shop, docs):
+    customers = _lookup_by_ids(
+        shop_db.customers, [d.get("customer_id") for d in docs],
+        {"company_name": 1, "first_name": 1, "last_name": 1, "contacts": 1},
+    )
+    units = _lookup_by_ids(shop_db.units, [d.get("unit_id") for d in docs], {"unit_number": 1, "vin": 1})
+    paid_by_wo = {
+        row["_id"]: row.get("paid") or 0
+        for row in shop_db.work_order_payments.aggregate([
+            {"$match": {"work_order_id": {"$in": [d["_id"] for d in docs]}, "is_active": True}},
+            {"$group": {"_id": "$work_order_id", "paid": {"$sum": "$amount"}}},
+        ])
+    }
+    for doc in docs:
+        totals = doc.get("totals") if isinstance(doc.get("totals"), dict) else {}
+        unit = units.get(doc.get("unit_id")) or {}
+        grand_total = _round2(totals.get("grand_total") if totals.get("grand_total") is not None else doc.get("grand_total"))
+        paid = _round2(paid_by_wo.get(doc["_id"]))
+        yield {
+            "wo_number": doc.get("wo_number"),
+            "work_order_date": doc.get("work_order_date") or doc.get("created_at"),
+            "status": doc.get("status"),
+            "customer": _customer_name(customers.get(doc.get("customer_id")) or {}),
+            "unit_number": unit.get("unit_number"),
+            "vin": unit.get("vin"),
+            "labor_total": _round2(totals.get("labor_total")),
+            "parts_total": _round2(totals.get("parts_total")),
+            "sales_tax_total": _round2(totals.get("sales_tax_total")),
+            "grand_total": grand_total,
+            "paid_amount": paid,
+            "remaining_balance": _round2(max(0.0, grand_total - paid)),
+        }
+
+
+def _payment_rows(shop_db, shop, docs):
+    work_orders = _lookup_by_ids(
+        shop_db.work_orders, [d.get("work_order_id") for d in docs],
+        {"wo_number": 1, "customer_id": 1},
+    )
+    customers = _lookup_by_ids(
+        shop_db.customers, [wo.get("customer_id") for wo in work_orders.values()],
+        {"company_name": 1, "first_name": 1, "last_name": 1, "contacts": 1},
+    )
+    for doc in docs:
+        wo = work_orders.get(doc.get("work_order_id")) or {}
+        yield {
+            "payment_date": doc.get("payment_date") or doc.get("created_at"),
+            "wo_number": wo.get("wo_number"),
+            "customer": _customer_name(customers.get(wo.get("customer_id")) or {}),
+            "amount": _round2(doc.get("amount")),
+            "payment_method": doc.get("payment_method"),
+            "notes": doc.get("notes"),
+        }
+
+
+ROW_MAPPERS = {
+    "customers": _customer_rows,
+    "units": _unit_rows,
+    "vendors": _vendor_rows,
+    "parts": _part_rows,
+    "work_orders": _work_order_rows,
+    "payments": _payment_rows,
+}
+
+
+# ── streaming core ───────────────────────────────────────────────────
+
+
+def _export_query(shop) -> dict:
+    return {"shop_id": shop["_id"], "is_active": True}
+
+
+def _iter_doc_batches(shop_db, shop, entity):
+    """Server-side cursor in _id order, yielded in EXPORT_BATCH_SIZE lists."""
+    collection_name, _ = EXPORT_ENTITIES[entity]
+    cursor = shop_db[collection_name].find(_export_query(shop), batch_size=EXPORT_BATCH_SIZE).sort("_id", 1)
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_export_rows(shop_db, shop, entity):
+    """Yield one dict per exported row; related names are resolved per batch."""
+    mapper = ROW_MAPPERS[entity]
+    for batch in _iter_doc_batches(shop_db, shop, entity):
+        yield from mapper(shop_db, shop, batch)
+
+
+def iter_csv_chunks(shop_db, shop, entity):
+    _, columns = EXPORT_ENTITIES[entity]
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow([c["label"] for c in columns])
+    for n, row in enumerate(iter_export_rows(shop_db, shop, entity), start=1):
+        writer.writerow([_cell(row.get(c["key"])) for c in columns])
+        if n % EXPORT_BATCH_SIZE == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate(0)
+    yield buf.getvalue()
+
+
+def iter_ndjson_chunks(shop_db, shop, entity):
+    """Full documents as Extended JSON — lossless, one per line."""
+    for batch in _iter_doc_batches(shop_db, shop, entity):
+        yield "".join(json_util.dumps(doc) + "\n" for doc in batch)
+
+
+def write_export_file(path, shop_db, shop, entity, fmt, progress=None) -> int:
+    """Write an export to `path`; returns row count. Constant memory for every format."""
+    _, columns = EXPORT_ENTITIES[entity]
+    written = 0
+
+    if fmt == "xlsx":
+        import openpyxl
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet(title=EXPORT_LABELS[entity][:31])
+        ws.append([c["label"] for c in columns])
+        for row in iter_export_rows(shop_db, shop, entity):
+            ws.append([_cell(row.get(c["key"])) for c in columns])
+            written += 1
+            if progress and written % EXPORT_BATCH_SIZE == 0:
+                progress(written)
+        wb.save(path)
+        return written
+
+    with open(path, "w", encoding="utf-8", newline="") as fh:
+        if fmt == "ndjson":
+            for batch in _iter_doc_batches(shop_db, shop, entity):
+                fh.write("".join(json_util.dumps(doc) + "\n" for doc in batch))
+                written += len(batch)
+                if progress:
+                    progress(written)
+            return written
+
+        writer = csv.writer(fh)
+        writer.writerow([c["label"] for c in columns])
+        for row in iter_export_rows(shop_db, shop, entity):
+            writer.writerow([_cell(row.get(c["key"])) for c in columns])
+            written += 1
+            if progress and written % EXPORT_BATCH_SIZE == 0:
+                progress(written)
+    return written
+
+
+def _run_export_job(job_id, *, entity, fmt, tenant_id, shop_id):
+    shop_db, shop = _get_shop_db_by_ids(tenant_id, shop_id)
+    if shop_db is None:
+        raise RuntimeError("Shop not configured.")
+
+    update_job_progress(job_id, processed=0)
+    path = job_file_path(job_id, EXPORT_FORMATS[fmt]["suffix"])
+    tmp_path = path + ".part"
+    rows = write_export_file(
+        tmp_path, shop_db, shop, entity, fmt,
+        progress=lambda n: update_job_progress(job_id, processed=n),
+    )
+    os.replace(tmp_path, path)
+    update_job_progress(job_id, processed=rows)
+    return {"rows": rows, "size": os.path.getsize(path)}
+
+
+def _export_filename(entity, fmt) -> str:
+    return f"{entity}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{EXPORT_FORMATS[fmt]['suffix']}"
+
+
+def _parse_export_args(entity):
+    fmt = (request.values.get("format") or "csv").strip().lower()
+    if entity not in EXPORT_ENTITIES:
+        return None, "Invalid entity type."
+    if fmt not in EXPORT_FORMATS:
+        return None, "Unsupported export format."
+    return fmt, None
+
+
+# ── routes ───────────────────────────────────────────────────────────
+
+
+@import_export_bp.get("/export/<entity>")
+@login_required
+@permission_required("settings.manage_org")
+def export_stream(entity):
+    """Direct streaming download (CSV / NDJSON) for small and medium shops."""
+    fmt, error = _parse_export_args(entity)
+    if error:
+        return jsonify({"ok": False, "error": error}), 400
+    if fmt == "xlsx":
+        return jsonify({"ok": False, "error": "XLSX exports run as a background job."}), 400
+
+    shop_db, shop = _get_shop_db()
+    if shop_db is None:
+        return jsonify({"ok": False, "error": "Shop not configured."}), 400
+
+    chunks = iter_ndjson_chunks if fmt == "ndjson" else iter_csv_chunks
+    response = Response(
+        stream_with_context(chunks(shop_db, shop, entity)),
+        mimetype=EXPORT_FORMATS[fmt]["mimetype"],
+    )
+    response.headers["Content-Disposition"] = f'attachment; filename="{_export_filename(entity, fmt)}"'
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@import_export_bp.post("/export/<entity>")
+@login_required
+@permission_required("settings.manage_org")
+def export_start(entity):
+    """
+    Returns either {"mode": "stream", "url"} for small exports or starts a
+    background job ({"mode": "job", "job_id"}) for large ones and XLSX.
+    """
+    fmt, error = _parse_export_args(entity)
+    if error:
+        return jsonify({"ok": False, "error": error}), 400
+
+    shop_db, shop = _get_shop_db()
+    if shop_db is None:
+        return jsonify({"ok": False, "error": "Shop not configured."}), 400
+
+    collection_name, _ = EXPORT_ENTITIES[entity]
+    total = shop_db[collection_name].count_documents(_export_query(shop))
+
+    if fmt != "xlsx" and total <= EXPORT_SYNC_MAX_ROWS:
+        return jsonify({
+            "ok": True,
+            "mode": "stream",
+            "total": total,
+            "url": url_for("import_export.export_stream", entity=entity, format=fmt),
+        })
+
+    job_id = create_job(
+        EXPORT_JOB_KIND,
+        tenant_id=shop.get("tenant_id"),
+        shop_id=shop["_id"],
+        user_id=_oid(session.get(SESSION_USER_ID)),
+        params={"entity": entity, "format": fmt, "total": total},
+    )
+    update_job_progress(job_id, total_estimate=total)
+    submit_job(
+        job_id,
+        _run_export_job,
+        entity=entity,
+        fmt=fmt,
+        tenant_id=shop.get("tenant_id"),
+        shop_id=shop["_id"],
+    )
+    return jsonify({"ok": True, "mode": "job", "job_id": str(job_id), "total": total})
+
+
+@import_export_bp.get("/export/jobs/<job_id>")
+@login_required
+@permission_required("settings.manage_org")
+def export_job_status(job_id):
+    job = _get_current_shop_job(job_id, EXPORT_JOB_KIND)
+    if not job:
+        return jsonify({"ok": False, "error": "Export job not found."}), 404
+    return jsonify({"ok": True, "job": serialize_job(job)})
+
+
+@import_export_bp.get("/export/jobs/<job_id>/download")
+@login_required
+@permission_required("settings.manage_org")
+def export_job_download(job_id):
+    job = _get_current_shop_job(job_id, EXPORT_JOB_KIND)
+    if not job or job.get("status") != "done":
+        return jsonify({"ok": False, "error": "Export not ready."}), 404
+
+    params = job.get("params") or {}
+    fmt = params.get("format") if params.get("format") in EXPORT_FORMATS else "csv"
+    path = job_file_path(job["_id"], EXPORT_FORMATS[fmt]["suffix"])
+    if not os.path.exists(path):
+        return jsonify({"ok": False, "error": "Export file expired."}), 404
+
+    # conditional=True → ETag / Last-Modified + HTTP Range support, so an
+    # interrupted download of a large export can resume.
+    return send_file(
+        path,
+        mimetype=EXPORT_FORMATS[fmt]["mimetype"],
+        as_attachment=True,
+        download_name=_export_filename(params.get("entity") or "export", fmt),
+        conditional=True,
+    )
@@ -1,15 +1,19 @@
 from __future__ import annotations
 
+import codecs
 import csv
 import io
 import json
+import os
 from datetime import datetime, timezone
 
 from bson import ObjectId
-from flask import request, redirect, url_for, flash, session, jsonify
+from flask import request, redirect, url_for, flash, session, jsonify, send_file
+from pymongo.errors import BulkWriteError
 
 from app.blueprints.import_export import import_export_bp
 from app.blueprints.main.routes import _render_app_page, NAV_ITEMS
+from app.blueprints.work_orders.preset_resolution import invalidate_presets
 from app.extensions import get_master_db, get_mongo_client
 from app.utils.parts_search import build_parts_search_terms
 from app.utils.auth import (
@@ -19,6 +23,14 @@ from app.utils.auth import (
     SESSION_SHOP_ID,
 )
 from app.utils.permissions import permission_required
+from app.utils.background_jobs import (
+    create_job,
+    get_job,
+    job_file_path,
+    serialize_job,
+    submit_job,
+    update_job_progress,
+)
 
 
 def _oid(value):
@@ -82,13 +94,29 @@ ENTITY_LABELS = {
     "parts": "Parts",
 }
 
+ENTITY_COLLECTIONS = {
+    "customers": "customers",
+    "units": "units",
+    "vendors": "vendors",
+    "parts": "parts",
+}
+
+IMPORT_JOB_KIND = "import"
+IMPORT_BATCH_SIZE = 1000
+
 # ── helpers ──────────────────────────────────────────────────────────
 
 
 def _get_shop_db():
+    return _get_shop_db_by_ids(
+        _oid(session.get(SESSION_TENANT_ID)),
+        _oid(session.get(SESSION_SHOP_ID)),
+    )
+
+
+def _get_shop_db_by_ids(tenant_id, shop_id):
+    """Shop DB lookup without a session (background jobs)."""
     master = get_master_db()
-    tenant_id = _oid(session.get(SESSION_TENANT_ID))
-    shop_id = _oid(session.get(SESSION_SHOP_ID))
     if not tenant_id or not shop_id:
         return None, None
 
@@ -135,41 +163,73 @@ def _parse_file_headers(file_storage):
     return []
 
 
-def _parse_all_rows(file_storage):
-    """Return (headers, rows) where rows is list of dicts keyed by header."""
-    filename = (file_storage.filename or "").lower()
+def _scan_csv(path):
+    """
+    One constant-memory pass over the raw bytes: pick the encoding
+    (utf-8 with latin-1 fallback, same as before) and estimate row count.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    encoding = "utf-8-sig"
+    lines = 0
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 16), b""):
+            lines += chunk.count(b"\n")
+            if encoding != "latin-1":
+                try:
+                    decoder.decode(chunk)
+                except UnicodeDecodeError:
+                    encoding = "latin-1"
+    return encoding, max(lines - 1, 0)
+
+
+def _iter_file_rows(path, filename):
+    """
+    Lazily yield (row_number, row_dict) keyed by header; row_number is the
+    1-based line in the file (header = 1). Nothing is materialized.
+    """
+    filename = (filename or "").lower()
 
     if filename.endswith(".csv"):
-        raw = file_storage.read()
-        try:
-            text = raw.decode("utf-8-sig")
-        except UnicodeDecodeError:
-            text = raw.decode("latin-1")
-        reader = csv.DictReader(io.StringIO(text))
-        headers = reader.fieldnames or []
-        rows = list(reader)
-        return headers, rows
+        encoding, _ = _scan_csv(path)
+        with open(path, "r", encoding=encoding, newline="") as fh:
+            reader = csv.DictReader(fh)
+            for i, row in enumerate(reader):
+                yield i + 2, row
+        return
 
     if filename.endswith((".xlsx", ".xls")):
         import openpyxl
-        wb = openpyxl.load_workbook(file_storage, read_only=True, data_only=True)
-        ws = wb.active
-        all_rows = list(ws.iter_rows(values_only=True))
-        wb.close()
-        if not all_rows:
-            return [], []
-        headers = [str(h).strip() if h else "" for h in all_rows[0]]
-        rows = []
-        for row_vals in all_rows[1:]:
-            row_dict = {}
-            for i, h in enumerate(headers):
-                if h:
-                    val = row_vals[i] if i < len(row_vals) else None
-                    row_dict[h] = val
-            rows.append(row_dict)
-        return headers, rows
-
-    return [], []
+        wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            ws = wb.active
+            rows = ws.iter_rows(values_only=True)
+            header_row = next(rows, None)
+            if not header_row:
+                return
+            headers = [str(h).strip() if h else "" for h in header_row]
+            for i, row_vals in enumerate(rows):
+                row_dict = {}
+                for col, h in enumerate(headers):
+                    if h:
+                        row_dict[h] = row_vals[col] if col < len(row_vals) else None
+                yield i + 2, row_dict
+        finally:
+            wb.close()
+
+
+def _estimate_row_count(path, filename):
+    filename = (filename or "").lower()
+    if filename.endswith(".csv"):
+        return _scan_csv(path)[1]
+    if filename.endswith((".xlsx", ".xls")):
+        import openpyxl
+        wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            max_row = wb.active.max_row
+        finally:
+            wb.close()
+        return max(int(max_row or 1) - 1, 0) if max_row else None
+    return None
 
 
 def _safe_int(val):
@@ -379,10 +439,13 @@ def import_export_index():
     if tab not in ENTITY_LABELS:
         tab = "customers"
 
+    from app.blueprints.import_export.exports import EXPORT_LABELS
+
     return _render_app_page(
         "public/import_export.html",
         active_page="import_export",
         active_tab=tab,
+        export_entities=EXPORT_LABELS,
         entity_tabs=ENTITY_LABELS,
         entity_fields=ENTITY_FIELDS.get(tab, []),
         entity_fields_json=json.dumps(ENTITY_FIELDS.get(tab, [])),
@@ -409,11 +472,139 @@ def upload_headers():
     return jsonify({"ok": True, "headers": headers})
 
 
+def _resolve_customer_import_defaults(shop_db, shop):
+    """(default_labor_rate_id, default_pricing_rule_id, pricing_rule_lookup)."""
+    from app.blueprints.customers.routes import (
+        _resolve_default_labor_rate_id,
+        _resolve_default_pricing_rule_id,
+    )
+    default_rate_id = _resolve_default_labor_rate_id(shop_db, shop["_id"])
+    default_pricing_rule_id = _resolve_default_pricing_rule_id(shop_db, shop["_id"])
+    pricing_rule_lookup = {}
+    for s in shop_db.parts_pricing_rules.find({"shop_id": shop["_id"]}, {"_id": 1, "name": 1}):
+        nm = (s.get("name") or "").strip().lower()
+        if nm:
+            pricing_rule_lookup[nm] = s["_id"]
+    return default_rate_id, default_pricing_rule_id, pricing_rule_lookup
+
+
+def _make_doc_builder(entity_type, shop_db, shop, now, user_id):
+    """Return build(mapped_row) -> doc | None for the entity."""
+    if entity_type == "customers":
+        rate_id, pricing_rule_id, pricing_rule_lookup = _resolve_customer_import_defaults(shop_db, shop)
+        return lambda row: _build_customer_doc(
+            row, shop, now, user_id,
+            default_labor_rate_id=rate_id,
+            pricing_rule_lookup=pricing_rule_lookup,
+            default_pricing_rule_id=pricing_rule_id,
+        )
+    if entity_type == "units":
+        # No customer reference column yet — units are imported unassigned.
+        return lambda row: _build_unit_doc(row, None, shop, now, user_id)
+    if entity_type == "vendors":
+        return lambda row: _build_vendor_doc(row, shop, now, user_id)
+    if entity_type == "parts":
+        return lambda row: _build_part_doc(row, shop, now, user_id)
+    raise ValueError(f"Unknown entity type: {entity_type}")
+
+
+def _insert_import_batch(collection, batch, batch_rows, error_writer):
+    """insert_many(ordered=False); returns (inserted, failed) and logs failures per row."""
+    if not batch:
+        return 0, 0
+    try:
+        res = collection.insert_many(batch, ordered=False)
+        return len(res.inserted_ids), 0
+    except BulkWriteError as exc:
+        details = exc.details or {}
+        write_errors = details.get("writeErrors") or []
+        for err in write_errors:
+            idx = err.get("index")
+            row_number = batch_rows[idx] if isinstance(idx, int) and idx < len(batch_rows) else ""
+            error_writer.writerow([row_number, err.get("errmsg") or "Write failed", ""])
+        return int(details.get("nInserted") or 0), len(write_errors)
+
+
+def _run_import_job(job_id, *, path, filename, entity_type, mapping, tenant_id, shop_id, user_id):
+    """
+    Streaming import: rows are read lazily, mapped and built into docs, and
+    written with insert_many(ordered=False) in IMPORT_BATCH_SIZE chunks.
+    Rejected rows go to a per-job CSV error report.
+    """
+    try:
+        shop_db, shop = _get_shop_db_by_ids(tenant_id, shop_id)
+        if shop_db is None:
+            raise RuntimeError("Shop not configured.")
+
+        collection = shop_db[ENTITY_COLLECTIONS[entity_type]]
+        build = _make_doc_builder(entity_type, shop_db, shop, utcnow(), user_id)
+
+        update_job_progress(job_id, total_estimate=_estimate_row_count(path, filename), processed=0)
+
+        processed = imported = skipped = 0
+        batch, batch_rows = [], []
+        error_path = job_file_path(job_id, "_errors.csv")
+
+        with open(error_path, "w", encoding="utf-8", newline="") as error_fh:
+            error_writer = csv.writer(error_fh)
+            error_writer.writerow(["Row", "Error", "Values"])
+
+            for row_number, row in _iter_file_rows(path, filename):
+                processed += 1
+                # Map file headers to our field keys
+                mapped_row = {}
+                for file_header, our_key in mapping.items():
+                    if our_key and file_header in row:
+                        mapped_row[our_key] = row[file_header]
+
+                try:
+                    doc = build(mapped_row)
+                except Exception as exc:
+                    doc = None
+                    reason = str(exc)
+                else:
+                    reason = "Missing required field."
+
+                if doc is None:
+                    skipped += 1
+                    error_writer.writerow([row_number, reason, json.dumps(mapped_row, default=str)])
+                else:
+                    batch.append(doc)
+                    batch_rows.append(row_number)
+
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    ok, failed = _insert_import_batch(collection, batch, batch_rows, error_writer)
+                    imported += ok
+                    skipped += failed
+                    batch, batch_rows = [], []
+                    update_job_progress(job_id, processed=processed, imported=imported, skipped=skipped)
+
+            ok, failed = _insert_import_batch(collection, batch, batch_rows, error_writer)
+            imported += ok
+            skipped += failed
+
+        if entity_type == "parts" and imported:
+            # New part numbers can re-point stale preset rows.
+            invalidate_presets(shop_db, shop["_id"])
+        update_job_progress(job_id, processed=processed, imported=imported, skipped=skipped)
+        return {
+            "imported": imported,
+            "skipped": skipped,
+            "total": processed,
+            "has_error_report": skipped > 0,
+        }
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
 @import_export_bp.post("/import")
 @login_required
 @permission_required("settings.manage_org")
 def run_import():
-    """Execute the import with field mapping."""
+    """Validate the request, stash the upload and start a background import job."""
     shop_db, shop = _get_shop_db()
     if shop_db is None:
         return jsonify({"ok": False, "error": "Shop not configured."}), 400
@@ -435,100 +626,69 @@ def run_import():
     if not f or not f.filename:
         return jsonify({"ok": False, "error": "No file uploaded."}), 400
 
-    headers, rows = _parse_all_rows(f)
-    if not rows:
-        return jsonify({"ok": False, "error": "No data rows found."}), 400
+    fname = f.filename.lower()
+    if not fname.endswith((".csv", ".xlsx", ".xls")):
+        return jsonify({"ok": False, "error": "Unsupported file format. Use CSV or Excel."}), 400
+
+    # Customers need a default labor rate so the field is never empty.
+    if entity_type == "customers":
+        from app.blueprints.customers.routes import _resolve_default_labor_rate_id
+        if not _resolve_default_labor_rate_id(shop_db, shop["_id"]):
+            return jsonify({"ok": False, "error": "No labor rates configured for this shop. Please create at least one labor rate first."}), 400
 
-    now = utcnow()
     user_id = _oid(session.get(SESSION_USER_ID))
+    job_id = create_job(
+        IMPORT_JOB_KIND,
+        tenant_id=shop.get("tenant_id"),
+        shop_id=shop["_id"],
+        user_id=user_id,
+        params={"entity_type": entity_type, "filename": f.filename},
+    )
+    path = job_file_path(job_id, os.path.splitext(fname)[1])
+    f.save(path)
+
+    submit_job(
+        job_id,
+        _run_import_job,
+        path=path,
+        filename=fname,
+        entity_type=entity_type,
+        mapping=mapping,
+        tenant_id=shop.get("tenant_id"),
+        shop_id=shop["_id"],
+        user_id=user_id,
+    )
+    return jsonify({"ok": True, "job_id": str(job_id)})
 
-    # mapping: {file_header: our_field_key}
-    imported = 0
-    skipped = 0
-    errors = []
 
-    # For units import we need a customer_id lookup
-    customer_lookup = {}
-    if entity_type == "units":
-        # Pre-build lookup by company_name (case-insensitive)
-        for c in shop_db.customers.find({"shop_id": shop["_id"], "is_active": True}, {"company_name": 1}):
-            cn = (c.get("company_name") or "").strip().lower()
-            if cn:
-                customer_lookup[cn] = c["_id"]
-
-    # Pre-resolve default labor rate for customer imports so the field is never empty.
-    customer_default_rate_id = None
-    pricing_rule_lookup = {}
-    customer_default_pricing_rule_id = None
-    if entity_type == "customers":
-        from app.blueprints.customers.routes import (
-            _resolve_default_labor_rate_id,
-            _resolve_default_pricing_rule_id,
-        )
-        customer_default_rate_id = _resolve_default_labor_rate_id(shop_db, shop["_id"])
-        if not customer_default_rate_id:
-            return jsonify({"ok": False, "error": "No labor rates configured for this shop. Please create at least one labor rate first."}), 400
-        customer_default_pricing_rule_id = _resolve_default_pricing_rule_id(shop_db, shop["_id"])
-        for s in shop_db.parts_pricing_rules.find({"shop_id": shop["_id"]}, {"_id": 1, "name": 1}):
-            nm = (s.get("name") or "").strip().lower()
-            if nm:
-                pricing_rule_lookup[nm] = s["_id"]
-
-    for i, row in enumerate(rows):
-        # Map file headers to our field keys
-        mapped_row = {}
-        for file_header, our_key in mapping.items():
-            if our_key and file_header in row:
-                mapped_row[our_key] = row[file_header]
+def _get_current_shop_job(job_id, kind):
+    _, shop = _get_shop_db()
+    if shop is None:
+        return None
+    return get_job(job_id, tenant_id=shop.get("tenant_id"), shop_id=shop["_id"], kind=kind)
 
-        try:
-            if entity_type == "customers":
-                doc = _build_customer_doc(
-                    mapped_row, shop, now, user_id,
-                    default_labor_rate_id=customer_default_rate_id,
-                    pricing_rule_lookup=pricing_rule_lookup,
-                    default_pricing_rule_id=customer_default_pricing_rule_id,
-                )
-                if doc is None:
-                    skipped += 1
-                    continue
-                shop_db.customers.insert_one(doc)
-                imported += 1
-
-            elif entity_type == "units":
-                doc = _build_unit_doc(mapped_row, None, shop, now, user_id)
-                # Try to assign customer_id if we have company name or customer ref
-                doc["customer_id"] = None
-                shop_db.units.insert_one(doc)
-                imported += 1
-
-            elif entity_type == "vendors":
-                doc = _build_vendor_doc(mapped_row, shop, now, user_id)
-                if doc is None:
-                    skipped += 1
-                    continue
-                shop_db.vendors.insert_one(doc)
-                imported += 1
 
-            elif entity_type == "parts":
-                doc = _build_part_doc(mapped_row, shop, now, user_id)
-                if doc is None:
-                    skipped += 1
-                    continue
-                shop_db.parts.insert_one(doc)
-                imported += 1
-
-        except Exception as exc:
-            skipped += 1
-            if len(errors) < 10:
-                errors.append(f"Row {i + 2}: {str(exc)}")
-
-    result = {
-        "ok": True,
-        "imported": imported,
-        "skipped": skipped,
-        "total": len(rows),
-    }
-    if errors:
-        result["errors"] = errors
-    return jsonify(result)
+@import_export_bp.get("/import/jobs/<job_id>")
+@login_required
+@permission_required("settings.manage_org")
+def import_job_status(job_id):
+    job = _get_current_shop_job(job_id, IMPORT_JOB_KIND)
+    if not job:
+        return jsonify({"ok": False, "error": "Import job not found."}), 404
+    return jsonify({"ok": True, "job": serialize_job(job)})
+
+
+@import_export_bp.get("/import/jobs/<job_id>/errors.csv")
+@login_required
+@permission_required("settings.manage_org")
+def import_job_errors(job_id):
+    job = _get_current_shop_job(job_id, IMPORT_JOB_KIND)
+    path = job_file_path(job["_id"], "_errors.csv") if job else None
+    if not path or not os.path.exists(path):
+        return jsonify({"ok": False, "error": "Error report not found."}), 404
+    return send_file(
+        path,
+        mimetype="text/csv",
+        as_attachment=True,
+        download_name=f"import_errors_{job_id}.csv",
+    )
@@ -8,6 +8,7 @@ from app.utils.permissions import permission_required
 from app.utils.hosts import app_url
 from app.extensions import get_master_db, get_mongo_client
 from app.utils.display_datetime import get_active_shop_timezone_name
+from app.utils.layout import get_shop_switcher_options
 from flask import current_app
 from . import main_bp
 
@@ -65,6 +66,10 @@ def _load_user_and_tenant_from_session():
     """
     Возвращает (user, tenant) или (None, None) если сессия битая/не совпадает.
     """
+    # load_current_context already loaded and validated both for this request.
+    if getattr(g, "user", None) and getattr(g, "tenant", None):
+        return g.user, g.tenant
+
     master = get_master_db()
 
     user_id = _maybe_object_id(session.get(SESSION_USER_ID))
@@ -95,27 +100,9 @@ def _render_app_page(template_name: str, active_page: str, **ctx):
     app_user_display = user_name or user_email or "—"
     app_tenant_display = tenant_name or "—"
 
-    master = get_master_db()
-
     # ✅ shops list for dropdown (only allowed shops)
     allowed_ids = session.get("shop_ids") or []
-    allowed_ids = [str(x) for x in allowed_ids]
-
-    allowed_oids = []
-    for sid in allowed_ids:
-        try:
-            allowed_oids.append(ObjectId(sid))
-        except Exception:
-            pass
-
-    shop_options = []
-    if allowed_oids:
-        for s in master.shops.find({
-            "tenant_id": tenant["_id"],
-            "_id": {"$in": allowed_oids},
-            "is_active": True,
-        }).sort("created_at", 1):
-            shop_options.append({"id": str(s["_id"]), "name": s.get("name") or "—"})
+    shop_options = get_shop_switcher_options(tenant, allowed_ids, active_only=True)
 
     # ✅ ensure active shop in session
     active_shop_id = session.get("shop_id")
@@ -7,7 +7,7 @@ from bson import ObjectId
 from flask import request, redirect, url_for, flash, session, jsonify
 
 from app.blueprints.main.routes import _render_app_page
-from app.extensions import get_master_db, get_mongo_client
+from app.extensions import get_master_db
 from app.utils.auth import login_required, SESSION_TENANT_ID, SESSION_USER_ID
 from app.utils.pagination import get_pagination_params, get_sort_params, paginate_find
 from app.utils.mongo_search import build_regex_search_filter
@@ -21,6 +21,9 @@ from app.utils.display_datetime import (
     shop_local_date_to_utc,
 )
 from app.utils.date_filters import build_date_range_filters
+from app.utils.tenant_context import get_active_shop_db
+from app.utils.parts_ledger import order_amounts as _parts_order_amounts, sync_parts_order
+from app.blueprints.work_orders.preset_resolution import invalidate_presets
 
 from . import parts_bp
 
@@ -46,54 +49,6 @@ def _oid(value) -> Optional[ObjectId]:
         return None
 
 
-def _tenant_id_variants():
-    """
-    Нужна из-за того, что tenant_id исторически мог быть то строкой, то ObjectId.
-    """
-    raw = session.get(SESSION_TENANT_ID)
-    out = set()
-    if raw is None:
-        return []
-    out.add(raw)
-    out.add(str(raw))
-    oid = _oid(raw)
-    if oid:
-        out.add(oid)
-    return list(out)
-
-
-def _get_active_shop(master):
-    shop_id_raw = session.get("shop_id")
-    shop_oid = _oid(shop_id_raw)
-    if not shop_oid:
-        return None
-
-    tenant_variants = _tenant_id_variants()
-    if not tenant_variants:
-        return None
-
-    return master.shops.find_one({"_id": shop_oid, "tenant_id": {"$in": tenant_variants}})
-
-
-def _get_shop_db(master):
-    shop = _get_active_shop(master)
-    if not shop:
-        return None, None
-
-    db_name = (
-        shop.get("db_name")
-        or shop.get("database")
-        or shop.get("db")
-        or shop.get("mongo_db")
-        or shop.get("shop_db")
-    )
-    if not db_name:
-        return None, shop
-
-    client = get_mongo_client()
-    return client[str(db_name)], shop
-
-
 def _parts_collections():
     """
     Все коллекции живут в SHOP DB:
@@ -104,7 +59,7 @@ def _parts_collections():
       - parts_orders
     """
     master = get_master_db()
-    db, shop = _get_shop_db(master)
+    db, shop = get_active_shop_db(master)
     if db is None:
         return None, None, None, None, None, shop, master
 
@@ -169,30 +124,6 @@ def _parse_non_inventory_amounts(raw_lines):
     return out, None
 
 
-def _parts_order_amounts(order_doc: dict):
-    items_amount = 0.0
-    for item in (order_doc.get("items") or []):
-        if not isinstance(item, dict):
-            continue
-        qty = max(0, _parse_int(item.get("quantity"), default=0))
-        price = max(0.0, _parse_float(item.get("price"), default=0.0))
-        core = max(0.0, _parse_float(item.get("core_charge"), default=0.0))
-        items_amount += qty * (price + core)
-
-    non_inventory_amount = 0.0
-    for line in (order_doc.get("non_inventory_amounts") or []):
-        if not isinstance(line, dict):
-            continue
-        non_inventory_amount += max(0.0, _parse_float(line.get("amount"), default=0.0))
-
-    total_amount = items_amount + non_inventory_amount
-    return {
-        "items_amount": float(items_amount),
-        "non_inventory_amount": float(non_inventory_amount),
-        "total_amount": float(total_amount),
-    }
-
-
 def _sum_active_order_payments(payments_coll, order_id: ObjectId) -> float:
     if payments_coll is None or not order_id:
         return 0.0
@@ -274,28 +205,10 @@ def _build_parts_order_payment_summary(order_doc: dict, paid_amount: float):
 
 
 def _sync_parts_order_payment_state(orders_coll, payments_coll, order_doc: dict, user_oid, now):
-    if orders_coll is None or payments_coll is None or not isinstance(order_doc, dict):
-        return
-
-    order_id = order_doc.get("_id")
-    if not order_id:
+    if orders_coll is None or not isinstance(order_doc, dict) or not order_doc.get("_id"):
         return
-
-    paid_amount = _sum_active_order_payments(payments_coll, order_id)
-    summary = _build_parts_order_payment_summary(order_doc, paid_amount)
-
-    orders_coll.update_one(
-        {"_id": order_id},
-        {
-            "$set": {
-                "payment_status": summary["payment_status"],
-                "paid_amount": float(summary["paid_amount"]),
-                "remaining_balance": float(summary["remaining_balance"]),
-                "updated_at": now,
-                "updated_by": user_oid,
-            }
-        },
-    )
+    # Totals, payment state and the vendor balance ledger in one place.
+    sync_parts_order(orders_coll.database, order_doc["_id"], user_oid=user_oid, now=now)
 
 
 def _get_parts_orders_totals(orders_coll, query: dict):
@@ -1272,6 +1185,7 @@ def parts_create():
         doc["in_stock"] = in_stock
 
     parts_coll.insert_one(doc)
+    invalidate_presets(parts_coll.database, shop["_id"], part_numbers=[part_number])
 
     flash("Part created successfully.", "success")
     return redirect(url_for("parts.parts_page"))
@@ -1357,6 +1271,7 @@ def parts_api_create():
         doc["in_stock"] = in_stock
 
     res = parts_coll.insert_one(doc)
+    invalidate_presets(parts_coll.database, shop["_id"], part_numbers=[part_number])
     return jsonify({"ok": True, "part_id": str(res.inserted_id)})
 
 
@@ -1731,6 +1646,7 @@ def parts_api_orders_create():
     }
 
     res = orders_coll.insert_one(order_doc)
+    sync_parts_order(shop_db, res.inserted_id, user_oid=user_oid, now=now)
 
     return jsonify(
         {
@@ -2204,6 +2120,7 @@ def parts_api_orders_receive(order_id: str):
 
     updated = 0
     updated_not_tracked = 0
+    repriced_ids = []
     for it in items:
         pid = it.get("part_id")
         if not pid:
@@ -2232,6 +2149,7 @@ def parts_api_orders_receive(order_id: str):
             )
             updated_not_tracked += 1
             updated += 1
+            repriced_ids.append(pid)
             continue
 
         old_qty = int(part.get("in_stock") or 0)
@@ -2251,6 +2169,7 @@ def parts_api_orders_receive(order_id: str):
         )
 
         updated += 1
+        repriced_ids.append(pid)
 
     orders_coll.update_one(
         {"_id": oid},
@@ -2263,6 +2182,10 @@ def parts_api_orders_receive(order_id: str):
             "updated_by": user_oid,
         }},
     )
+    sync_parts_order(orders_coll.database, oid, user_oid=user_oid, now=now)
+    # Presets show live average cost.
+    if repriced_ids:
+        invalidate_presets(parts_coll.database, shop["_id"], part_ids=repriced_ids)
 
     return jsonify({
         "ok": True,
@@ -2374,6 +2297,7 @@ def parts_api_orders_unreceive(order_id: str):
             },
         },
     )
+    sync_parts_order(orders_coll.database, oid, user_oid=user_oid, now=now)
 
     return jsonify({"ok": True, "updated_parts": updated})
 
@@ -2433,6 +2357,7 @@ def parts_api_orders_delete(order_id: str):
             }
         },
     )
+    sync_parts_order(orders_coll.database, oid, user_oid=user_oid, now=now)
 
     return jsonify({"ok": True, "updated_parts": updated})
 
@@ -2573,7 +2498,7 @@ def parts_api_history(part_id: str):
         })
 
     # Work order history (prefer part_id match, fallback by part_number for legacy docs)
-    db, _ = _get_shop_db(master)
+    db, _ = get_active_shop_db(master)
     if db is None:
         return jsonify({
             "ok": True,
@@ -2809,6 +2734,7 @@ def parts_api_update(part_id: str):
         update_doc["$unset"] = unset_doc
 
     parts_coll.update_one({"_id": pid}, update_doc)
+    invalidate_presets(parts_coll.database, shop["_id"], part_ids=[pid], part_numbers=[part.get("part_number"), part_number])
 
     return jsonify({"ok": True, "message": "Part updated successfully"})
 
@@ -2852,6 +2778,7 @@ def parts_deactivate(part_id: str):
             "deactivated_by": user_oid,
         }},
     )
+    invalidate_presets(parts_coll.database, shop["_id"], part_ids=[pid], part_numbers=[existing.get("part_number")])
 
     flash("Part deactivated.", "success")
     return redirect(url_for("parts.parts_page"))
@@ -2897,6 +2824,7 @@ def parts_restore(part_id: str):
             "deactivated_by": None,
         }},
     )
+    invalidate_presets(parts_coll.database, shop["_id"], part_ids=[pid], part_numbers=[existing.get("part_number")])
 
     flash("Part restored.", "success")
     return redirect(url_for("parts.parts_page"))
@@ -0,0 +1,121 @@
+"""Merging per-shop standard reports into one all-locations report.
+
+Each `_report_*` in routes.py runs unchanged against one shop DB (see
+`app.utils.shop_fanout`); `merge_report` combines the partial results.
+Customers and vendors belong to one shop, so their rows stay per shop (label
+suffixed with the shop name) and are heap-merged by the report's sort column;
+mechanics are master users and are summed across shops.
+"""
+from __future__ import annotations
+
+from app.utils.shop_fanout import (
+    merge_chart_data,
+    merge_keyed_rows,
+    merge_sorted_rows,
+    ratio,
+    sum_fields,
+)
+
+
+# report key -> (row label field, row sort field, summary fields that are plain sums)
+_PER_SHOP_ROW_REPORTS = {
+    "sales_summary": (
+        "customer_label", "grand_total",
+        ("orders_count", "revenue_total", "labor_total", "parts_total", "sales_tax_total"),
+    ),
+    "payments_summary": ("customer_label", "amount_total", ("payments_count", "payments_total")),
+    "customer_balances": ("customer_label", "outstanding_total", ("outstanding_total", "billed_total", "paid_total")),
+    "vendor_balances": (
+        "vendor_label", "remaining_balance",
+        ("orders_count", "total_amount", "paid_amount", "remaining_balance"),
+    ),
+    "parts_orders_summary": (
+        "vendor_label", "total_amount",
+        ("orders_count", "parts_total", "cores_total", "non_inventory_total",
+         "total_amount", "paid_amount", "remaining_balance"),
+    ),
+}
+
+_MECHANIC_TOTAL_CATEGORY = "Mechanic Hours — Total"
+
+
+def label_rows_with_shop(report: dict, report_key: str, shop_name: str) -> dict:
+    """Suffix customer / vendor labels with the shop they belong to."""
+    spec = _PER_SHOP_ROW_REPORTS.get(report_key)
+    if spec:
+        label_field = spec[0]
+        for row in report.get("rows") or []:
+            row[label_field] = f"{row.get(label_field) or '-'} · {shop_name}"
+            row["shop_name"] = shop_name
+    return report
+
+
+def _by_category(row: dict):
+    return row.get("category")
+
+
+def _merge_general_revenue_rows(row_lists: list[list[dict]]) -> list[dict]:
+    money_rows, hours_total, mechanics = [], [], []
+    for rows in row_lists:
+        money, hours, mech = [], [], []
+        for row in rows or []:
+            category = row.get("category") or ""
+            if not row.get("is_hours"):
+                if category:
+                    money.append(row)
+            elif category == _MECHANIC_TOTAL_CATEGORY:
+                hours.append(row)
+            else:
+                mech.append(row)
+        money_rows.append(money)
+        hours_total.append(hours)
+        mechanics.append(mech)
+
+    merged_mechanics = merge_keyed_rows(mechanics, _by_category, ("amount",))
+    merged_mechanics.sort(key=lambda r: float(r.get("amount") or 0), reverse=True)
+    return (
+        merge_keyed_rows(money_rows, _by_category, ("amount",))
+        + [{"category": "", "amount": None}]
+        + merge_keyed_rows(hours_total, _by_category, ("amount",))
+        + merged_mechanics
+    )
+
+
+def merge_report(report_key: str, parts: list[dict], *, fill_labels=None) -> dict:
+    """One report_data dict from the per-shop ones (same shape as a single shop's)."""
+    if not parts:
+        return {"title": "", "summary": {}, "rows": []}
+    summaries = [p.get("summary") or {} for p in parts]
+    row_lists = [p.get("rows") or [] for p in parts]
+    merged = {"title": parts[0].get("title") or ""}
+
+    spec = _PER_SHOP_ROW_REPORTS.get(report_key)
+    if spec:
+        _, sort_field, summed = spec
+        rows = merge_sorted_rows(row_lists, sort_field)
+        summary = sum_fields(summaries, summed)
+        if report_key == "sales_summary":
+            summary["avg_ticket"] = round(ratio(summary["revenue_total"], summary["orders_count"]), 2)
+        elif report_key == "payments_summary":
+            summary["avg_payment"] = round(ratio(summary["payments_total"], summary["payments_count"]), 2)
+        elif report_key == "customer_balances":
+            summary["customers_count"] = len(rows)
+        else:
+            summary["vendors_count"] = len(rows)
+    elif report_key == "mechanic_hours":
+        rows = merge_keyed_rows(
+            row_lists, lambda r: r.get("mechanic_id"), ("total_hours", "wo_count", "labor_entries")
+        )
+        rows.sort(key=lambda r: float(r.get("total_hours") or 0), reverse=True)
+        summary = sum_fields(summaries, ("total_hours", "total_wo", "total_entries"))
+        summary["mechanics_count"] = len(rows)
+    else:  # general_revenue: every summary field is additive
+        rows = _merge_general_revenue_rows(row_lists)
+        summary = sum_fields(summaries, list(summaries[0].keys()))
+
+    merged["summary"] = summary
+    merged["rows"] = rows
+    chart = merge_chart_data([p.get("chart_data") for p in parts], fill_labels)
+    if chart is not None:
+        merged["chart_data"] = chart
+    return merged
@@ -1,12 +1,18 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone
+import base64
+import re
+import time
+from datetime import datetime, timedelta, timezone
 from uuid import uuid4
 
 from flask import g, has_request_context, request, session
+from bson import ObjectId, json_util
+from pymongo import ASCENDING, ReplaceOne
 
-from app.extensions import get_master_db
+from app.extensions import _safe_create_index, get_master_db
 from app.utils.auth import SESSION_TENANT_ID, SESSION_USER_ID
+from app.utils.metrics import observe_audit_write
 
 
 MUTATING_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
@@ -23,10 +29,204 @@ SENSITIVE_KEYS = {
 }
 
 
+# Journal is partitioned by calendar month (UTC): one collection per month,
+# e.g. audit_journal_2026_10. Old months are archived + dropped as a whole by
+# `python -m app.scripts.archive_audit_journal`; tenants with a shorter
+# retention get per-document `expire_at` handled by a TTL index.
+JOURNAL_PARTITION_PREFIX = "audit_journal_"
+JOURNAL_PARTITION_RE = re.compile(r"^audit_journal_(\d{4})_(\d{2})$")
+# Unpartitioned collection of older releases; master migration 10 moves its
+# rows into the monthly partitions (`migrate_legacy_journal`).
+LEGACY_JOURNAL_COLLECTION = "audit_journal"
+LEGACY_MOVE_BATCH_SIZE = 1000
+
+# Fields the viewer can sort by. Every sort is keyset-paged on (field, _id),
+# "created_at" maps to _id itself (ObjectId is insert-time ordered).
+JOURNAL_SORT_FIELDS = ("created_at", "method", "endpoint", "path", "status_code")
+
+_ensured_partitions: set[str] = set()
+
+
 def utcnow() -> datetime:
     return datetime.now(timezone.utc)
 
 
+def journal_partition_name(dt: datetime) -> str:
+    return f"{JOURNAL_PARTITION_PREFIX}{dt.year:04d}_{dt.month:02d}"
+
+
+def parse_journal_month(value) -> datetime | None:
+    """'YYYY-MM' -> first day of that month (UTC), or None."""
+    text = str(value or "").strip()
+    try:
+        dt = datetime.strptime(text, "%Y-%m")
+    except Exception:
+        return None
+    return dt.replace(tzinfo=timezone.utc)
+
+
+def ensure_journal_partition_indexes(collection) -> None:
+    """
+    Indexes for one monthly partition. Every viewer query is
+    tenant_id (+ method / endpoint equality) sorted by one column + _id.
+    Safe to call multiple times.
+    """
+    _safe_create_index(collection, [("tenant_id", ASCENDING), ("_id", ASCENDING)], name="idx_journal_tenant_id")
+    _safe_create_index(collection, [("tenant_id", ASCENDING), ("method", ASCENDING), ("_id", ASCENDING)], name="idx_journal_tenant_method_id")
+    _safe_create_index(collection, [("tenant_id", ASCENDING), ("endpoint", ASCENDING), ("_id", ASCENDING)], name="idx_journal_tenant_endpoint_id")
+    _safe_create_index(collection, [("tenant_id", ASCENDING), ("method", ASCENDING), ("endpoint", ASCENDING), ("_id", ASCENDING)], name="idx_journal_tenant_method_endpoint_id")
+    _safe_create_index(collection, [("tenant_id", ASCENDING), ("path", ASCENDING), ("_id", ASCENDING)], name="idx_journal_tenant_path_id")
+    _safe_create_index(collection, [("tenant_id", ASCENDING), ("status_code", ASCENDING), ("_id", ASCENDING)], name="idx_journal_tenant_status_id")
+    # Per-tenant retention: documents carry `expire_at` only when the tenant
+    # has a custom retention shorter than the global archive window.
+    _safe_create_index(collection, [("expire_at", ASCENDING)], expireAfterSeconds=0, sparse=True, name="ttl_journal_expire_at")
+
+
+def get_journal_partition(master, dt: datetime, ensure_indexes: bool = True):
+    name = journal_partition_name(dt)
+    collection = master[name]
+    if ensure_indexes and name not in _ensured_partitions:
+        ensure_journal_partition_indexes(collection)
+        _ensured_partitions.add(name)
+    return collection
+
+
+def list_journal_partitions(master) -> list[str]:
+    """Existing monthly partitions, newest first."""
+    names = master.list_collection_names(
+        filter={"name": {"$regex": JOURNAL_PARTITION_RE.pattern}}
+    )
+    return sorted((n for n in names if JOURNAL_PARTITION_RE.match(n)), reverse=True)
+
+
+def partition_month_start(name: str) -> datetime | None:
+    m = JOURNAL_PARTITION_RE.match(name or "")
+    if not m:
+        return None
+    return datetime(int(m.group(1)), int(m.group(2)), 1, tzinfo=timezone.utc)
+
+
+def _legacy_row_time(doc: dict) -> datetime:
+    created = doc.get("created_at")
+    if isinstance(created, datetime):
+        return created
+    if isinstance(doc.get("_id"), ObjectId):
+        return doc["_id"].generation_time
+    return utcnow()
+
+
+def migrate_legacy_journal(master, batch_size: int = LEGACY_MOVE_BATCH_SIZE) -> int:
+    """
+    Move the rows of the legacy `audit_journal` collection into the monthly
+    partition of their `created_at`, then drop it. Rows are upserted by _id
+    before they are deleted, so an interrupted run can be repeated.
+    Returns rows moved.
+    """
+    if LEGACY_JOURNAL_COLLECTION not in master.list_collection_names():
+        return 0
+    legacy = master[LEGACY_JOURNAL_COLLECTION]
+    moved = 0
+    while True:
+        batch = list(legacy.find({}).sort("_id", ASCENDING).limit(batch_size))
+        if not batch:
+            break
+        by_partition: dict[str, tuple[datetime, list]] = {}
+        for doc in batch:
+            dt = _legacy_row_time(doc)
+            _, ops = by_partition.setdefault(journal_partition_name(dt), (dt, []))
+            ops.append(ReplaceOne({"_id": doc["_id"]}, doc, upsert=True))
+        for dt, ops in by_partition.values():
+            get_journal_partition(master, dt).bulk_write(ops, ordered=False)
+        legacy.delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+        moved += len(batch)
+    master.drop_collection(LEGACY_JOURNAL_COLLECTION)
+    return moved
+
+
+def encode_journal_cursor(row: dict, sort_field: str) -> str:
+    value = row.get("_id") if sort_field == "created_at" else row.get(sort_field)
+    raw = json_util.dumps({"v": value, "id": row.get("_id")})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_journal_cursor(token) -> dict | None:
+    text = str(token or "").strip()
+    if not text:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(text + "=" * (-len(text) % 4)).decode("utf-8")
+        data = json_util.loads(raw)
+    except Exception:
+        return None
+    if not isinstance(data, dict) or "id" not in data:
+        return None
+    return data
+
+
+def fetch_journal_page(
+    collection,
+    query: dict,
+    sort_field: str,
+    sort_dir: int,
+    per_page: int,
+    projection: dict | None = None,
+    after: str | None = None,
+    before: str | None = None,
+) -> tuple[list[dict], str | None, str | None]:
+    """
+    Keyset page over one partition, ordered by (sort_field, _id).
+    `after` continues forward from a row, `before` walks back from one.
+    Returns (rows, prev_cursor, next_cursor); no count_documents / skip.
+    """
+    if sort_field not in JOURNAL_SORT_FIELDS:
+        sort_field = "created_at"
+    key = "_id" if sort_field == "created_at" else sort_field
+
+    before_data = decode_journal_cursor(before)
+    cursor_data = before_data or decode_journal_cursor(after)
+    backwards = before_data is not None
+    direction = -sort_dir if backwards else sort_dir
+
+    q = dict(query)
+    if cursor_data:
+        op = "$gt" if direction == 1 else "$lt"
+        if key == "_id":
+            q["_id"] = {op: cursor_data["id"]}
+        else:
+            q["$or"] = [
+                {key: {op: cursor_data.get("v")}},
+                {key: cursor_data.get("v"), "_id": {op: cursor_data["id"]}},
+            ]
+
+    sort = [("_id", direction)] if key == "_id" else [(key, direction), ("_id", direction)]
+    rows = list(collection.find(q, projection).sort(sort).limit(per_page + 1))
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    if not rows:
+        return [], None, None
+
+    has_prev = has_more if backwards else bool(cursor_data)
+    has_next = bool(cursor_data) if backwards else has_more
+
+    prev_cursor = encode_journal_cursor(rows[0], sort_field) if has_prev else None
+    next_cursor = encode_journal_cursor(rows[-1], sort_field) if has_next else None
+    return rows, prev_cursor, next_cursor
+
+
+def _tenant_retention_days() -> int | None:
+    tenant = getattr(g, "tenant", None) or {}
+    raw = tenant.get("audit_retention_days")
+    try:
+        days = int(raw)
+    except Exception:
+        return None
+    return days if days > 0 else None
+
+
 def build_request_id() -> str:
     return uuid4().hex
 
@@ -163,9 +363,22 @@ def write_audit_journal(response=None, error: Exception | None = None) -> None:
         "error": _safe_str(error, 4000) if error else "",
     }
 
+    retention_days = _tenant_retention_days()
+    if retention_days:
+        entry["expire_at"] = entry["created_at"] + timedelta(days=retention_days)
+
+    write_started = time.perf_counter()
     try:
         master = get_master_db()
-        master.audit_journal.insert_one(entry)
+        get_journal_partition(master, entry["created_at"]).insert_one(entry)
         g._audit_journal_written = True
     except Exception:
-        pass
+        observe_audit_write(0.0, None, ok=False)
+    else:
+        request_started = getattr(g, "_request_start_time", None)
+        now = time.perf_counter()
+        observe_audit_write(
+            now - write_started,
+            now - request_started if request_started is not None else None,
+            ok=True,
+        )
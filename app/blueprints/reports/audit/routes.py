@@ -7,6 +7,15 @@ from flask import jsonify, make_response, render_template, request, session
 
 from app.blueprints.main.routes import NAV_ITEMS
 from app.blueprints.reports import reports_bp
+from app.blueprints.reports.audit.consolidated import label_rows_with_shop, merge_report
+from app.blueprints.reports.audit.journal import (
+    JOURNAL_SORT_FIELDS,
+    fetch_journal_page,
+    get_journal_partition,
+    list_journal_partitions,
+    parse_journal_month,
+    partition_month_start,
+)
 from app.extensions import get_master_db, get_mongo_client
 from app.utils.auth import SESSION_TENANT_ID, login_required
 from app.utils.date_filters import build_date_range_filters
@@ -14,6 +23,8 @@ from app.utils.layout import render_internal_page
 from app.utils.pagination import get_sort_params
 from app.utils.pdf_utils import render_chart_to_base64, render_html_to_pdf
 from app.utils.permissions import filter_nav_items
+from app.utils.shop_fanout import fan_out_shops
+from app.utils.tenant_context import get_accessible_shops, get_active_shop, shop_db_name
 
 
 STANDARD_REPORT_TABS = {
@@ -36,6 +47,8 @@ VENDOR_FILTER_TABS = {
     "parts_orders_summary",
 }
 
+ALL_LOCATIONS_LABEL = "All locations"
+
 NON_INVENTORY_AMOUNT_TYPES = {
     "shop_supply",
     "tools",
@@ -117,40 +130,11 @@ def _to_oid_list(values: list[str]) -> list[ObjectId]:
     return out
 
 
-def _tenant_variants() -> list:
-    tenant_raw = session.get(SESSION_TENANT_ID)
-    if tenant_raw is None:
-        return []
-
-    out = {tenant_raw, str(tenant_raw)}
-    tenant_oid = _maybe_oid(tenant_raw)
-    if tenant_oid is not None:
-        out.add(tenant_oid)
-    return list(out)
-
-
-def _get_active_shop(master):
-    tenant_ids = _tenant_variants()
-    shop_oid = _maybe_oid(session.get("shop_id"))
-    if not tenant_ids or shop_oid is None:
-        return None
-
-    return master.shops.find_one({"_id": shop_oid, "tenant_id": {"$in": tenant_ids}})
-
-
 def _get_shop_db(shop_doc):
-    if not shop_doc:
-        return None
-    db_name = (
-        shop_doc.get("db_name")
-        or shop_doc.get("database")
-        or shop_doc.get("db")
-        or shop_doc.get("mongo_db")
-        or shop_doc.get("shop_db")
-    )
+    db_name = shop_db_name(shop_doc)
     if not db_name:
         return None
-    return get_mongo_client()[str(db_name)]
+    return get_mongo_client()[db_name]
 
 
 def _append_and(query: dict, extra: dict | None):
@@ -1176,9 +1160,83 @@ def _report_mechanic_hours(shop_db, shop_id, date_ctx, chart_bucket="month"):
     }
 
 
+def _run_standard_report(selected_tab, shop_db, shop_id, date_ctx, include_customer_ids, exclude_customer_ids,
+                         customer_map, include_vendor_ids, vendor_map, chart_bucket):
+    if selected_tab == "sales_summary":
+        return _report_sales_summary(
+            shop_db,
+            shop_id,
+            date_ctx,
+            include_customer_ids,
+            exclude_customer_ids,
+            customer_map,
+            chart_bucket=chart_bucket,
+        )
+    elif selected_tab == "payments_summary":
+        return _report_payments_summary(
+            shop_db,
+            shop_id,
+            date_ctx,
+            include_customer_ids,
+            exclude_customer_ids,
+            customer_map,
+            chart_bucket=chart_bucket,
+        )
+    elif selected_tab == "customer_balances":
+        return _report_customer_balances(
+            shop_db,
+            shop_id,
+            {},
+            include_customer_ids,
+            exclude_customer_ids,
+            customer_map,
+        )
+    elif selected_tab == "vendor_balances":
+        return _report_vendor_balances(
+            shop_db,
+            shop_id,
+            {},
+        )
+    elif selected_tab == "parts_orders_summary":
+        return _report_parts_orders_summary(
+            shop_db,
+            shop_id,
+            date_ctx,
+            include_vendor_ids,
+            vendor_map,
+            chart_bucket=chart_bucket,
+        )
+    elif selected_tab == "mechanic_hours":
+        return _report_mechanic_hours(
+            shop_db,
+            shop_id,
+            date_ctx,
+            chart_bucket=chart_bucket,
+        )
+    else:
+        return _report_general_revenue(
+            shop_db,
+            shop_id,
+            date_ctx,
+            chart_bucket=chart_bucket,
+        )
+
+
+def _run_report_for_shop(selected_tab, shop_db, shop, date_ctx, include_customer_ids, exclude_customer_ids,
+                         include_vendor_ids, chart_bucket):
+    """One shop's part of an all-locations report (runs on the fan-out pool)."""
+    customer_map = _get_customer_options(shop_db, shop["_id"])[1] if selected_tab in CUSTOMER_FILTER_TABS else {}
+    vendor_map = _get_vendor_options(shop_db, shop["_id"])[1] if selected_tab in VENDOR_FILTER_TABS else {}
+    report = _run_standard_report(
+        selected_tab, shop_db, shop["_id"], date_ctx, include_customer_ids, exclude_customer_ids,
+        customer_map, include_vendor_ids, vendor_map, chart_bucket,
+    )
+    return label_rows_with_shop(report, selected_tab, str(shop.get("name") or "-"))
+
+
 def _build_standard_reports_context(selected_tab: str, args, *, skip_report_data: bool = False):
     master = get_master_db()
-    shop = _get_active_shop(master)
+    shop = get_active_shop(master)
 
     selected_tab = str(selected_tab or "sales_summary").strip().lower()
     if selected_tab not in STANDARD_REPORT_TABS:
@@ -1205,6 +1263,11 @@ def _build_standard_reports_context(selected_tab: str, args, *, skip_report_data
 
     date_ctx = build_date_range_filters(args, default_preset="this_month")
 
+    # scope=all: the same report over every shop the user can open, merged.
+    shops = get_accessible_shops(master)
+    can_consolidate = len(shops) > 1
+    consolidated = can_consolidate and str(args.get("scope") or "").strip().lower() == "all"
+
     customer_ids_raw = (args.get("customer_ids") or "").strip()
     include_customer_ids_raw = [v.strip() for v in customer_ids_raw.split(",") if v.strip()] if customer_ids_raw else args.getlist("include_customer_ids")
     exclude_customer_ids_raw = args.getlist("exclude_customer_ids")
@@ -1215,13 +1278,18 @@ def _build_standard_reports_context(selected_tab: str, args, *, skip_report_data
     exclude_set = {str(x) for x in exclude_customer_ids}
     include_customer_ids = [x for x in include_customer_ids if str(x) not in exclude_set]
 
-    customer_options, customer_map = _get_customer_options(shop_db, shop["_id"])
-
     vendor_ids_raw = (args.get("vendor_ids") or "").strip()
     include_vendor_ids_raw = [v.strip() for v in vendor_ids_raw.split(",") if v.strip()] if vendor_ids_raw else []
     include_vendor_ids = _to_oid_list(include_vendor_ids_raw)
 
-    vendor_options, vendor_map = _get_vendor_options(shop_db, shop["_id"])
+    if consolidated:
+        # Customers and vendors are per shop; their filters don't apply across shops.
+        include_customer_ids, exclude_customer_ids, include_vendor_ids = [], [], []
+        customer_options, customer_map = [], {}
+        vendor_options, vendor_map = [], {}
+    else:
+        customer_options, customer_map = _get_customer_options(shop_db, shop["_id"])
+        vendor_options, vendor_map = _get_vendor_options(shop_db, shop["_id"])
 
     chart_bucket_raw = str(args.get("chart_bucket") or "month").strip().lower()
     chart_bucket = chart_bucket_raw if chart_bucket_raw in ("week", "month") else "month"
@@ -1237,73 +1305,38 @@ def _build_standard_reports_context(selected_tab: str, args, *, skip_report_data
             "customer_options": customer_options,
             "include_customer_ids": [str(x) for x in include_customer_ids],
             "exclude_customer_ids": [str(x) for x in exclude_customer_ids],
-            "show_customer_filters": selected_tab in CUSTOMER_FILTER_TABS,
-            "show_vendor_filters": selected_tab in VENDOR_FILTER_TABS,
+            "show_customer_filters": selected_tab in CUSTOMER_FILTER_TABS and not consolidated,
+            "show_vendor_filters": selected_tab in VENDOR_FILTER_TABS and not consolidated,
             "vendor_options": vendor_options,
             "include_vendor_ids": [str(x) for x in include_vendor_ids],
             "report_data": {"title": "", "summary": {}, "rows": []},
-            "shop_name": str(shop.get("name") or "-"),
+            "shop_name": ALL_LOCATIONS_LABEL if consolidated else str(shop.get("name") or "-"),
+            "scope": "all" if consolidated else "shop",
+            "can_consolidate": can_consolidate,
+            "consolidated": None,
             "generated_at": _now_utc(),
         }
 
-    if selected_tab == "sales_summary":
-        report_data = _report_sales_summary(
-            shop_db,
-            shop["_id"],
-            date_ctx,
-            include_customer_ids,
-            exclude_customer_ids,
-            customer_map,
-            chart_bucket=chart_bucket,
-        )
-    elif selected_tab == "payments_summary":
-        report_data = _report_payments_summary(
-            shop_db,
-            shop["_id"],
-            date_ctx,
-            include_customer_ids,
-            exclude_customer_ids,
-            customer_map,
-            chart_bucket=chart_bucket,
-        )
-    elif selected_tab == "customer_balances":
-        report_data = _report_customer_balances(
-            shop_db,
-            shop["_id"],
-            {},
-            include_customer_ids,
-            exclude_customer_ids,
-            customer_map,
-        )
-    elif selected_tab == "vendor_balances":
-        report_data = _report_vendor_balances(
-            shop_db,
-            shop["_id"],
-            {},
-        )
-    elif selected_tab == "parts_orders_summary":
-        report_data = _report_parts_orders_summary(
-            shop_db,
-            shop["_id"],
-            date_ctx,
-            include_vendor_ids,
-            vendor_map,
-            chart_bucket=chart_bucket,
+    if consolidated:
+        fanout = fan_out_shops(
+            shops,
+            lambda shop_db_, shop_: _run_report_for_shop(
+                selected_tab, shop_db_, shop_, date_ctx, include_customer_ids, exclude_customer_ids,
+                include_vendor_ids, chart_bucket,
+            ),
         )
-    elif selected_tab == "mechanic_hours":
-        report_data = _report_mechanic_hours(
-            shop_db,
-            shop["_id"],
-            date_ctx,
-            chart_bucket=chart_bucket,
+        report_data = merge_report(
+            selected_tab,
+            fanout.values,
+            fill_labels=lambda buckets: _fill_bucket_gaps(buckets, chart_bucket),
         )
+        consolidated_marker = fanout.marker()
     else:
-        report_data = _report_general_revenue(
-            shop_db,
-            shop["_id"],
-            date_ctx,
-            chart_bucket=chart_bucket,
+        report_data = _run_standard_report(
+            selected_tab, shop_db, shop["_id"], date_ctx, include_customer_ids, exclude_customer_ids,
+            customer_map, include_vendor_ids, vendor_map, chart_bucket,
         )
+        consolidated_marker = None
 
     return {
         "ok": True,
@@ -1315,12 +1348,15 @@ def _build_standard_reports_context(selected_tab: str, args, *, skip_report_data
         "customer_options": customer_options,
         "include_customer_ids": [str(x) for x in include_customer_ids],
         "exclude_customer_ids": [str(x) for x in exclude_customer_ids],
-        "show_customer_filters": selected_tab in CUSTOMER_FILTER_TABS,
-        "show_vendor_filters": selected_tab in VENDOR_FILTER_TABS,
+        "show_customer_filters": selected_tab in CUSTOMER_FILTER_TABS and not consolidated,
+        "show_vendor_filters": selected_tab in VENDOR_FILTER_TABS and not consolidated,
         "vendor_options": vendor_options,
         "include_vendor_ids": [str(x) for x in include_vendor_ids],
         "report_data": report_data,
-        "shop_name": str(shop.get("name") or "-"),
+        "shop_name": ALL_LOCATIONS_LABEL if consolidated else str(shop.get("name") or "-"),
+        "scope": "all" if consolidated else "shop",
+        "can_consolidate": can_consolidate,
+        "consolidated": consolidated_marker,
         "generated_at": _now_utc(),
     }
 
@@ -1379,6 +1415,8 @@ def standard_report_page(report_key: str):
         report_data=ctx["report_data"],
         generated_at=ctx["generated_at"],
         shop_name=ctx["shop_name"],
+        report_scope=ctx["scope"],
+        can_consolidate=ctx["can_consolidate"],
     )
 
 
@@ -1394,6 +1432,7 @@ def standard_report_api(report_key: str):
         ok=True,
         selected_tab=ctx["selected_tab"],
         shop_name=ctx["shop_name"],
+        consolidated=ctx["consolidated"],
         report_data={
             "title": rd.get("title") or "",
             "summary": rd.get("summary") or {},
@@ -1425,6 +1464,7 @@ def standard_report_pdf(report_key: str):
         report_data=ctx["report_data"],
         generated_at=ctx["generated_at"],
         shop_name=ctx["shop_name"],
+        consolidated=ctx["consolidated"],
         chart_image=render_chart_to_base64(ctx["report_data"].get("chart_data")),
     )
 
@@ -1446,18 +1486,24 @@ def activity_journal_page():
 
     tenant_id = str(session.get(SESSION_TENANT_ID) or "")
 
-    page_raw = (request.args.get("page") or "1").strip()
-    try:
-        page = int(page_raw)
-    except Exception:
-        page = 1
-    if page < 1:
-        page = 1
-
     per_page = 25
     method_filter = (request.args.get("method") or "").strip().upper()
     endpoint_filter = (request.args.get("endpoint") or "").strip()
 
+    # One monthly partition at a time; default = current month.
+    available_months = [
+        start.strftime("%Y-%m")
+        for start in (partition_month_start(name) for name in list_journal_partitions(master))
+        if start
+    ]
+    month_start = parse_journal_month(request.args.get("month")) or _now_utc().replace(
+        day=1, hour=0, minute=0, second=0, microsecond=0
+    )
+    month_filter = month_start.strftime("%Y-%m")
+    if month_filter not in available_months:
+        available_months.insert(0, month_filter)
+        available_months.sort(reverse=True)
+
     query = {}
     if tenant_id:
         query["tenant_id"] = tenant_id
@@ -1469,20 +1515,18 @@ def activity_journal_page():
     sort = get_sort_params(
         request.args,
         [("created_at", -1)],
-        ["created_at", "method", "endpoint", "path", "status_code"],
+        list(JOURNAL_SORT_FIELDS),
     )
     sort_by = sort[0][0] if sort else "created_at"
     sort_dir = "asc" if sort and sort[0][1] == 1 else "desc"
 
-    total = master.audit_journal.count_documents(query)
-    total_pages = (total + per_page - 1) // per_page if total > 0 else 1
-    if page > total_pages:
-        page = total_pages
-
-    skip = (page - 1) * per_page
-    cursor = master.audit_journal.find(
+    rows, prev_cursor, next_cursor = fetch_journal_page(
+        get_journal_partition(master, month_start, ensure_indexes=False),
         query,
-        {
+        sort_by,
+        1 if sort_dir == "asc" else -1,
+        per_page,
+        projection={
             "created_at": 1,
             "method": 1,
             "path": 1,
@@ -1493,10 +1537,12 @@ def activity_journal_page():
             "payload": 1,
             "error": 1,
         },
-    ).sort(sort).skip(skip).limit(per_page)
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+    )
 
     entries = []
-    for row in cursor:
+    for row in rows:
         payload = row.get("payload") if isinstance(row.get("payload"), dict) else {}
         entries.append(
             {
@@ -1517,10 +1563,11 @@ def activity_journal_page():
         layout_nav,
         "reports",
         activity_entries=entries,
-        activity_total=total,
-        activity_page=page,
         activity_per_page=per_page,
-        activity_total_pages=total_pages,
+        activity_prev_cursor=prev_cursor,
+        activity_next_cursor=next_cursor,
+        available_months=available_months,
+        month_filter=month_filter,
         method_filter=method_filter,
         endpoint_filter=endpoint_filter,
         sort_by=sort_by,
@@ -6,15 +6,21 @@ from datetime import datetime, timezone
 from zoneinfo import available_timezones
 
 from bson import ObjectId, Binary
-from flask import render_template, request, redirect, url_for, flash, session, jsonify, make_response
+from flask import current_app, render_template, request, redirect, url_for, flash, session, jsonify, make_response
 
 from app.blueprints.settings import settings_bp
 from app.extensions import get_master_db, get_mongo_client
 from app.utils.auth import login_required, SESSION_USER_ID, SESSION_TENANT_ID
 from app.utils.permissions import permission_required, filter_nav_items
 from app.blueprints.main.routes import NAV_ITEMS
-from app.utils.layout import build_app_layout_context
+from app.utils.layout import build_app_layout_context, invalidate_shop_switcher
 from app.utils.sales_tax import extract_us_zip, refresh_zip_tax_rate
+from app.blueprints.work_orders.settings_snapshot import invalidate_shop_settings_snapshot
+from app.utils.cache import invalidate_cache
+from app.utils.display_datetime import TIMEZONE_CACHE_NAMESPACE
+from app.utils.sales_tax import SALES_TAX_CACHE_NAMESPACE
+from app.utils.admin_stats import record_active_change, record_created
+from app.utils.billing_usage import record_shop_change
 
 
 COMMON_TIMEZONES = [
@@ -364,6 +370,21 @@ def init_shop_database(shop_db_name: str, tenant_doc: dict, shop_doc: dict, acto
         # without shop_id we cannot seed shop-scoped collections
         return
 
+    # -----------------------------
+    # apply versioned schema migrations (shop indexes) right away —
+    # app startup no longer walks every shop DB
+    # -----------------------------
+    try:
+        from app.migrations import migrate_shop
+        result = migrate_shop(client, get_master_db(), shop_db_name)
+        if result["skipped"]:
+            current_app.logger.warning(
+                "Shop DB %s not migrated (%s); run `python -m app.scripts.migrate --db %s`.",
+                shop_db_name, result["skipped"], shop_db_name,
+            )
+    except Exception:
+        current_app.logger.warning("Shop DB %s migration failed", shop_db_name, exc_info=True)
+
     # -----------------------------
     # seed default categories
     # -----------------------------
@@ -540,18 +561,9 @@ def locations_index():
                 flash("Invalid timezone selected.", "error")
                 return redirect(url_for("settings.locations_index"))
 
-            tenant_variants = [tenant_oid, str(tenant_oid)]
-            shop_variants = [shop_oid, str(shop_oid)]
-
             # Primary storage: master DB collection timezone_location
             master.timezone_location.update_one(
-                {
-                    "$or": [
-                        {"tenant_id": tv, "shop_id": sv}
-                        for tv in tenant_variants
-                        for sv in shop_variants
-                    ]
-                },
+                {"tenant_id": tenant_oid, "shop_id": shop_oid},
                 {
                     "$set": {
                         "shop_id": shop_oid,
@@ -575,9 +587,7 @@ def locations_index():
                     {
                         "$or": [
                             {"shop_id": shop_oid},
-                            {"shop_id": str(shop_oid)},
                             {"location_id": shop_oid},
-                            {"location_id": str(shop_oid)},
                         ]
                     },
                     {
@@ -597,6 +607,7 @@ def locations_index():
                     upsert=True,
                 )
 
+            invalidate_cache(TIMEZONE_CACHE_NAMESPACE, shop_oid)
             flash("Timezone updated for active shop.", "success")
 
         return redirect(url_for("settings.locations_index"))
@@ -645,20 +656,11 @@ def locations_index():
 
     if active_shop:
         active_shop_oid = active_shop.get("_id")
-        active_shop_id_str = str(active_shop_oid)
         tenant_oid = tenant["_id"]
 
         # Primary read path: master DB timezone_location
         tz_doc = master.timezone_location.find_one(
-            {
-                "is_active": {"$ne": False},
-                "$or": [
-                    {"tenant_id": tenant_oid, "shop_id": active_shop_oid},
-                    {"tenant_id": tenant_oid, "shop_id": active_shop_id_str},
-                    {"tenant_id": str(tenant_oid), "shop_id": active_shop_oid},
-                    {"tenant_id": str(tenant_oid), "shop_id": active_shop_id_str},
-                ],
-            },
+            {"is_active": {"$ne": False}, "tenant_id": tenant_oid, "shop_id": active_shop_oid},
             {"timezone": 1, "updated_at": 1, "created_at": 1},
             sort=[("updated_at", -1), ("created_at", -1)],
         )
@@ -682,10 +684,8 @@ def locations_index():
                 {
                     "is_active": {"$ne": False},
                     "$or": [
-                        {"shop_id": active_shop.get("_id")},
-                        {"shop_id": active_shop_id_str},
-                        {"location_id": active_shop.get("_id")},
-                        {"location_id": active_shop_id_str},
+                        {"shop_id": active_shop_oid},
+                        {"location_id": active_shop_oid},
                     ],
                 },
                 {"timezone": 1, "updated_at": 1, "created_at": 1},
@@ -853,12 +853,15 @@ def api_locations_create():
     try:
         res = master.shops.insert_one(shop_doc)
         new_shop_id = res.inserted_id
+        record_created(master, "shops", active=shop_doc.get("is_active") is True)
+        record_shop_change(master, tenant["_id"], False, shop_doc.get("is_active") is True)
 
         # ✅ IMPORTANT: нужен _id для seed parts_categories / labor_rates
         shop_doc["_id"] = new_shop_id
 
         # ✅ доступ выдаём только owners
         _grant_shop_to_owners(master, tenant["_id"], new_shop_id)
+        invalidate_shop_switcher(tenant["_id"])
 
         # Also grant access to the current user immediately.
         # This prevents requiring re-login to see/select the new shop.
@@ -965,6 +968,8 @@ def api_locations_update(shop_id: str):
             },
         },
     )
+    if name != (shop.get("name") or ""):
+        invalidate_shop_switcher(tenant["_id"])
 
     # If the address changed, refresh the sales-tax cache for the new ZIP
     # so subsequent work-orders use the up-to-date rate.
@@ -973,6 +978,9 @@ def api_locations_update(shop_id: str):
             refresh_zip_tax_rate(master, extracted_zip)
         except Exception:
             pass
+    if address_changed:
+        invalidate_shop_settings_snapshot(shop_oid)
+        invalidate_cache(SALES_TAX_CACHE_NAMESPACE, shop_oid)
 
     return jsonify({"ok": True})
 
@@ -1007,6 +1015,9 @@ def api_locations_inactive(shop_id: str):
             }
         },
     )
+    record_active_change(master, "shops", shop.get("is_active") is True, False)
+    record_shop_change(master, tenant["_id"], shop.get("is_active") is True, False)
+    invalidate_shop_switcher(tenant["_id"])
 
     return jsonify({"ok": True})
 
@@ -26,7 +26,15 @@ from app.utils.permissions import permission_required, filter_nav_items
 from app.blueprints.main.routes import NAV_ITEMS
 from app.utils.layout import build_app_layout_context
 from app.utils.pagination import get_pagination_params, get_sort_params, paginate_find
-from app.utils.sales_tax import get_zip_sales_tax_rate, get_custom_shop_sales_tax_settings, get_shop_zip_code
+from app.utils.sales_tax import (
+    SALES_TAX_CACHE_NAMESPACE,
+    get_zip_sales_tax_rate,
+    get_custom_shop_sales_tax_settings,
+    get_shop_zip_code,
+)
+from app.utils.cache import invalidate_cache
+from app.blueprints.work_orders.settings_snapshot import invalidate_shop_settings_snapshot
+from app.blueprints.work_orders.preset_resolution import invalidate_presets
 
 
 # -----------------------------
@@ -356,6 +364,8 @@ def parts_settings_save_tax():
         except ValueError:
             flash("Invalid tax rate format. Please enter a decimal number.", "error")
 
+    invalidate_shop_settings_snapshot(shop_oid)
+    invalidate_cache(SALES_TAX_CACHE_NAMESPACE, shop_oid)
     return redirect(url_for("settings.parts_settings_index"))
 
 
@@ -663,6 +673,8 @@ def parts_pricing_rules_save():
         },
     )
 
+    invalidate_shop_settings_snapshot(shop_oid)
+    invalidate_presets(sdb, shop_oid)
     return jsonify({"ok": True})
 
 
@@ -705,6 +717,8 @@ def parts_pricing_rules_create():
         "updated_at": now,
     })
 
+    invalidate_shop_settings_snapshot(shop_oid)
+    invalidate_presets(sdb, shop_oid)
     return jsonify({"ok": True, "id": str(res.inserted_id)})
 
 
@@ -732,6 +746,8 @@ def parts_pricing_rules_delete(scale_id):
         return jsonify({"ok": False, "error": "Cannot delete the last remaining scale."}), 400
 
     sdb.parts_pricing_rules.delete_one({"_id": sid, "shop_id": shop_oid})
+    invalidate_shop_settings_snapshot(shop_oid)
+    invalidate_presets(sdb, shop_oid)
     return jsonify({"ok": True})
 
 
@@ -760,4 +776,6 @@ def parts_pricing_rules_set_default(scale_id):
         {"_id": sid, "shop_id": shop_oid},
         {"$set": {"is_default": True, "is_active": True, "updated_at": now}},
     )
+    invalidate_shop_settings_snapshot(shop_oid)
+    invalidate_presets(sdb, shop_oid)
     return jsonify({"ok": True})
@@ -19,6 +19,9 @@ from app.blueprints.main.routes import NAV_ITEMS
 from app.utils.layout import build_app_layout_context
 from app.utils.pagination import get_pagination_params, get_sort_params, paginate_find
 from app.utils.mongo_search import build_regex_search_filter
+from app.blueprints.work_orders.settings_snapshot import invalidate_tenant_settings_snapshots
+from app.utils.admin_stats import record_active_change, record_created
+from app.utils.billing_usage import record_user_change
 
 
 # -----------------------------
@@ -38,35 +41,6 @@ def _maybe_object_id(value):
         return None
 
 
-def _id_variants(value):
-    """
-    Варианты для надёжного поиска tenant_id:
-    - как есть
-    - ObjectId(.) если возможно
-    - str(.)
-    """
-    if value is None:
-        return []
-
-    variants = [value]
-
-    oid = _maybe_object_id(value)
-    if oid is not None:
-        variants.append(oid)
-
-    variants.append(str(value))
-
-    out = []
-    seen = set()
-    for v in variants:
-        key = str(v)
-        if key in seen:
-            continue
-        seen.add(key)
-        out.append(v)
-    return out
-
-
 def _get_tenant_db():
     db_name = session.get(SESSION_TENANT_DB)
     if not db_name:
@@ -164,12 +138,10 @@ def users_index():
     if request.method == "POST":
         return _handle_create_user(master, current_user, tenant_oid, tenant_id_raw)
 
-    tenant_values = _id_variants(tenant_from_user)
-
     q = (request.args.get("q") or "").strip()
 
     page, per_page = get_pagination_params(request.args, default_per_page=20, max_per_page=100)
-    query_filter = {"tenant_id": {"$in": tenant_values}}
+    query_filter = {"tenant_id": tenant_oid}
     search_filter = build_regex_search_filter(
         q,
         text_fields=["name", "first_name", "last_name", "email", "phone", "role"],
@@ -229,8 +201,8 @@ def users_edit(user_id):
         flash("Invalid user id.", "error")
         return _redirect_users_index()
 
-    tenant_values = _id_variants(current_user.get("tenant_id") or tenant_id_raw)
-    target = master.users.find_one({"_id": target_id, "tenant_id": {"$in": tenant_values}})
+    tenant_oid = _maybe_object_id(current_user.get("tenant_id") or tenant_id_raw)
+    target = master.users.find_one({"_id": target_id, "tenant_id": tenant_oid})
     if not target:
         flash("User not found.", "error")
         return _redirect_users_index()
@@ -304,6 +276,10 @@ def users_edit(user_id):
         return _redirect_users_index()
 
     master.users.update_one({"_id": target_id}, {"$set": update_doc})
+    record_active_change(master, "users", target.get("is_active") is True, is_active is True)
+    record_user_change(master, target.get("tenant_id"), target, update_doc)
+    # Mechanic lists in the work-order editor are part of the shop snapshot.
+    invalidate_tenant_settings_snapshots(target.get("tenant_id"))
     flash("User updated successfully.", "success")
     return _redirect_users_index()
 
@@ -329,16 +305,20 @@ def users_deactivate(user_id):
         flash("You cannot deactivate your own account.", "error")
         return _redirect_users_index()
 
-    tenant_values = _id_variants(tenant_id_raw)
-    res = master.users.update_one(
-        {"_id": target_id, "tenant_id": {"$in": tenant_values}},
+    before = master.users.find_one_and_update(
+        {"_id": target_id, "tenant_id": _maybe_object_id(tenant_id_raw)},
         {"$set": {"is_active": False, "updated_at": utcnow()}},
+        projection={"is_active": 1, "role": 1, "tenant_id": 1},
     )
 
-    if res.matched_count == 0:
+    if before is None:
         flash("User not found.", "error")
         return _redirect_users_index()
 
+    record_active_change(master, "users", before.get("is_active") is True, False)
+    record_user_change(master, before.get("tenant_id"), before, {**before, "is_active": False})
+
+    invalidate_tenant_settings_snapshots(tenant_id_raw)
     flash("User deactivated.", "success")
     return _redirect_users_index()
 
@@ -434,6 +414,9 @@ def _handle_create_user(master, current_user, tenant_oid, tenant_id_raw):
     }
 
     master.users.insert_one(user_doc)
+    record_created(master, "users", active=user_doc["is_active"] is True)
+    record_user_change(master, tenant_id, None, user_doc)
+    invalidate_tenant_settings_snapshots(tenant_id)
 
     flash("User created successfully.", "success")
     return redirect(url_for("settings.users_index"))
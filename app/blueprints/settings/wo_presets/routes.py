@@ -12,6 +12,8 @@ from app.utils.auth import login_required, SESSION_USER_ID, SESSION_TENANT_ID, S
 from app.utils.permissions import permission_required, filter_nav_items
 from app.blueprints.main.routes import NAV_ITEMS
 from app.utils.layout import build_app_layout_context
+from app.blueprints.work_orders.settings_snapshot import invalidate_shop_settings_snapshot
+from app.blueprints.work_orders.preset_resolution import get_resolved_preset, preset_payload, refresh_presets
 
 
 # ───────────────────────── helpers ──────────────────────────
@@ -299,8 +301,11 @@ def wo_presets_create():
         "created_by": user["_id"],
         "updated_at": now,
         "updated_by": user["_id"],
+        "resolve_gen": 1,
     }
-    sdb.wo_presets.insert_one(doc)
+    res = sdb.wo_presets.insert_one(doc)
+    refresh_presets(sdb, shop_oid, [res.inserted_id])
+    invalidate_shop_settings_snapshot(shop_oid)
 
     flash(f"Preset \"{data['name']}\" created.", "success")
     return redirect(url_for("settings.wo_presets_index"))
@@ -324,106 +329,11 @@ def wo_presets_detail(preset_id: str):
     if not oid:
         return jsonify({"error": "bad_id"}), 400
 
-    doc = sdb.wo_presets.find_one({"_id": oid, "shop_id": shop_oid, "is_active": True})
+    doc, resolved = get_resolved_preset(sdb, shop_oid, oid)
     if not doc:
         return jsonify({"error": "not_found"}), 404
 
-    # Enrich parts with live core/misc data from parts collection.
-    # If a row's stored part_id is stale (part deleted/recreated), fall back to
-    # part_number lookup so the WO still gets up-to-date cost/core/misc data.
-    raw_parts = doc.get("parts") or []
-    part_ids = []
-    fallback_part_numbers = []
-    for p in raw_parts:
-        pid_str = p.get("part_id")
-        if pid_str:
-            o = _maybe_oid(pid_str)
-            if o:
-                part_ids.append(o)
-        pn = str(p.get("part_number") or "").strip()
-        if pn:
-            fallback_part_numbers.append(pn)
-
-    proj = {
-        "_id": 1,
-        "part_number": 1,
-        "average_cost": 1,
-        "core_has_charge": 1,
-        "core_cost": 1,
-        "misc_has_charge": 1,
-        "misc_charges": 1,
-    }
-
-    parts_lookup = {}
-    if part_ids:
-        for pdoc in sdb.parts.find(
-            {"_id": {"$in": part_ids}, "is_active": True},
-            proj,
-        ):
-            parts_lookup[str(pdoc["_id"])] = pdoc
-
-    parts_by_number = {}
-    if fallback_part_numbers:
-        for pdoc in sdb.parts.find(
-            {"part_number": {"$in": fallback_part_numbers}, "is_active": True},
-            proj,
-        ):
-            pn_key = str(pdoc.get("part_number") or "").strip()
-            if pn_key and pn_key not in parts_by_number:
-                parts_by_number[pn_key] = pdoc
-
-    # Cache pending preset patches (stale part_id -> fresh _id) to apply once.
-    preset_patches = []  # list of (row_index, fresh_id_str)
-
-    enriched_parts = []
-    for idx, p in enumerate(raw_parts):
-        ep = dict(p)
-        pid_str = p.get("part_id")
-        live = parts_lookup.get(pid_str) if pid_str else None
-        # Fallback: stale or missing part_id, but we have a matching part_number.
-        if live is None:
-            pn_key = str(p.get("part_number") or "").strip()
-            if pn_key and pn_key in parts_by_number:
-                live = parts_by_number[pn_key]
-                fresh_id = str(live.get("_id"))
-                ep["part_id"] = fresh_id
-                if pid_str != fresh_id:
-                    preset_patches.append((idx, fresh_id))
-
-        if live is not None:
-            ep["core_has_charge"] = bool(live.get("core_has_charge"))
-            ep["core_cost"] = float(live.get("core_cost") or 0)
-            misc_items = []
-            for m in (live.get("misc_charges") or []):
-                if isinstance(m, dict):
-                    misc_items.append({
-                        "description": str(m.get("description") or "").strip(),
-                        "price": float(m.get("price") or 0),
-                    })
-            ep["misc_has_charge"] = bool(live.get("misc_has_charge"))
-            ep["misc_charges"] = misc_items
-            if live.get("average_cost") is not None:
-                ep["cost"] = float(live["average_cost"])
-        enriched_parts.append(ep)
-
-    # Persist any healed part_id references back into the preset doc so the
-    # next load is fast and consistent.
-    if preset_patches:
-        update_set = {f"parts.{i}.part_id": pid for i, pid in preset_patches}
-        try:
-            sdb.wo_presets.update_one({"_id": doc["_id"]}, {"$set": update_set})
-        except Exception:
-            pass
-
-    return jsonify({
-        "id": str(doc["_id"]),
-        "name": doc.get("name") or "",
-        "description": doc.get("description") or "",
-        "labor_hours": doc.get("labor_hours"),
-        "labor_rate_code": doc.get("labor_rate_code"),
-        "allow_discount": bool(doc.get("allow_discount")),
-        "parts": enriched_parts,
-    })
+    return jsonify(preset_payload(doc, resolved))
 
 
 @settings_bp.route("/wo_presets/<preset_id>/update", methods=["POST"])
@@ -461,14 +371,22 @@ def wo_presets_update(preset_id: str):
         return redirect(url_for("settings.wo_presets_index"))
 
     now = _utcnow()
+    # Bump resolve_gen in the same write as the parts so a resolve that read
+    # the old parts can't store its result (preset_resolution._store).
     sdb.wo_presets.update_one(
         {"_id": oid},
-        {"$set": {
-            **data,
-            "updated_at": now,
-            "updated_by": user["_id"],
-        }},
+        {
+            "$set": {
+                **data,
+                "updated_at": now,
+                "updated_by": user["_id"],
+            },
+            "$inc": {"resolve_gen": 1},
+            "$unset": {"resolved": ""},
+        },
     )
+    refresh_presets(sdb, shop_oid, [oid])
+    invalidate_shop_settings_snapshot(shop_oid)
 
     flash(f"Preset \"{data['name']}\" updated.", "success")
     return redirect(url_for("settings.wo_presets_index"))
@@ -501,6 +419,7 @@ def wo_presets_delete(preset_id: str):
         {"_id": oid, "shop_id": shop_oid, "is_active": True},
         {"$set": {"is_active": False, "updated_at": now, "updated_by": user["_id"]}},
     )
+    invalidate_shop_settings_snapshot(shop_oid)
 
     flash("Preset deleted.", "success")
     return redirect(url_for("settings.wo_presets_index"))
@@ -11,6 +11,8 @@ from app.utils.auth import login_required, SESSION_USER_ID, SESSION_TENANT_ID, S
 from app.utils.permissions import permission_required, filter_nav_items
 from app.blueprints.main.routes import NAV_ITEMS
 from app.utils.layout import build_app_layout_context
+from app.blueprints.work_orders.settings_snapshot import invalidate_shop_settings_snapshot
+from app.blueprints.work_orders.preset_resolution import invalidate_presets
 from bson import ObjectId
 
 
@@ -224,6 +226,7 @@ def work_orders_index():
             upsert=True,
         )
 
+        invalidate_shop_settings_snapshot(shop_oid)
         flash("Work order settings updated.", "success")
         return redirect(url_for("settings.work_orders_index"))
 
@@ -261,6 +264,7 @@ def work_orders_index():
             upsert=True,
         )
         core_existing = core_rules_col.find_one({"shop_id": shop_oid})
+        invalidate_shop_settings_snapshot(shop_oid)
 
     supply_value = existing.get("shop_supply_procentage") if isinstance(existing, dict) else 5
     core_charge_default = bool(core_existing.get("charge_for_cores_default")) if isinstance(core_existing, dict) else False
@@ -316,6 +320,8 @@ def work_orders_labor_rates_create():
         }
     )
 
+    invalidate_shop_settings_snapshot(shop_oid)
+    invalidate_presets(sdb, shop_oid)
     flash("Labor rate created.", "success")
     return redirect(url_for("settings.work_orders_index"))
 
@@ -372,6 +378,8 @@ def work_orders_labor_rates_update(rate_id: str):
         },
     )
 
+    invalidate_shop_settings_snapshot(shop_oid)
+    invalidate_presets(sdb, shop_oid)
     flash("Labor rate updated.", "success")
     return redirect(url_for("settings.work_orders_index"))
 
@@ -413,6 +421,8 @@ def work_orders_labor_rates_delete(rate_id: str):
         flash("Labor rate not found.", "error")
         return redirect(url_for("settings.work_orders_index"))
 
+    invalidate_shop_settings_snapshot(shop_oid)
+    invalidate_presets(sdb, shop_oid)
     flash("Labor rate deleted.", "success")
     return redirect(url_for("settings.work_orders_index"))
 
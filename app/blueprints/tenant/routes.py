@@ -5,11 +5,13 @@ import hashlib
 from datetime import datetime, timezone, timedelta
 
 from bson import ObjectId
-from flask import request, jsonify
+from flask import current_app, request, jsonify
 from werkzeug.security import generate_password_hash
 from pymongo.errors import DuplicateKeyError
 
 from app.extensions import get_master_db, get_mongo_client
+from app.utils.admin_stats import bump_admin_stats
+from app.utils.billing_usage import bump_billing_usage
 from app.utils.sales_tax import extract_us_zip, refresh_zip_tax_rate
 from . import tenant_bp
 
@@ -408,6 +410,21 @@ def init_shop_database(shop_db_name: str, tenant_doc: dict, shop_doc: dict, acto
     except Exception:
         pass
 
+    # -----------------------------
+    # apply versioned schema migrations (shop indexes) right away —
+    # app startup no longer walks every shop DB
+    # -----------------------------
+    try:
+        from app.migrations import migrate_shop
+        result = migrate_shop(client, get_master_db(), shop_db_name)
+        if result["skipped"]:
+            current_app.logger.warning(
+                "Shop DB %s not migrated (%s); run `python -m app.scripts.migrate --db %s`.",
+                shop_db_name, result["skipped"], shop_db_name,
+            )
+    except Exception:
+        current_app.logger.warning("Shop DB %s migration failed", shop_db_name, exc_info=True)
+
     # -----------------------------
     # seed default categories
     # -----------------------------
@@ -614,6 +631,15 @@ def register_tenant():
         init_shop_database(shop_db_name, tenant_doc, shop_doc, actor_user_id=owner_user_id)
         created_shop_db = True
 
+        # Only now: the except branches below roll all three documents back.
+        bump_admin_stats(
+            master,
+            tenants_total=1, tenants_active=1,
+            shops_total=1, shops_active=1,
+            users_total=1, users_active=1,
+        )
+        bump_billing_usage(master, tenant_id, locations_active=1, full_active=1)  # the owner
+
         return jsonify({
             "ok": True,
             "tenant": {
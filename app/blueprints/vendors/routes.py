@@ -7,7 +7,7 @@ from flask import request, redirect, url_for, flash, session, jsonify
 
 from app.blueprints.vendors import vendors_bp
 from app.blueprints.main.routes import _render_app_page
-from app.extensions import get_master_db, get_mongo_client
+from app.extensions import get_master_db
 from app.utils.auth import (
     login_required,
     SESSION_TENANT_ID,
@@ -28,6 +28,8 @@ from app.utils.contacts import (
     get_main_contact_email,
     get_main_contact_phone,
 )
+from app.utils.tenant_context import get_active_shop_db
+from app.utils.parts_ledger import get_vendor_balances
 
 
 def utcnow():
@@ -54,54 +56,9 @@ def _to_float(value, default: float = 0.0) -> float:
         return default
 
 
-def _tenant_id_variants():
-    raw = session.get(SESSION_TENANT_ID)
-    out = set()
-    if raw is None:
-        return []
-    out.add(raw)
-    out.add(str(raw))
-    oid = _oid(raw)
-    if oid:
-        out.add(oid)
-    return list(out)
-
-
-def _get_active_shop(master):
-    shop_id_raw = session.get("shop_id")
-    shop_oid = _oid(shop_id_raw)
-    if not shop_oid:
-        return None
-
-    tenant_variants = _tenant_id_variants()
-    if not tenant_variants:
-        return None
-
-    return master.shops.find_one({"_id": shop_oid, "tenant_id": {"$in": tenant_variants}})
-
-
-def _get_shop_db(master):
-    shop = _get_active_shop(master)
-    if not shop:
-        return None, None
-
-    db_name = (
-        shop.get("db_name")
-        or shop.get("database")
-        or shop.get("db")
-        or shop.get("mongo_db")
-        or shop.get("shop_db")
-    )
-    if not db_name:
-        return None, shop
-
-    client = get_mongo_client()
-    return client[str(db_name)], shop
-
-
 def _vendors_collection():
     master = get_master_db()
-    db, shop = _get_shop_db(master)
+    db, shop = get_active_shop_db(master)
     if db is None:
         return None, None, None
     return db.vendors, shop, master
@@ -186,30 +143,10 @@ def vendors_api_balances():
     if not oids:
         return jsonify(ok=True, balances={})
 
-    orders_coll = coll.database.parts_orders
-    pipeline = [
-        {
-            "$match": {
-                "shop_id": shop["_id"],
-                "vendor_id": {"$in": oids},
-                "is_active": {"$ne": False},
-            }
-        },
-        {
-            "$group": {
-                "_id": "$vendor_id",
-                "balance_total": {"$sum": {"$ifNull": ["$remaining_balance", 0]}},
-            }
-        },
-    ]
-    balance_map = {}
-    for row in orders_coll.aggregate(pipeline):
-        if not isinstance(row, dict):
-            continue
-        vid = row.get("_id")
-        if not vid:
-            continue
-        balance_map[str(vid)] = round(_to_float(row.get("balance_total"), 0.0), 2)
+    balance_map = {
+        str(vid): round(_to_float(doc.get("remaining_balance"), 0.0), 2)
+        for vid, doc in get_vendor_balances(coll.database, shop["_id"], oids).items()
+    }
 
     return jsonify(ok=True, balances=balance_map)
 
@@ -447,67 +384,43 @@ def vendors_api_get(vendor_id):
     })
 
 
-def _calc_order_total(order_doc: dict) -> float:
-    total = 0.0
-    for item in (order_doc.get("items") or []):
-        if not isinstance(item, dict):
-            continue
-        qty = max(0, int(_to_float(item.get("quantity"), 0)))
-        price = max(0.0, _to_float(item.get("price"), 0.0))
-        total += qty * price
-        # Add core charge per unit if applicable
-        if item.get("core_has_charge") and _to_float(item.get("core_cost"), 0.0) > 0:
-            total += qty * _to_float(item.get("core_cost"), 0.0)
-    for line in (order_doc.get("non_inventory_amounts") or []):
-        if not isinstance(line, dict):
-            continue
-        total += max(0.0, _to_float(line.get("amount"), 0.0))
-    return round(total, 2)
-
-
-def _build_vendor_orders_summary(orders_coll, payments_coll, query: dict) -> dict:
-    all_orders = list(orders_coll.find(query, {
-        "_id": 1, "status": 1, "items": 1, "non_inventory_amounts": 1,
-    }))
-
-    total_orders = len(all_orders)
-    total_amount = 0.0
-    received_count = 0
-    not_received_count = 0
-    order_ids = []
-
-    for order in all_orders:
-        total_amount += _calc_order_total(order)
-        status = (order.get("status") or "ordered").strip().lower()
-        if status == "received":
-            received_count += 1
-        else:
-            not_received_count += 1
-        order_ids.append(order["_id"])
-
-    # Calculate paid amounts
-    total_paid = 0.0
-    if order_ids and payments_coll is not None:
-        pipeline = [
-            {"$match": {"parts_order_id": {"$in": order_ids}, "is_active": True}},
-            {"$group": {"_id": None, "total": {"$sum": {"$ifNull": ["$amount", 0]}}}},
-        ]
-        rows = list(payments_coll.aggregate(pipeline))
-        if rows:
-            total_paid = float(rows[0].get("total", 0))
-
-    unpaid = max(0.0, total_amount - total_paid)
-
+def _summary_from_counters(row: dict | None) -> dict:
+    row = row or {}
+    total_amount = _to_float(row.get("order_total"), 0.0)
+    total_paid = _to_float(row.get("paid_total"), 0.0)
     return {
-        "total_orders": total_orders,
+        "total_orders": int(row.get("orders") or 0),
         "total_amount": round(total_amount, 2),
         "total_paid": round(total_paid, 2),
-        "unpaid": round(unpaid, 2),
-        "received": received_count,
-        "not_received": not_received_count,
+        "unpaid": round(max(0.0, _to_float(row.get("remaining_balance"), 0.0)), 2),
+        "received": int(row.get("received") or 0),
+        "not_received": int(row.get("not_received") or 0),
     }
 
 
+def _build_vendor_orders_summary(orders_coll, query: dict, *, all_time: bool) -> dict:
+    """Totals from the materialized order fields (see app.utils.parts_ledger)."""
+    if all_time:
+        balances = get_vendor_balances(orders_coll.database, query["shop_id"], [query["vendor_id"]])
+        return _summary_from_counters(balances.get(query["vendor_id"]))
+
+    rows = list(orders_coll.aggregate([
+        {"$match": query},
+        {"$group": {
+            "_id": None,
+            "orders": {"$sum": 1},
+            "received": {"$sum": {"$cond": [{"$eq": ["$status", "received"]}, 1, 0]}},
+            "order_total": {"$sum": {"$ifNull": ["$order_total", 0]}},
+            "paid_total": {"$sum": {"$ifNull": ["$paid_total", 0]}},
+            "remaining_balance": {"$sum": {"$ifNull": ["$remaining_balance", 0]}},
+        }},
+    ]))
+    row = rows[0] if rows else {}
+    if row:
+        row["not_received"] = row["orders"] - row["received"]
+    return _summary_from_counters(row)
+
+
 @vendors_bp.get("/api/<vendor_id>/part-orders")
 @login_required
 @permission_required("vendors.view")
@@ -528,7 +441,6 @@ def vendors_api_part_orders(vendor_id):
 
     page, per_page = get_pagination_params(request.args, default_per_page=10, max_per_page=100)
     orders_coll = coll.database.parts_orders
-    payments_coll = coll.database.parts_order_payments
 
     query = {
         "shop_id": shop["_id"],
@@ -553,29 +465,27 @@ def vendors_api_part_orders(vendor_id):
         projection={
             "order_number": 1,
             "status": 1,
-            "items": 1,
-            "non_inventory_amounts": 1,
+            "items_count": 1,
+            "order_total": 1,
             "created_at": 1,
         },
     )
 
     items = []
     for order in orders:
-        raw_items = order.get("items") if isinstance(order.get("items"), list) else []
-        order_total = _calc_order_total(order)
         items.append(
             {
                 "id": str(order.get("_id")),
                 "order_number": order.get("order_number") or "-",
                 "status": (order.get("status") or "ordered").strip().lower(),
-                "items_count": len(raw_items),
-                "total_amount": order_total,
+                "items_count": int(order.get("items_count") or 0),
+                "total_amount": round(_to_float(order.get("order_total"), 0.0), 2),
                 "created_at": _fmt_dt_label(order.get("created_at")),
             }
         )
 
     # Build summary across ALL matching orders (not just current page)
-    summary = _build_vendor_orders_summary(orders_coll, payments_coll, query)
+    summary = _build_vendor_orders_summary(orders_coll, query, all_time="created_at" not in query)
 
     return jsonify(
         {
@@ -0,0 +1,234 @@
+"""Per-unit maintenance history derived from work orders.
+
+The shop DB's `unit_maintenance_history` holds one row per labor / service
+line of every active work order that has a unit:
+
+    {"_id": "<wo_id>:<line_index>", "shop_id", "customer_id", "unit_id",
+     "work_order_id", "wo_number", "line_index", "date", "mileage",
+     "description", "hours", "line_total", "wo_total",
+     "parts": [{"part_number", "description", "qty", "price"}],
+     "parts_summary", "synced_at"}
+
+A work order without lines still gets one `placeholder` row so it shows up
+in the history. Work-order create / update / delete call
+`sync_work_order_history`; unit pages, the portal maintenance tab / PDF and
+the labor expand-in-place API read rows instead of walking `labors`.
+
+`mileage` is the work order's own `mileage` (the unit reading entered when
+it was created / last saved with one), so rows can always be rebuilt from
+`work_orders` alone. `rebuild_maintenance_history` (shop migration 9,
+`python -m app.scripts.build_maintenance_history`) builds rows for existing
+work orders.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from flask import current_app
+from pymongo import DeleteMany, ReplaceOne
+
+from app.blueprints.work_orders.totals import _work_order_grand_total
+
+
+HISTORY_COLLECTION = "unit_maintenance_history"
+REBUILD_BATCH_SIZE = 500
+
+_WO_PROJECTION = {
+    "shop_id": 1,
+    "customer_id": 1,
+    "unit_id": 1,
+    "wo_number": 1,
+    "work_order_date": 1,
+    "created_at": 1,
+    "mileage": 1,
+    "labors": 1,
+    "totals": 1,
+    "grand_total": 1,
+    "is_active": 1,
+}
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _num(value) -> float:
+    try:
+        return float(value or 0)
+    except Exception:
+        return 0.0
+
+
+def normalize_mileage(value) -> int | None:
+    if value is None:
+        return None
+    try:
+        return int(float(str(value).replace(",", "").strip()))
+    except Exception:
+        return None
+
+
+def _line_description(block: dict) -> str:
+    labor = block.get("labor") if isinstance(block.get("labor"), dict) else {}
+    return str(
+        labor.get("description")
+        or block.get("labor_description")
+        or block.get("description")
+        or block.get("labor_desc")
+        or block.get("name")
+        or ""
+    ).strip()
+
+
+def _line_parts(block: dict) -> list[dict]:
+    return [
+        {
+            "part_number": str(p.get("part_number") or ""),
+            "description": str(p.get("description") or ""),
+            "qty": p.get("qty") or 0,
+            "price": _num(p.get("price")),
+        }
+        for p in block.get("parts") or []
+        if isinstance(p, dict)
+    ]
+
+
+def _parts_summary(parts: list[dict]) -> str:
+    labels = (f"{p['qty']} × {p['part_number'] or p['description']}" for p in parts if p["part_number"] or p["description"])
+    return ", ".join(labels)
+
+
+def history_lines(wo: dict) -> list[dict]:
+    """Per-line fields of a work order's labor blocks, shared by the history rows and the labors API."""
+    totals = wo.get("totals") if isinstance(wo.get("totals"), dict) else {}
+    block_totals = totals.get("labors") if isinstance(totals.get("labors"), list) else []
+    lines = []
+    for idx, block in enumerate(b for b in (wo.get("labors") or []) if isinstance(b, dict)):
+        labor = block.get("labor") if isinstance(block.get("labor"), dict) else {}
+        block_total = block_totals[idx] if idx < len(block_totals) and isinstance(block_totals[idx], dict) else {}
+        line_total = block_total.get("labor_full_total")
+        if line_total is None:
+            line_total = labor.get("labor_full_total")
+        parts = _line_parts(block)
+        lines.append({
+            "line_index": idx,
+            "description": _line_description(block),
+            "hours": str(labor.get("hours") or "").strip(),
+            "line_total": round(_num(line_total), 2),
+            "parts": parts,
+            "parts_summary": _parts_summary(parts),
+        })
+    return lines
+
+
+def build_history_rows(wo: dict) -> list[dict]:
+    """History rows for one work order (pure; [] if it has no unit or is inactive)."""
+    if wo.get("is_active") is False or not wo.get("unit_id"):
+        return []
+    base = {
+        "shop_id": wo.get("shop_id"),
+        "customer_id": wo.get("customer_id"),
+        "unit_id": wo.get("unit_id"),
+        "work_order_id": wo["_id"],
+        "wo_number": str(wo.get("wo_number") or "").strip(),
+        "date": wo.get("work_order_date") or wo.get("created_at"),
+        "mileage": normalize_mileage(wo.get("mileage")),
+        "wo_total": round(float(_work_order_grand_total(wo) or 0), 2),
+    }
+    lines = history_lines(wo) or [{
+        "line_index": 0, "description": "", "hours": "", "line_total": 0.0,
+        "parts": [], "parts_summary": "", "placeholder": True,
+    }]
+    return [{**base, **line, "_id": f"{wo['_id']}:{line['line_index']}"} for line in lines]
+
+
+def labors_payload(lines: list[dict]) -> list[dict]:
+    """`labors` of the expand-in-place API from history rows / `history_lines`."""
+    return [
+        {
+            "description": line["description"],
+            "hours": line["hours"],
+            "labor_total": line["line_total"],
+            "parts": line["parts"],
+        }
+        for line in lines
+        if not line.get("placeholder")
+    ]
+
+
+def _write_ops(wo_id, rows: list[dict], now: datetime) -> list:
+    ops = [ReplaceOne({"_id": row["_id"]}, {**row, "synced_at": now}, upsert=True) for row in rows]
+    ops.append(DeleteMany({"work_order_id": wo_id, "line_index": {"$gte": len(rows)}}))
+    return ops
+
+
+def sync_work_order_history(shop_db, wo_id) -> None:
+    """Rebuild the rows of one work order after a write. Never raises."""
+    if shop_db is None or not wo_id:
+        return
+    try:
+        coll = shop_db[HISTORY_COLLECTION]
+        wo = shop_db.work_orders.find_one({"_id": wo_id}, _WO_PROJECTION)
+        if wo is None:
+            coll.delete_many({"work_order_id": wo_id})
+            return
+        coll.bulk_write(_write_ops(wo_id, build_history_rows(wo), _utcnow()), ordered=True)
+    except Exception:
+        current_app.logger.warning("Maintenance history sync failed for work order %s", wo_id, exc_info=True)
+
+
+def rebuild_maintenance_history(shop_db, *, batch_size: int = REBUILD_BATCH_SIZE) -> int:
+    """Build rows for every work order of a shop DB and drop rows nobody produced. Returns rows written."""
+    coll = shop_db[HISTORY_COLLECTION]
+    started = _utcnow()
+    written = 0
+
+    def flush(batch: list[dict]) -> int:
+        ops, count = [], 0
+        now = _utcnow()
+        for wo in batch:
+            rows = build_history_rows(wo)
+            ops.extend(_write_ops(wo["_id"], rows, now))
+            count += len(rows)
+        if ops:
+            coll.bulk_write(ops, ordered=True)
+        return count
+
+    batch: list[dict] = []
+    for wo in shop_db.work_orders.find({}, _WO_PROJECTION, batch_size=batch_size):
+        batch.append(wo)
+        if len(batch) >= batch_size:
+            written += flush(batch)
+            batch = []
+    written += flush(batch)
+
+    # Rows of work orders that no longer exist (a save during the rebuild stamps a later synced_at).
+    coll.delete_many({"synced_at": {"$lt": started}})
+    return written
+
+
+# ── read ─────────────────────────────────────────────────────
+
+
+def work_order_lines(shop_db, wo_id) -> list[dict]:
+    """History rows of one work order, in line order."""
+    return list(shop_db[HISTORY_COLLECTION].find({"work_order_id": wo_id}).sort("line_index", 1))
+
+
+def last_service_by_unit(shop_db, unit_ids: list) -> dict:
+    """{unit_id: {"date", "mileage", "wo_number"}} of each unit's latest history row."""
+    if not unit_ids:
+        return {}
+    out = {}
+    for row in shop_db[HISTORY_COLLECTION].aggregate([
+        {"$match": {"unit_id": {"$in": list(unit_ids)}}},
+        {"$sort": {"unit_id": 1, "date": -1, "line_index": 1}},
+        {"$group": {
+            "_id": "$unit_id",
+            "date": {"$first": "$date"},
+            "mileage": {"$first": "$mileage"},
+            "wo_number": {"$first": "$wo_number"},
+        }},
+    ]):
+        out[row["_id"]] = {"date": row.get("date"), "mileage": row.get("mileage"), "wo_number": row.get("wo_number")}
+    return out
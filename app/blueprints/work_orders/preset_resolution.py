@@ -0,0 +1,268 @@
+"""Precomputed ("resolved") form of work-order presets.
+
+Each `wo_presets` document carries what applying it needs, so the editor's
+preset API and the settings edit modal answer with one read:
+
+    "resolved": {"format", "parts": [...], "labor_hourly_rate", "labor_amount",
+                 "parts_total", "misc_total", "total", "pricing_rule_id",
+                 "resolved_at"},
+    "resolve_gen": int
+
+Resolved part rows are the stored rows plus live part data (average cost,
+core / misc charges) and `unit_price`: the preset's own price, else the
+part's selling price, else the shop's default pricing scale applied to the
+cost. A stale `part_id` (part deleted and recreated) is re-pointed by part
+number when resolving; nothing is written while reading.
+
+Writers call `invalidate_presets` (part / pricing scale / labor rate
+changes) or `refresh_presets` (preset saves). Both bump `resolve_gen`, drop
+the stored form and resolve the affected presets again right away; a result
+is only stored if nobody bumped the generation meanwhile. Readers that still
+find no current form (presets older than shop migration 8) resolve in memory.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from flask import current_app
+
+from app.blueprints.work_orders.pricing import CompiledScale
+from app.blueprints.work_orders.settings_snapshot import _default_pricing_rule, _pricing_rule_to_json
+
+
+# Bump when the resolved shape changes; older stored forms are then ignored.
+RESOLVED_FORMAT = 1
+
+_PART_PROJECTION = {
+    "_id": 1,
+    "part_number": 1,
+    "average_cost": 1,
+    "has_selling_price": 1,
+    "selling_price": 1,
+    "core_has_charge": 1,
+    "core_cost": 1,
+    "misc_has_charge": 1,
+    "misc_charges": 1,
+}
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _maybe_oid(value):
+    if isinstance(value, ObjectId):
+        return value
+    try:
+        return ObjectId(str(value)) if value else None
+    except Exception:
+        return None
+
+
+def _f(value) -> float:
+    try:
+        return float(value or 0)
+    except Exception:
+        return 0.0
+
+
+def _round2(value: float) -> float:
+    return round(float(value), 2)
+
+
+# ── shared inputs ────────────────────────────────────────────
+
+
+def _load_context(shop_db, shop_id) -> dict:
+    """Labor rates and default pricing scale of a shop, loaded once per resolve batch."""
+    rates = {}
+    for r in shop_db.labor_rates.find({"shop_id": shop_id, "is_active": True}, {"code": 1, "name": 1, "hourly_rate": 1}).sort([("name", 1)]):
+        code = str(r.get("code") or "").strip()
+        if code:
+            rates[code] = _f(r.get("hourly_rate"))
+    standard = rates.get("standard") or (next(iter(rates.values())) if rates else 0.0)
+
+    rule_doc = _default_pricing_rule(list(shop_db.parts_pricing_rules.find({"shop_id": shop_id})))
+    return {
+        "rates": rates,
+        "standard_rate": standard,
+        "scale": CompiledScale.from_pricing(_pricing_rule_to_json(rule_doc)) if rule_doc else None,
+        "pricing_rule_id": str(rule_doc["_id"]) if rule_doc else None,
+    }
+
+
+def _load_parts(shop_db, presets: list[dict]) -> tuple[dict, dict]:
+    """Live parts referenced by `presets`, by id and by part number, in one query."""
+    ids, numbers = set(), set()
+    for preset in presets:
+        for row in preset.get("parts") or []:
+            o = _maybe_oid(row.get("part_id"))
+            if o:
+                ids.add(o)
+            pn = str(row.get("part_number") or "").strip()
+            if pn:
+                numbers.add(pn)
+    by_id, by_number = {}, {}
+    if not ids and not numbers:
+        return by_id, by_number
+    for pdoc in shop_db.parts.find(
+        {"is_active": True, "$or": [{"_id": {"$in": list(ids)}}, {"part_number": {"$in": list(numbers)}}]},
+        _PART_PROJECTION,
+    ):
+        by_id[str(pdoc["_id"])] = pdoc
+        pn = str(pdoc.get("part_number") or "").strip()
+        if pn and pn not in by_number:
+            by_number[pn] = pdoc
+    return by_id, by_number
+
+
+# ── resolve ──────────────────────────────────────────────────
+
+
+def _resolve_part(row: dict, live: dict | None, scale: CompiledScale | None) -> dict:
+    out = dict(row)
+    if live is not None:
+        out["part_id"] = str(live["_id"])
+        out["core_has_charge"] = bool(live.get("core_has_charge"))
+        out["core_cost"] = _f(live.get("core_cost"))
+        out["misc_has_charge"] = bool(live.get("misc_has_charge"))
+        out["misc_charges"] = [
+            {
+                "description": str(m.get("description") or "").strip(),
+                "price": _f(m.get("price")),
+                "taxable": m.get("taxable", True),
+            }
+            for m in (live.get("misc_charges") or [])
+            if isinstance(m, dict)
+        ]
+        if live.get("average_cost") is not None:
+            out["cost"] = _f(live["average_cost"])
+
+    unit_price = row.get("price")
+    if unit_price is None and live is not None and live.get("has_selling_price") and live.get("selling_price") is not None:
+        unit_price = _f(live["selling_price"])
+    if unit_price is None and scale is not None:
+        unit_price = scale.price_for_cost(out.get("cost"))
+    out["unit_price"] = _round2(unit_price) if unit_price is not None else None
+    return out
+
+
+def resolve_preset(preset: dict, context: dict, by_id: dict, by_number: dict) -> dict:
+    """Resolved form of one preset from preloaded inputs (`_load_context`, `_load_parts`)."""
+    parts = []
+    parts_total = misc_total = 0.0
+    for row in preset.get("parts") or []:
+        live = by_id.get(str(row.get("part_id") or ""))
+        if live is None:
+            live = by_number.get(str(row.get("part_number") or "").strip())
+        part = _resolve_part(row, live, context["scale"])
+        qty = _f(part.get("qty"))
+        parts_total += qty * _f(part.get("unit_price"))
+        if part.get("misc_has_charge", True):
+            misc_total += qty * sum(_f(m.get("price")) for m in part.get("misc_charges") or [])
+        parts.append(part)
+
+    rate = context["rates"].get(preset.get("labor_rate_code") or "", context["standard_rate"])
+    labor_amount = _round2(_f(preset.get("labor_hours")) * rate)
+    return {
+        "format": RESOLVED_FORMAT,
+        "parts": parts,
+        "labor_hourly_rate": rate,
+        "labor_amount": labor_amount,
+        "parts_total": _round2(parts_total),
+        "misc_total": _round2(misc_total),
+        "total": _round2(labor_amount + parts_total + misc_total),
+        "pricing_rule_id": context["pricing_rule_id"],
+        "resolved_at": _utcnow(),
+    }
+
+
+def _store(shop_db, preset: dict, resolved: dict) -> bool:
+    """Save `resolved` (and re-pointed part ids) unless the preset changed since it was read."""
+    update = {"resolved": resolved}
+    for idx, (row, part) in enumerate(zip(preset.get("parts") or [], resolved["parts"])):
+        if part.get("part_id") and part["part_id"] != row.get("part_id"):
+            update[f"parts.{idx}.part_id"] = part["part_id"]
+    res = shop_db.wo_presets.update_one(
+        {"_id": preset["_id"], "resolve_gen": preset.get("resolve_gen")},
+        {"$set": update},
+    )
+    return res.modified_count > 0
+
+
+def refresh_presets(shop_db, shop_id, preset_ids: list | None = None) -> int:
+    """Invalidate and re-resolve presets of a shop (default: all). Returns how many were stored."""
+    query: dict = {"shop_id": shop_id, "is_active": True}
+    if preset_ids is not None:
+        query["_id"] = {"$in": list(preset_ids)}
+    shop_db.wo_presets.update_many(query, {"$inc": {"resolve_gen": 1}, "$unset": {"resolved": ""}})
+
+    presets = list(shop_db.wo_presets.find(query))
+    if not presets:
+        return 0
+    context = _load_context(shop_db, shop_id)
+    by_id, by_number = _load_parts(shop_db, presets)
+    return sum(_store(shop_db, p, resolve_preset(p, context, by_id, by_number)) for p in presets)
+
+
+def invalidate_presets(shop_db, shop_id, *, part_ids=None, part_numbers=None) -> None:
+    """
+    Re-resolve the presets affected by a change: those using any of
+    `part_ids` / `part_numbers`, or every preset of the shop when neither is
+    given (pricing scale / labor rate changes). Never raises.
+    """
+    if shop_db is None or not shop_id:
+        return
+    try:
+        preset_ids = None
+        if part_ids is not None or part_numbers is not None:
+            ors = []
+            ids = [str(p) for p in (part_ids or []) if p]
+            numbers = [str(n).strip() for n in (part_numbers or []) if str(n or "").strip()]
+            if ids:
+                ors.append({"parts.part_id": {"$in": ids}})
+            if numbers:
+                ors.append({"parts.part_number": {"$in": numbers}})
+            if not ors:
+                return
+            preset_ids = [d["_id"] for d in shop_db.wo_presets.find(
+                {"shop_id": shop_id, "is_active": True, "$or": ors}, {"_id": 1})]
+            if not preset_ids:
+                return
+        refresh_presets(shop_db, shop_id, preset_ids)
+    except Exception:
+        current_app.logger.warning("Preset re-resolve failed for shop %s", shop_id, exc_info=True)
+
+
+# ── read ─────────────────────────────────────────────────────
+
+
+def get_resolved_preset(shop_db, shop_id, preset_oid) -> tuple[dict | None, dict | None]:
+    """(preset, resolved) with one read; resolved in memory if no current form is stored."""
+    preset = shop_db.wo_presets.find_one({"_id": preset_oid, "shop_id": shop_id, "is_active": True})
+    if preset is None:
+        return None, None
+    resolved = preset.get("resolved")
+    if not isinstance(resolved, dict) or resolved.get("format") != RESOLVED_FORMAT:
+        by_id, by_number = _load_parts(shop_db, [preset])
+        resolved = resolve_preset(preset, _load_context(shop_db, shop_id), by_id, by_number)
+    return preset, resolved
+
+
+def preset_payload(preset: dict, resolved: dict) -> dict:
+    """JSON body of the preset detail endpoints."""
+    return {
+        "id": str(preset["_id"]),
+        "name": preset.get("name") or "",
+        "description": preset.get("description") or "",
+        "labor_hours": preset.get("labor_hours"),
+        "labor_rate_code": preset.get("labor_rate_code"),
+        "allow_discount": bool(preset.get("allow_discount")),
+        "parts": resolved["parts"],
+        "labor_hourly_rate": resolved["labor_hourly_rate"],
+        "labor_amount": resolved["labor_amount"],
+        "parts_total": resolved["parts_total"],
+        "misc_total": resolved["misc_total"],
+        "total": resolved["total"],
+    }
@@ -0,0 +1,166 @@
+"""Server-side work-order pricing.
+
+The editor used to be the only place that knew how to turn hours, rate codes,
+part costs and shop settings into money; the server stored whatever `totals`
+the browser sent. This module is the authoritative version of that math:
+
+* `CompiledScale` turns a `parts_pricing_rules` scale into sorted breakpoint
+  arrays and resolves a cost with two bisects (same first-match semantics as
+  `matchRule()` in work_order_details.js).
+* `compute_work_order_totals` prices a whole WO in one pass over its blocks
+  and returns the stored `totals` shape (see `totals.align_totals_with_labors`).
+"""
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from math import inf
+
+from app.blueprints.work_orders.totals import _apply_sales_tax_to_totals, align_totals_with_labors
+
+
+def _num(v):
+    if v is None:
+        return None
+    if isinstance(v, str):
+        v = v.strip()
+        if not v:
+            return None
+    try:
+        return float(v)
+    except Exception:
+        return None
+
+
+def _round2(v) -> float:
+    n = _num(v)
+    if n is None:
+        return 0.0
+    return round(n + 1e-12, 2)
+
+
+@dataclass(frozen=True)
+class CompiledScale:
+    mode: str  # margin | markup
+    starts: tuple[float, ...]
+    ends: tuple[float, ...]  # inf for open-ended ranges
+    values: tuple[float, ...]
+    reach: tuple[float, ...]  # running max of `ends`, non-decreasing
+
+    @classmethod
+    def from_pricing(cls, pricing: dict | None) -> "CompiledScale | None":
+        """Build from the `{"mode", "rules"}` shape of get_pricing_rules_json()."""
+        if not isinstance(pricing, dict):
+            return None
+        rows = []
+        for r in (pricing.get("rules") or []):
+            frm = _num(r.get("from"))
+            vp = _num(r.get("value_percent"))
+            if frm is None or vp is None:
+                continue
+            to = _num(r.get("to"))
+            rows.append((frm, inf if to is None else to, vp))
+        if not rows:
+            return None
+
+        # Stable sort keeps the original order for equal `from` values, which
+        # matches the editor iterating a list already sorted by `from`.
+        rows.sort(key=lambda x: x[0])
+        reach = []
+        top = -inf
+        for _, end, _ in rows:
+            top = max(top, end)
+            reach.append(top)
+        return cls(
+            mode=(pricing.get("mode") or "margin").strip().lower(),
+            starts=tuple(r[0] for r in rows),
+            ends=tuple(r[1] for r in rows),
+            values=tuple(r[2] for r in rows),
+            reach=tuple(reach),
+        )
+
+    def value_for(self, cost: float) -> float | None:
+        """Percent of the first rule with from <= cost <= to, or None."""
+        last = bisect_right(self.starts, cost) - 1
+        if last < 0 or self.reach[last] < cost:
+            return None
+        # First index whose running max end covers cost: its own end does.
+        return self.values[bisect_left(self.reach, cost)]
+
+    def price_for_cost(self, cost) -> float | None:
+        cost = _num(cost)
+        if cost is None or cost <= 0:
+            return None
+        vp = self.value_for(cost)
+        if vp is None:
+            return None
+        if self.mode == "markup":
+            return _round2(cost * (1 + vp / 100))
+        denom = 1 - vp / 100  # margin
+        if denom <= 0:
+            return _round2(cost)
+        return _round2(cost / denom)
+
+
+def _block_labor_fields(block: dict) -> tuple[float | None, str]:
+    """(hours, rate_code) for both stored (`labor` sub-doc) and flat API blocks."""
+    labor = block.get("labor") if isinstance(block.get("labor"), dict) else None
+    if labor is not None:
+        return _num(labor.get("hours")), str(labor.get("rate_code") or "").strip()
+    return _num(block.get("labor_hours")), str(block.get("labor_rate_code") or "").strip()
+
+
+def apply_scale_prices(labors: list, scale: CompiledScale | None) -> list:
+    """Fill blank part prices from the scale, like the editor's autofill. Mutates in place."""
+    if scale is None or not isinstance(labors, list):
+        return labors
+    for block in labors:
+        if not isinstance(block, dict):
+            continue
+        for part in (block.get("parts") or []):
+            if not isinstance(part, dict) or _num(part.get("price")) is not None:
+                continue
+            price = scale.price_for_cost(part.get("cost"))
+            if price is not None:
+                part["price"] = price
+    return labors
+
+
+def compute_work_order_totals(
+    labors: list,
+    *,
+    labor_rates: dict[str, float],
+    shop_supply_pct: float = 0.0,
+    shop_supply_override: float | None = None,
+    sales_tax_rate: float = 0.0,
+    is_taxable: bool = False,
+) -> dict:
+    """
+    Authoritative totals for `labors` (part prices already resolved).
+
+    Labor per block is hours * hourly rate of its code; shop supply is
+    `shop_supply_pct` of the labor base unless the user typed an override;
+    parts/core/misc come from the part rows; tax applies to parts + taxable misc.
+    """
+    blocks = []
+    labor_sum = 0.0
+    for block in (labors if isinstance(labors, list) else []):
+        hours, code = _block_labor_fields(block if isinstance(block, dict) else {})
+        rate = labor_rates.get(code) if code else None
+        labor = _round2(hours * rate) if hours is not None and rate is not None else 0.0
+        labor_sum += labor
+        blocks.append({"labor": labor})
+    labor_sum = _round2(labor_sum)
+
+    if shop_supply_override is not None and _num(shop_supply_override) is not None:
+        supply = max(0.0, _round2(shop_supply_override))
+    else:
+        pct = _num(shop_supply_pct) or 0.0
+        supply = _round2(labor_sum * (pct / 100)) if pct > 0 else 0.0
+
+    # align_* does the per-block parts/core/misc pass and splits shop supply
+    # across blocks by labor share; tax is applied last on the aligned numbers.
+    totals = align_totals_with_labors({"labors": blocks, "shop_supply_total": supply}, labors)
+    totals["misc_taxable_total"] = _round2(sum(b.get("misc_taxable_total") or 0 for b in totals["labors"]))
+    totals.pop("parts_taxable_total", None)
+    return _apply_sales_tax_to_totals(totals, sales_tax_rate, is_taxable)
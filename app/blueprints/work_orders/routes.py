@@ -1,7 +1,6 @@
 from __future__ import annotations
 
 import base64
-import json
 import secrets
 from datetime import datetime, timedelta, timezone
 from bson import ObjectId
@@ -10,7 +9,7 @@ from flask import g, request, session, redirect, url_for, flash, jsonify, render
 from app.blueprints.work_orders import work_orders_bp
 from app.blueprints.main.routes import _render_app_page
 from app.extensions import get_master_db, get_mongo_client
-from app.utils.auth import login_required, SESSION_TENANT_ID, SESSION_USER_ID
+from app.utils.auth import login_required, SESSION_USER_ID
 from app.utils.pagination import get_pagination_params, get_sort_params, paginate_find
 from app.utils.mongo_search import build_regex_search_filter
 from app.utils.parts_search import build_query_tokens, part_matches_query
@@ -28,67 +27,33 @@ from app.utils.email_sender import send_email
 from app.utils.pdf_utils import render_html_to_pdf
 from app.utils.sales_tax import get_shop_zip_code, get_zip_sales_tax_rate
 from app.utils.issue_describer import polish_issue_description
+from app.utils.tenant_context import get_active_shop_db, shop_members_filter
+from app.blueprints.customer_portal.cache import bump_portal_data_version
+from app.blueprints.work_orders.maintenance_history import normalize_mileage, sync_work_order_history
+from app.blueprints.work_orders.pricing import CompiledScale, apply_scale_prices, compute_work_order_totals
+from app.blueprints.work_orders.totals import (
+    _parse_misc_items,
+    _work_order_grand_total,
+    as_bool,
+    f64,
+    i32,
+    normalize_parts_payload,
+    normalize_totals_payload,
+    oid,
+    round2,
+)
+from app.blueprints.work_orders.preset_resolution import get_resolved_preset, preset_payload
+from app.blueprints.work_orders.settings_snapshot import (
+    _pricing_rule_to_json,
+    get_shop_settings_snapshot,
+    snapshot_pricing_rules,
+)
 
 
 def utcnow():
     return datetime.now(timezone.utc)
 
 
-def oid(v):
-    if not v:
-        return None
-    try:
-        return ObjectId(str(v))
-    except Exception:
-        return None
-
-
-def i32(v):
-    if v is None:
-        return None
-    s = str(v).strip()
-    if not s:
-        return None
-    try:
-        return int(s)
-    except Exception:
-        return None
-
-
-def f64(v):
-    if v is None:
-        return None
-    try:
-        return float(v)
-    except Exception:
-        return None
-
-
-def round2(v):
-    n = f64(v)
-    if n is None:
-        return 0.0
-    return round(n + 1e-12, 2)
-
-
-def _work_order_grand_total(wo: dict) -> float:
-    totals_doc = wo.get("totals") if isinstance(wo.get("totals"), dict) else {}
-    return round2(
-        totals_doc.get("grand_total")
-        if totals_doc.get("grand_total") is not None
-        else wo.get("grand_total") or 0
-    )
-
-
-def _work_order_tax_total(wo: dict) -> float:
-    totals_doc = wo.get("totals") if isinstance(wo.get("totals"), dict) else {}
-    return round2(
-        totals_doc.get("sales_tax_total")
-        if totals_doc.get("sales_tax_total") is not None
-        else wo.get("sales_tax_total") or 0
-    )
-
-
 def _get_shop_sales_tax_context(shop: dict, shop_db=None) -> dict:
     from app.utils.sales_tax import resolve_active_shop_sales_tax_rate
     master = get_master_db()
@@ -128,33 +93,6 @@ def _is_customer_taxable(shop_db, customer_id: ObjectId | None) -> bool:
     return bool(customer.get("taxable", False))
 
 
-def _apply_sales_tax_to_totals(totals: dict, tax_rate: float, is_taxable: bool) -> dict:
-    src = normalize_totals_payload(totals or {})
-
-    parts_only = round2(src.get("parts") if src.get("parts") is not None else src.get("parts_total"))
-    misc_taxable_total = round2(src.get("misc_taxable_total") or 0)
-    parts_taxable_total = round2(parts_only + misc_taxable_total)
-    safe_tax_rate = 0.0
-    try:
-        safe_tax_rate = max(0.0, float(tax_rate or 0))
-    except Exception:
-        safe_tax_rate = 0.0
-
-    sales_tax_total = round2(parts_taxable_total * safe_tax_rate) if is_taxable else 0.0
-    grand_total = round2(
-        round2(src.get("labor_total"))
-        + round2(src.get("parts_total"))
-        + sales_tax_total
-    )
-
-    src["parts_taxable_total"] = parts_taxable_total
-    src["sales_tax_rate"] = round(safe_tax_rate + 1e-12, 6)
-    src["sales_tax_total"] = sales_tax_total
-    src["is_taxable"] = bool(is_taxable)
-    src["grand_total"] = grand_total
-    return src
-
-
 def _sum_active_work_order_payments(shop_db, wo_id) -> float:
     if shop_db is None or not wo_id:
         return 0.0
@@ -201,22 +139,12 @@ def _sync_work_order_payment_state(shop_db, wo: dict, user_id, now):
             }
         },
     )
+    bump_portal_data_version(shop_db, wo.get("customer_id"))
     summary["status"] = new_status
     summary["is_in_progress"] = new_status == "in_progress"
     return summary
 
 
-def as_bool(v) -> bool:
-    if isinstance(v, bool):
-        return v
-    if isinstance(v, (int, float)):
-        return v != 0
-    if v is None:
-        return False
-    raw = str(v).strip().lower()
-    return raw in ("1", "true", "yes", "on")
-
-
 def get_next_wo_number(shop_db, shop_id):
     """
     Get next work order number using atomic counter.
@@ -242,65 +170,6 @@ def get_next_wo_number(shop_db, shop_id):
     return initial + seq - 1
 
 
-def normalize_parts_payload(raw_parts):
-    if not isinstance(raw_parts, list):
-        return []
-
-    out = []
-    for p in raw_parts:
-        if not isinstance(p, dict):
-            continue
-
-        part_number = str(p.get("part_number") or "").strip()
-        part_id = oid(p.get("part_id"))
-        one_time_part = as_bool(p.get("one_time_part"))
-        description = str(p.get("description") or "").strip()
-        misc_charge_description = str(
-            p.get("misc_charge_description") if p.get("misc_charge_description") is not None else ""
-        ).strip()
-
-        qty_raw = i32(p.get("qty"))
-        cost_raw = f64(p.get("cost"))
-        price_raw = f64(p.get("price"))
-        core_raw = f64(
-            p.get("core_charge") if p.get("core_charge") is not None else p.get("core_cost")
-        )
-        misc_raw = f64(p.get("misc_charge"))
-
-        has_any = bool(part_number or description or misc_charge_description)
-        if qty_raw is not None and qty_raw > 0:
-            has_any = True
-        if cost_raw is not None and cost_raw > 0:
-            has_any = True
-        if price_raw is not None and price_raw > 0:
-            has_any = True
-        if core_raw is not None and core_raw > 0:
-            has_any = True
-        if misc_raw is not None and misc_raw > 0:
-            has_any = True
-
-        if not has_any:
-            continue
-
-        item = {
-            "part_number": part_number,
-            "description": description,
-            "one_time_part": one_time_part,
-            "qty": int(qty_raw if qty_raw is not None else 0),
-            "cost": round2(cost_raw if cost_raw is not None else 0),
-            "price": round2(price_raw if price_raw is not None else 0),
-            "core_charge": round2(core_raw if core_raw is not None else 0),
-            "misc_charge": round2(misc_raw if misc_raw is not None else 0),
-            "misc_charge_description": misc_charge_description,
-        }
-        if part_id:
-            item["part_id"] = part_id
-
-        out.append(item)
-
-    return out
-
-
 def _resolve_part_for_inventory(shop_db, raw_part: dict):
     """Resolve part document by part_id first, then by part_number."""
     if not isinstance(raw_part, dict):
@@ -381,281 +250,6 @@ def _collect_inventory_qty_by_part(shop_db, labors: list):
     return out, errors
 
 
-def normalize_totals_payload(raw):
-    src = raw if isinstance(raw, dict) else {}
-
-    blocks = []
-    for b in (src.get("labors") or []):
-        if not isinstance(b, dict):
-            continue
-        labor = round2(b.get("labor") if b.get("labor") is not None else b.get("labor_total"))
-        parts = round2(b.get("parts") if b.get("parts") is not None else b.get("parts_total"))
-        core_total = round2(b.get("core_total"))
-        misc_total = round2(b.get("misc_total"))
-        shop_supply_total = round2(b.get("shop_supply_total"))
-        cost_total = round2(b.get("cost_total") if b.get("cost_total") is not None else parts)
-        labor_total = round2(labor + shop_supply_total)
-        parts_total = round2(parts + core_total + misc_total)
-        labor_full_total = round2(
-            b.get("labor_full_total")
-            if b.get("labor_full_total") is not None
-            else (labor + parts_total + shop_supply_total)
-        )
-        blocks.append(
-            {
-                "labor": labor,
-                "labor_total": labor_total,
-                "parts": parts,
-                "parts_total": parts_total,
-                "core_total": core_total,
-                "misc_total": misc_total,
-                "cost_total": cost_total,
-                "shop_supply_total": shop_supply_total,
-                "labor_full_total": labor_full_total,
-            }
-        )
-
-    labor = round2(src.get("labor") if src.get("labor") is not None else src.get("labor_total"))
-    parts = round2(src.get("parts") if src.get("parts") is not None else src.get("parts_total"))
-    core_total = round2(src.get("core_total"))
-    misc_total = round2(src.get("misc_total"))
-    shop_supply_total = round2(src.get("shop_supply_total"))
-    cost_total = round2(src.get("cost_total") if src.get("cost_total") is not None else parts)
-    parts_taxable_total = round2(src.get("parts_taxable_total") if src.get("parts_taxable_total") is not None else parts)
-    misc_taxable_total = round2(src.get("misc_taxable_total") or 0)
-    sales_tax_rate = round(float(src.get("sales_tax_rate") or 0) + 1e-12, 6)
-    sales_tax_total = round2(src.get("sales_tax_total"))
-    is_taxable = bool(src.get("is_taxable", False))
-
-    labor_total = round2(labor + shop_supply_total)
-    parts_total = round2(parts + core_total + misc_total)
-    calculated_grand_total = round2(labor_total + parts_total)
-    grand_total = round2(
-        src.get("grand_total")
-        if src.get("grand_total") is not None
-        else round2(calculated_grand_total + sales_tax_total)
-    )
-
-    return {
-        "labor": labor,
-        "labor_total": labor_total,
-        "parts": parts,
-        "parts_total": parts_total,
-        "core_total": core_total,
-        "misc_total": misc_total,
-        "misc_taxable_total": misc_taxable_total,
-        "cost_total": cost_total,
-        "shop_supply_total": shop_supply_total,
-        "parts_taxable_total": parts_taxable_total,
-        "sales_tax_rate": sales_tax_rate,
-        "sales_tax_total": sales_tax_total,
-        "is_taxable": is_taxable,
-        "grand_total": grand_total,
-        "labors": blocks,
-    }
-
-
-def _parse_misc_items(raw):
-    value = str(raw or "").strip()
-    if not value:
-        return []
-    try:
-        parsed = json.loads(value)
-    except Exception:
-        return []
-    if not isinstance(parsed, list):
-        return []
-
-    out = []
-    for item in parsed:
-        if not isinstance(item, dict):
-            continue
-        out.append(
-            {
-                "description": str(item.get("description") or "").strip(),
-                "quantity": f64(item.get("quantity") if item.get("quantity") is not None else 1) or 0,
-                "price": f64(item.get("price")),
-                "manual": item.get("manual") is True,
-                "taxable": item.get("taxable") is not False,
-            }
-        )
-    return out
-
-
-def _calc_misc_total_from_parts(parts: list) -> tuple:
-    """Returns (misc_total, misc_taxable_total)."""
-    if not isinstance(parts, list) or not parts:
-        return 0.0, 0.0
-
-    first_row_items = _parse_misc_items((parts[0] or {}).get("misc_charge_description"))
-    if first_row_items:
-        total = 0.0
-        taxable_total = 0.0
-        for item in first_row_items:
-            price = f64(item.get("price"))
-            qty = f64(item.get("quantity") if item.get("quantity") is not None else 0)
-            if not price or price <= 0 or not qty or qty <= 0:
-                continue
-            amount = round2(price * qty)
-            total += amount
-            if item.get("taxable") is not False:
-                taxable_total += amount
-        return round2(total), round2(taxable_total)
-
-    # Backward compatibility for older rows where misc was stored per-part row.
-    total = 0.0
-    taxable_total = 0.0
-    for part in parts:
-        if not isinstance(part, dict):
-            continue
-        part_qty = i32(part.get("qty")) or 0
-
-        row_items = _parse_misc_items(part.get("misc_charge_description"))
-        if row_items:
-            for item in row_items:
-                price = f64(item.get("price"))
-                if not price or price <= 0:
-                    continue
-                if item.get("manual"):
-                    qty = f64(item.get("quantity") if item.get("quantity") is not None else 0) or 0
-                else:
-                    qty = part_qty
-                if qty <= 0:
-                    continue
-                amount = round2(price * qty)
-                total += amount
-                if item.get("taxable") is not False:
-                    taxable_total += amount
-            continue
-
-        misc_charge = f64(part.get("misc_charge")) or 0
-        if misc_charge > 0 and part_qty > 0:
-            amount = round2(misc_charge * part_qty)
-            total += amount
-            taxable_total += amount  # legacy items default to taxable
-
-    return round2(total), round2(taxable_total)
-
-
-def align_totals_with_labors(totals: dict, labors: list) -> dict:
-    src = normalize_totals_payload(totals or {})
-    blocks_src = src.get("labors") if isinstance(src.get("labors"), list) else []
-
-    out_blocks = []
-    parts_base_sum = 0.0
-    core_sum = 0.0
-    misc_sum = 0.0
-    misc_taxable_sum = 0.0
-
-    normalized_labors = labors if isinstance(labors, list) else []
-
-    for idx, block in enumerate(normalized_labors):
-        block_src = blocks_src[idx] if idx < len(blocks_src) and isinstance(blocks_src[idx], dict) else {}
-        parts = normalize_parts_payload((block or {}).get("parts") or [])
-
-        parts_base = 0.0
-        core_total = 0.0
-        for part in parts:
-            qty = i32(part.get("qty")) or 0
-            if qty <= 0:
-                continue
-            price = round2(part.get("price") if part.get("price") is not None else 0)
-            core_charge = round2(part.get("core_charge") if part.get("core_charge") is not None else 0)
-            parts_base += round2(price * qty)
-            core_total += round2(core_charge * qty)
-
-        misc_total, misc_taxable_block = _calc_misc_total_from_parts(parts)
-        misc_taxable_block = round2(misc_taxable_block)
-
-        labor_base = round2(
-            block_src.get("labor") if block_src.get("labor") is not None else block_src.get("labor_total")
-        )
-        shop_supply_total = round2(block_src.get("shop_supply_total"))
-        labor_total = round2(labor_base + shop_supply_total)
-        parts_total = round2(parts_base + core_total + misc_total)
-
-        out_blocks.append(
-            {
-                "labor": labor_base,
-                "labor_total": labor_total,
-                "parts": round2(parts_base),
-                "parts_total": parts_total,
-                "core_total": round2(core_total),
-                "misc_total": round2(misc_total),
-                "misc_taxable_total": misc_taxable_block,
-                "cost_total": round2(parts_base),
-                "shop_supply_total": shop_supply_total,
-                "labor_full_total": round2(labor_total + parts_total),
-            }
-        )
-
-        parts_base_sum += parts_base
-        core_sum += core_total
-        misc_sum += misc_total
-        misc_taxable_sum += misc_taxable_block
-
-    labor_base_sum = round2(sum(round2(b.get("labor") or 0) for b in out_blocks))
-    shop_supply_from_blocks = round2(sum(round2(b.get("shop_supply_total") or 0) for b in out_blocks))
-    requested_shop_supply = round2(src.get("shop_supply_total"))
-    shop_supply_sum = requested_shop_supply if requested_shop_supply > 0 else shop_supply_from_blocks
-
-    if out_blocks:
-        if shop_supply_sum > 0 and labor_base_sum > 0:
-            allocated = 0.0
-            for idx, block in enumerate(out_blocks):
-                labor_base = round2(block.get("labor") or 0)
-                if idx == len(out_blocks) - 1:
-                    block_supply = round2(shop_supply_sum - allocated)
-                else:
-                    block_supply = round2(shop_supply_sum * (labor_base / labor_base_sum))
-                    allocated = round2(allocated + block_supply)
-
-                block["shop_supply_total"] = block_supply
-                block["labor_total"] = round2(labor_base + block_supply)
-                block["labor_full_total"] = round2(block["labor_total"] + round2(block.get("parts_total") or 0))
-        else:
-            for block in out_blocks:
-                labor_base = round2(block.get("labor") or 0)
-                block["shop_supply_total"] = 0.0
-                block["labor_total"] = round2(labor_base)
-                block["labor_full_total"] = round2(block["labor_total"] + round2(block.get("parts_total") or 0))
-
-    shop_supply_sum = round2(sum(round2(b.get("shop_supply_total") or 0) for b in out_blocks)) if out_blocks else shop_supply_sum
-    labor_total_sum = round2(labor_base_sum + shop_supply_sum)
-    parts_base_sum = round2(parts_base_sum)
-    core_sum = round2(core_sum)
-    misc_sum = round2(misc_sum)
-    misc_taxable_sum = round2(misc_taxable_sum)
-    parts_total_sum = round2(parts_base_sum + core_sum + misc_sum)
-    sales_tax_rate = round(float(src.get("sales_tax_rate") or 0) + 1e-12, 6)
-    sales_tax_total = round2(src.get("sales_tax_total"))
-    is_taxable = bool(src.get("is_taxable", False))
-    misc_taxable_total = round2(
-        src.get("misc_taxable_total") if src.get("misc_taxable_total") is not None else misc_taxable_sum
-    )
-    parts_taxable_total = round2(
-        src.get("parts_taxable_total") if src.get("parts_taxable_total") is not None else round2(parts_base_sum + misc_taxable_total)
-    )
-
-    return {
-        "labor": labor_base_sum,
-        "labor_total": labor_total_sum,
-        "parts": parts_base_sum,
-        "parts_total": parts_total_sum,
-        "core_total": core_sum,
-        "misc_total": misc_sum,
-        "misc_taxable_total": misc_taxable_total,
-        "cost_total": parts_base_sum,
-        "shop_supply_total": shop_supply_sum,
-        "parts_taxable_total": parts_taxable_total,
-        "sales_tax_rate": sales_tax_rate,
-        "sales_tax_total": sales_tax_total,
-        "is_taxable": is_taxable,
-        "grand_total": round2(labor_total_sum + parts_total_sum + sales_tax_total),
-        "labors": out_blocks,
-    }
-
-
 def normalize_saved_labors(raw, shop_db=None):
     if not isinstance(raw, list):
         return []
@@ -1290,42 +884,6 @@ def current_user_id():
     return oid(session.get(SESSION_USER_ID))
 
 
-def tenant_id_variants():
-    raw = session.get(SESSION_TENANT_ID)
-    out = set()
-    if raw is None:
-        return []
-    out.add(raw)
-    out.add(str(raw))
-    o = oid(raw)
-    if o:
-        out.add(o)
-    return list(out)
-
-
-def get_shop_db():
-    master = get_master_db()
-
-    shop_id = oid(session.get("shop_id"))
-    if not shop_id:
-        return None, None
-
-    tenant_variants = tenant_id_variants()
-    if not tenant_variants:
-        return None, None
-
-    shop = master.shops.find_one({"_id": shop_id, "tenant_id": {"$in": tenant_variants}})
-    if not shop:
-        return None, None
-
-    db_name = shop.get("db_name")
-    if not db_name:
-        return None, shop
-
-    client = get_mongo_client()
-    return client[str(db_name)], shop
-
-
 def customer_label(c: dict) -> str:
     company = (c.get("company_name") or "").strip()
     if company:
@@ -1406,39 +964,17 @@ def get_labor_rates(shop_db, shop_id: ObjectId):
     ]
 
 
-def _tenant_variants_from_shop(shop: dict):
-    raw = shop.get("tenant_id")
-    if raw is None:
-        return []
-
-    out = {raw, str(raw)}
-    parsed = oid(raw)
-    if parsed:
-        out.add(parsed)
-    return list(out)
-
-
 def get_assignable_mechanics(shop: dict):
-    shop_id = shop.get("_id")
-    if not shop_id:
+    if not shop.get("_id") or not shop.get("tenant_id"):
         return []
 
-    tenant_variants = _tenant_variants_from_shop(shop)
-    if not tenant_variants:
-        return []
-
-    shop_variants = [shop_id, str(shop_id)]
     master = get_master_db()
     rows = list(
         master.users.find(
             {
-                "tenant_id": {"$in": tenant_variants},
+                **shop_members_filter(shop),
                 "is_active": True,
                 "role": {"$in": ["senior_mechanic", "mechanic"]},
-                "$or": [
-                    {"shop_ids": {"$in": shop_variants}},
-                    {"shop_id": {"$in": shop_variants}},
-                ],
             },
             {
                 "first_name": 1,
@@ -1568,38 +1104,10 @@ def get_pricing_rules_json(shop_db, shop_id: ObjectId, customer_id: ObjectId | N
     if not doc:
         return None
 
-    mode = (doc.get("mode") or "margin").strip().lower()  # margin | markup
-    rules = []
-    for r in (doc.get("rules") or []):
-        frm = r.get("from")
-        to = r.get("to")
-        vp = r.get("value_percent")
-
-        try:
-            frm_f = float(frm)
-        except Exception:
-            continue
-
-        if to is None:
-            to_f = None
-        else:
-            try:
-                to_f = float(to)
-            except Exception:
-                to_f = None
-
-        try:
-            vp_f = float(vp)
-        except Exception:
-            continue
-
-        rules.append({"from": frm_f, "to": to_f, "value_percent": vp_f})
-
     override_part_selling_price = bool((customer_doc or {}).get("override_part_selling_price", False))
 
     return {
-        "mode": mode,
-        "rules": rules,
+        **_pricing_rule_to_json(doc),
         "override_part_selling_price": override_part_selling_price,
     }
 
@@ -1639,20 +1147,101 @@ def get_core_charge_default(shop_db, shop_id: ObjectId) -> bool:
     return bool(doc.get("charge_for_cores_default", True))
 
 
+def _locked_shop_supply_pct(totals: dict, default: float) -> float:
+    """Shop-supply % implied by a saved WO, so edits don't re-rate it."""
+    try:
+        supply_total = float((totals or {}).get("shop_supply_total") or 0)
+        labor_base = float((totals or {}).get("labor") or 0)
+    except Exception:
+        return default
+    if labor_base > 0:
+        return round((supply_total / labor_base) * 100, 4)
+    if supply_total <= 0:
+        # Saved WO had no shop supply — keep it at zero on edit.
+        return 0.0
+    return default
+
+
+def _shop_supply_override(raw_totals) -> float | None:
+    """Manual shop-supply dollars typed in the editor (None = use the shop %)."""
+    if not isinstance(raw_totals, dict):
+        return None
+    if "shop_supply_override" in raw_totals:
+        return f64(raw_totals.get("shop_supply_override"))
+    # Older editor builds only sent the resulting amount.
+    return f64(raw_totals.get("shop_supply_total"))
+
+
+def _get_pricing_context(shop_db, shop, customer_id=None, wo: dict | None = None) -> dict:
+    """
+    Everything compute_work_order_totals() needs besides the labors.
+    For an existing WO the tax rate and shop-supply % stay locked to what was saved.
+    """
+    snapshot = get_shop_settings_snapshot(shop_db, shop)
+    customer_doc = None
+    if customer_id:
+        customer_doc = shop_db.customers.find_one(
+            {"_id": customer_id},
+            {"pricing_rule_id": 1, "override_part_selling_price": 1, "taxable": 1},
+        )
+
+    tax_rate = (snapshot.get("sales_tax_context") or {}).get("rate") or 0
+    shop_supply_pct = snapshot.get("shop_supply_procentage") or 0
+    existing_totals = (wo or {}).get("totals") if isinstance((wo or {}).get("totals"), dict) else {}
+    if wo is not None:
+        if existing_totals.get("sales_tax_rate") is not None:
+            tax_rate = existing_totals.get("sales_tax_rate")
+        shop_supply_pct = _locked_shop_supply_pct(existing_totals, shop_supply_pct)
+
+    if "is_taxable" in existing_totals:
+        is_taxable = bool(existing_totals.get("is_taxable"))
+    else:
+        is_taxable = bool((customer_doc or {}).get("taxable", False))
+
+    return {
+        "scale": CompiledScale.from_pricing(snapshot_pricing_rules(snapshot, customer_doc)),
+        "labor_rates": {r["code"]: float(r.get("hourly_rate") or 0) for r in snapshot.get("labor_rates") or [] if r.get("code")},
+        "shop_supply_pct": shop_supply_pct,
+        "sales_tax_rate": tax_rate,
+        "is_taxable": is_taxable,
+    }
+
+
+def _price_work_order(labors: list, pricing_ctx: dict, raw_totals=None) -> dict:
+    """Authoritative totals for `labors`; honours the UI's taxable toggle and supply override."""
+    is_taxable = pricing_ctx["is_taxable"]
+    if isinstance(raw_totals, dict) and "is_taxable" in raw_totals:
+        is_taxable = bool(raw_totals.get("is_taxable"))
+    return compute_work_order_totals(
+        labors,
+        labor_rates=pricing_ctx["labor_rates"],
+        shop_supply_pct=pricing_ctx["shop_supply_pct"],
+        shop_supply_override=_shop_supply_override(raw_totals),
+        sales_tax_rate=pricing_ctx["sales_tax_rate"],
+        is_taxable=is_taxable,
+    )
+
+
 def render_details(shop_db, shop, customer_id, unit_id, form_state=None):
     from bson import ObjectId as _ObjId
-    mechanics = get_assignable_mechanics(shop)
+    # Settings-derived reference data comes from one cached snapshot per shop.
+    snapshot = get_shop_settings_snapshot(shop_db, shop)
+    mechanics = snapshot["mechanics"]
 
     # Only load the selected customer for initial render; full list loaded via JS
     selected_customer = None
+    customer_doc = None
     if customer_id:
         c = shop_db.customers.find_one({"_id": customer_id, "is_active": True})
+        customer_doc = c or shop_db.customers.find_one(
+            {"_id": customer_id},
+            {"pricing_rule_id": 1, "override_part_selling_price": 1},
+        )
         if c:
-            rate_rows = list(shop_db.labor_rates.find({"is_active": True}, {"_id": 1, "code": 1}))
-            rates_by_id = {r.get("_id"): str(r.get("code") or "").strip() for r in rate_rows if r.get("_id")}
+            rates_by_id = snapshot["labor_rate_codes"]
             def _resolve_rate(value):
                 if isinstance(value, ObjectId):
-                    return rates_by_id.get(value, "")
+                    return rates_by_id.get(str(value), "")
                 legacy = str(value or "").strip().lower()
                 if legacy == "standart":
                     return "standard"
@@ -1683,7 +1272,7 @@ def render_details(shop_db, shop, customer_id, unit_id, form_state=None):
     # If we are opening an existing WO, lock the displayed tax rate to the value
     # that was saved on the WO itself (so address changes on the shop don't
     # silently re-quote tax for old work orders).
-    sales_tax_context = _get_shop_sales_tax_context(shop, shop_db)
+    sales_tax_context = dict(snapshot["sales_tax_context"])
     initial_totals_state = (form_state or {}).get("initial_totals") or {}
     locked_rate = initial_totals_state.get("sales_tax_rate") if isinstance(initial_totals_state, dict) else None
     if (form_state or {}).get("work_order_created") and locked_rate is not None:
@@ -1699,18 +1288,9 @@ def render_details(shop_db, shop, customer_id, unit_id, form_state=None):
     # Lock shop-supply percentage to whatever was applied when this WO was
     # saved, so editing an existing WO doesn't silently re-rate it with the
     # current shop configuration.
-    shop_supply_pct = get_shop_supply_percentage(shop_db, shop["_id"])
+    shop_supply_pct = snapshot["shop_supply_procentage"]
     if (form_state or {}).get("work_order_created"):
-        try:
-            supply_total = float((initial_totals_state or {}).get("shop_supply_total") or 0)
-            labor_base = float((initial_totals_state or {}).get("labor") or 0)
-            if labor_base > 0:
-                shop_supply_pct = round((supply_total / labor_base) * 100, 4)
-            elif supply_total <= 0:
-                # Saved WO had no shop supply — keep it at zero on edit.
-                shop_supply_pct = 0.0
-        except Exception:
-            pass
+        shop_supply_pct = _locked_shop_supply_pct(initial_totals_state, shop_supply_pct)
 
     ctx = {
         "sales_tax_context": sales_tax_context,
@@ -1719,11 +1299,11 @@ def render_details(shop_db, shop, customer_id, unit_id, form_state=None):
         "units": units,
         "selected_customer_id": str(customer_id) if customer_id else "",
         "selected_unit_id": str(unit_id) if unit_id else "",
-        "labor_rates": get_labor_rates(shop_db, shop["_id"]),
+        "labor_rates": snapshot["labor_rates"],
         "mechanics": mechanics,
-        "parts_pricing_rules": get_pricing_rules_json(shop_db, shop["_id"], customer_id=customer_id),
+        "parts_pricing_rules": snapshot_pricing_rules(snapshot, customer_doc),
         "shop_supply_procentage": shop_supply_pct,
-        "charge_for_cores_default": get_core_charge_default(shop_db, shop["_id"]),
+        "charge_for_cores_default": snapshot["charge_for_cores_default"],
 
         # старые поля (оставляем как у тебя было)
         "labor_description": (form_state or {}).get("labor_description") or "",
@@ -2162,7 +1742,7 @@ def sync_work_order_cores(shop_db, shop: dict, old_labors: list, new_labors: lis
 @login_required
 @permission_required("work_orders.view")
 def work_orders_page():
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         flash("Shop database not configured.", "error")
         return redirect(url_for("dashboard.dashboard"))
@@ -2212,7 +1792,7 @@ def work_orders_page():
 @login_required
 @permission_required("work_orders.view")
 def estimates_api():
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         return jsonify({"ok": False, "error": "Shop database not configured."}), 400
 
@@ -2253,7 +1833,7 @@ def estimates_api():
 @login_required
 @permission_required("work_orders.view")
 def customers_api():
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         return jsonify({"ok": False, "error": "Shop database not configured."}), 400
 
@@ -2265,7 +1845,7 @@ def customers_api():
 @login_required
 @permission_required("work_orders.create")
 def work_order_details_page():
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         flash("Shop database not configured.", "error")
         return redirect(url_for("dashboard.dashboard"))
@@ -2326,7 +1906,7 @@ def work_order_details_page():
 @login_required
 @permission_required("work_orders.create")
 def create_unit():
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         flash("Shop database not configured.", "error")
         return redirect(url_for("dashboard.dashboard"))
@@ -2364,6 +1944,7 @@ def create_unit():
 
     res = shop_db.units.insert_one(doc)
     unit_id = res.inserted_id
+    bump_portal_data_version(shop_db, customer_id)
 
     flash("Unit created.", "success")
     return redirect(url_for("work_orders.work_order_details_page", customer_id=str(customer_id), unit_id=str(unit_id)))
@@ -2373,7 +1954,7 @@ def create_unit():
 @login_required
 @permission_required("work_orders.create")
 def create_work_order():
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         flash("Shop database not configured.", "error")
         return redirect(url_for("dashboard.dashboard"))
@@ -2455,6 +2036,10 @@ def create_work_order():
                 b["parts"][ridx]["one_time_part"] = raw in ("1", "true", "yes", "on")
             continue
 
+    # Blank part prices are filled from the customer's pricing scale, like the editor does.
+    pricing_ctx = _get_pricing_context(shop_db, shop, customer_id)
+    apply_scale_prices(list(labors_map.values()), pricing_ctx["scale"])
+
     # normalize labors list in order
     mechanics_by_id = {m["id"]: m for m in get_assignable_mechanics(shop)}
     labors = []
@@ -2485,7 +2070,8 @@ def create_work_order():
             "parts": parts_clean,
         })
 
-    # ✅ totals from front (we just store)
+    # totals from the front only carry UI choices (taxable toggle, supply override);
+    # the numbers themselves are recomputed by the pricing engine.
     totals = {}
     totals_raw = (request.form.get("totals_json") or "").strip()
     if totals_raw:
@@ -2496,20 +2082,8 @@ def create_work_order():
         except Exception:
             totals = {}
 
-    # Honor an explicit per-WO taxable override coming from the UI; fall back to
-    # the customer's taxable flag when the front-end didn't send one.
-    if isinstance(totals, dict) and "is_taxable" in totals:
-        is_taxable_override = bool(totals.get("is_taxable"))
-    else:
-        is_taxable_override = _is_customer_taxable(shop_db, customer_id)
-
-    totals = align_totals_with_labors(normalize_totals_payload(totals), labors)
-    shop_tax = _get_shop_sales_tax_context(shop, shop_db)
-    totals = _apply_sales_tax_to_totals(
-        totals,
-        shop_tax.get("rate") or 0,
-        is_taxable_override,
-    )
+    # Explicit per-WO taxable toggle from the UI wins over the customer's flag.
+    totals = _price_work_order(labors, pricing_ctx, totals)
     work_order_date = shop_local_date_to_utc(request.form.get("work_order_date"), default_today=True)
 
     now = utcnow()
@@ -2553,8 +2127,8 @@ def create_work_order():
         "status": "in_progress" if (request.form.get("create_status") or "").strip().lower() == "in_progress" else "open",
         "labors": labors,
         "work_order_date": work_order_date,
+        "mileage": normalize_mileage(unit_mileage),
 
-        # ✅ store totals from UI
         "totals": totals,
 
         # ✅ track inventory deductions
@@ -2570,6 +2144,8 @@ def create_work_order():
 
     res = shop_db.work_orders.insert_one(doc)
     new_wo_id = res.inserted_id
+    sync_work_order_history(shop_db, new_wo_id)
+    bump_portal_data_version(shop_db, customer_id)
 
     # ✅ Reassign pending attachments to the real work order ID
     pending_att_id = oid(request.form.get("pending_attachment_id"))
@@ -2616,7 +2192,7 @@ def api_parts_search():
     Returns:
       {"items":[{id, part_number, description, reference, average_cost, in_stock}]}
     """
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         return jsonify({"items": [], "error": "shop_db_missing"}), 200
 
@@ -2820,7 +2396,7 @@ def api_parse_handwritten_work_order():
     """
     from app.utils.wo_parser import parse_work_order
 
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         return jsonify({"ok": False, "error": "Shop database not configured."}), 400
 
@@ -2944,7 +2520,7 @@ def api_parse_handwritten_work_order():
 @login_required
 @permission_required("work_orders.create")
 def api_units_for_customer():
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         return jsonify({"items": [], "error": "shop_db_missing"}), 200
 
@@ -2966,20 +2542,63 @@ def api_units_for_customer():
 @login_required
 @permission_required("work_orders.create")
 def api_parts_pricing_for_customer():
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         return jsonify({"pricing": None, "error": "shop_db_missing"}), 200
 
     customer_id = oid(request.args.get("customer_id")) if request.args.get("customer_id") else None
-    pricing = get_pricing_rules_json(shop_db, shop["_id"], customer_id=customer_id)
+    customer_doc = None
+    if customer_id:
+        customer_doc = shop_db.customers.find_one(
+            {"_id": customer_id},
+            {"pricing_rule_id": 1, "override_part_selling_price": 1},
+        )
+    pricing = snapshot_pricing_rules(get_shop_settings_snapshot(shop_db, shop), customer_doc)
     return jsonify({"pricing": pricing}), 200
 
 
+@work_orders_bp.post("/work_orders/api/totals/preview")
+@login_required
+@permission_required("work_orders.create")
+def api_work_order_totals_preview():
+    """
+    Price an editor state without saving it.
+    Payload: {labors, customer_id, work_order_id?, totals?: {is_taxable, shop_supply_override}}.
+    """
+    shop_db, shop = get_active_shop_db()
+    if shop_db is None:
+        return jsonify({"ok": False, "error": "shop_db_missing"}), 200
+
+    data = request.get_json(silent=True) or {}
+    labors = data.get("labors", data.get("blocks"))
+    if not isinstance(labors, list):
+        return jsonify({"ok": False, "error": "labors_required"}), 200
+
+    wo = None
+    wo_id = oid(data.get("work_order_id"))
+    if wo_id:
+        wo = shop_db.work_orders.find_one(
+            {"_id": wo_id, "shop_id": shop["_id"], "is_active": True},
+            {"totals": 1, "customer_id": 1},
+        )
+    customer_id = oid(data.get("customer_id")) or (wo or {}).get("customer_id")
+
+    pricing_ctx = _get_pricing_context(shop_db, shop, customer_id, wo=wo)
+    apply_scale_prices(labors, pricing_ctx["scale"])
+    labors = [
+        {**b, "parts": normalize_parts_payload(b.get("parts") or [])}
+        for b in labors
+        if isinstance(b, dict)
+    ]
+    totals = _price_work_order(labors, pricing_ctx, data.get("totals"))
+    return jsonify({"ok": True, "totals": totals}), 200
+
+
 @work_orders_bp.get("/work_orders/api/unit")
 @login_required
 @permission_required("work_orders.create")
 def api_unit_details():
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         return jsonify({"ok": False, "item": None, "error": "shop_db_missing"}), 200
 
@@ -3009,7 +2628,7 @@ def api_unit_details():
 @login_required
 @permission_required("work_orders.create")
 def api_work_order_update(work_order_id):
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         return jsonify({"ok": False, "error": "shop_db_missing"}), 200
 
@@ -3024,7 +2643,6 @@ def api_work_order_update(work_order_id):
     data = request.get_json(silent=True) or {}
     labors = data.get("labors", data.get("blocks"))
     raw_totals = data.get("totals") or {}
-    totals = normalize_totals_payload(raw_totals)
     unit_mileage = data.get("unit_mileage")
     work_order_date = shop_local_date_to_utc(data.get("work_order_date"), default_today=True)
 
@@ -3051,32 +2669,15 @@ def api_work_order_update(work_order_id):
     if not isinstance(labors, list):
         return jsonify({"ok": False, "error": "labors_required"}), 200
 
+    # Tax rate and shop-supply % stay locked to what the WO was saved with
+    # (legacy WOs without a stored rate fall back to the current shop rate);
+    # the taxable toggle falls back to the stored flag, then the customer's.
+    pricing_ctx = _get_pricing_context(shop_db, shop, new_customer_id or wo.get("customer_id"), wo=wo)
+    apply_scale_prices(labors, pricing_ctx["scale"])
+
     mechanics_by_id = {m["id"]: m for m in get_assignable_mechanics(shop)}
     labors = apply_assignments_to_labors(labors, mechanics_by_id)
-    totals = align_totals_with_labors(totals, labors)
-
-    # Use the rate that was locked-in when the WO was originally created.
-    # We never re-quote tax for an existing WO if the shop address changed.
-    existing_totals = wo.get("totals") or {}
-    locked_tax_rate = existing_totals.get("sales_tax_rate")
-    if locked_tax_rate is None:
-        # Legacy WOs without a stored rate: fall back to the current shop rate.
-        locked_tax_rate = (_get_shop_sales_tax_context(shop, shop_db).get("rate") or 0)
-
-    # Honor an explicit per-WO taxable override coming from the UI; fall back to
-    # whatever the WO already had stored, then to the customer's flag.
-    if isinstance(raw_totals, dict) and "is_taxable" in raw_totals:
-        is_taxable_override = bool(raw_totals.get("is_taxable"))
-    elif "is_taxable" in existing_totals:
-        is_taxable_override = bool(existing_totals.get("is_taxable"))
-    else:
-        is_taxable_override = _is_customer_taxable(shop_db, wo.get("customer_id"))
-
-    totals = _apply_sales_tax_to_totals(
-        totals,
-        locked_tax_rate,
-        is_taxable_override,
-    )
+    totals = _price_work_order(labors, pricing_ctx, raw_totals)
 
     # (опционально) можно запретить редактирование, если paid
     if (wo.get("status") or "open") == "paid":
@@ -3117,7 +2718,7 @@ def api_work_order_update(work_order_id):
     set_fields = {
         "labors": labors,
         "work_order_date": work_order_date,
-        "totals": totals,  # ✅ сохраняем totals от фронта
+        "totals": totals,
         # ✅ update inventory tracking
         "inventory_adjusted_at": now,
         "inventory_adjustment_count": (wo.get("inventory_adjustment_count", 0) or 0) + len(inventory_adjustment["adjusted"]),
@@ -3128,6 +2729,9 @@ def api_work_order_update(work_order_id):
         set_fields["customer_id"] = new_customer_id
     if new_unit_id:
         set_fields["unit_id"] = new_unit_id
+    # Reading taken with this save; the maintenance history is built from it.
+    if normalize_mileage(unit_mileage) is not None:
+        set_fields["mileage"] = normalize_mileage(unit_mileage)
 
     # ✅ Optional explicit status transition: "open" (completed) or "in_progress"
     save_status = (data.get("save_status") or "").strip().lower()
@@ -3146,6 +2750,8 @@ def api_work_order_update(work_order_id):
             },
         }
     )
+    sync_work_order_history(shop_db, wo_id)
+    bump_portal_data_version(shop_db, wo.get("customer_id"), new_customer_id)
 
     return jsonify({
         "ok": True,
@@ -3169,7 +2775,7 @@ def api_work_order_payment(work_order_id):
     Request body: {amount, payment_method, notes}
     Saves to work_order_payments collection and updates work_order status if fully paid.
     """
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         return jsonify({"ok": False, "error": "shop_db_missing"}), 200
 
@@ -3256,7 +2862,7 @@ def api_get_work_order_payments(work_order_id):
     """
     Get all payments for a work order with balance info.
     """
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         return jsonify({"ok": False, "error": "shop_db_missing"}), 200
 
@@ -3312,7 +2918,7 @@ def api_get_work_order_payments(work_order_id):
 @login_required
 @permission_required("work_orders.create")
 def api_delete_work_order_payment(payment_id):
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         return jsonify({"ok": False, "error": "shop_db_missing"}), 200
 
@@ -3373,7 +2979,7 @@ def api_get_all_payments():
     """
     Get all payments for the current shop.
     """
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         return jsonify({"ok": False, "error": "shop_db_missing"}), 200
 
@@ -3534,7 +3140,7 @@ def api_test_create_sample_payment(work_order_id):
     """
     TEST ENDPOINT: Create a sample payment for testing (remove in production).
     """
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         return jsonify({"ok": False, "error": "shop_db_missing"}), 200
 
@@ -3575,7 +3181,7 @@ def api_test_create_sample_payment(work_order_id):
 @login_required
 @permission_required("work_orders.create")
 def api_work_order_set_status(work_order_id):
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         return jsonify({"ok": False, "error": "shop_db_missing"}), 200
 
@@ -3610,6 +3216,7 @@ def api_work_order_set_status(work_order_id):
             }
         }
     )
+    bump_portal_data_version(shop_db, wo.get("customer_id"))
 
     return jsonify({"ok": True, "status": status}), 200
 
@@ -3620,7 +3227,7 @@ def api_work_order_delete(work_order_id):
     """
     Delete a work order and restore parts to inventory.
     """
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         return jsonify({"ok": False, "error": "shop_db_missing"}), 200
 
@@ -3669,6 +3276,8 @@ def api_work_order_delete(work_order_id):
             }
         }
     )
+    sync_work_order_history(shop_db, wo_id)
+    bump_portal_data_version(shop_db, wo.get("customer_id"))
 
     return jsonify({
         "ok": True,
@@ -3900,7 +3509,7 @@ def _build_wo_pdf_context(shop_db, shop, wo):
 @login_required
 @permission_required("work_orders.view")
 def api_download_work_order_pdf(work_order_id):
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         return jsonify({"ok": False, "error": "Shop not found"}), 404
 
@@ -3935,7 +3544,7 @@ def api_download_work_order_pdf(work_order_id):
 @login_required
 @permission_required("work_orders.create")
 def api_send_work_order_email(work_order_id):
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         return jsonify({"ok": False, "error": "Shop not found"}), 404
 
@@ -4013,7 +3622,7 @@ def api_send_work_order_email(work_order_id):
 @login_required
 @permission_required("work_orders.create")
 def api_send_payment_receipt(payment_id):
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         return jsonify({"ok": False, "error": "Shop not found"}), 404
 
@@ -4195,7 +3804,7 @@ def _build_authorization_context(shop_db, shop, wo, scope: str, labor_index):
 @login_required
 @permission_required("work_orders.create")
 def api_send_authorization_email(work_order_id):
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         return jsonify({"ok": False, "error": "Shop not found"}), 404
 
@@ -4367,7 +3976,7 @@ def api_polish_issue_description():
 @login_required
 @permission_required("work_orders.create")
 def api_save_labor_issue_description(work_order_id, labor_index):
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         return jsonify({"ok": False, "error": "Shop not found"}), 404
 
@@ -4519,6 +4128,7 @@ def public_authorization_submit(token):
         {"_id": wo["_id"]},
         {"$push": {"authorizations": record}},
     )
+    bump_portal_data_version(shop_db, wo.get("customer_id"))
 
     auth_doc = auth_col.find_one({"_id": auth_doc["_id"]}) or auth_doc
     ctx = _build_authorization_context(shop_db, shop, wo, scope, labor_index)
@@ -4539,24 +4149,18 @@ def public_authorization_submit(token):
 @login_required
 @permission_required("work_orders.create")
 def api_presets_list():
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         return jsonify([]), 200
 
-    rows = list(
-        shop_db.wo_presets.find(
-            {"shop_id": shop["_id"], "is_active": True},
-            {"name": 1},
-        ).sort([("name", 1)])
-    )
-    return jsonify([{"id": str(r["_id"]), "name": r.get("name") or ""} for r in rows]), 200
+    return jsonify(get_shop_settings_snapshot(shop_db, shop)["presets"]), 200
 
 
 @work_orders_bp.get("/work_orders/api/presets/<preset_id>")
 @login_required
 @permission_required("work_orders.create")
 def api_preset_detail(preset_id):
-    shop_db, shop = get_shop_db()
+    shop_db, shop = get_active_shop_db()
     if shop_db is None:
         return jsonify({"error": "no_shop"}), 400
 
@@ -4564,66 +4168,8 @@ def api_preset_detail(preset_id):
     if not pid:
         return jsonify({"error": "bad_id"}), 400
 
-    doc = shop_db.wo_presets.find_one({"_id": pid, "shop_id": shop["_id"], "is_active": True})
+    doc, resolved = get_resolved_preset(shop_db, shop["_id"], pid)
     if not doc:
         return jsonify({"error": "not_found"}), 404
 
-    # Enrich parts with current core/misc data from the parts collection
-    raw_parts = doc.get("parts") or []
-    part_ids = []
-    for p in raw_parts:
-        pid_str = p.get("part_id")
-        if pid_str:
-            o = oid(pid_str)
-            if o:
-                part_ids.append(o)
-
-    parts_lookup = {}
-    if part_ids:
-        for pdoc in shop_db.parts.find(
-            {"_id": {"$in": part_ids}, "is_active": True},
-            {
-                "_id": 1,
-                "average_cost": 1,
-                "core_has_charge": 1,
-                "core_cost": 1,
-                "misc_has_charge": 1,
-                "misc_charges": 1,
-                "has_selling_price": 1,
-                "selling_price": 1,
-            },
-        ):
-            parts_lookup[str(pdoc["_id"])] = pdoc
-
-    enriched_parts = []
-    for p in raw_parts:
-        ep = dict(p)
-        pid_str = p.get("part_id")
-        if pid_str and pid_str in parts_lookup:
-            live = parts_lookup[pid_str]
-            ep["core_has_charge"] = bool(live.get("core_has_charge"))
-            ep["core_cost"] = float(live.get("core_cost") or 0)
-            misc_items = []
-            for m in (live.get("misc_charges") or []):
-                if isinstance(m, dict):
-                    misc_items.append({
-                        "description": str(m.get("description") or "").strip(),
-                        "price": float(m.get("price") or 0),
-                        "taxable": m.get("taxable", True),
-                    })
-            ep["misc_has_charge"] = bool(live.get("misc_has_charge"))
-            ep["misc_charges"] = misc_items
-            # Update cost to current average
-            if live.get("average_cost") is not None:
-                ep["cost"] = float(live["average_cost"])
-        enriched_parts.append(ep)
-
-    return jsonify({
-        "id": str(doc["_id"]),
-        "name": doc.get("name") or "",
-        "description": doc.get("description") or "",
-        "labor_hours": doc.get("labor_hours"),
-        "labor_rate_code": doc.get("labor_rate_code"),
-        "allow_discount": bool(doc.get("allow_discount")),
-        "parts": enriched_parts,
-    }), 200
\ No newline at end of file
+    return jsonify(preset_payload(doc, resolved)), 200
\ No newline at end of file
@@ -0,0 +1,242 @@
+"""Per-shop reference-data snapshot for the work-order editor.
+
+Everything `render_details` needs that only changes through settings
+(mechanics, labor rates, pricing scales, shop supply %, core default,
+sales tax, preset names) is built once per shop and stored in
+`master_db.shop_settings_snapshots`:
+
+    {"_id": <shop_id>, "tenant_id", "version": int,
+     "snapshot": {...} | None, "built_version": int, "built_at"}
+
+Settings routes call `invalidate_shop_settings_snapshot` (bumps `version`,
+drops `snapshot`); the next reader rebuilds it. Each worker also keeps the
+last snapshot in memory for SNAPSHOT_LOCAL_TTL seconds so a burst of editor
+opens costs one primary-key read.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+from app.extensions import get_master_db
+from app.utils.cache import MISSING, TTLCache
+from app.utils.tenant_context import as_object_id
+
+
+SNAPSHOTS_COLLECTION = "shop_settings_snapshots"
+
+# In-process copy is trusted this long without re-reading the shared doc.
+SNAPSHOT_LOCAL_TTL = 5.0
+# Sales tax also changes via the ZIP rate sync, so rebuild periodically anyway.
+SNAPSHOT_MAX_AGE = timedelta(minutes=15)
+
+# The shared doc carries the version, so the local tier skips stamp checks.
+_local_cache = TTLCache("shop_settings_snapshot", maxsize=512, ttl=SNAPSHOT_LOCAL_TTL, versioned=False)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_aware(dt):
+    if isinstance(dt, datetime) and dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def _snapshots_col():
+    return get_master_db()[SNAPSHOTS_COLLECTION]
+
+
+def _pricing_rule_to_json(doc: dict) -> dict:
+    mode = (doc.get("mode") or "margin").strip().lower()  # margin | markup
+    rules = []
+    for r in (doc.get("rules") or []):
+        try:
+            frm_f = float(r.get("from"))
+        except Exception:
+            continue
+
+        to = r.get("to")
+        if to is None:
+            to_f = None
+        else:
+            try:
+                to_f = float(to)
+            except Exception:
+                to_f = None
+
+        try:
+            vp_f = float(r.get("value_percent"))
+        except Exception:
+            continue
+
+        rules.append({"from": frm_f, "to": to_f, "value_percent": vp_f})
+    return {"mode": mode, "rules": rules}
+
+
+def _default_pricing_rule(rows: list[dict]) -> dict | None:
+    # Same fallback order as the old find_one chain (natural order within each tier).
+    for predicate in (
+        lambda d: d.get("is_default") is True and d.get("is_active") is True,
+        lambda d: d.get("is_default") is True,
+        lambda d: d.get("is_active") is True,
+        lambda d: True,
+    ):
+        for d in rows:
+            if predicate(d):
+                return d
+    return None
+
+
+def _shop_supply_percentage(shop_db, shop_id: ObjectId) -> float:
+    # Read-only: a missing rule means the default 5% (the settings page creates it).
+    doc = shop_db.shop_supply_amount_rules.find_one({"shop_id": shop_id}, {"shop_supply_procentage": 1})
+    if not doc:
+        return 5.0
+    try:
+        raw = doc.get("shop_supply_procentage")
+        return float(raw) if raw is not None else 0.0
+    except Exception:
+        return 0.0
+
+
+def build_shop_settings_snapshot(shop_db, shop: dict) -> dict:
+    from app.blueprints.work_orders.routes import (
+        _get_shop_sales_tax_context,
+        get_assignable_mechanics,
+        get_core_charge_default,
+    )
+
+    shop_id = shop["_id"]
+
+    labor_rates = []
+    labor_rate_codes = {}
+    rate_rows = shop_db.labor_rates.find(
+        {"is_active": True},
+        {"shop_id": 1, "code": 1, "name": 1, "hourly_rate": 1},
+    )
+    for r in rate_rows:
+        code = str(r.get("code") or "").strip()
+        labor_rate_codes[str(r["_id"])] = code
+        if r.get("shop_id") == shop_id:
+            labor_rates.append({
+                "code": r.get("code") or "",
+                "name": r.get("name") or (r.get("code") or ""),
+                "hourly_rate": float(r.get("hourly_rate") or 0),
+            })
+    labor_rates.sort(key=lambda x: x["name"])
+
+    pricing_rows = list(shop_db.parts_pricing_rules.find({"shop_id": shop_id}))
+    default_rule = _default_pricing_rule(pricing_rows)
+
+    return {
+        "mechanics": get_assignable_mechanics(shop),
+        "labor_rates": labor_rates,
+        "labor_rate_codes": labor_rate_codes,
+        "pricing_rules": {str(d["_id"]): _pricing_rule_to_json(d) for d in pricing_rows},
+        "default_pricing_rule_id": str(default_rule["_id"]) if default_rule else None,
+        "shop_supply_procentage": _shop_supply_percentage(shop_db, shop_id),
+        "charge_for_cores_default": get_core_charge_default(shop_db, shop_id),
+        "sales_tax_context": _get_shop_sales_tax_context(shop, shop_db),
+        "presets": [
+            {"id": str(r["_id"]), "name": r.get("name") or ""}
+            for r in shop_db.wo_presets.find(
+                {"shop_id": shop_id, "is_active": True},
+                {"name": 1},
+            ).sort([("name", 1)])
+        ],
+    }
+
+
+def get_shop_settings_snapshot(shop_db, shop: dict) -> dict:
+    """Cached snapshot for `shop`; rebuilds when invalidated or older than SNAPSHOT_MAX_AGE."""
+    shop_id = shop["_id"]
+    key = str(shop_id)
+
+    cached = _local_cache.get(key)
+    if cached is not MISSING:
+        return cached
+
+    col = _snapshots_col()
+    doc = col.find_one({"_id": shop_id}) or {}
+    version = int(doc.get("version") or 0)
+    built_at = _as_aware(doc.get("built_at"))
+    snapshot = doc.get("snapshot")
+    fresh = (
+        isinstance(snapshot, dict)
+        and int(doc.get("built_version") or 0) == version
+        and isinstance(built_at, datetime)
+        and _utcnow() - built_at < SNAPSHOT_MAX_AGE
+    )
+
+    if not fresh:
+        snapshot = build_shop_settings_snapshot(shop_db, shop)
+        # Only store if nobody invalidated while we were building.
+        col.update_one(
+            {"_id": shop_id, "version": version} if doc else {"_id": shop_id},
+            {
+                "$set": {
+                    "tenant_id": shop.get("tenant_id"),
+                    "snapshot": snapshot,
+                    "built_version": version,
+                    "built_at": _utcnow(),
+                },
+                "$setOnInsert": {"version": version},
+            },
+            upsert=not doc,
+        )
+
+    _local_cache.set(key, snapshot)
+    return snapshot
+
+
+def _drop_local(shop_ids) -> None:
+    for sid in shop_ids:
+        _local_cache.discard(str(sid))
+
+
+def invalidate_shop_settings_snapshot(shop_id) -> None:
+    if not shop_id:
+        return
+    _snapshots_col().update_one(
+        {"_id": shop_id},
+        {"$inc": {"version": 1}, "$unset": {"snapshot": ""}},
+        upsert=True,
+    )
+    _drop_local([shop_id])
+
+
+def invalidate_tenant_settings_snapshots(tenant_id) -> None:
+    """For changes that touch every shop of a tenant (users / roles)."""
+    tenant_id = as_object_id(tenant_id)
+    if tenant_id is None:
+        return
+    col = _snapshots_col()
+    shop_ids = [d["_id"] for d in col.find({"tenant_id": tenant_id}, {"_id": 1})]
+    if not shop_ids:
+        return
+    col.update_many(
+        {"_id": {"$in": shop_ids}},
+        {"$inc": {"version": 1}, "$unset": {"snapshot": ""}},
+    )
+    _drop_local(shop_ids)
+
+
+def snapshot_pricing_rules(snapshot: dict, customer_doc: dict | None) -> dict | None:
+    """Equivalent of get_pricing_rules_json() resolved from the snapshot."""
+    rules_by_id = snapshot.get("pricing_rules") or {}
+    rule = None
+    customer_rule_id = (customer_doc or {}).get("pricing_rule_id")
+    if isinstance(customer_rule_id, ObjectId):
+        rule = rules_by_id.get(str(customer_rule_id))
+    if not rule:
+        rule = rules_by_id.get(snapshot.get("default_pricing_rule_id") or "")
+    if not rule:
+        return None
+    return {
+        "mode": rule.get("mode") or "margin",
+        "rules": list(rule.get("rules") or []),
+        "override_part_selling_price": bool((customer_doc or {}).get("override_part_selling_price", False)),
+    }
@@ -0,0 +1,440 @@
+"""Work-order money helpers shared by the routes, the pricing engine and the maintenance history.
+
+Scalar parsing (`oid`, `i32`, `f64`, `round2`, `as_bool`), the part / totals
+payload normalizers, the stored `totals` shape (`align_totals_with_labors`),
+sales tax on top of it and the grand total of a saved work order. Kept out
+of routes.py so `pricing` and `maintenance_history` can import them at
+module level.
+"""
+from __future__ import annotations
+
+import json
+
+from bson import ObjectId
+
+
+def oid(v):
+    if not v:
+        return None
+    try:
+        return ObjectId(str(v))
+    except Exception:
+        return None
+
+
+def i32(v):
+    if v is None:
+        return None
+    s = str(v).strip()
+    if not s:
+        return None
+    try:
+        return int(s)
+    except Exception:
+        return None
+
+
+def f64(v):
+    if v is None:
+        return None
+    try:
+        return float(v)
+    except Exception:
+        return None
+
+
+def round2(v):
+    n = f64(v)
+    if n is None:
+        return 0.0
+    return round(n + 1e-12, 2)
+
+
+def as_bool(v) -> bool:
+    if isinstance(v, bool):
+        return v
+    if isinstance(v, (int, float)):
+        return v != 0
+    if v is None:
+        return False
+    raw = str(v).strip().lower()
+    return raw in ("1", "true", "yes", "on")
+
+
+def _work_order_grand_total(wo: dict) -> float:
+    totals_doc = wo.get("totals") if isinstance(wo.get("totals"), dict) else {}
+    return round2(
+        totals_doc.get("grand_total")
+        if totals_doc.get("grand_total") is not None
+        else wo.get("grand_total") or 0
+    )
+
+
+def _work_order_tax_total(wo: dict) -> float:
+    totals_doc = wo.get("totals") if isinstance(wo.get("totals"), dict) else {}
+    return round2(
+        totals_doc.get("sales_tax_total")
+        if totals_doc.get("sales_tax_total") is not None
+        else wo.get("sales_tax_total") or 0
+    )
+
+
+def _apply_sales_tax_to_totals(totals: dict, tax_rate: float, is_taxable: bool) -> dict:
+    src = normalize_totals_payload(totals or {})
+
+    parts_only = round2(src.get("parts") if src.get("parts") is not None else src.get("parts_total"))
+    misc_taxable_total = round2(src.get("misc_taxable_total") or 0)
+    parts_taxable_total = round2(parts_only + misc_taxable_total)
+    safe_tax_rate = 0.0
+    try:
+        safe_tax_rate = max(0.0, float(tax_rate or 0))
+    except Exception:
+        safe_tax_rate = 0.0
+
+    sales_tax_total = round2(parts_taxable_total * safe_tax_rate) if is_taxable else 0.0
+    grand_total = round2(
+        round2(src.get("labor_total"))
+        + round2(src.get("parts_total"))
+        + sales_tax_total
+    )
+
+    src["parts_taxable_total"] = parts_taxable_total
+    src["sales_tax_rate"] = round(safe_tax_rate + 1e-12, 6)
+    src["sales_tax_total"] = sales_tax_total
+    src["is_taxable"] = bool(is_taxable)
+    src["grand_total"] = grand_total
+    return src
+
+
+def normalize_parts_payload(raw_parts):
+    if not isinstance(raw_parts, list):
+        return []
+
+    out = []
+    for p in raw_parts:
+        if not isinstance(p, dict):
+            continue
+
+        part_number = str(p.get("part_number") or "").strip()
+        part_id = oid(p.get("part_id"))
+        one_time_part = as_bool(p.get("one_time_part"))
+        description = str(p.get("description") or "").strip()
+        misc_charge_description = str(
+            p.get("misc_charge_description") if p.get("misc_charge_description") is not None else ""
+        ).strip()
+
+        qty_raw = i32(p.get("qty"))
+        cost_raw = f64(p.get("cost"))
+        price_raw = f64(p.get("price"))
+        core_raw = f64(
+            p.get("core_charge") if p.get("core_charge") is not None else p.get("core_cost")
+        )
+        misc_raw = f64(p.get("misc_charge"))
+
+        has_any = bool(part_number or description or misc_charge_description)
+        if qty_raw is not None and qty_raw > 0:
+            has_any = True
+        if cost_raw is not None and cost_raw > 0:
+            has_any = True
+        if price_raw is not None and price_raw > 0:
+            has_any = True
+        if core_raw is not None and core_raw > 0:
+            has_any = True
+        if misc_raw is not None and misc_raw > 0:
+            has_any = True
+
+        if not has_any:
+            continue
+
+        item = {
+            "part_number": part_number,
+            "description": description,
+            "one_time_part": one_time_part,
+            "qty": int(qty_raw if qty_raw is not None else 0),
+            "cost": round2(cost_raw if cost_raw is not None else 0),
+            "price": round2(price_raw if price_raw is not None else 0),
+            "core_charge": round2(core_raw if core_raw is not None else 0),
+            "misc_charge": round2(misc_raw if misc_raw is not None else 0),
+            "misc_charge_description": misc_charge_description,
+        }
+        if part_id:
+            item["part_id"] = part_id
+
+        out.append(item)
+
+    return out
+
+
+def normalize_totals_payload(raw):
+    src = raw if isinstance(raw, dict) else {}
+
+    blocks = []
+    for b in (src.get("labors") or []):
+        if not isinstance(b, dict):
+            continue
+        labor = round2(b.get("labor") if b.get("labor") is not None else b.get("labor_total"))
+        parts = round2(b.get("parts") if b.get("parts") is not None else b.get("parts_total"))
+        core_total = round2(b.get("core_total"))
+        misc_total = round2(b.get("misc_total"))
+        shop_supply_total = round2(b.get("shop_supply_total"))
+        cost_total = round2(b.get("cost_total") if b.get("cost_total") is not None else parts)
+        labor_total = round2(labor + shop_supply_total)
+        parts_total = round2(parts + core_total + misc_total)
+        labor_full_total = round2(
+            b.get("labor_full_total")
+            if b.get("labor_full_total") is not None
+            else (labor + parts_total + shop_supply_total)
+        )
+        blocks.append(
+            {
+                "labor": labor,
+                "labor_total": labor_total,
+                "parts": parts,
+                "parts_total": parts_total,
+                "core_total": core_total,
+                "misc_total": misc_total,
+                "cost_total": cost_total,
+                "shop_supply_total": shop_supply_total,
+                "labor_full_total": labor_full_total,
+            }
+        )
+
+    labor = round2(src.get("labor") if src.get("labor") is not None else src.get("labor_total"))
+    parts = round2(src.get("parts") if src.get("parts") is not None else src.get("parts_total"))
+    core_total = round2(src.get("core_total"))
+    misc_total = round2(src.get("misc_total"))
+    shop_supply_total = round2(src.get("shop_supply_total"))
+    cost_total = round2(src.get("cost_total") if src.get("cost_total") is not None else parts)
+    parts_taxable_total = round2(src.get("parts_taxable_total") if src.get("parts_taxable_total") is not None else parts)
+    misc_taxable_total = round2(src.get("misc_taxable_total") or 0)
+    sales_tax_rate = round(float(src.get("sales_tax_rate") or 0) + 1e-12, 6)
+    sales_tax_total = round2(src.get("sales_tax_total"))
+    is_taxable = bool(src.get("is_taxable", False))
+
+    labor_total = round2(labor + shop_supply_total)
+    parts_total = round2(parts + core_total + misc_total)
+    calculated_grand_total = round2(labor_total + parts_total)
+    grand_total = round2(
+        src.get("grand_total")
+        if src.get("grand_total") is not None
+        else round2(calculated_grand_total + sales_tax_total)
+    )
+
+    return {
+        "labor": labor,
+        "labor_total": labor_total,
+        "parts": parts,
+        "parts_total": parts_total,
+        "core_total": core_total,
+        "misc_total": misc_total,
+        "misc_taxable_total": misc_taxable_total,
+        "cost_total": cost_total,
+        "shop_supply_total": shop_supply_total,
+        "parts_taxable_total": parts_taxable_total,
+        "sales_tax_rate": sales_tax_rate,
+        "sales_tax_total": sales_tax_total,
+        "is_taxable": is_taxable,
+        "grand_total": grand_total,
+        "labors": blocks,
+    }
+
+
+def _parse_misc_items(raw):
+    value = str(raw or "").strip()
+    if not value:
+        return []
+    try:
+        parsed = json.loads(value)
+    except Exception:
+        return []
+    if not isinstance(parsed, list):
+        return []
+
+    out = []
+    for item in parsed:
+        if not isinstance(item, dict):
+            continue
+        out.append(
+            {
+                "description": str(item.get("description") or "").strip(),
+                "quantity": f64(item.get("quantity") if item.get("quantity") is not None else 1) or 0,
+                "price": f64(item.get("price")),
+                "manual": item.get("manual") is True,
+                "taxable": item.get("taxable") is not False,
+            }
+        )
+    return out
+
+
+def _calc_misc_total_from_parts(parts: list) -> tuple:
+    """Returns (misc_total, misc_taxable_total)."""
+    if not isinstance(parts, list) or not parts:
+        return 0.0, 0.0
+
+    first_row_items = _parse_misc_items((parts[0] or {}).get("misc_charge_description"))
+    if first_row_items:
+        total = 0.0
+        taxable_total = 0.0
+        for item in first_row_items:
+            price = f64(item.get("price"))
+            qty = f64(item.get("quantity") if item.get("quantity") is not None else 0)
+            if not price or price <= 0 or not qty or qty <= 0:
+                continue
+            amount = round2(price * qty)
+            total += amount
+            if item.get("taxable") is not False:
+                taxable_total += amount
+        return round2(total), round2(taxable_total)
+
+    # Backward compatibility for older rows where misc was stored per-part row.
+    total = 0.0
+    taxable_total = 0.0
+    for part in parts:
+        if not isinstance(part, dict):
+            continue
+        part_qty = i32(part.get("qty")) or 0
+
+        row_items = _parse_misc_items(part.get("misc_charge_description"))
+        if row_items:
+            for item in row_items:
+                price = f64(item.get("price"))
+                if not price or price <= 0:
+                    continue
+                if item.get("manual"):
+                    qty = f64(item.get("quantity") if item.get("quantity") is not None else 0) or 0
+                else:
+                    qty = part_qty
+                if qty <= 0:
+                    continue
+                amount = round2(price * qty)
+                total += amount
+                if item.get("taxable") is not False:
+                    taxable_total += amount
+            continue
+
+        misc_charge = f64(part.get("misc_charge")) or 0
+        if misc_charge > 0 and part_qty > 0:
+            amount = round2(misc_charge * part_qty)
+            total += amount
+            taxable_total += amount  # legacy items default to taxable
+
+    return round2(total), round2(taxable_total)
+
+
+def align_totals_with_labors(totals: dict, labors: list) -> dict:
+    src = normalize_totals_payload(totals or {})
+    blocks_src = src.get("labors") if isinstance(src.get("labors"), list) else []
+
+    out_blocks = []
+    parts_base_sum = 0.0
+    core_sum = 0.0
+    misc_sum = 0.0
+    misc_taxable_sum = 0.0
+
+    normalized_labors = labors if isinstance(labors, list) else []
+
+    for idx, block in enumerate(normalized_labors):
+        block_src = blocks_src[idx] if idx < len(blocks_src) and isinstance(blocks_src[idx], dict) else {}
+        parts = normalize_parts_payload((block or {}).get("parts") or [])
+
+        parts_base = 0.0
+        core_total = 0.0
+        for part in parts:
+            qty = i32(part.get("qty")) or 0
+            if qty <= 0:
+                continue
+            price = round2(part.get("price") if part.get("price") is not None else 0)
+            core_charge = round2(part.get("core_charge") if part.get("core_charge") is not None else 0)
+            parts_base += round2(price * qty)
+            core_total += round2(core_charge * qty)
+
+        misc_total, misc_taxable_block = _calc_misc_total_from_parts(parts)
+        misc_taxable_block = round2(misc_taxable_block)
+
+        labor_base = round2(
+            block_src.get("labor") if block_src.get("labor") is not None else block_src.get("labor_total")
+        )
+        shop_supply_total = round2(block_src.get("shop_supply_total"))
+        labor_total = round2(labor_base + shop_supply_total)
+        parts_total = round2(parts_base + core_total + misc_total)
+
+        out_blocks.append(
+            {
+                "labor": labor_base,
+                "labor_total": labor_total,
+                "parts": round2(parts_base),
+                "parts_total": parts_total,
+                "core_total": round2(core_total),
+                "misc_total": round2(misc_total),
+                "misc_taxable_total": misc_taxable_block,
+                "cost_total": round2(parts_base),
+                "shop_supply_total": shop_supply_total,
+                "labor_full_total": round2(labor_total + parts_total),
+            }
+        )
+
+        parts_base_sum += parts_base
+        core_sum += core_total
+        misc_sum += misc_total
+        misc_taxable_sum += misc_taxable_block
+
+    labor_base_sum = round2(sum(round2(b.get("labor") or 0) for b in out_blocks))
+    shop_supply_from_blocks = round2(sum(round2(b.get("shop_supply_total") or 0) for b in out_blocks))
+    requested_shop_supply = round2(src.get("shop_supply_total"))
+    shop_supply_sum = requested_shop_supply if requested_shop_supply > 0 else shop_supply_from_blocks
+
+    if out_blocks:
+        if shop_supply_sum > 0 and labor_base_sum > 0:
+            allocated = 0.0
+            for idx, block in enumerate(out_blocks):
+                labor_base = round2(block.get("labor") or 0)
+                if idx == len(out_blocks) - 1:
+                    block_supply = round2(shop_supply_sum - allocated)
+                else:
+                    block_supply = round2(shop_supply_sum * (labor_base / labor_base_sum))
+                    allocated = round2(allocated + block_supply)
+
+                block["shop_supply_total"] = block_supply
+                block["labor_total"] = round2(labor_base + block_supply)
+                block["labor_full_total"] = round2(block["labor_total"] + round2(block.get("parts_total") or 0))
+        else:
+            for block in out_blocks:
+                labor_base = round2(block.get("labor") or 0)
+                block["shop_supply_total"] = 0.0
+                block["labor_total"] = round2(labor_base)
+                block["labor_full_total"] = round2(block["labor_total"] + round2(block.get("parts_total") or 0))
+
+    shop_supply_sum = round2(sum(round2(b.get("shop_supply_total") or 0) for b in out_blocks)) if out_blocks else shop_supply_sum
+    labor_total_sum = round2(labor_base_sum + shop_supply_sum)
+    parts_base_sum = round2(parts_base_sum)
+    core_sum = round2(core_sum)
+    misc_sum = round2(misc_sum)
+    misc_taxable_sum = round2(misc_taxable_sum)
+    parts_total_sum = round2(parts_base_sum + core_sum + misc_sum)
+    sales_tax_rate = round(float(src.get("sales_tax_rate") or 0) + 1e-12, 6)
+    sales_tax_total = round2(src.get("sales_tax_total"))
+    is_taxable = bool(src.get("is_taxable", False))
+    misc_taxable_total = round2(
+        src.get("misc_taxable_total") if src.get("misc_taxable_total") is not None else misc_taxable_sum
+    )
+    parts_taxable_total = round2(
+        src.get("parts_taxable_total") if src.get("parts_taxable_total") is not None else round2(parts_base_sum + misc_taxable_total)
+    )
+
+    return {
+        "labor": labor_base_sum,
+        "labor_total": labor_total_sum,
+        "parts": parts_base_sum,
+        "parts_total": parts_total_sum,
+        "core_total": core_sum,
+        "misc_total": misc_sum,
+        "misc_taxable_total": misc_taxable_total,
+        "cost_total": parts_base_sum,
+        "shop_supply_total": shop_supply_sum,
+        "parts_taxable_total": parts_taxable_total,
+        "sales_tax_rate": sales_tax_rate,
+        "sales_tax_total": sales_tax_total,
+        "is_taxable": is_taxable,
+        "grand_total": round2(labor_total_sum + parts_total_sum + sales_tax_total),
+        "labors": out_blocks,
+    }
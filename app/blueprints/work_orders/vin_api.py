@@ -1,22 +1,58 @@
+"""VIN decode API.
+
+Lookup order: `master_db.vin_decode_cache` (vPIC results, long TTL), then the
+bundled WMI tables in `vin_decoder`. vPIC is only called on a cache miss: in
+the background when the local decode already answered, synchronously (short
+timeout) when it couldn't.
+
+    vin_decode_cache: {"_id": <vin>, "ok": bool, "make", "model", "year",
+                       "type", "error", "message", "fetched_at", "expire_at"}
+"""
 from __future__ import annotations
 
 import json
 import urllib.parse
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from threading import Lock
 
-from flask import request, jsonify
+from flask import current_app, request, jsonify
 
 from app.blueprints.work_orders import work_orders_bp
+from app.blueprints.work_orders.vin_decoder import decode_vin_locally
+from app.extensions import get_master_db
 from app.utils.auth import login_required
 from app.utils.permissions import permission_required
 
 
-def _fetch_vpic(vin: str) -> dict:
+VIN_CACHE_COLLECTION = "vin_decode_cache"
+# A VIN's decode never changes; the TTL only bounds stale vPIC corrections.
+VIN_CACHE_TTL = timedelta(days=365)
+# Upstream "invalid VIN" answers are cached briefly so retyping doesn't re-hit vPIC.
+VIN_NEGATIVE_CACHE_TTL = timedelta(days=1)
+VPIC_SYNC_TIMEOUT = 4
+VPIC_BACKGROUND_TIMEOUT = 15
+
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="vin-refresh")
+_refresh_inflight: set[str] = set()
+_refresh_lock = Lock()
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _cache_col():
+    return get_master_db()[VIN_CACHE_COLLECTION]
+
+
+def _fetch_vpic(vin: str, timeout: float = VPIC_BACKGROUND_TIMEOUT) -> dict:
     url = (
         "https://vpic.nhtsa.dot.gov/api/vehicles/DecodeVinValuesExtended/"
         f"{urllib.parse.quote(vin)}?format=json"
     )
-    with urllib.request.urlopen(url, timeout=10) as resp:
+    with urllib.request.urlopen(url, timeout=timeout) as resp:
         raw = resp.read().decode("utf-8")
     return json.loads(raw)
 
@@ -32,6 +68,102 @@ def _extract_value(row: dict, keys: list[str]) -> str:
     return ""
 
 
+def _decode_vpic_payload(vin: str, payload) -> dict:
+    """vPIC response -> cache doc fields (`ok` False for upstream rejections)."""
+    results = payload.get("Results") if isinstance(payload, dict) else None
+    if not results or not isinstance(results, list):
+        return {"ok": False, "error": "vin_no_results", "message": "No results found for this VIN"}
+
+    row = results[0]
+
+    # Check if VIN was actually found (VPIC returns empty values if VIN is invalid)
+    error_code = row.get("ErrorCode")
+    if error_code and str(error_code) != "0":
+        return {"ok": False, "error": "vin_invalid", "message": row.get("ErrorText", "Invalid VIN number")}
+
+    return {
+        "ok": True,
+        "make": _extract_value(row, ["Make"]),
+        "model": _extract_value(row, ["Model"]),
+        "year": _extract_value(row, ["ModelYear", "Model Year", "Year"]),
+        "type": _extract_value(row, ["VehicleType", "Vehicle Type"]),
+    }
+
+
+def _store_decode(vin: str, decoded: dict) -> None:
+    now = _utcnow()
+    ttl = VIN_CACHE_TTL if decoded.get("ok") else VIN_NEGATIVE_CACHE_TTL
+    _cache_col().update_one(
+        {"_id": vin},
+        {"$set": {**decoded, "fetched_at": now, "expire_at": now + ttl}},
+        upsert=True,
+    )
+
+
+def _lookup_vpic(vin: str, timeout: float) -> dict:
+    """Call vPIC and cache the answer. Raises on network errors (nothing cached)."""
+    decoded = _decode_vpic_payload(vin, _fetch_vpic(vin, timeout=timeout))
+    _store_decode(vin, decoded)
+    return decoded
+
+
+def _schedule_vpic_refresh(vin: str) -> None:
+    with _refresh_lock:
+        if vin in _refresh_inflight:
+            return
+        _refresh_inflight.add(vin)
+    app = current_app._get_current_object()
+
+    def _run():
+        try:
+            with app.app_context():
+                _lookup_vpic(vin, VPIC_BACKGROUND_TIMEOUT)
+        except Exception as e:
+            app.logger.warning("[VIN API] Background vPIC lookup failed for %s: %s", vin, e)
+        finally:
+            with _refresh_lock:
+                _refresh_inflight.discard(vin)
+
+    _refresh_executor.submit(_run)
+
+
+def _get_cached_decode(vin: str) -> dict | None:
+    try:
+        doc = _cache_col().find_one({"_id": vin})
+    except Exception:
+        return None
+    if not doc:
+        return None
+    # The TTL monitor runs once a minute; don't serve entries it hasn't reaped yet.
+    expire_at = doc.get("expire_at")
+    if isinstance(expire_at, datetime):
+        if expire_at.tzinfo is None:
+            expire_at = expire_at.replace(tzinfo=timezone.utc)
+        if expire_at <= _utcnow():
+            return None
+    return doc
+
+
+def _decode_response(vin: str, decoded: dict, source: str):
+    if not decoded.get("ok"):
+        return jsonify({
+            "ok": False,
+            "error": decoded.get("error") or "vin_invalid",
+            "message": decoded.get("message") or "Invalid VIN number",
+        }), 200
+    return jsonify(
+        {
+            "ok": True,
+            "vin": vin,
+            "make": decoded.get("make") or "",
+            "model": decoded.get("model") or "",
+            "year": decoded.get("year") or "",
+            "type": decoded.get("type") or "",
+            "source": source,
+        }
+    ), 200
+
+
 @work_orders_bp.get("/work_orders/api/vin")
 @login_required
 @permission_required("work_orders.create")
@@ -47,40 +179,20 @@ def api_decode_vin():
     if any(c in vin for c in ['I', 'O', 'Q']):
         return jsonify({"ok": False, "error": "vin_invalid_chars", "message": "VIN cannot contain I, O, or Q"}), 200
 
+    cached = _get_cached_decode(vin)
+    if cached is not None:
+        return _decode_response(vin, cached, "cache")
+
+    local = decode_vin_locally(vin)
+    if local is not None:
+        # Known WMI: answer now, let vPIC fill in the model for next time.
+        _schedule_vpic_refresh(vin)
+        return _decode_response(vin, {**local, "ok": True}, "local")
+
     try:
-        payload = _fetch_vpic(vin)
+        decoded = _lookup_vpic(vin, VPIC_SYNC_TIMEOUT)
     except Exception as e:
-        print(f"[VIN API] Error fetching from VPIC: {e}")
+        current_app.logger.warning("[VIN API] Error fetching from VPIC: %s", e)
         return jsonify({"ok": False, "error": "vin_lookup_failed", "message": "Failed to connect to VIN lookup service"}), 200
 
-    results = payload.get("Results") if isinstance(payload, dict) else None
-    if not results or not isinstance(results, list):
-        return jsonify({"ok": False, "error": "vin_no_results", "message": "No results found for this VIN"}), 200
-
-    row = results[0] if results else {}
-    
-    # Check if VIN was actually found (VPIC returns empty values if VIN is invalid)
-    error_code = row.get("ErrorCode")
-    if error_code and str(error_code) != "0":
-        error_text = row.get("ErrorText", "Invalid VIN number")
-        print(f"[VIN API] VPIC error for {vin}: {error_text}")
-        return jsonify({"ok": False, "error": "vin_invalid", "message": error_text}), 200
-    
-    make = _extract_value(row, ["Make"])
-    model = _extract_value(row, ["Model"])
-    year = _extract_value(row, ["ModelYear", "Model Year", "Year"])
-    vehicle_type = _extract_value(row, ["VehicleType", "Vehicle Type"])
-
-    # Log successful lookup
-    print(f"[VIN API] Successfully decoded {vin}: {year} {make} {model}")
-
-    return jsonify(
-        {
-            "ok": True,
-            "vin": vin,
-            "make": make,
-            "model": model,
-            "year": year,
-            "type": vehicle_type,
-        }
-    ), 200
+    return _decode_response(vin, decoded, "vpic")
@@ -0,0 +1,162 @@
+"""Offline VIN decoding from bundled WMI / model-year tables.
+
+Resolves manufacturer, make, model year and a coarse vehicle type from the
+VIN alone (positions 1-3 = WMI, 10 = model year), without calling vPIC.
+Model and trim need the full vPIC database, so `model` is never filled here;
+`vin_api` backfills it from the upstream in the background.
+"""
+from __future__ import annotations
+
+from datetime import date
+
+
+# WMI -> (manufacturer, make, kind). `kind` is the vPIC VehicleType for
+# commercial WMIs; "" for light-duty WMIs where vPIC reports several types.
+WMI_TABLE: dict[str, tuple[str, str, str]] = {
+    # Class 8 / medium duty
+    "1FU": ("Daimler Trucks North America", "FREIGHTLINER", "TRUCK"),
+    "1FV": ("Daimler Trucks North America", "FREIGHTLINER", "TRUCK"),
+    "3AK": ("Daimler Trucks North America", "FREIGHTLINER", "TRUCK"),
+    "3AL": ("Daimler Trucks North America", "FREIGHTLINER", "TRUCK"),
+    "4UZ": ("Freightliner Custom Chassis", "FREIGHTLINER", "INCOMPLETE VEHICLE"),
+    "2FZ": ("Sterling Truck Corporation", "STERLING", "TRUCK"),
+    "2FW": ("Sterling Truck Corporation", "STERLING", "TRUCK"),
+    "5KJ": ("Daimler Trucks North America", "WESTERN STAR", "TRUCK"),
+    "5KK": ("Daimler Trucks North America", "WESTERN STAR", "TRUCK"),
+    "2WK": ("Western Star Trucks", "WESTERN STAR", "TRUCK"),
+    "2WL": ("Western Star Trucks", "WESTERN STAR", "TRUCK"),
+    "1XK": ("PACCAR", "KENWORTH", "TRUCK"),
+    "1NK": ("PACCAR", "KENWORTH", "TRUCK"),
+    "2XK": ("PACCAR", "KENWORTH", "TRUCK"),
+    "2NK": ("PACCAR", "KENWORTH", "TRUCK"),
+    "3BK": ("PACCAR", "KENWORTH", "TRUCK"),
+    "1XP": ("PACCAR", "PETERBILT", "TRUCK"),
+    "1NP": ("PACCAR", "PETERBILT", "TRUCK"),
+    "2NP": ("PACCAR", "PETERBILT", "TRUCK"),
+    "3BP": ("PACCAR", "PETERBILT", "TRUCK"),
+    "1HT": ("Navistar", "INTERNATIONAL", "TRUCK"),
+    "1HS": ("Navistar", "INTERNATIONAL", "TRUCK"),
+    "3HA": ("Navistar", "INTERNATIONAL", "TRUCK"),
+    "3HS": ("Navistar", "INTERNATIONAL", "TRUCK"),
+    "3HT": ("Navistar", "INTERNATIONAL", "TRUCK"),
+    "1M1": ("Mack Trucks", "MACK", "TRUCK"),
+    "1M2": ("Mack Trucks", "MACK", "TRUCK"),
+    "4V4": ("Volvo Trucks North America", "VOLVO TRUCK", "TRUCK"),
+    "4V5": ("Volvo Trucks North America", "VOLVO TRUCK", "TRUCK"),
+    "4VG": ("Volvo Trucks North America", "VOLVO TRUCK", "TRUCK"),
+    "4VZ": ("Volvo Trucks North America", "VOLVO TRUCK", "TRUCK"),
+    "JAL": ("Isuzu Motors", "ISUZU", "TRUCK"),
+    "54D": ("Spartan Motors (Isuzu)", "ISUZU", "TRUCK"),
+    "5PV": ("Hino Motors Manufacturing USA", "HINO", "TRUCK"),
+    "JL6": ("Mitsubishi Fuso Truck and Bus", "MITSUBISHI FUSO", "TRUCK"),
+    "JL7": ("Mitsubishi Fuso Truck and Bus", "MITSUBISHI FUSO", "TRUCK"),
+    # Buses
+    "1HV": ("IC Bus", "INTERNATIONAL", "BUS"),
+    "4DR": ("IC Bus", "IC BUS", "BUS"),
+    "1BA": ("Blue Bird Body Company", "BLUE BIRD", "BUS"),
+    # Trailers
+    "1UY": ("Utility Trailer Manufacturing", "UTILITY", "TRAILER"),
+    "1GR": ("Great Dane Trailers", "GREAT DANE", "TRAILER"),
+    "1JJ": ("Wabash National", "WABASH", "TRAILER"),
+    "3H3": ("Hyundai Translead", "HYUNDAI TRANSLEAD", "TRAILER"),
+    "1DW": ("Stoughton Trailers", "STOUGHTON", "TRAILER"),
+    "1PT": ("Trailmobile", "TRAILMOBILE", "TRAILER"),
+    "13N": ("Fontaine Trailer", "FONTAINE", "TRAILER"),
+    "5V8": ("Vanguard National Trailer", "VANGUARD", "TRAILER"),
+    # Light / medium duty pickups and vans
+    "1FT": ("Ford Motor Company", "FORD", "TRUCK"),
+    "1FD": ("Ford Motor Company", "FORD", "INCOMPLETE VEHICLE"),
+    "1FM": ("Ford Motor Company", "FORD", ""),
+    "1FA": ("Ford Motor Company", "FORD", ""),
+    "1GC": ("General Motors", "CHEVROLET", "TRUCK"),
+    "3GC": ("General Motors", "CHEVROLET", "TRUCK"),
+    "1GB": ("General Motors", "CHEVROLET", "INCOMPLETE VEHICLE"),
+    "1GN": ("General Motors", "CHEVROLET", ""),
+    "1G1": ("General Motors", "CHEVROLET", ""),
+    "1GT": ("General Motors", "GMC", "TRUCK"),
+    "3GT": ("General Motors", "GMC", "TRUCK"),
+    "1GD": ("General Motors", "GMC", "INCOMPLETE VEHICLE"),
+    "1GK": ("General Motors", "GMC", ""),
+    "1C6": ("FCA US", "RAM", "TRUCK"),
+    "3C6": ("FCA US", "RAM", "TRUCK"),
+    "3C7": ("FCA US", "RAM", "INCOMPLETE VEHICLE"),
+    "1D7": ("Chrysler", "DODGE", "TRUCK"),
+    "3D7": ("Chrysler", "DODGE", "TRUCK"),
+    "WD3": ("Mercedes-Benz", "MERCEDES-BENZ", ""),
+    "WD4": ("Mercedes-Benz", "MERCEDES-BENZ", ""),
+    "W1W": ("Mercedes-Benz", "MERCEDES-BENZ", ""),
+    "W1Y": ("Mercedes-Benz", "MERCEDES-BENZ", ""),
+    "1N6": ("Nissan North America", "NISSAN", "TRUCK"),
+    "5TF": ("Toyota Motor Manufacturing", "TOYOTA", "TRUCK"),
+}
+
+# Light-duty WMIs follow the 2010+ rule (alpha position 7); incomplete
+# chassis are usually over 10,000 lb GVWR and don't.
+_LIGHT_DUTY_WMIS = frozenset(
+    wmi for wmi, (_, make, kind) in WMI_TABLE.items()
+    if make in ("FORD", "CHEVROLET", "GMC", "RAM", "DODGE", "NISSAN", "TOYOTA", "MERCEDES-BENZ")
+    and kind != "INCOMPLETE VEHICLE"
+)
+
+# Position 10: index i maps to 1980 + i (and 2010 + i on the next cycle).
+_YEAR_CODES = "ABCDEFGHJKLMNPRSTVWXY123456789"
+_YEAR_BY_CODE = {c: 1980 + i for i, c in enumerate(_YEAR_CODES)}
+
+_TRANSLITERATION = {
+    **{str(d): d for d in range(10)},
+    "A": 1, "B": 2, "C": 3, "D": 4, "E": 5, "F": 6, "G": 7, "H": 8,
+    "J": 1, "K": 2, "L": 3, "M": 4, "N": 5, "P": 7, "R": 9,
+    "S": 2, "T": 3, "U": 4, "V": 5, "W": 6, "X": 7, "Y": 8, "Z": 9,
+}
+_WEIGHTS = (8, 7, 6, 5, 4, 3, 2, 10, 0, 9, 8, 7, 6, 5, 4, 3, 2)
+
+
+def vin_check_digit_ok(vin: str) -> bool | None:
+    """Position 9 check for North American VINs; None where it doesn't apply."""
+    if len(vin) != 17 or vin[0] not in "12345":
+        return None
+    try:
+        total = sum(_TRANSLITERATION[c] * w for c, w in zip(vin, _WEIGHTS))
+    except KeyError:
+        return False
+    expected = total % 11
+    return vin[8] == ("X" if expected == 10 else str(expected))
+
+
+def decode_model_year(vin: str, *, today: date | None = None) -> int | None:
+    base = _YEAR_BY_CODE.get(vin[9]) if len(vin) == 17 else None
+    if base is None:
+        return None
+    latest = (today or date.today()).year + 1
+    if vin[:3] in _LIGHT_DUTY_WMIS:
+        return base + 30 if vin[6].isalpha() and base + 30 <= latest else base
+    # Heavy trucks and trailers have no cycle marker: take the newest
+    # candidate that isn't in the future.
+    newest = base + 30
+    return newest if newest <= latest else base
+
+
+def decode_vin_locally(vin: str) -> dict | None:
+    """
+    Decode from bundled tables; None when the WMI isn't known.
+
+    Returns the `api_decode_vin` shape plus `manufacturer` and
+    `check_digit_ok`; `model` is always "".
+    """
+    vin = (vin or "").strip().upper()
+    if len(vin) != 17:
+        return None
+    entry = WMI_TABLE.get(vin[:3])
+    if entry is None:
+        return None
+    manufacturer, make, kind = entry
+    year = decode_model_year(vin)
+    return {
+        "vin": vin,
+        "make": make,
+        "model": "",
+        "year": str(year) if year else "",
+        "type": kind,
+        "manufacturer": manufacturer,
+        "check_digit_ok": vin_check_digit_ok(vin),
+    }
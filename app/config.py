@@ -57,6 +57,60 @@ class Config:
     # Master DB where we store tenants/users/shops
     MASTER_DB_NAME = os.environ.get("MASTER_DB_NAME") or os.environ.get("MONGO_DB") or "master_db"
 
+    # Apply pending master-DB migrations during app startup. Off by default:
+    # data migrations (e.g. the id canonicalize pass) run once per deploy via
+    # `python -m app.scripts.migrate`, not while gunicorn workers boot.
+    AUTO_MIGRATE_MASTER = _parse_bool(os.environ.get("AUTO_MIGRATE_MASTER"), False)
+
+    # Apply pending shop-DB migrations during app startup (old behaviour).
+    # Off by default: run `python -m app.scripts.migrate` on deploy instead so
+    # gunicorn workers boot without touching every shop database.
+    AUTO_MIGRATE_SHOPS = _parse_bool(os.environ.get("AUTO_MIGRATE_SHOPS"), False)
+
+    # ── Background jobs (imports / exports) ─────────────────────────────────
+    # Threads per gunicorn worker and the scratch directory for uploaded
+    # files, error reports and generated exports.
+    BACKGROUND_JOB_WORKERS = int(os.environ.get("BACKGROUND_JOB_WORKERS", "2"))
+    BACKGROUND_JOB_DIR = os.environ.get("BACKGROUND_JOB_DIR", "")
+
+    # ── Audit journal retention ───────────────────────────────────────────────
+    # Monthly partitions older than this are exported to gzipped NDJSON in
+    # AUDIT_JOURNAL_ARCHIVE_DIR and dropped by
+    # `python -m app.scripts.archive_audit_journal`. Tenants can keep less via
+    # `audit_retention_days` on their tenant document (TTL-expired).
+    AUDIT_JOURNAL_RETENTION_MONTHS = int(os.environ.get("AUDIT_JOURNAL_RETENTION_MONTHS", "12"))
+    AUDIT_JOURNAL_ARCHIVE_DIR = os.environ.get("AUDIT_JOURNAL_ARCHIVE_DIR", "audit_archive")
+
+    # ── Request profiling ─────────────────────────────────────────────────────
+    # Per-endpoint Mongo query accounting (GET /admin/profiling on the admin
+    # host). PROFILE_SAMPLE_RATE (0..1) runs that share of requests under
+    # cProfile and keeps captures of the ones slower than PROFILE_THRESHOLD_MS.
+    QUERY_PROFILING = _parse_bool(os.environ.get("QUERY_PROFILING"), True)
+    PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_THRESHOLD_MS = int(os.environ.get("PROFILE_THRESHOLD_MS", "500"))
+
+    # ── Prometheus metrics ────────────────────────────────────────────────────
+    # GET /metrics on the admin host: admin session or
+    # `Authorization: Bearer $METRICS_TOKEN`. METRICS_MULTIPROC_DIR aggregates
+    # gunicorn workers (see app/utils/metrics.py).
+    METRICS_ENABLED = _parse_bool(os.environ.get("METRICS_ENABLED"), True)
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+    METRICS_MULTIPROC_DIR = os.environ.get("METRICS_MULTIPROC_DIR", "")
+
+    # ── All-locations reports ─────────────────────────────────────────────────
+    # Reports / dashboard with scope=all run once per shop DB on a pool of
+    # SHOP_FANOUT_WORKERS threads per gunicorn worker; a shop that takes longer
+    # than SHOP_FANOUT_TIMEOUT_SECONDS is left out and flagged as missing.
+    SHOP_FANOUT_WORKERS = int(os.environ.get("SHOP_FANOUT_WORKERS", "8"))
+    SHOP_FANOUT_TIMEOUT_SECONDS = float(os.environ.get("SHOP_FANOUT_TIMEOUT_SECONDS", "20"))
+
+    # ── Dashboard snapshots ───────────────────────────────────────────────────
+    # Dashboard blocks are served from the last stored result; one older than
+    # DASHBOARD_SNAPSHOT_FRESH_SECONDS is recomputed in the background on
+    # DASHBOARD_REFRESH_WORKERS threads per gunicorn worker.
+    DASHBOARD_SNAPSHOT_FRESH_SECONDS = int(os.environ.get("DASHBOARD_SNAPSHOT_FRESH_SECONDS", "120"))
+    DASHBOARD_REFRESH_WORKERS = int(os.environ.get("DASHBOARD_REFRESH_WORKERS", "2"))
+
     # Max upload size (16 MB — matches MongoDB BSON document limit)
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
 
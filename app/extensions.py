@@ -112,12 +112,8 @@ def ensure_master_collections_indexes(master_db):
     _safe_create_index(master_db.zip_sales_tax_rates, [("zip_code", ASCENDING)], unique=True, name="uniq_zip_sales_tax_rates_zip")
     _safe_create_index(master_db.zip_sales_tax_rates, [("updated_at", DESCENDING)], name="idx_zip_sales_tax_rates_updated_desc")
 
-    # Audit journal for create/edit/delete operations across all routes.
-    _safe_create_index(master_db.audit_journal, [("created_at", DESCENDING)], name="idx_audit_journal_created_desc")
-    _safe_create_index(master_db.audit_journal, [("tenant_id", ASCENDING), ("created_at", DESCENDING)], name="idx_audit_journal_tenant_created")
-    _safe_create_index(master_db.audit_journal, [("shop_id", ASCENDING), ("created_at", DESCENDING)], name="idx_audit_journal_shop_created")
-    _safe_create_index(master_db.audit_journal, [("endpoint", ASCENDING), ("created_at", DESCENDING)], name="idx_audit_journal_endpoint_created")
-    _safe_create_index(master_db.audit_journal, [("method", ASCENDING), ("created_at", DESCENDING)], name="idx_audit_journal_method_created")
+    # Audit journal lives in monthly partitions (audit_journal_YYYY_MM); their
+    # indexes are created on first write, see reports/audit/journal.py.
 
     # Customer authorization tokens for work orders / individual labor items.
     _safe_create_index(master_db.work_order_authorizations, [("token", ASCENDING)], unique=True, name="uniq_wo_auth_token")
@@ -227,44 +223,28 @@ def ensure_shop_collections_indexes(shop_db):
     _safe_create_index(shop_db.timezone_location, [("shop_id", ASCENDING)], name="idx_timezone_location_shop")
 
 
-def ensure_all_shop_databases_indexes(client, master_db):
-    shops_cursor = master_db.shops.find(
-        {
-            "$or": [
-                {"db_name": {"$exists": True, "$ne": None}},
-                {"database": {"$exists": True, "$ne": None}},
-                {"db": {"$exists": True, "$ne": None}},
-                {"mongo_db": {"$exists": True, "$ne": None}},
-                {"shop_db": {"$exists": True, "$ne": None}},
-            ]
-        },
-        {"db_name": 1, "database": 1, "db": 1, "mongo_db": 1, "shop_db": 1},
+def init_mongo(app, event_listeners=None):
+    client = MongoClient(
+        app.config["MONGO_URI"],
+        serverSelectionTimeoutMS=5000,
+        event_listeners=list(event_listeners or []),
     )
-
-    seen = set()
-    for shop in shops_cursor:
-        db_name = (
-            shop.get("db_name")
-            or shop.get("database")
-            or shop.get("db")
-            or shop.get("mongo_db")
-            or shop.get("shop_db")
-        )
-        if not db_name:
-            continue
-        db_name = str(db_name)
-        if db_name in seen:
-            continue
-        seen.add(db_name)
-        ensure_shop_collections_indexes(client[db_name])
-
-def init_mongo(app):
-    client = MongoClient(app.config["MONGO_URI"], serverSelectionTimeoutMS=5000)
     app.extensions["mongo_client"] = client
 
     # fail fast if mongo not reachable
     client.admin.command("ping")
 
+    # Indexes / data migrations are versioned (app/migrations); startup only
+    # compares recorded versions. The master and shop DBs are migrated by
+    # `python -m app.scripts.migrate` unless AUTO_MIGRATE_MASTER /
+    # AUTO_MIGRATE_SHOPS is on.
+    from app.migrations import check_schema_versions
+
     master_db = client[app.config["MASTER_DB_NAME"]]
-    ensure_master_collections_indexes(master_db)
-    ensure_all_shop_databases_indexes(client, master_db)
+    check_schema_versions(
+        client,
+        master_db,
+        logger=app.logger,
+        migrate_master_db=bool(app.config.get("AUTO_MIGRATE_MASTER")),
+        migrate_shops=bool(app.config.get("AUTO_MIGRATE_SHOPS")),
+    )
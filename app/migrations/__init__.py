@@ -0,0 +1,330 @@
+"""Versioned schema migrations for the master DB and every shop DB.
+
+Each database has one record in `master_db.schema_versions`:
+
+    {"_id": <db_name>, "kind": "master" | "shop", "version": int,
+     "history": [{"version", "name", "applied_at", "duration_ms"}],
+     "locked_until": datetime | None, "updated_at": datetime}
+
+Migrations are plain functions registered in `app/migrations/master.py` and
+`app/migrations/shop.py` with a strictly increasing number. They MUST be
+idempotent — a crashed run is simply re-applied from the last recorded
+version.
+
+App startup only compares recorded versions against the registry
+(`check_schema_versions`, two small queries). The master DB and shop
+databases are migrated once per deploy by `python -m app.scripts.migrate`
+(shops in parallel); a freshly created shop is migrated inline by
+`init_shop_database`.
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+
+SCHEMA_VERSIONS_COLLECTION = "schema_versions"
+KIND_MASTER = "master"
+KIND_SHOP = "shop"
+
+# A runner holds a per-database lease while applying migrations so two
+# processes (e.g. CLI + a new-shop request) never migrate the same DB at once.
+LOCK_TTL = timedelta(minutes=30)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    apply: Callable  # apply(db) for shop, apply(db) for master
+
+
+_REGISTRY: dict[str, list[Migration]] = {KIND_MASTER: [], KIND_SHOP: []}
+
+
+def migration(kind: str, version: int, name: str):
+    """Decorator: register `fn(db)` as migration `version` for `kind`."""
+    def decorator(fn):
+        items = _REGISTRY[kind]
+        if any(m.version == version for m in items):
+            raise RuntimeError(f"Duplicate {kind} migration version {version}")
+        items.append(Migration(version=version, name=name, apply=fn))
+        items.sort(key=lambda m: m.version)
+        return fn
+    return decorator
+
+
+def _load_registry() -> None:
+    # Import for side effects: modules register themselves via @migration.
+    from app.migrations import master as _master  # noqa: F401
+    from app.migrations import shop as _shop  # noqa: F401
+
+
+def get_migrations(kind: str) -> list[Migration]:
+    _load_registry()
+    return list(_REGISTRY[kind])
+
+
+def latest_version(kind: str) -> int:
+    items = get_migrations(kind)
+    return items[-1].version if items else 0
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def iter_shop_db_names(master_db) -> list[str]:
+    """Distinct shop database names across all shops (legacy field names included)."""
+    shops_cursor = master_db.shops.find(
+        {
+            "$or": [
+                {"db_name": {"$exists": True, "$ne": None}},
+                {"database": {"$exists": True, "$ne": None}},
+                {"db": {"$exists": True, "$ne": None}},
+                {"mongo_db": {"$exists": True, "$ne": None}},
+                {"shop_db": {"$exists": True, "$ne": None}},
+            ]
+        },
+        {"db_name": 1, "database": 1, "db": 1, "mongo_db": 1, "shop_db": 1},
+    )
+
+    seen = set()
+    names = []
+    for shop in shops_cursor:
+        db_name = (
+            shop.get("db_name")
+            or shop.get("database")
+            or shop.get("db")
+            or shop.get("mongo_db")
+            or shop.get("shop_db")
+        )
+        if not db_name:
+            continue
+        db_name = str(db_name)
+        if db_name in seen:
+            continue
+        seen.add(db_name)
+        names.append(db_name)
+    return names
+
+
+# `location_id` is the shop id on timezone_location and a parts location elsewhere.
+ID_FIELDS = ("tenant_id", "shop_id", "location_id")
+ID_LIST_FIELDS = ("shop_ids",)
+# Collections whose writers store tenant / shop ids as strings on purpose
+# (request journal, job records); converting them would split their queries.
+STRING_ID_COLLECTIONS = frozenset({"audit_journal"})
+STRING_ID_PREFIXES = ("audit_journal_",)
+_CANONICALIZE_BATCH = 1000
+
+
+def _canonical_id(value):
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    return value
+
+
+def canonicalize_id_fields(db) -> int:
+    """
+    Convert hex-string tenant_id / shop_id / shop_ids / location_id values to
+    ObjectId in every collection of `db` except STRING_ID_COLLECTIONS. Non-hex
+    strings are left alone. Returns the number of documents rewritten.
+    """
+    changed = 0
+    for name in db.list_collection_names():
+        if name.startswith("system.") or name == SCHEMA_VERSIONS_COLLECTION:
+            continue
+        if name in STRING_ID_COLLECTIONS or name.startswith(STRING_ID_PREFIXES):
+            continue
+        col = db[name]
+        query = {"$or": [
+            *({f: {"$type": "string"}} for f in ID_FIELDS),
+            *({f: {"$elemMatch": {"$type": "string"}}} for f in ID_LIST_FIELDS),
+        ]}
+        ops = []
+        for doc in col.find(query, {f: 1 for f in (*ID_FIELDS, *ID_LIST_FIELDS)}):
+            update = {}
+            for f in ID_FIELDS:
+                value = _canonical_id(doc.get(f))
+                if value is not doc.get(f):
+                    update[f] = value
+            for f in ID_LIST_FIELDS:
+                values = doc.get(f)
+                if isinstance(values, list):
+                    fixed = []
+                    for v in map(_canonical_id, values):
+                        if v not in fixed:
+                            fixed.append(v)
+                    if fixed != values:
+                        update[f] = fixed
+            if update:
+                ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": update}))
+            if len(ops) >= _CANONICALIZE_BATCH:
+                changed += col.bulk_write(ops, ordered=False).modified_count
+                ops = []
+        if ops:
+            changed += col.bulk_write(ops, ordered=False).modified_count
+    return changed
+
+
+def stringify_id_fields(col) -> int:
+    """Undo `canonicalize_id_fields` on one STRING_ID_COLLECTIONS collection. Returns documents rewritten."""
+    changed = 0
+    ops = []
+    for doc in col.find({"$or": [{f: {"$type": "objectId"}} for f in ID_FIELDS]}, {f: 1 for f in ID_FIELDS}):
+        update = {f: str(doc[f]) for f in ID_FIELDS if isinstance(doc.get(f), ObjectId)}
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": update}))
+        if len(ops) >= _CANONICALIZE_BATCH:
+            changed += col.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        changed += col.bulk_write(ops, ordered=False).modified_count
+    return changed
+
+
+def get_recorded_versions(master_db, kind: str | None = None) -> dict[str, int]:
+    query = {"kind": kind} if kind else {}
+    return {
+        str(doc["_id"]): int(doc.get("version") or 0)
+        for doc in master_db[SCHEMA_VERSIONS_COLLECTION].find(query, {"version": 1})
+    }
+
+
+def _acquire_lock(master_db, db_name: str, kind: str) -> dict | None:
+    now = _utcnow()
+    try:
+        return master_db[SCHEMA_VERSIONS_COLLECTION].find_one_and_update(
+            {
+                "_id": db_name,
+                "$or": [
+                    {"locked_until": None},
+                    {"locked_until": {"$exists": False}},
+                    {"locked_until": {"$lt": now}},
+                ],
+            },
+            {
+                "$set": {"locked_until": now + LOCK_TTL, "kind": kind},
+                "$setOnInsert": {"version": 0, "history": [], "created_at": now},
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # Record exists and is locked by someone else.
+        return None
+
+
+def _release_lock(master_db, db_name: str) -> None:
+    master_db[SCHEMA_VERSIONS_COLLECTION].update_one(
+        {"_id": db_name},
+        {"$set": {"locked_until": None, "updated_at": _utcnow()}},
+    )
+
+
+def migrate_database(client, master_db, db_name: str, kind: str) -> dict:
+    """
+    Apply every pending migration of `kind` to `db_name`, recording each step.
+    Returns {"db_name", "from", "to", "applied": [names], "skipped": reason|None}.
+    """
+    result = {"db_name": db_name, "from": None, "to": None, "applied": [], "skipped": None}
+
+    record = _acquire_lock(master_db, db_name, kind)
+    if record is None:
+        result["skipped"] = "locked"
+        return result
+
+    current = int(record.get("version") or 0)
+    result["from"] = current
+    result["to"] = current
+    db = master_db if kind == KIND_MASTER else client[db_name]
+
+    try:
+        for m in get_migrations(kind):
+            if m.version <= current:
+                continue
+            started = time.perf_counter()
+            m.apply(db)
+            duration_ms = int((time.perf_counter() - started) * 1000)
+            master_db[SCHEMA_VERSIONS_COLLECTION].update_one(
+                {"_id": db_name},
+                {
+                    "$set": {"version": m.version, "updated_at": _utcnow()},
+                    "$push": {"history": {
+                        "version": m.version,
+                        "name": m.name,
+                        "applied_at": _utcnow(),
+                        "duration_ms": duration_ms,
+                    }},
+                },
+            )
+            current = m.version
+            result["to"] = current
+            result["applied"].append(m.name)
+    finally:
+        _release_lock(master_db, db_name)
+
+    return result
+
+
+def migrate_master(client, master_db) -> dict:
+    return migrate_database(client, master_db, master_db.name, KIND_MASTER)
+
+
+def migrate_shop(client, master_db, db_name: str) -> dict:
+    return migrate_database(client, master_db, db_name, KIND_SHOP)
+
+
+def pending_shop_databases(master_db) -> list[str]:
+    target = latest_version(KIND_SHOP)
+    recorded = get_recorded_versions(master_db, KIND_SHOP)
+    return [name for name in iter_shop_db_names(master_db) if recorded.get(name, 0) < target]
+
+
+def check_schema_versions(
+    client,
+    master_db,
+    logger=None,
+    migrate_master_db: bool = False,
+    migrate_shops: bool = False,
+) -> dict:
+    """
+    Startup check. Pending master / shop migrations are only reported unless
+    `migrate_master_db` / `migrate_shops` is set; the migration lock keeps
+    concurrently booting workers from applying them twice.
+    """
+    status = {"master_migrated": None, "master_pending": False, "pending_shops": []}
+
+    master_target = latest_version(KIND_MASTER)
+    master_record = master_db[SCHEMA_VERSIONS_COLLECTION].find_one({"_id": master_db.name}, {"version": 1})
+    if int((master_record or {}).get("version") or 0) < master_target:
+        migrated = migrate_master(client, master_db) if migrate_master_db else None
+        status["master_migrated"] = migrated
+        status["master_pending"] = (migrated or {}).get("to") != master_target
+        if status["master_pending"] and logger is not None:
+            logger.warning(
+                "[MIGRATIONS] master database behind schema v%d%s; run `python -m app.scripts.migrate`.",
+                master_target,
+                " (another process holds the migration lock)" if (migrated or {}).get("skipped") else "",
+            )
+
+    pending = pending_shop_databases(master_db)
+    if pending and migrate_shops:
+        for db_name in pending:
+            migrate_shop(client, master_db, db_name)
+        pending = pending_shop_databases(master_db)
+    status["pending_shops"] = pending
+
+    if pending and logger is not None:
+        logger.warning(
+            "[MIGRATIONS] %d shop database(s) behind schema v%d; run `python -m app.scripts.migrate`.",
+            len(pending),
+            latest_version(KIND_SHOP),
+        )
+    return status
@@ -0,0 +1,85 @@
+"""Master DB migrations. Append new ones with the next version number."""
+from __future__ import annotations
+
+from pymongo import ASCENDING, DESCENDING
+
+from app.extensions import _safe_create_index, ensure_master_collections_indexes
+from app.migrations import (
+    KIND_MASTER,
+    STRING_ID_COLLECTIONS,
+    STRING_ID_PREFIXES,
+    canonicalize_id_fields,
+    migration,
+    stringify_id_fields,
+)
+from app.utils.admin_stats import rebuild_admin_stats
+from app.utils.background_jobs import JOB_TTL
+from app.utils.billing_usage import rebuild_billing_usage
+
+
+@migration(KIND_MASTER, 1, "master_indexes")
+def m001_master_indexes(master_db):
+    ensure_master_collections_indexes(master_db)
+
+
+@migration(KIND_MASTER, 2, "background_jobs_indexes")
+def m002_background_jobs_indexes(master_db):
+    _safe_create_index(master_db.background_jobs, [("tenant_id", ASCENDING), ("kind", ASCENDING), ("created_at", DESCENDING)], name="idx_background_jobs_tenant_kind_created")
+    # Job records are only needed while the user polls / downloads results.
+    _safe_create_index(master_db.background_jobs, [("created_at", ASCENDING)], expireAfterSeconds=int(JOB_TTL.total_seconds()), name="ttl_background_jobs_created")
+
+
+@migration(KIND_MASTER, 3, "shop_settings_snapshots_indexes")
+def m003_shop_settings_snapshots_indexes(master_db):
+    # Tenant-wide invalidation (user changes) looks snapshots up by tenant.
+    _safe_create_index(master_db.shop_settings_snapshots, [("tenant_id", ASCENDING)], name="idx_shop_settings_snapshots_tenant")
+
+
+@migration(KIND_MASTER, 4, "vin_decode_cache_ttl")
+def m004_vin_decode_cache_ttl(master_db):
+    # Each entry carries its own expiry (long for decodes, short for upstream rejections).
+    _safe_create_index(master_db.vin_decode_cache, [("expire_at", ASCENDING)], expireAfterSeconds=0, name="ttl_vin_decode_cache_expire")
+
+
+@migration(KIND_MASTER, 5, "canonical_tenant_shop_ids")
+def m005_canonical_tenant_shop_ids(master_db):
+    # users / shops / timezone_location etc. may hold string ids from older code paths.
+    canonicalize_id_fields(master_db)
+
+
+@migration(KIND_MASTER, 6, "cache_entries_ttl")
+def m006_cache_entries_ttl(master_db):
+    # Shared tier of app.utils.cache; entries carry their own expiry.
+    _safe_create_index(master_db.cache_entries, [("expire_at", ASCENDING)], expireAfterSeconds=0, name="ttl_cache_entries_expire")
+
+
+@migration(KIND_MASTER, 7, "admin_stats")
+def m007_admin_stats(master_db):
+    # Admin tenants list pages by created_at; dashboard counters start from a full recount.
+    _safe_create_index(master_db.tenants, [("created_at", DESCENDING)], name="idx_tenants_created_desc")
+    rebuild_admin_stats(master_db)
+
+
+@migration(KIND_MASTER, 8, "billing_usage")
+def m008_billing_usage(master_db):
+    # Invoicing reads maintained counters; start them from a full recount.
+    _safe_create_index(master_db.billing_run_items, [("run_id", ASCENDING), ("status", ASCENDING)], name="idx_billing_run_items_run_status")
+    rebuild_billing_usage(master_db)
+
+
+@migration(KIND_MASTER, 9, "journal_string_ids")
+def m009_journal_string_ids(master_db):
+    # Migration 5 converted journal tenant_id / shop_id to ObjectId; the
+    # journal writes and filters strings (reports/audit/journal.py).
+    for name in master_db.list_collection_names():
+        if name in STRING_ID_COLLECTIONS or name.startswith(STRING_ID_PREFIXES):
+            stringify_id_fields(master_db[name])
+
+
+@migration(KIND_MASTER, 10, "journal_legacy_partitions")
+def m010_journal_legacy_partitions(master_db):
+    # Rows written before the journal was partitioned by month; the viewer
+    # only reads audit_journal_YYYY_MM.
+    from app.blueprints.reports.audit.journal import migrate_legacy_journal
+
+    migrate_legacy_journal(master_db)
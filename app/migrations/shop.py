@@ -0,0 +1,86 @@
+"""Shop DB migrations. Append new ones with the next version number."""
+from __future__ import annotations
+
+from pymongo import ASCENDING, DESCENDING
+
+from app.extensions import _safe_create_index, ensure_shop_collections_indexes
+from app.migrations import KIND_SHOP, canonicalize_id_fields, migration
+from app.utils.parts_ledger import verify_parts_ledger
+
+
+@migration(KIND_SHOP, 1, "shop_indexes_and_pricing_rules_multi_scale")
+def m001_shop_indexes(shop_db):
+    # Baseline: every index declared up to the migration runner plus the
+    # legacy pricing-rules reshaping (`_migrate_parts_pricing_rules`).
+    ensure_shop_collections_indexes(shop_db)
+
+
+@migration(KIND_SHOP, 2, "calendar_events_interval_index")
+def m002_calendar_events_interval_index(shop_db):
+    # Overlap query: start_time < end AND end_time > start (api_events).
+    _safe_create_index(shop_db.calendar_events, [("shop_id", ASCENDING), ("end_time", ASCENDING), ("start_time", ASCENDING)], name="idx_calendar_events_shop_end_start")
+
+
+@migration(KIND_SHOP, 3, "customer_portal_indexes")
+def m003_customer_portal_indexes(shop_db):
+    # Portal tabs page a customer's WOs by work_order_date and payments by payment_date.
+    _safe_create_index(shop_db.work_orders, [("customer_id", ASCENDING), ("is_active", ASCENDING), ("work_order_date", DESCENDING), ("created_at", DESCENDING)], name="idx_work_orders_customer_active_wo_date_desc")
+    _safe_create_index(shop_db.work_order_payments, [("customer_id", ASCENDING), ("is_active", ASCENDING), ("payment_date", DESCENDING)], name="idx_work_order_payments_customer_active_date_desc")
+
+
+@migration(KIND_SHOP, 4, "canonical_tenant_shop_ids")
+def m004_canonical_tenant_shop_ids(shop_db):
+    canonicalize_id_fields(shop_db)
+
+
+@migration(KIND_SHOP, 5, "parts_order_ledger")
+def m005_parts_order_ledger(shop_db):
+    # Materialize order totals and build vendor_balances (app.utils.parts_ledger).
+    _safe_create_index(shop_db.vendor_balances, [("shop_id", ASCENDING)], name="idx_vendor_balances_shop")
+    verify_parts_ledger(shop_db, repair=True)
+
+
+@migration(KIND_SHOP, 6, "calendar_mechanic_schedule_index")
+def m006_calendar_mechanic_schedule_index(shop_db):
+    # Double-booking / free-slot scans (app.blueprints.calendar.scheduling) and
+    # the longest existing event, which bounds those scans.
+    _safe_create_index(shop_db.calendar_events, [("shop_id", ASCENDING), ("mechanic_id", ASCENDING), ("start_time", ASCENDING)], name="idx_calendar_events_shop_mechanic_start")
+    rows = list(shop_db.calendar_events.aggregate([
+        {"$match": {"start_time": {"$type": "date"}, "end_time": {"$type": "date"}}},
+        {"$group": {"_id": None, "ms": {"$max": {"$subtract": ["$end_time", "$start_time"]}}}},
+    ]))
+    if rows and rows[0].get("ms"):
+        shop_db.calendar_settings.update_one(
+            {"key": "max_event_span"},  # scheduling.MAX_SPAN_KEY
+            {"$max": {"seconds": rows[0]["ms"] / 1000}},
+            upsert=True,
+        )
+
+
+@migration(KIND_SHOP, 7, "dashboard_snapshots_ttl")
+def m007_dashboard_snapshots_ttl(shop_db):
+    # Stored dashboard block results (app.blueprints.dashboard.snapshots)
+    # expire once nobody has opened that block / range for the retention period.
+    _safe_create_index(shop_db.dashboard_snapshots, [("expire_at", ASCENDING)], expireAfterSeconds=0, name="ttl_dashboard_snapshots_expire")
+
+
+@migration(KIND_SHOP, 8, "wo_presets_resolved")
+def m008_wo_presets_resolved(shop_db):
+    # Store the resolved form (app.blueprints.work_orders.preset_resolution)
+    # of existing presets; later part / pricing / labor rate writes keep it current.
+    from app.blueprints.work_orders.preset_resolution import refresh_presets
+
+    for shop_id in shop_db.wo_presets.distinct("shop_id", {"is_active": True}):
+        refresh_presets(shop_db, shop_id)
+
+
+@migration(KIND_SHOP, 9, "unit_maintenance_history")
+def m009_unit_maintenance_history(shop_db):
+    # Per-line maintenance history (app.blueprints.work_orders.maintenance_history):
+    # unit pages / portal read it by unit and date, WO saves rewrite it by work order.
+    from app.blueprints.work_orders.maintenance_history import HISTORY_COLLECTION, rebuild_maintenance_history
+
+    coll = shop_db[HISTORY_COLLECTION]
+    _safe_create_index(coll, [("unit_id", ASCENDING), ("date", DESCENDING)], name="idx_unit_maintenance_history_unit_date")
+    _safe_create_index(coll, [("work_order_id", ASCENDING), ("line_index", ASCENDING)], name="idx_unit_maintenance_history_wo_line")
+    rebuild_maintenance_history(shop_db)
@@ -0,0 +1,111 @@
+"""CLI: archive and drop expired monthly audit journal partitions.
+
+Every month older than AUDIT_JOURNAL_RETENTION_MONTHS is streamed to
+`<archive-dir>/audit_journal_YYYY_MM.ndjson.gz` (one Extended JSON document per
+line) and the partition is dropped only after the file was fully written.
+
+Usage (run from project root with the venv active):
+
+    python -m app.scripts.archive_audit_journal
+    python -m app.scripts.archive_audit_journal --dry-run
+    python -m app.scripts.archive_audit_journal --months 6 --archive-dir /var/backups/audit
+    python -m app.scripts.archive_audit_journal --keep           # export only, don't drop
+    python -m app.scripts.archive_audit_journal --include-legacy # also the old unpartitioned collection
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import os
+import sys
+from datetime import datetime, timezone
+
+from bson import json_util
+
+# Ensure .env is loaded the same way as run.py.
+from dotenv import load_dotenv
+load_dotenv()
+
+from app import create_app
+from app.blueprints.reports.audit.journal import (
+    LEGACY_JOURNAL_COLLECTION as LEGACY_COLLECTION,
+    list_journal_partitions,
+    partition_month_start,
+)
+from app.extensions import get_master_db
+
+
+def _parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Archive expired audit journal months to gzipped NDJSON.")
+    p.add_argument("--months", type=int, help="Months to keep (default: AUDIT_JOURNAL_RETENTION_MONTHS).")
+    p.add_argument("--archive-dir", dest="archive_dir", help="Output directory (default: AUDIT_JOURNAL_ARCHIVE_DIR).")
+    p.add_argument("--dry-run", dest="dry_run", action="store_true", help="Only list what would be archived.")
+    p.add_argument("--keep", action="store_true", help="Write archives but do not drop partitions.")
+    p.add_argument("--include-legacy", dest="include_legacy", action="store_true",
+                   help=f"Also archive + drop the legacy unpartitioned `{LEGACY_COLLECTION}` collection.")
+    return p.parse_args()
+
+
+def _cutoff_month(keep_months: int) -> datetime:
+    """First month that is still retained; everything before it expires."""
+    now = datetime.now(timezone.utc)
+    total = now.year * 12 + (now.month - 1) - max(keep_months, 1) + 1
+    return datetime(total // 12, total % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def _export_collection(collection, path: str) -> int:
+    """Stream a collection to gzipped NDJSON via a temp file; returns row count."""
+    tmp_path = path + ".part"
+    written = 0
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as fh:
+        for doc in collection.find({}, batch_size=1000).sort("_id", 1):
+            fh.write(json_util.dumps(doc))
+            fh.write("\n")
+            written += 1
+    os.replace(tmp_path, path)
+    return written
+
+
+def main() -> int:
+    args = _parse_args()
+
+    app = create_app()
+    with app.app_context():
+        keep_months = args.months or int(app.config.get("AUDIT_JOURNAL_RETENTION_MONTHS") or 12)
+        archive_dir = args.archive_dir or app.config.get("AUDIT_JOURNAL_ARCHIVE_DIR") or "audit_archive"
+        cutoff = _cutoff_month(keep_months)
+
+        master = get_master_db()
+        expired = [
+            name for name in list_journal_partitions(master)
+            if (partition_month_start(name) or cutoff) < cutoff
+        ]
+        if args.include_legacy and LEGACY_COLLECTION in master.list_collection_names():
+            expired.append(LEGACY_COLLECTION)
+
+        if not expired:
+            print(f"Nothing to archive (keeping months from {cutoff:%Y-%m}).")
+            return 0
+
+        if args.dry_run:
+            for name in sorted(expired):
+                print(f"Would archive {name} ({master[name].estimated_document_count()} docs).")
+            return 0
+
+        os.makedirs(archive_dir, exist_ok=True)
+        for name in sorted(expired):
+            path = os.path.join(archive_dir, f"{name}.ndjson.gz")
+            if os.path.exists(path):
+                print(f"Archive {path} already exists, skipping {name}.", file=sys.stderr)
+                continue
+            count = _export_collection(master[name], path)
+            if args.keep:
+                print(f"Archived {name}: {count} docs -> {path}.")
+                continue
+            master.drop_collection(name)
+            print(f"Archived and dropped {name}: {count} docs -> {path}.")
+        return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
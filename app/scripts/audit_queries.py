@@ -0,0 +1,250 @@
+"""CLI: explain the hot query shapes against a shop DB and suggest missing indexes.
+
+Replays a catalog of representative queries (built with the same helpers the
+routes use, filled with values sampled from the shop) through
+`explain("executionStats")`, flags COLLSCANs, in-memory SORTs and loose
+indexes (docs examined / returned), and prints the compound index that would
+serve each flagged shape (app/utils/query_audit.py). --create builds those
+indexes; add the ones worth keeping to a shop migration afterwards.
+
+Usage (run from project root with the venv active):
+
+    python -m app.scripts.audit_queries                        # the benchmark tenant's shop
+    python -m app.scripts.audit_queries --db shop_acme_main --only parts_by_number
+    python -m app.scripts.audit_queries --system-profile 100   # also replay db.system.profile
+    python -m app.scripts.audit_queries --strict --json audit.json
+
+With --strict it exits 1 when a shape has an issue its catalog entry doesn't
+accept, so it can guard the synthetic data set
+(`app.scripts.seed_benchmark_data`) against index regressions.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+# Ensure .env is loaded the same way as run.py.
+from dotenv import load_dotenv
+load_dotenv()
+
+from app import create_app
+from app.blueprints.calendar.scheduling import DEFAULT_MAX_SPAN, _blocking, _overlap_query
+from app.blueprints.dashboard.routes import _build_period_work_orders_query
+from app.blueprints.work_orders.routes import append_and_filter, build_preferred_date_range_filter
+from app.extensions import get_master_db, get_mongo_client
+from app.scripts.seed_benchmark_data import DEFAULT_EMAIL
+from app.utils.mongo_search import build_regex_search_filter
+from app.utils.parts_search import build_query_tokens
+from app.utils.query_audit import (
+    DEFAULT_MAX_RATIO,
+    QuerySpec,
+    audit_query,
+    create_suggested_index,
+    harvest_system_profile,
+)
+
+
+def _first(coll, query: dict, field: str):
+    doc = coll.find_one({**query, field: {"$nin": [None, ""]}}, {field: 1})
+    return (doc or {}).get(field)
+
+
+def _sample_context(sdb) -> dict:
+    """Literal values for the catalog, taken from the shop's own data."""
+    shop_id = _first(sdb.work_orders, {}, "shop_id") or _first(sdb.parts, {}, "shop_id") or _first(sdb.customers, {}, "shop_id")
+    company = str(_first(sdb.customers, {}, "company_name") or "fleet")
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return {
+        "shop_id": shop_id,
+        "customer_id": _first(sdb.work_orders, {}, "customer_id"),
+        "unit_id": _first(sdb.work_orders, {}, "unit_id"),
+        "work_order_ids": [d["_id"] for d in sdb.work_orders.find({}, {"_id": 1}).limit(20)],
+        "part_number": _first(sdb.parts, {}, "part_number") or "P-1",
+        "mechanic_id": _first(sdb.calendar_events, {}, "mechanic_id"),
+        "vendor_id": _first(sdb.parts_orders, {}, "vendor_id"),
+        "term": company.split()[0][:6],
+        "month_start": (now - timedelta(days=30)).replace(hour=0, minute=0, second=0, microsecond=0),
+        "now": now,
+    }
+
+
+def _catalog(ctx: dict) -> list[QuerySpec]:
+    shop_id, term = ctx["shop_id"], ctx["term"]
+    start, end = ctx["month_start"], ctx["now"]
+    shop = {"_id": shop_id}
+
+    wo_base = {"shop_id": shop_id, "is_active": True}
+    wo_period = append_and_filter(dict(wo_base), build_preferred_date_range_filter("work_order_date", start, end))
+    wo_search = {"$and": [wo_base, build_regex_search_filter(
+        term,
+        text_fields=["status"],
+        numeric_fields=["wo_number", "grand_total", "totals.grand_total", "totals.parts_total", "totals.labor_total"],
+        object_id_fields=["_id", "customer_id", "unit_id", "shop_id", "tenant_id"],
+    )]}
+    wo_list_sort = [("work_order_date", -1), ("created_at", -1)]
+    normalized, tokens = build_query_tokens(term)
+
+    return [
+        QuerySpec("wo_list_period", "work_orders", wo_period, wo_list_sort, 20,
+                  source="work_orders/routes.py get_work_orders_list"),
+        QuerySpec("wo_list_unpaid", "work_orders", {**wo_base, "status": {"$ne": "paid"}}, wo_list_sort, 20,
+                  source="work_orders/routes.py get_work_orders_list (paid_status=unpaid)"),
+        QuerySpec("wo_list_search", "work_orders", wo_search, wo_list_sort, 20,
+                  source="work_orders/routes.py get_work_orders_list (q=)",
+                  expected=("RATIO",)),  # $expr/$toString over numbers and ids examines every WO of the shop
+        QuerySpec("wo_totals", "work_orders", wo_period,
+                  pipeline=[{"$group": {"_id": None, "grand_total": {"$sum": "$totals.grand_total"}}}],
+                  source="work_orders/routes.py get_work_orders_totals"),
+        QuerySpec("wo_by_customer", "work_orders",
+                  {"shop_id": shop_id, "customer_id": ctx["customer_id"], "is_active": True}, [("created_at", -1)], 20,
+                  source="customers/routes.py customer work orders tab"),
+        QuerySpec("wo_by_unit", "work_orders",
+                  {"shop_id": shop_id, "unit_id": ctx["unit_id"], "is_active": True}, [("created_at", -1)], 20,
+                  source="units history"),
+        QuerySpec("wo_payments_by_wo", "work_order_payments",
+                  {"work_order_id": {"$in": ctx["work_order_ids"]}, "is_active": True},
+                  source="dashboard/routes.py _compute_wo_money_metrics"),
+        QuerySpec("dashboard_period_wos", "work_orders",
+                  _build_period_work_orders_query(shop, start, end),
+                  source="dashboard/routes.py _load_period_work_orders"),
+        QuerySpec("outstanding_balance_wos", "work_orders", wo_base,
+                  source="dashboard/routes.py _compute_outstanding_balance_metrics"),
+        QuerySpec("parts_search_api", "parts",
+                  {"shop_id": shop_id, "is_active": True,
+                   "search_terms": normalized if len(tokens) <= 1 else {"$all": tokens}},
+                  limit=300, source="parts/routes.py parts_api_search"),
+        QuerySpec("parts_list", "parts", {"is_active": True}, [("part_number", 1), ("description", 1), ("created_at", -1)], 20,
+                  source="parts/routes.py parts page (no shop_id in the filter)"),
+        QuerySpec("parts_by_number", "parts", {"is_active": True, "part_number": ctx["part_number"]}, limit=1,
+                  source="work_orders/routes.py _resolve_part_for_inventory"),
+        QuerySpec("parts_orders_list", "parts_orders",
+                  {"shop_id": shop_id, "is_active": {"$ne": False}}, [("created_at", -1)], 20,
+                  source="parts/routes.py orders tab"),
+        QuerySpec("parts_orders_period", "parts_orders",
+                  append_and_filter({"shop_id": shop_id, "is_active": {"$ne": False}},
+                                    build_preferred_date_range_filter("order_date", start, end)),
+                  source="dashboard/routes.py _compute_parts_orders_metrics"),
+        QuerySpec("parts_orders_by_vendor", "parts_orders",
+                  {"shop_id": shop_id, "vendor_id": ctx["vendor_id"], "is_active": True}, [("created_at", -1)], 20,
+                  source="vendors/routes.py vendor orders"),
+        QuerySpec("customers_list", "customers", {},
+                  [("is_active", -1), ("company_name", 1), ("last_name", 1), ("first_name", 1), ("created_at", -1)], 20,
+                  source="customers/routes.py customers_page"),
+        QuerySpec("customers_search", "customers", build_regex_search_filter(
+                      term,
+                      text_fields=["company_name", "first_name", "last_name", "phone", "email", "address"],
+                      object_id_fields=["_id", "shop_id", "tenant_id"],
+                  ), limit=20,
+                  source="customers/routes.py customers_page (q=)",
+                  expected=("COLLSCAN", "RATIO")),  # regex search over free text
+        QuerySpec("units_by_customer", "units",
+                  {"shop_id": shop_id, "customer_id": ctx["customer_id"], "is_active": True}, [("created_at", -1)],
+                  source="customers/routes.py units tab"),
+        QuerySpec("calendar_window", "calendar_events",
+                  _overlap_query(shop_id, start, end, DEFAULT_MAX_SPAN), [("start_time", 1)],
+                  source="calendar/routes.py api_events"),
+        QuerySpec("calendar_mechanic_conflicts", "calendar_events",
+                  _blocking({**_overlap_query(shop_id, start, end, DEFAULT_MAX_SPAN), "mechanic_id": ctx["mechanic_id"]}),
+                  [("start_time", 1)], 5,
+                  source="calendar/scheduling.py find_conflicts"),
+        QuerySpec("vendors_list", "vendors", {"shop_id": shop_id, "is_active": True}, [("name", 1)], 20,
+                  source="vendors/routes.py vendors page"),
+    ]
+
+
+def _parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Explain hot query shapes and suggest indexes.")
+    p.add_argument("--db", help="Shop DB to audit (default: the benchmark tenant's shop).")
+    p.add_argument("--email", default=DEFAULT_EMAIL, help="Benchmark owner used to find the default shop.")
+    p.add_argument("--only", action="append", default=[], metavar="NAME", help="Only these catalog entries (repeatable).")
+    p.add_argument("--system-profile", type=int, default=0, metavar="N",
+                   help="Also replay up to N distinct shapes from the DB's system.profile.")
+    p.add_argument("--max-ratio", type=float, default=DEFAULT_MAX_RATIO,
+                   help=f"Flag docs examined / returned above this (default {DEFAULT_MAX_RATIO:g}).")
+    p.add_argument("--create", action="store_true", help="Create the suggested indexes.")
+    p.add_argument("--json", help="Write the results here.")
+    p.add_argument("--strict", action="store_true", help="Exit 1 on issues the catalog doesn't accept.")
+    return p.parse_args()
+
+
+def _resolve_db_name(args) -> str | None:
+    if args.db:
+        return args.db
+    master = get_master_db()
+    user = master.users.find_one({"email": args.email.lower()}, {"shop_ids": 1})
+    shop = master.shops.find_one({"_id": {"$in": (user or {}).get("shop_ids") or []}}, {"db_name": 1}) if user else None
+    return (shop or {}).get("db_name")
+
+
+def main() -> int:
+    args = _parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db_name = _resolve_db_name(args)
+        if not db_name:
+            print("No shop DB: pass --db or seed the benchmark tenant first.", file=sys.stderr)
+            return 2
+        sdb = get_mongo_client()[db_name]
+
+        specs = _catalog(_sample_context(sdb))
+        if args.only:
+            unknown = set(args.only) - {s.name for s in specs}
+            if unknown:
+                print(f"Unknown catalog entries: {', '.join(sorted(unknown))}", file=sys.stderr)
+                return 2
+            specs = [s for s in specs if s.name in args.only]
+        if args.system_profile:
+            specs += harvest_system_profile(sdb, limit=args.system_profile)
+
+        print(f"Auditing {len(specs)} query shapes on {db_name}")
+        audits = []
+        for spec in specs:
+            audit = audit_query(sdb, spec, max_ratio=args.max_ratio)
+            audits.append(audit)
+            if audit.error:
+                print(f"  {spec.name:30} ERROR {audit.error}")
+                continue
+            status = "ok" if not audit.issues else ("accepted" if not audit.unexpected_issues else "FLAG")
+            print(
+                f"  {spec.name:30} {status:8} {audit.plan or '-'}  "
+                f"examined {audit.docs_examined}/{audit.keys_examined} keys, returned {audit.returned}, {audit.millis} ms"
+            )
+            for issue in audit.issues:
+                print(f"      - {issue}")
+            for note in audit.unindexable:
+                print(f"      ~ not indexable: {note}")
+            if audit.suggestion:
+                print(f"      + suggest {audit.suggestion}")
+            elif audit.covered_by:
+                print(f"      = leading keys already indexed by {audit.covered_by} (planner chose otherwise or the filter is unselective)")
+
+        created = []
+        if args.create:
+            for audit in audits:
+                if audit.suggestion:
+                    created.append(create_suggested_index(sdb, audit))
+            if created:
+                print(f"Created {len(created)} indexes: {', '.join(created)}")
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump({
+                "db": db_name,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "audits": [a.as_dict() for a in audits],
+                "created_indexes": created,
+            }, fh, indent=2, default=str)
+        print(f"Wrote {args.json}")
+
+    flagged = [a for a in audits if a.error or a.unexpected_issues]
+    print(f"{len(flagged)} of {len(audits)} shapes flagged")
+    return 1 if args.strict and flagged else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,294 @@
+"""CLI: repeatable latency / query-count benchmark of the hot endpoints.
+
+Logs in as the synthetic tenant created by `app.scripts.seed_benchmark_data`
+and drives the Flask test client (in-process, against the configured mongod)
+through the work-order list and details, parts search, dashboard, standard
+reports and global search. Each scenario gets --warmup unmeasured requests,
+then --requests measured ones; p50 / p95 / max wall time come from the client
+side, Mongo commands per request (avg / max), server time and documents
+returned from the request profiler (app/utils/profiling.py).
+
+Results go to a JSON baseline; --compare diffs the run against an earlier
+one and, with --fail-over, exits 1 when a scenario's p95 grew by more than
+that percentage or it issues more queries than before.
+
+Usage (run from project root with the venv active):
+
+    python -m app.scripts.benchmark --out bench/main.json
+    python -m app.scripts.benchmark --out bench/branch.json --compare bench/main.json --fail-over 20
+    python -m app.scripts.benchmark --only wo_list --only wo_details --requests 50
+
+Latency depends on the machine and the dataset; compare runs made on the
+same machine against the same seed / volumes.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable
+
+# Ensure .env is loaded the same way as run.py.
+from dotenv import load_dotenv
+load_dotenv()
+
+# Query accounting must be on and cProfile sampling off while measuring.
+os.environ["QUERY_PROFILING"] = "1"
+os.environ["PROFILE_SAMPLE_RATE"] = "0"
+
+from flask import url_for
+
+from app import create_app
+from app.blueprints.reports.audit.routes import STANDARD_REPORT_TABS
+from app.extensions import get_master_db, get_mongo_client
+from app.scripts.seed_benchmark_data import DEFAULT_EMAIL, DEFAULT_PASSWORD
+from app.utils.profiling import profiling_report, reset_profiling
+
+
+BASELINE_FORMAT = 1
+SAMPLE_SIZE = 200
+DATASET_COLLECTIONS = (
+    "customers", "units", "parts", "vendors", "work_orders", "work_order_payments",
+    "parts_orders", "parts_order_payments", "calendar_events",
+)
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    endpoint: str
+    url: Callable[[dict, int], str]   # url(samples, i), called inside a request context
+
+
+def _pick(values: list, i: int):
+    return values[i % len(values)] if values else ""
+
+
+def _scenarios() -> list[Scenario]:
+    out = [
+        Scenario("wo_list", "work_orders.work_orders_page",
+                 lambda s, i: url_for("work_orders.work_orders_page")),
+        Scenario("wo_list_all_time", "work_orders.work_orders_page",
+                 lambda s, i: url_for("work_orders.work_orders_page", date_preset="all_time", page=1 + i % 5)),
+        Scenario("wo_list_search", "work_orders.work_orders_page",
+                 lambda s, i: url_for("work_orders.work_orders_page", date_preset="all_time", q=_pick(s["company_terms"], i))),
+        Scenario("wo_details", "work_orders.work_order_details_page",
+                 lambda s, i: url_for("work_orders.work_order_details_page", work_order_id=_pick(s["work_order_ids"], i))),
+        Scenario("wo_parts_search", "work_orders.api_parts_search",
+                 lambda s, i: url_for("work_orders.api_parts_search", q=_pick(s["part_terms"], i))),
+        Scenario("parts_search", "parts.parts_api_search",
+                 lambda s, i: url_for("parts.parts_api_search", q=_pick(s["part_terms"], i))),
+        Scenario("dashboard", "dashboard.dashboard",
+                 lambda s, i: url_for("dashboard.dashboard")),
+        Scenario("dashboard_metrics", "dashboard.dashboard_metrics_api",
+                 lambda s, i: url_for("dashboard.dashboard_metrics_api")),
+        Scenario("global_search", "main.global_search_api",
+                 lambda s, i: url_for("main.global_search_api", q=_pick(s["search_terms"], i))),
+    ]
+    for key in sorted(STANDARD_REPORT_TABS):
+        out.append(Scenario(
+            f"report_{key}", "reports.standard_report_api",
+            lambda s, i, key=key: url_for("reports.standard_report_api", report_key=key, date_preset="this_year"),
+        ))
+    return out
+
+
+def _parse_args(names: list[str]) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Benchmark hot endpoints against the synthetic tenant.")
+    p.add_argument("--email", default=DEFAULT_EMAIL)
+    p.add_argument("--password", default=DEFAULT_PASSWORD)
+    p.add_argument("--requests", type=int, default=30, help="Measured requests per scenario.")
+    p.add_argument("--warmup", type=int, default=3, help="Unmeasured requests per scenario first.")
+    p.add_argument("--only", action="append", default=[], choices=names, metavar="SCENARIO",
+                   help=f"Run only these (repeatable): {', '.join(names)}")
+    p.add_argument("--seed", type=int, default=1, help="Seed for picking sample ids / search terms.")
+    p.add_argument("--out", help="Write the results JSON here.")
+    p.add_argument("--compare", help="Baseline JSON to diff against.")
+    p.add_argument("--fail-over", type=float, default=None, metavar="PCT",
+                   help="With --compare: exit 1 if a p95 grew more than PCT%% or queries per request grew.")
+    return p.parse_args()
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5, check=True,
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _load_samples(sdb, shop_id, rng: random.Random) -> dict:
+    """Ids and search terms the scenarios cycle through (same for the same seed and data)."""
+    wo_ids = [str(d["_id"]) for d in sdb.work_orders.find(
+        {"shop_id": shop_id, "is_active": True}, {"_id": 1}).sort("wo_number", 1)]
+    companies = [d.get("company_name") or "" for d in sdb.customers.find(
+        {"shop_id": shop_id, "is_active": True}, {"company_name": 1}).sort("_id", 1)]
+    part_numbers = [d.get("part_number") or "" for d in sdb.parts.find(
+        {"shop_id": shop_id, "is_active": True}, {"part_number": 1}).sort("_id", 1)]
+    unit_numbers = [d.get("unit_number") or "" for d in sdb.units.find(
+        {"shop_id": shop_id, "is_active": True}, {"unit_number": 1}).sort("_id", 1)]
+
+    def sample(values):
+        values = [v for v in values if v]
+        return rng.sample(values, min(SAMPLE_SIZE, len(values)))
+
+    company_terms = [c.split()[0] for c in sample(companies)]
+    part_terms = [pn[:6] for pn in sample(part_numbers)]
+    return {
+        "work_order_ids": sample(wo_ids),
+        "company_terms": company_terms,
+        "part_terms": part_terms,
+        "search_terms": [t for pair in zip(sample(unit_numbers), company_terms) for t in pair] or company_terms,
+    }
+
+
+def _run_scenario(app, client, scenario: Scenario, samples: dict, args) -> dict:
+    with app.test_request_context():
+        urls = [scenario.url(samples, i) for i in range(args.warmup + args.requests)]
+
+    for url in urls[:args.warmup]:
+        client.get(url)
+
+    reset_profiling()
+    timings, errors, statuses = [], 0, {}
+    for url in urls[args.warmup:]:
+        started = time.perf_counter()
+        resp = client.get(url)
+        timings.append((time.perf_counter() - started) * 1000)
+        resp.close()
+        statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+        errors += resp.status_code >= 400 or resp.status_code in (301, 302)
+
+    profile = next((e for e in profiling_report()["endpoints"] if e["endpoint"] == scenario.endpoint), {})
+    timings.sort()
+    return {
+        "endpoint": scenario.endpoint,
+        "requests": len(timings),
+        "errors": errors,
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "p50_ms": round(_percentile(timings, 50), 2),
+        "p95_ms": round(_percentile(timings, 95), 2),
+        "mean_ms": round(sum(timings) / len(timings), 2) if timings else 0.0,
+        "max_ms": round(timings[-1], 2) if timings else 0.0,
+        "queries_avg": profile.get("avg_queries"),
+        "queries_max": profile.get("max_queries"),
+        "db_ms_avg": profile.get("avg_db_ms"),
+        "docs_avg": profile.get("avg_docs"),
+    }
+
+
+def _pct_change(old, new) -> float | None:
+    if not old or new is None:
+        return None
+    return (float(new) - float(old)) / float(old) * 100
+
+
+def _compare(baseline: dict, current: dict, fail_over: float | None) -> int:
+    """Print a diff table; returns the number of regressions past `fail_over`."""
+    regressions = 0
+    old_scenarios = baseline.get("scenarios") or {}
+    print(f"\nvs baseline {baseline.get('git_commit') or '?'} ({baseline.get('created_at') or '?'})")
+    print(f"{'scenario':28} {'p50 ms':>19} {'p95 ms':>27} {'queries':>15}")
+    for name, new in current["scenarios"].items():
+        old = old_scenarios.get(name)
+        if not old:
+            print(f"{name:28} {'(new)':>19}")
+            continue
+        p95_delta = _pct_change(old.get("p95_ms"), new.get("p95_ms"))
+        q_old, q_new = old.get("queries_avg"), new.get("queries_avg")
+        flags = []
+        if fail_over is not None and p95_delta is not None and p95_delta > fail_over:
+            flags.append("p95")
+        if fail_over is not None and q_old is not None and q_new is not None and q_new > q_old + 0.5:
+            flags.append("queries")
+        regressions += bool(flags)
+        delta_txt = f"{p95_delta:+.0f}%" if p95_delta is not None else "n/a"
+        print(
+            f"{name:28} {old.get('p50_ms'):>8} -> {new.get('p50_ms'):<8} "
+            f"{old.get('p95_ms'):>8} -> {new.get('p95_ms'):<8} ({delta_txt:>5}) "
+            f"{q_old if q_old is not None else '-':>6} -> {q_new if q_new is not None else '-':<6}"
+            + (f"  REGRESSION ({', '.join(flags)})" if flags else "")
+        )
+    return regressions
+
+
+def main() -> int:
+    scenarios = _scenarios()
+    args = _parse_args([s.name for s in scenarios])
+    if args.only:
+        scenarios = [s for s in scenarios if s.name in args.only]
+
+    app = create_app()
+    with app.app_context():
+        master = get_master_db()
+        user = master.users.find_one({"email": args.email.lower(), "is_active": True})
+        shop = master.shops.find_one({"_id": {"$in": (user or {}).get("shop_ids") or []}}) if user else None
+        if not user or not shop or not shop.get("db_name"):
+            print(f"No benchmark tenant for {args.email}; run app.scripts.seed_benchmark_data first.", file=sys.stderr)
+            return 2
+        sdb = get_mongo_client()[shop["db_name"]]
+        samples = _load_samples(sdb, shop["_id"], random.Random(args.seed))
+        dataset = {name: sdb[name].estimated_document_count() for name in DATASET_COLLECTIONS}
+
+    client = app.test_client()
+    with app.test_request_context():
+        login_url = url_for("auth.login")
+    client.post(login_url, data={"email": args.email, "password": args.password})
+    with client.session_transaction() as sess:
+        if not sess.get("user_id"):
+            print("Login failed (wrong --password, inactive tenant or expired subscription).", file=sys.stderr)
+            return 2
+
+    results = {
+        "format": BASELINE_FORMAT,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "shop_db": shop["db_name"],
+        "dataset": dataset,
+        "settings": {"requests": args.requests, "warmup": args.warmup, "seed": args.seed},
+        "scenarios": {},
+    }
+    print(f"Benchmarking {shop['db_name']} ({dataset['work_orders']} work orders), {args.requests} requests each")
+    for scenario in scenarios:
+        row = _run_scenario(app, client, scenario, samples, args)
+        results["scenarios"][scenario.name] = row
+        print(
+            f"  {scenario.name:28} p50 {row['p50_ms']:>8.1f} ms  p95 {row['p95_ms']:>8.1f} ms  "
+            f"queries {row['queries_avg'] if row['queries_avg'] is not None else '-':>6}"
+            + (f"  errors {row['errors']} {row['statuses']}" if row["errors"] else "")
+        )
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+        print(f"Wrote {args.out}")
+
+    regressions = 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            regressions = _compare(json.load(fh), results, args.fail_over)
+    failed = sum(row["errors"] for row in results["scenarios"].values())
+    return 1 if regressions or failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,49 @@
+"""CLI: fingerprint, minify and precompress app/static into app/static/dist.
+
+Run on every deploy before restarting gunicorn (workers load the manifest at
+startup). No database access is needed.
+
+Usage (run from project root with the venv active):
+
+    python -m app.scripts.build_assets
+    python -m app.scripts.build_assets --clean        # drop previous builds first
+    python -m app.scripts.build_assets --no-minify --no-compress
+
+Minification uses rjsmin / rcssmin and `.br` files need `brotli`; without
+them the build still succeeds with unminified files / `.gz` only.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+
+from app.utils.assets import DIST_DIR, MANIFEST_NAME, build_assets
+
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
+
+
+def _parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Build content-hashed static assets.")
+    p.add_argument("--static-dir", dest="static_dir", default=STATIC_DIR, help="Static root (default: app/static).")
+    p.add_argument("--clean", action="store_true", help="Remove the previous dist/ before building.")
+    p.add_argument("--no-minify", dest="minify", action="store_false", help="Copy JS/CSS as-is.")
+    p.add_argument("--no-compress", dest="compress", action="store_false", help="Skip .gz/.br siblings.")
+    return p.parse_args()
+
+
+def main() -> int:
+    args = _parse_args()
+    stats = build_assets(args.static_dir, minify=args.minify, compress=args.compress, clean=args.clean)
+    saved = stats["bytes_in"] - stats["bytes_out"]
+    print(
+        f"{stats['files']} file(s) -> {os.path.join(args.static_dir, DIST_DIR, MANIFEST_NAME)}; "
+        f"{stats['bytes_in']:,} -> {stats['bytes_out']:,} bytes ({saved:,} saved by minify)"
+    )
+    if args.compress and not stats["brotli"]:
+        print("brotli not installed: wrote .gz siblings only.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
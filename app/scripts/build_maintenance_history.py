@@ -0,0 +1,59 @@
+"""CLI: build the per-unit maintenance history from existing work orders.
+
+Rewrites `unit_maintenance_history` (app/blueprints/work_orders/maintenance_history.py)
+from each shop's work orders and drops rows of work orders that no longer
+exist. Shop migration 9 does the same once; run this to repair drift or
+after importing work orders outside the app. Safe to re-run.
+
+Usage (run from project root with the venv active):
+
+    python -m app.scripts.build_maintenance_history                      # every shop DB
+    python -m app.scripts.build_maintenance_history --db shop_acme_main
+    python -m app.scripts.build_maintenance_history --batch-size 200
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+
+# Ensure .env is loaded the same way as run.py.
+from dotenv import load_dotenv
+load_dotenv()
+
+from app import create_app
+from app.blueprints.work_orders.maintenance_history import REBUILD_BATCH_SIZE, rebuild_maintenance_history
+from app.extensions import get_master_db, get_mongo_client
+from app.migrations import iter_shop_db_names
+
+
+def _parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Build unit maintenance history rows from work orders.")
+    p.add_argument("--db", action="append", default=[], help="Only this shop DB (repeatable).")
+    p.add_argument("--batch-size", dest="batch_size", type=int, default=REBUILD_BATCH_SIZE,
+                   help="Work orders per bulk write.")
+    return p.parse_args()
+
+
+def main() -> int:
+    args = _parse_args()
+
+    app = create_app()
+    with app.app_context():
+        client = get_mongo_client()
+        targets = args.db or iter_shop_db_names(get_master_db())
+
+        failed = 0
+        for name in targets:
+            try:
+                written = rebuild_maintenance_history(client[name], batch_size=max(args.batch_size, 1))
+            except Exception as exc:
+                failed += 1
+                print(f"shop {name}: FAILED {exc}", file=sys.stderr)
+                continue
+            print(f"shop {name}: {written} history row(s)")
+
+        return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,101 @@
+"""CLI: apply pending schema migrations to the master DB and all shop DBs.
+
+Usage (run from project root with the venv active):
+
+    python -m app.scripts.migrate                 # master + every shop DB behind
+    python -m app.scripts.migrate --status        # only report versions
+    python -m app.scripts.migrate --workers 16    # parallel shop migrations
+    python -m app.scripts.migrate --db shop_acme_main
+
+Migrations are idempotent and recorded per database in
+`master_db.schema_versions`, so re-running is always safe.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Ensure .env is loaded the same way as run.py.
+from dotenv import load_dotenv
+load_dotenv()
+
+from app import create_app
+from app.extensions import get_master_db, get_mongo_client
+from app.migrations import (
+    KIND_MASTER,
+    KIND_SHOP,
+    get_recorded_versions,
+    iter_shop_db_names,
+    latest_version,
+    migrate_master,
+    migrate_shop,
+    pending_shop_databases,
+)
+
+
+def _parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Apply Roobico schema migrations.")
+    p.add_argument("--status", action="store_true", help="Print versions and exit.")
+    p.add_argument("--workers", type=int, default=8, help="Parallel shop DB workers (default 8).")
+    p.add_argument("--db", action="append", default=[], help="Only migrate this shop DB (repeatable).")
+    return p.parse_args()
+
+
+def _print_status(master) -> None:
+    shop_target = latest_version(KIND_SHOP)
+    master_versions = get_recorded_versions(master, KIND_MASTER)
+    shop_versions = get_recorded_versions(master, KIND_SHOP)
+    print(f"master {master.name}: v{master_versions.get(master.name, 0)} / v{latest_version(KIND_MASTER)}")
+    for db_name in iter_shop_db_names(master):
+        current = shop_versions.get(db_name, 0)
+        marker = "" if current >= shop_target else "  (pending)"
+        print(f"shop {db_name}: v{current} / v{shop_target}{marker}")
+
+
+def main() -> int:
+    args = _parse_args()
+
+    app = create_app()
+    with app.app_context():
+        client = get_mongo_client()
+        master = get_master_db()
+
+        if args.status:
+            _print_status(master)
+            return 0
+
+        result = migrate_master(client, master)
+        if result["applied"]:
+            print(f"master: v{result['from']} -> v{result['to']} ({', '.join(result['applied'])})")
+
+        targets = args.db or pending_shop_databases(master)
+        if not targets:
+            print("All shop databases are up to date.")
+            return 0
+
+        failures = 0
+        workers = max(1, args.workers)
+        print(f"Migrating {len(targets)} shop database(s) with {workers} worker(s)...")
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(migrate_shop, client, master, name): name for name in targets}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    res = future.result()
+                except Exception as exc:
+                    failures += 1
+                    print(f"shop {name}: FAILED {exc}", file=sys.stderr)
+                    continue
+                if res["skipped"]:
+                    print(f"shop {name}: skipped ({res['skipped']})")
+                elif res["applied"]:
+                    print(f"shop {name}: v{res['from']} -> v{res['to']} ({', '.join(res['applied'])})")
+                else:
+                    print(f"shop {name}: up to date (v{res['to']})")
+
+        return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
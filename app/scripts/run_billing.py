@@ -0,0 +1,67 @@
+"""CLI: invoice every tenant due for renewal (app/blueprints/billing/batch.py).
+
+Usage (run from project root with the venv active):
+
+    python -m app.scripts.run_billing                       # run id = current month
+    python -m app.scripts.run_billing --dry-run             # snapshot + summary only
+    python -m app.scripts.run_billing --period 2026-10      # re-run: retries failures, skips invoiced periods
+    python -m app.scripts.run_billing --tenant <tenant id> --workers 1
+    python -m app.scripts.run_billing --recount             # rebuild billing_usage counters first
+
+Exit code is 1 when any item failed.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+# Ensure .env is loaded the same way as run.py.
+from dotenv import load_dotenv
+load_dotenv()
+
+from app import create_app
+from app.blueprints.billing.batch import DEFAULT_WORKERS, STATUS_FAILED, run_billing
+from app.extensions import get_master_db
+from app.utils.billing_usage import rebuild_billing_usage
+
+
+def _parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Snapshot billable usage and invoice tenants due for renewal.")
+    p.add_argument("--period", default=datetime.utcnow().strftime("%Y-%m"),
+                   help="Run id (default: YYYY-MM). Items are keyed by tenant and billing period, "
+                        "so re-running, or a later run seeing a still-unpaid tenant, never invoices twice.")
+    p.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent Stripe submissions.")
+    p.add_argument("--due-within", dest="due_within", type=int, default=3,
+                   help="Bill tenants whose subscription ends within this many days.")
+    p.add_argument("--tenant", action="append", default=[], help="Limit to this tenant id (repeatable).")
+    p.add_argument("--dry-run", dest="dry_run", action="store_true", help="Snapshot only, don't call Stripe.")
+    p.add_argument("--recount", action="store_true", help="Rebuild billing_usage counters before the snapshot.")
+    return p.parse_args()
+
+
+def main() -> int:
+    args = _parse_args()
+    tenant_ids = [ObjectId(t) if ObjectId.is_valid(t) else t for t in args.tenant] or None
+
+    app = create_app()
+    with app.app_context():
+        if args.recount:
+            written = rebuild_billing_usage(get_master_db(), tenant_ids)
+            print(f"Recounted billing usage for {written} tenant(s).")
+
+        result = run_billing(
+            args.period,
+            due_before=datetime.utcnow() + timedelta(days=max(args.due_within, 0)),
+            tenant_ids=tenant_ids,
+            workers=args.workers,
+            dry_run=args.dry_run,
+        )
+        print(json.dumps(result, indent=2, default=str))
+    return 1 if (result["summary"].get(STATUS_FAILED) or {}).get("tenants") else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,700 @@
+"""CLI: provision a synthetic tenant + shop with realistic data volumes for load testing.
+
+Creates the tenant, its first shop and an owner login the same way sign-up
+does (`init_tenant_database` / `init_shop_database`, which also migrates the
+shop DB), adds mechanics, then bulk-inserts customers, units, vendors, parts,
+work orders (labors with parts and mechanics, priced by the work-order totals
+engine), payments, parts orders with payments, and calendar events. The
+generated data is the same for the same --seed and volumes.
+
+Usage (run from project root with the venv active, against a LOCAL mongod):
+
+    python -m app.scripts.seed_benchmark_data
+    python -m app.scripts.seed_benchmark_data --drop --customers 2000 --work-orders 50000
+    python -m app.scripts.benchmark --out bench.json      # then measure
+
+Refuses a non-local MONGO_URI unless --allow-remote is given, and an existing
+benchmark tenant unless --drop is given (which deletes it first).
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+# Ensure .env is loaded the same way as run.py.
+from dotenv import load_dotenv
+load_dotenv()
+
+from bson import ObjectId
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+from app.blueprints.calendar.scheduling import MAX_SPAN_KEY
+from app.blueprints.tenant.routes import (
+    init_shop_database,
+    init_tenant_database,
+    make_shop_db_name,
+    make_tenant_db_name,
+    slugify_company_name,
+    slugify_shop_name,
+)
+from app.blueprints.work_orders.maintenance_history import rebuild_maintenance_history
+from app.blueprints.work_orders.pricing import apply_scale_prices
+from app.blueprints.work_orders.routes import (
+    _build_work_order_payment_summary,
+    _get_pricing_context,
+    _price_work_order,
+    normalize_parts_payload,
+)
+from app.extensions import get_master_db, get_mongo_client
+from app.utils.admin_stats import rebuild_admin_stats
+from app.utils.billing_usage import rebuild_billing_usage
+from app.utils.contacts import build_customer_legacy_contact_fields, build_vendor_legacy_contact_fields, normalize_contacts
+from app.utils.parts_ledger import verify_parts_ledger
+from app.utils.parts_search import build_parts_search_terms
+
+
+DEFAULT_COMPANY = "Benchmark Fleet Service"
+DEFAULT_EMAIL = "bench-owner@example.test"
+DEFAULT_PASSWORD = "bench-password"
+
+_LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1", "mongo", "mongodb"}
+
+_FIRST = ["James", "Maria", "Robert", "Linda", "Michael", "Olga", "David", "Sofia", "Daniel", "Anna",
+          "Carlos", "Emily", "Ivan", "Grace", "Omar", "Nina", "Victor", "Paula", "Sergei", "Laura"]
+_LAST = ["Smith", "Garcia", "Johnson", "Petrov", "Brown", "Lopez", "Miller", "Novak", "Davis", "Kim",
+         "Wilson", "Moore", "Taylor", "Ivanova", "Clark", "Lewis", "Walker", "Hall", "Young", "King"]
+_COMPANY_A = ["North", "Prairie", "Lone Star", "Great Lakes", "Summit", "Red River", "Blue Line", "Iron",
+              "Eagle", "Frontier", "Midwest", "Coastal", "Pioneer", "Silver", "Granite"]
+_COMPANY_B = ["Logistics", "Freight", "Transport", "Hauling", "Carriers", "Express", "Trucking", "Lines"]
+_MAKES = {
+    "Freightliner": ["Cascadia", "M2 106", "Columbia"],
+    "Peterbilt": ["579", "389", "567"],
+    "Kenworth": ["T680", "W900", "T880"],
+    "Volvo": ["VNL 860", "VNR 640"],
+    "International": ["LT625", "HX620", "MV607"],
+    "Mack": ["Anthem", "Granite", "Pinnacle"],
+    "Great Dane": ["Everest", "Champion"],
+    "Utility": ["3000R", "4000D-X"],
+}
+_UNIT_TYPES = ["Truck", "Trailer", "Reefer", "Box truck"]
+_PART_GROUPS = [
+    ("FLT", "Filter", ["oil", "fuel", "air", "cabin", "hydraulic", "DEF"]),
+    ("BRK", "Brake", ["pad set", "shoe kit", "drum", "chamber", "slack adjuster", "rotor"]),
+    ("ELC", "Electrical", ["alternator", "starter", "battery", "headlamp", "relay", "harness"]),
+    ("SUS", "Suspension", ["air bag", "shock absorber", "leaf spring", "bushing kit", "torque rod"]),
+    ("ENG", "Engine", ["water pump", "thermostat", "belt", "injector", "turbo gasket", "fan clutch"]),
+    ("TIR", "Tire", ["steer 295/75R22.5", "drive 11R22.5", "trailer 255/70R22.5", "valve stem"]),
+]
+_LABOR_JOBS = ["PM service", "Brake job", "Replace alternator", "DOT inspection", "Diagnose check engine light",
+               "Replace air bags", "Tire rotation", "Replace water pump", "Coolant flush", "Repair wiring harness",
+               "Replace injectors", "Trailer light repair", "Align front end", "Replace clutch"]
+_PAYMENT_METHODS = ["cash", "card", "check", "ach"]
+_EVENT_STATUSES = ["scheduled", "scheduled", "scheduled", "confirmed", "completed", "cancelled"]
+_VIN_CHARS = "ABCDEFGHJKLMNPRSTUVWXYZ0123456789"
+
+
+def _parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Provision a synthetic tenant for load benchmarks.")
+    p.add_argument("--company", default=DEFAULT_COMPANY, help="Tenant / first shop name.")
+    p.add_argument("--email", default=DEFAULT_EMAIL, help="Owner login.")
+    p.add_argument("--password", default=DEFAULT_PASSWORD, help="Owner password.")
+    p.add_argument("--mechanics", type=int, default=6)
+    p.add_argument("--customers", type=int, default=500)
+    p.add_argument("--units-per-customer", type=int, default=3, help="Average; 1..2x this per customer.")
+    p.add_argument("--vendors", type=int, default=25)
+    p.add_argument("--parts", type=int, default=3000)
+    p.add_argument("--work-orders", type=int, default=10000)
+    p.add_argument("--max-labors", type=int, default=4, help="Labor blocks per work order: 1..N.")
+    p.add_argument("--max-parts", type=int, default=4, help="Parts per labor block: 0..N.")
+    p.add_argument("--paid-share", type=float, default=0.75, help="Share of work orders with payments.")
+    p.add_argument("--parts-orders", type=int, default=1500)
+    p.add_argument("--events", type=int, default=5000, help="Calendar events.")
+    p.add_argument("--months", type=int, default=12, help="History spread (work orders, orders, events).")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--batch-size", type=int, default=1000)
+    p.add_argument("--drop", action="store_true", help="Delete an existing tenant with the same name first.")
+    p.add_argument("--allow-remote", action="store_true", help="Allow a non-local MONGO_URI.")
+    return p.parse_args()
+
+
+def _is_local_uri(uri: str) -> bool:
+    if uri.startswith("mongodb+srv://"):
+        return False
+    hosts = urlparse(uri).netloc.rsplit("@", 1)[-1]
+    names = {h.rsplit(":", 1)[0].strip("[]").lower() for h in hosts.split(",") if h}
+    return bool(names) and names <= _LOCAL_HOSTS
+
+
+class _Batcher:
+    """insert_many in chunks; counts what was written."""
+
+    def __init__(self, coll, size: int):
+        self.coll, self.size, self.buf, self.count = coll, size, [], 0
+
+    def add(self, doc: dict) -> None:
+        self.buf.append(doc)
+        if len(self.buf) >= self.size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.buf:
+            self.coll.insert_many(self.buf, ordered=False)
+            self.count += len(self.buf)
+            self.buf = []
+
+
+def _step(label: str, started: float, count: int | None = None) -> None:
+    suffix = f" {count}" if count is not None else ""
+    print(f"  {label}:{suffix} ({time.perf_counter() - started:.1f}s)")
+
+
+def _drop_tenant(master, client, tenant: dict) -> None:
+    tid = tenant["_id"]
+    for shop in master.shops.find({"tenant_id": tid}, {"db_name": 1}):
+        if shop.get("db_name"):
+            client.drop_database(shop["db_name"])
+            master.schema_versions.delete_one({"_id": shop["db_name"]})
+    if tenant.get("db_name"):
+        client.drop_database(tenant["db_name"])
+    master.users.delete_many({"tenant_id": tid})
+    master.shops.delete_many({"tenant_id": tid})
+    master.tenants.delete_one({"_id": tid})
+    master.billing_usage.delete_one({"_id": tid})
+
+
+def _provision(master, args, now: datetime) -> tuple[dict, dict, dict]:
+    """Tenant, shop and owner docs, created like /tenant/register does."""
+    tenant_slug = slugify_company_name(args.company)
+    shop_slug = slugify_shop_name(args.company)
+    tenant_doc = {
+        "name": args.company,
+        "slug": tenant_slug,
+        "db_name": make_tenant_db_name(args.company),
+        "address": "100 Benchmark Way, Dallas, TX 75201",
+        "zip": "75201",
+        "phone": "2145550100",
+        "email": args.email,
+        "contact_name": "Bench Owner",
+        "contact_email": args.email,
+        "timezone": "America/Chicago",
+        "status": "active",
+        "subscription_status": "active",
+        "subscription_until": now + timedelta(days=3650),
+        "created_at": now,
+        "updated_at": now,
+    }
+    tenant_doc["_id"] = master.tenants.insert_one(tenant_doc).inserted_id
+
+    shop_doc = {
+        "tenant_id": tenant_doc["_id"],
+        "name": args.company,
+        "slug": shop_slug,
+        "db_name": make_shop_db_name(tenant_slug, shop_slug),
+        "address": tenant_doc["address"],
+        "zip": tenant_doc["zip"],
+        "phone": tenant_doc["phone"],
+        "email": args.email,
+        "status": "active",
+        "is_active": True,
+        "is_primary": True,
+        "created_at": now,
+        "updated_at": now,
+    }
+    shop_doc["_id"] = master.shops.insert_one(shop_doc).inserted_id
+
+    owner = {
+        "tenant_id": tenant_doc["_id"],
+        "shop_ids": [shop_doc["_id"]],
+        "first_name": "Bench",
+        "last_name": "Owner",
+        "name": "Bench Owner",
+        "email": args.email,
+        "password_hash": generate_password_hash(args.password),
+        "role": "owner",
+        "is_active": True,
+        "created_at": now,
+        "updated_at": now,
+    }
+    owner["_id"] = master.users.insert_one(owner).inserted_id
+
+    init_tenant_database(tenant_doc["db_name"], tenant_doc)
+    init_shop_database(shop_doc["db_name"], tenant_doc, shop_doc, actor_user_id=owner["_id"])
+    return tenant_doc, shop_doc, owner
+
+
+def _person(rng: random.Random, n: int) -> dict:
+    first, last = rng.choice(_FIRST), rng.choice(_LAST)
+    return {
+        "first_name": first,
+        "last_name": last,
+        "phone": f"214555{n % 10000:04d}",
+        "email": f"{first.lower()}.{last.lower()}{n}@example.test",
+        "is_main": True,
+    }
+
+
+def _seed_mechanics(master, rng, args, tenant, shop, now) -> list[dict]:
+    docs = []
+    for i in range(args.mechanics):
+        person = _person(rng, i)
+        docs.append({
+            "tenant_id": tenant["_id"],
+            "shop_ids": [shop["_id"]],
+            "email": f"bench-mechanic-{i + 1}@example.test",
+            "password_hash": generate_password_hash(args.password),
+            "first_name": person["first_name"],
+            "last_name": person["last_name"],
+            "name": f"{person['first_name']} {person['last_name']}",
+            "phone": None,
+            "role": "senior_mechanic" if i == 0 else "mechanic",
+            "is_active": True,
+            "must_reset_password": False,
+            "allow_permissions": [],
+            "deny_permissions": [],
+            "created_at": now,
+            "updated_at": now,
+        })
+    if docs:
+        master.users.insert_many(docs)
+    return [{"user_id": d["_id"], "name": d["name"], "role": d["role"]} for d in docs]
+
+
+def _seed_customers_and_units(sdb, rng, args, shop, owner_id, now) -> tuple[list, dict]:
+    labor_rate = sdb.labor_rates.find_one({"shop_id": shop["_id"], "is_active": True}, {"_id": 1})
+    customers, units_by_customer = [], {}
+    cust_batch = _Batcher(sdb.customers, args.batch_size)
+    unit_batch = _Batcher(sdb.units, args.batch_size)
+    for i in range(args.customers):
+        company = f"{rng.choice(_COMPANY_A)} {rng.choice(_COMPANY_B)} {i + 1}"
+        contacts = normalize_contacts([_person(rng, i)])
+        doc = {
+            "_id": ObjectId(),
+            "company_name": company,
+            "contacts": contacts,
+            "address": f"{100 + i} Commerce St, Dallas, TX 75201",
+            "taxable": rng.random() < 0.3,
+            "default_labor_rate": labor_rate["_id"] if labor_rate else None,
+            "pricing_rule_id": None,
+            "override_part_selling_price": False,
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now,
+            "created_by": owner_id,
+            "updated_by": owner_id,
+            "deactivated_at": None,
+            "deactivated_by": None,
+            "shop_id": shop["_id"],
+            "tenant_id": shop["tenant_id"],
+        }
+        doc.update(build_customer_legacy_contact_fields(contacts))
+        cust_batch.add(doc)
+        customers.append({"_id": doc["_id"], "label": company, "taxable": doc["taxable"]})
+
+        units = []
+        for j in range(rng.randint(1, max(1, args.units_per_customer * 2 - 1))):
+            make = rng.choice(list(_MAKES))
+            unit = {
+                "_id": ObjectId(),
+                "customer_id": doc["_id"],
+                "vin": "".join(rng.choice(_VIN_CHARS) for _ in range(17)),
+                "unit_number": f"U{i + 1:05d}-{j + 1}",
+                "make": make,
+                "model": rng.choice(_MAKES[make]),
+                "year": rng.randint(2008, now.year),
+                "type": rng.choice(_UNIT_TYPES),
+                "mileage": rng.randint(20_000, 900_000),
+                "shop_id": shop["_id"],
+                "tenant_id": shop["tenant_id"],
+                "is_active": True,
+                "created_at": now,
+                "updated_at": now,
+                "created_by": owner_id,
+                "updated_by": owner_id,
+            }
+            unit_batch.add(unit)
+            units.append({"_id": unit["_id"], "label": f"{unit['unit_number']} {unit['year']} {make} {unit['model']}"})
+        units_by_customer[doc["_id"]] = units
+    cust_batch.flush()
+    unit_batch.flush()
+    return customers, units_by_customer
+
+
+def _seed_vendors(sdb, rng, args, shop, owner_id, now) -> list:
+    docs = []
+    for i in range(args.vendors):
+        contacts = normalize_contacts([_person(rng, 5000 + i)])
+        doc = {
+            "name": f"{rng.choice(_COMPANY_A)} Parts Supply {i + 1}",
+            "website": None,
+            "address": f"{200 + i} Industrial Blvd, Dallas, TX 75207",
+            "contacts": contacts,
+            "notes": None,
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now,
+            "created_by": owner_id,
+            "updated_by": owner_id,
+            "deactivated_at": None,
+            "deactivated_by": None,
+            "shop_id": shop["_id"],
+            "tenant_id": shop["tenant_id"],
+        }
+        doc.update(build_vendor_legacy_contact_fields(contacts))
+        docs.append(doc)
+    if docs:
+        sdb.vendors.insert_many(docs)
+    return [d["_id"] for d in docs]
+
+
+def _seed_parts(sdb, rng, args, shop, vendor_ids, owner_id, now) -> list[dict]:
+    category_ids = [c["_id"] for c in sdb.parts_categories.find({}, {"_id": 1})]
+    parts = []
+    batch = _Batcher(sdb.parts, args.batch_size)
+    for i in range(args.parts):
+        prefix, group, names = _PART_GROUPS[i % len(_PART_GROUPS)]
+        part_number = f"{prefix}-{10000 + i}"
+        description = f"{group} {rng.choice(names)}"
+        reference = f"REF{rng.randint(100000, 999999)}"
+        cost = round(rng.uniform(4, 650), 2)
+        doc = {
+            "_id": ObjectId(),
+            "part_number": part_number,
+            "description": description,
+            "reference": reference,
+            "search_terms": build_parts_search_terms(part_number, description, reference),
+            "vendor_id": rng.choice(vendor_ids) if vendor_ids else None,
+            "category_id": rng.choice(category_ids) if category_ids else None,
+            "location_id": None,
+            "do_not_track_inventory": False,
+            "average_cost": cost,
+            "has_selling_price": False,
+            "selling_price": None,
+            "core_has_charge": prefix == "ELC",
+            "core_cost": round(cost * 0.2, 2) if prefix == "ELC" else None,
+            "misc_has_charge": False,
+            "misc_charges": [],
+            "in_stock": rng.randint(0, 40),
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now,
+            "created_by": owner_id,
+            "updated_by": owner_id,
+            "deactivated_at": None,
+            "deactivated_by": None,
+            "shop_id": shop["_id"],
+            "tenant_id": shop["tenant_id"],
+        }
+        batch.add(doc)
+        parts.append({
+            "_id": doc["_id"], "part_number": part_number, "description": description,
+            "cost": cost, "vendor_id": doc["vendor_id"],
+        })
+    batch.flush()
+    return parts
+
+
+def _random_date(rng: random.Random, start: datetime, end: datetime) -> datetime:
+    seconds = int((end - start).total_seconds())
+    return start + timedelta(seconds=rng.randint(0, max(0, seconds)))
+
+
+def _seed_work_orders(sdb, rng, args, shop, customers, units_by_customer, parts, mechanics, owner_id, now) -> tuple[int, int]:
+    rate_codes = [r["code"] for r in sdb.labor_rates.find({"shop_id": shop["_id"], "is_active": True}, {"code": 1})]
+    # Customers carry no pricing rule, so one context serves all; only taxability differs.
+    pricing = _get_pricing_context(sdb, shop)
+    history_start = now - timedelta(days=30 * args.months)
+
+    wo_batch = _Batcher(sdb.work_orders, args.batch_size)
+    pay_batch = _Batcher(sdb.work_order_payments, args.batch_size)
+    for i in range(args.work_orders):
+        customer = rng.choice(customers)
+        unit = rng.choice(units_by_customer[customer["_id"]])
+        wo_date = _random_date(rng, history_start, now).replace(hour=6, minute=0, second=0, microsecond=0)
+
+        labors = []
+        for _ in range(rng.randint(1, max(1, args.max_labors))):
+            raw_parts = [
+                {
+                    "part_id": str(p["_id"]),
+                    "part_number": p["part_number"],
+                    "description": p["description"],
+                    "qty": rng.randint(1, 4),
+                    "cost": p["cost"],
+                    "price": None,  # filled from the pricing scale like the editor does
+                }
+                for p in rng.sample(parts, k=min(len(parts), rng.randint(0, max(0, args.max_parts))))
+            ]
+            assigned = []
+            if mechanics:
+                m = rng.choice(mechanics)
+                assigned = [{**m, "percent": 100.0}]
+            hours = rng.choice([0.5, 1, 1.5, 2, 2.5, 3, 4, 6])
+            labors.append({
+                "labor": {
+                    "description": rng.choice(_LABOR_JOBS),
+                    "hours": f"{hours:g}",
+                    "rate_code": rng.choice(rate_codes) if rate_codes else "",
+                    "labor_full_total": 0.0,
+                    "assigned_mechanics": assigned,
+                    "issue_description": "",
+                },
+                "parts": raw_parts,
+            })
+        apply_scale_prices(labors, pricing["scale"])
+        for block in labors:
+            block["parts"] = normalize_parts_payload(block["parts"])
+        totals = _price_work_order(labors, {**pricing, "is_taxable": customer["taxable"]})
+        for block, block_totals in zip(labors, totals.get("labors") or []):
+            block["labor"]["labor_full_total"] = block_totals.get("labor_full_total") or 0.0
+
+        wo = {
+            "_id": ObjectId(),
+            "shop_id": shop["_id"],
+            "tenant_id": shop["tenant_id"],
+            "wo_number": 1000 + i,
+            "customer_id": customer["_id"],
+            "unit_id": unit["_id"],
+            "status": "open",
+            "labors": labors,
+            "work_order_date": wo_date,
+            "totals": totals,
+            "inventory_deducted": False,
+            "inventory_deductions": [],
+            "is_active": True,
+            "created_at": wo_date,
+            "updated_at": wo_date,
+            "created_by": owner_id,
+            "updated_by": owner_id,
+        }
+
+        paid = 0.0
+        grand_total = float(totals.get("grand_total") or 0)
+        if grand_total > 0 and rng.random() < args.paid_share:
+            installments = rng.choice([1, 1, 1, 2])
+            full = rng.random() < 0.85
+            target = grand_total if full else round(grand_total * rng.uniform(0.2, 0.8), 2)
+            for k in range(installments):
+                amount = round(target - paid, 2) if k == installments - 1 else round(target / installments, 2)
+                if amount <= 0:
+                    continue
+                paid_at = min(now, wo_date + timedelta(days=rng.randint(0, 30)))
+                pay_batch.add({
+                    "work_order_id": wo["_id"],
+                    "shop_id": shop["_id"],
+                    "tenant_id": shop["tenant_id"],
+                    "amount": amount,
+                    "payment_method": rng.choice(_PAYMENT_METHODS),
+                    "notes": "",
+                    "payment_date": paid_at,
+                    "is_active": True,
+                    "created_at": paid_at,
+                    "created_by": owner_id,
+                })
+                paid = round(paid + amount, 2)
+        summary = _build_work_order_payment_summary(wo, paid)
+        wo["status"] = summary["status"]
+        if wo["status"] == "open" and paid <= 0 and (now - wo_date).days < 7 and rng.random() < 0.5:
+            wo["status"] = "in_progress"
+        wo_batch.add(wo)
+    wo_batch.flush()
+    pay_batch.flush()
+
+    # Continue numbering after the seeded work orders (see get_next_wo_number).
+    sdb.counters.update_one(
+        {"_id": f"wo_number_{shop['_id']}"},
+        {"$set": {"seq": args.work_orders, "initial_value": 1000}},
+        upsert=True,
+    )
+    return wo_batch.count, pay_batch.count
+
+
+def _seed_parts_orders(sdb, rng, args, shop, parts, owner_id, now) -> tuple[int, int]:
+    by_vendor: dict = {}
+    for p in parts:
+        if p["vendor_id"]:
+            by_vendor.setdefault(p["vendor_id"], []).append(p)
+    vendor_ids = list(by_vendor)
+    if not vendor_ids:
+        return 0, 0
+    history_start = now - timedelta(days=30 * args.months)
+
+    order_batch = _Batcher(sdb.parts_orders, args.batch_size)
+    pay_batch = _Batcher(sdb.parts_order_payments, args.batch_size)
+    for i in range(args.parts_orders):
+        vendor_id = rng.choice(vendor_ids)
+        pool = by_vendor[vendor_id]
+        items = [
+            {
+                "part_id": p["_id"],
+                "part_number": p["part_number"],
+                "description": p["description"],
+                "price": p["cost"],
+                "quantity": rng.randint(1, 12),
+                "core_charge": 0.0,
+            }
+            for p in rng.sample(pool, k=min(len(pool), rng.randint(1, 6)))
+        ]
+        order_date = _random_date(rng, history_start, now)
+        order = {
+            "_id": ObjectId(),
+            "vendor_id": vendor_id,
+            "order_number": 1000 + i,
+            "vendor_bill": f"INV-{rng.randint(10000, 99999)}",
+            "items": items,
+            "non_inventory_amounts": [],
+            "status": "received" if (now - order_date).days > 3 else "ordered",
+            "order_date": order_date,
+            "is_active": True,
+            "created_at": order_date,
+            "updated_at": order_date,
+            "created_by": owner_id,
+            "updated_by": owner_id,
+            "shop_id": shop["_id"],
+            "tenant_id": shop["tenant_id"],
+        }
+        order_batch.add(order)
+        if rng.random() < 0.7:
+            total = round(sum(it["price"] * it["quantity"] for it in items), 2)
+            paid_at = min(now, order_date + timedelta(days=rng.randint(0, 45)))
+            pay_batch.add({
+                "parts_order_id": order["_id"],
+                "shop_id": shop["_id"],
+                "tenant_id": shop["tenant_id"],
+                "amount": total if rng.random() < 0.8 else round(total / 2, 2),
+                "payment_method": rng.choice(_PAYMENT_METHODS),
+                "notes": "",
+                "payment_date": paid_at,
+                "is_active": True,
+                "created_at": paid_at,
+                "created_by": owner_id,
+            })
+    order_batch.flush()
+    pay_batch.flush()
+
+    sdb.counters.update_one(
+        {"_id": f"order_number_{shop['_id']}"},
+        {"$set": {"seq": args.parts_orders, "initial_value": 1000}},
+        upsert=True,
+    )
+    # Order totals, payment status and vendor_balances come from the ledger.
+    verify_parts_ledger(sdb, repair=True)
+    return order_batch.count, pay_batch.count
+
+
+def _seed_calendar(sdb, rng, args, shop, customers, units_by_customer, mechanics, owner_id, now) -> int:
+    if not mechanics or not customers:
+        return 0
+    first_day = (now - timedelta(days=30 * args.months)).replace(hour=0, minute=0, second=0, microsecond=0)
+    days = 30 * args.months + 28  # history plus four weeks ahead
+    cursors: dict = {}  # (mechanic index, day) -> next free minute
+    batch = _Batcher(sdb.calendar_events, args.batch_size)
+    longest = timedelta(0)
+    attempts = 0
+    while batch.count + len(batch.buf) < args.events and attempts < args.events * 5:
+        attempts += 1
+        mi = rng.randrange(len(mechanics))
+        day = rng.randrange(days)
+        start_min = max(cursors.get((mi, day), 7 * 60), 7 * 60) + rng.choice([0, 0, 15, 30, 60])
+        duration = rng.choice([30, 60, 60, 90, 120, 180, 240])
+        if start_min + duration > 19 * 60:
+            continue
+        cursors[(mi, day)] = start_min + duration
+        start = first_day + timedelta(days=day, minutes=start_min)
+        end = start + timedelta(minutes=duration)
+        longest = max(longest, end - start)
+        customer = rng.choice(customers)
+        unit = rng.choice(units_by_customer[customer["_id"]])
+        mechanic = mechanics[mi]
+        batch.add({
+            "title": customer["label"],
+            "start_time": start,
+            "end_time": end,
+            "status": rng.choice(_EVENT_STATUSES) if start < now else "scheduled",
+            "customer_id": customer["_id"],
+            "customer_label": customer["label"],
+            "unit_id": unit["_id"],
+            "unit_label": unit["label"],
+            "mechanic_id": mechanic["user_id"],
+            "mechanic_name": mechanic["name"],
+            "presets": [],
+            "shop_id": shop["_id"],
+            "tenant_id": shop["tenant_id"],
+            "created_at": now,
+            "updated_at": now,
+            "created_by": owner_id,
+            "updated_by": owner_id,
+        })
+    batch.flush()
+    if longest:
+        sdb.calendar_settings.update_one(
+            {"key": MAX_SPAN_KEY}, {"$max": {"seconds": longest.total_seconds()}}, upsert=True
+        )
+    return batch.count
+
+
+def main() -> int:
+    args = _parse_args()
+    rng = random.Random(args.seed)
+
+    app = create_app()
+    uri = app.config.get("MONGO_URI") or ""
+    if not args.allow_remote and not _is_local_uri(uri):
+        print("Refusing to seed a non-local MONGO_URI (pass --allow-remote to override).", file=sys.stderr)
+        return 2
+
+    with app.app_context():
+        master = get_master_db()
+        client = get_mongo_client()
+        existing = master.tenants.find_one({"slug": slugify_company_name(args.company)})
+        if existing or master.users.find_one({"email": args.email.lower()}):
+            if not args.drop:
+                print(f"Tenant '{args.company}' or user {args.email} already exists (use --drop).", file=sys.stderr)
+                return 2
+            if existing:
+                _drop_tenant(master, client, existing)
+            master.users.delete_many({"email": args.email.lower()})
+
+        started = time.perf_counter()
+        now = datetime.utcnow().replace(microsecond=0)
+        print(f"Seeding '{args.company}' (seed {args.seed})")
+        tenant, shop, owner = _provision(master, args, now)
+        sdb = client[shop["db_name"]]
+        _step("tenant + shop", started)
+
+        mechanics = _seed_mechanics(master, rng, args, tenant, shop, now)
+        _step("mechanics", started, len(mechanics))
+        customers, units_by_customer = _seed_customers_and_units(sdb, rng, args, shop, owner["_id"], now)
+        _step("customers / units", started, len(customers))
+        vendor_ids = _seed_vendors(sdb, rng, args, shop, owner["_id"], now)
+        parts = _seed_parts(sdb, rng, args, shop, vendor_ids, owner["_id"], now)
+        _step("vendors / parts", started, len(parts))
+        wos, wo_payments = _seed_work_orders(
+            sdb, rng, args, shop, customers, units_by_customer, parts, mechanics, owner["_id"], now
+        )
+        _step("work orders / payments", started, wos)
+        history = rebuild_maintenance_history(sdb)
+        _step("maintenance history", started, history)
+        orders, order_payments = _seed_parts_orders(sdb, rng, args, shop, parts, owner["_id"], now)
+        _step("parts orders / payments", started, orders)
+        events = _seed_calendar(sdb, rng, args, shop, customers, units_by_customer, mechanics, owner["_id"], now)
+        _step("calendar events", started, events)
+        rebuild_admin_stats(master)
+        rebuild_billing_usage(master, [tenant["_id"]])
+
+        print(
+            f"Done in {time.perf_counter() - started:.1f}s: shop DB {shop['db_name']}; "
+            f"{len(customers)} customers, {sum(len(u) for u in units_by_customer.values())} units, "
+            f"{len(parts)} parts, {wos} work orders ({wo_payments} payments), "
+            f"{orders} parts orders ({order_payments} payments), {events} events."
+        )
+        print(f"Login: {args.email} / {args.password}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,73 @@
+"""CLI: detect (and repair) drift in materialized parts-order totals / vendor balances.
+
+Recomputes every parts order's order_total / paid_total / remaining_balance
+from its items and active payments, and every vendor_balances doc from the
+orders (see app/utils/parts_ledger.py). Exit status is 1 when drift was found
+and not repaired.
+
+Usage (run from project root with the venv active):
+
+    python -m app.scripts.verify_parts_ledger                  # every shop DB, report only
+    python -m app.scripts.verify_parts_ledger --repair
+    python -m app.scripts.verify_parts_ledger --db shop_acme_main --verbose
+
+Repairs overwrite vendor_balances, so run --repair outside business hours.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+
+# Ensure .env is loaded the same way as run.py.
+from dotenv import load_dotenv
+load_dotenv()
+
+from app import create_app
+from app.extensions import get_master_db, get_mongo_client
+from app.migrations import iter_shop_db_names
+from app.utils.parts_ledger import verify_parts_ledger
+
+
+def _parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Verify parts-order totals and vendor balances.")
+    p.add_argument("--db", action="append", default=[], help="Only this shop DB (repeatable).")
+    p.add_argument("--repair", action="store_true", help="Rewrite drifted orders and vendor balances.")
+    p.add_argument("--verbose", action="store_true", help="Print up to 20 drifted orders per DB.")
+    return p.parse_args()
+
+
+def main() -> int:
+    args = _parse_args()
+
+    app = create_app()
+    with app.app_context():
+        client = get_mongo_client()
+        targets = args.db or iter_shop_db_names(get_master_db())
+
+        unrepaired = 0
+        for name in targets:
+            try:
+                report = verify_parts_ledger(client[name], repair=args.repair)
+            except Exception as exc:
+                unrepaired += 1
+                print(f"shop {name}: FAILED {exc}", file=sys.stderr)
+                continue
+
+            drifted = report["orders_drifted"] + report["vendors_drifted"]
+            action = "repaired" if args.repair else "found"
+            print(
+                f"shop {name}: {report['orders']} order(s), {report['vendors']} vendor(s); "
+                f"drift {action}: {report['orders_drifted']} order(s), {report['vendors_drifted']} vendor(s)"
+            )
+            if args.verbose:
+                for example in report["examples"]:
+                    print("  " + json.dumps(example, default=str))
+            if drifted and not args.repair:
+                unrepaired += 1
+
+        return 1 if unrepaired else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
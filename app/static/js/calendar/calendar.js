@@ -166,6 +166,23 @@
     });
   }
 
+  // POST/PUT an event; on a double-booking 409 ask once and resend with
+  // allow_double_booking. Resolves to the response JSON (or {cancelled: true}).
+  function sendEvent(url, method, payload) {
+    function send(body) {
+      return fetch(url, {
+        method: method,
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(body),
+      }).then(function (r) { return r.json(); });
+    }
+    return send(payload).then(function (data) {
+      if (data.code !== "double_booking") return data;
+      if (!confirm(data.error + "\n\nDouble-book anyway?")) return { cancelled: true };
+      return send(Object.assign({}, payload, { allow_double_booking: true }));
+    });
+  }
+
   function loadCustomers() {
     return fetchJSON("/calendar/api/customers").then(function (data) {
       cachedCustomers = data || [];
@@ -195,12 +212,38 @@
     return fetchJSON("/calendar/api/units/" + customerId);
   }
 
+  // url -> { etag, data }. Switching back to a seen week renders from
+  // memory at once and revalidates with If-None-Match (304 = nothing to do).
+  var eventsWindowCache = {};
+
   function loadEvents() {
     var ws = toISODate(weekStart);
     var we = toISODate(addDays(weekStart, 7));
-    return fetchJSON("/calendar/api/events?start=" + ws + "T00:00:00&end=" + we + "T00:00:00")
-      .then(function (data) {
-        cachedEvents = data || [];
+    var url = "/calendar/api/events?start=" + ws + "T00:00:00&end=" + we + "T00:00:00";
+    var cached = eventsWindowCache[url];
+    var headers = {};
+
+    if (cached) {
+      cachedEvents = cached.data;
+      renderEvents();
+      if (cached.etag) headers["If-None-Match"] = cached.etag;
+    }
+
+    return fetch(url, { headers: headers, cache: "no-store" })
+      .then(function (r) {
+        if (r.status === 304) return null;
+        if (!r.ok) throw new Error("HTTP " + r.status);
+        var etag = r.headers.get("ETag");
+        return r.json().then(function (data) {
+          eventsWindowCache[url] = { etag: etag, data: data || [] };
+          return eventsWindowCache[url];
+        });
+      })
+      .then(function (entry) {
+        if (!entry) return;
+        // Ignore late responses for a week the user already left.
+        if (toISODate(weekStart) !== ws) return;
+        cachedEvents = entry.data;
         renderEvents();
       });
   }
@@ -582,12 +625,7 @@
     var evtId = drag.evt.id;
     drag = null;
 
-    fetch("/calendar/api/events/" + evtId, {
-      method: "PUT",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ start_time: startISO, end_time: endISO }),
-    })
-      .then(function (r) { return r.json(); })
+    sendEvent("/calendar/api/events/" + evtId, "PUT", { start_time: startISO, end_time: endISO })
       .then(function (data) {
         if (data.error) { alert(data.error); }
         loadEvents();
@@ -988,13 +1026,9 @@
       method = "POST";
     }
 
-    fetch(url, {
-      method: method,
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify(payload),
-    })
-      .then(function (r) { return r.json(); })
+    sendEvent(url, method, payload)
       .then(function (data) {
+        if (data.cancelled) return;
         if (data.error) {
           alert(data.error);
           return;
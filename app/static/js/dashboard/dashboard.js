@@ -1,6 +1,10 @@
 (function () {
   let activeBatchId = 0;
   const blockRequestIds = new Map();
+  // Snapshot meta per block ({age_seconds, stale, refreshing}) from the last response.
+  const blockSnapshots = new Map();
+  const REVALIDATE_DELAY_MS = 4000;
+  const REVALIDATE_MAX_POLLS = 8;
 
   function asNumber(value) {
     const n = Number(value);
@@ -269,21 +273,64 @@
     'mechanic-hours': renderMechanicHoursBlock,
   };
 
-  function buildBlockUrl(blockName) {
+  function buildBlockUrl(blockName, force) {
     const template = window.DASHBOARD_METRICS_BLOCK_API_TEMPLATE;
     if (!template) return '';
 
     const baseUrl = template.replace('__BLOCK__', encodeURIComponent(blockName));
-    const qs = buildQueryString();
+    let qs = buildQueryString();
+    if (force) qs = qs ? `${qs}&refresh=1` : '?refresh=1';
     return qs ? `${baseUrl}${qs}` : baseUrl;
   }
 
-  async function loadBlockMetrics(card, batchId) {
+  function formatAge(seconds) {
+    const s = Math.max(0, Math.round(asNumber(seconds)));
+    if (s < 60) return 'just now';
+    if (s < 3600) return `${Math.round(s / 60)} min ago`;
+    if (s < 86400) return `${Math.round(s / 3600)} h ago`;
+    return `${Math.round(s / 86400)} d ago`;
+  }
+
+  function renderSnapshotNote() {
+    const el = document.getElementById('dashSnapshotNote');
+    const textEl = document.getElementById('dashSnapshotNoteText');
+    if (!el || !textEl) return;
+    let oldest = null;
+    let refreshing = false;
+    blockSnapshots.forEach((meta) => {
+      if (!meta || !meta.stale) return;
+      refreshing = refreshing || !!meta.refreshing;
+      if (!oldest || asNumber(meta.age_seconds) > asNumber(oldest.age_seconds)) oldest = meta;
+    });
+    if (!oldest) {
+      el.style.display = 'none';
+      textEl.textContent = '';
+      return;
+    }
+    textEl.textContent = `Figures as of ${formatAge(oldest.age_seconds)}${refreshing ? ' (updating…)' : ''}.`;
+    el.style.display = '';
+  }
+
+  function renderPartialNote(consolidated) {
+    const el = document.getElementById('dashPartialNote');
+    if (!el) return;
+    if (!consolidated || !consolidated.partial) {
+      el.style.display = 'none';
+      el.textContent = '';
+      return;
+    }
+    const names = (consolidated.missing || []).map((m) => m.shop_name).join(', ');
+    el.textContent = `Partial result: ${consolidated.shops_ok} of ${consolidated.shops_total} shops included (missing: ${names}).`;
+    el.style.display = '';
+  }
+
+  async function loadBlockMetrics(card, batchId, options) {
     if (!card) return;
+    const opts = options || {};
 
     const blockName = String(card.dataset.block || '').trim();
     const renderBlock = blockRenderers[blockName];
-    const url = buildBlockUrl(blockName);
+    const url = buildBlockUrl(blockName, !!opts.force);
     if (!blockName || !renderBlock || !url) {
       setCardLoadError(card);
       return;
@@ -291,7 +338,8 @@
 
     const requestId = (blockRequestIds.get(blockName) || 0) + 1;
     blockRequestIds.set(blockName, requestId);
-    setCardLoading(card);
+    // Background revalidation keeps the current figures on screen.
+    if (!opts.quiet) setCardLoading(card);
 
     let lastError = null;
     const maxAttempts = 3;
@@ -318,7 +366,18 @@
           return;
         }
         renderBlock(payload.data);
+        renderPartialNote(payload.consolidated || null);
+        blockSnapshots.set(blockName, payload.snapshot || null);
+        renderSnapshotNote();
         setCardLoaded(card);
+        // Served from a stale snapshot while the server recomputes it: pick up the new one.
+        const polls = asNumber(opts.polls);
+        if (payload.snapshot && payload.snapshot.refreshing && polls < REVALIDATE_MAX_POLLS) {
+          window.setTimeout(() => {
+            if (batchId !== activeBatchId || requestId !== blockRequestIds.get(blockName)) return;
+            loadBlockMetrics(card, batchId, { quiet: true, polls: polls + 1 });
+          }, REVALIDATE_DELAY_MS);
+        }
         return;
       } catch (err) {
         window.clearTimeout(timeoutId);
@@ -335,22 +394,34 @@
     if (batchId !== activeBatchId || requestId !== blockRequestIds.get(blockName)) {
       return;
     }
-    if (lastError) {
+    if (lastError && !opts.quiet) {
       setCardLoadError(card);
     }
   }
 
-  function loadMetrics() {
+  function loadMetrics(force) {
     activeBatchId += 1;
     const batchId = activeBatchId;
+    blockSnapshots.clear();
+    renderSnapshotNote();
     document.querySelectorAll('.dashboard-async-card[data-block]').forEach((card) => {
-      loadBlockMetrics(card, batchId);
+      loadBlockMetrics(card, batchId, { force: !!force });
+    });
+  }
+
+  function initSnapshotRefresh() {
+    const btn = document.getElementById('dashSnapshotRefreshBtn');
+    if (!btn || btn.dataset.bound === '1') return;
+    btn.dataset.bound = '1';
+    btn.addEventListener('click', function () {
+      loadMetrics(true);
     });
   }
 
   function init() {
     loadMetrics();
     initGoalsModal();
+    initSnapshotRefresh();
   }
 
   window.roobicoInitDashboardMetrics = init;
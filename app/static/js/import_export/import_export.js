@@ -15,6 +15,7 @@
   const step2 = document.getElementById("importStep2");
   const step3 = document.getElementById("importStep3");
   const spinner = document.getElementById("importSpinner");
+  const spinnerText = document.getElementById("importSpinnerText");
 
   const mappingBody = document.getElementById("importMappingBody");
   const runBtn = document.getElementById("importRunBtn");
@@ -37,8 +38,83 @@
     fileError.style.display = msg ? "" : "none";
   }
 
-  function setSpinner(on) {
+  function setSpinner(on, text) {
     spinner.style.display = on ? "" : "none";
+    if (spinnerText) spinnerText.textContent = text || "Processing…";
+  }
+
+  const POLL_INTERVAL_MS = 1000;
+
+  function escapeHtml(s) {
+    return String(s == null ? "" : s).replace(/</g, "&lt;");
+  }
+
+  function progressText(progress) {
+    const processed = progress.processed || 0;
+    const total = progress.total_estimate;
+    if (total) {
+      const pct = Math.min(100, Math.round((processed / total) * 100));
+      return "Importing… " + processed + " / ~" + total + " rows (" + pct + "%)";
+    }
+    return "Importing… " + processed + " rows";
+  }
+
+  function showImportResult(job) {
+    const r = job.result || {};
+    let html =
+      '<div class="alert alert-success py-2">' +
+      "<strong>Import complete.</strong> " +
+      (r.imported || 0) + " imported, " +
+      (r.skipped || 0) + " skipped out of " +
+      (r.total || 0) + " rows." +
+      "</div>";
+
+    if (r.has_error_report) {
+      html +=
+        '<div class="alert alert-warning py-2 mt-2">Some rows were skipped. ' +
+        '<a href="/import-export/import/jobs/' + encodeURIComponent(job.id) + '/errors.csv">' +
+        "Download error report (CSV)</a></div>";
+    }
+    resultContent.innerHTML = html;
+  }
+
+  function showImportError(msg) {
+    resultContent.innerHTML =
+      '<div class="alert alert-danger py-2">' +
+      "<strong>Error:</strong> " + escapeHtml(msg || "Import failed.") +
+      "</div>";
+  }
+
+  function pollImportJob(jobId) {
+    fetch("/import-export/import/jobs/" + encodeURIComponent(jobId), { cache: "no-store" })
+      .then(function (r) { return r.json(); })
+      .then(function (data) {
+        if (!data.ok) {
+          setSpinner(false);
+          showImportError(data.error);
+          showStep(3);
+          return;
+        }
+        const job = data.job;
+        if (job.status === "done") {
+          setSpinner(false);
+          showImportResult(job);
+          showStep(3);
+          return;
+        }
+        if (job.status === "failed" || job.stale) {
+          setSpinner(false);
+          showImportError(job.error || "Import job stopped unexpectedly.");
+          showStep(3);
+          return;
+        }
+        setSpinner(true, progressText(job.progress || {}));
+        setTimeout(function () { pollImportJob(jobId); }, POLL_INTERVAL_MS);
+      })
+      .catch(function () {
+        // transient network error — keep polling
+        setTimeout(function () { pollImportJob(jobId); }, POLL_INTERVAL_MS * 3);
+      });
   }
 
   function buildSelect(fileHeader) {
@@ -177,34 +253,14 @@
     fetch("/import-export/import", { method: "POST", body: fd })
       .then(function (r) { return r.json(); })
       .then(function (data) {
-        setSpinner(false);
-
         if (!data.ok) {
-          resultContent.innerHTML =
-            '<div class="alert alert-danger py-2">' +
-            '<strong>Error:</strong> ' + (data.error || "Import failed.") +
-            "</div>";
-        } else {
-          let html =
-            '<div class="alert alert-success py-2">' +
-            "<strong>Import complete.</strong> " +
-            data.imported + " imported, " +
-            data.skipped + " skipped out of " +
-            data.total + " rows." +
-            "</div>";
-
-          if (data.errors && data.errors.length) {
-            html += '<div class="alert alert-warning py-2 mt-2"><strong>Warnings:</strong><ul class="mb-0 small">';
-            data.errors.forEach(function (e) {
-              html += "<li>" + e.replace(/</g, "&lt;") + "</li>";
-            });
-            html += "</ul></div>";
-          }
-
-          resultContent.innerHTML = html;
+          setSpinner(false);
+          showImportError(data.error);
+          showStep(3);
+          return;
         }
-
-        showStep(3);
+        setSpinner(true, "Import queued…");
+        pollImportJob(data.job_id);
       })
       .catch(function (err) {
         setSpinner(false);
@@ -225,4 +281,79 @@
     showStep(1);
     showError("");
   });
+
+  // ── Export ──
+
+  const exportEntity = document.getElementById("exportEntity");
+  const exportFormat = document.getElementById("exportFormat");
+  const exportRunBtn = document.getElementById("exportRunBtn");
+  const exportStatus = document.getElementById("exportStatus");
+
+  function setExportStatus(html) {
+    if (exportStatus) exportStatus.innerHTML = html || "";
+  }
+
+  function pollExportJob(jobId) {
+    fetch("/import-export/export/jobs/" + encodeURIComponent(jobId), { cache: "no-store" })
+      .then(function (r) { return r.json(); })
+      .then(function (data) {
+        if (!data.ok) {
+          exportRunBtn.disabled = false;
+          setExportStatus('<span class="text-danger">' + escapeHtml(data.error || "Export failed.") + "</span>");
+          return;
+        }
+        const job = data.job;
+        if (job.status === "done") {
+          exportRunBtn.disabled = false;
+          const rows = (job.result && job.result.rows) || 0;
+          setExportStatus(
+            "Export ready (" + rows + " rows). " +
+            '<a href="/import-export/export/jobs/' + encodeURIComponent(job.id) + '/download">Download</a>'
+          );
+          window.location.href = "/import-export/export/jobs/" + encodeURIComponent(job.id) + "/download";
+          return;
+        }
+        if (job.status === "failed" || job.stale) {
+          exportRunBtn.disabled = false;
+          setExportStatus('<span class="text-danger">' + escapeHtml(job.error || "Export job stopped unexpectedly.") + "</span>");
+          return;
+        }
+        const p = job.progress || {};
+        setExportStatus("Exporting… " + (p.processed || 0) + (p.total_estimate ? " / " + p.total_estimate : "") + " rows");
+        setTimeout(function () { pollExportJob(jobId); }, POLL_INTERVAL_MS);
+      })
+      .catch(function () {
+        setTimeout(function () { pollExportJob(jobId); }, POLL_INTERVAL_MS * 3);
+      });
+  }
+
+  if (exportRunBtn) {
+    exportRunBtn.addEventListener("click", function () {
+      const fd = new FormData();
+      fd.append("format", exportFormat.value);
+      exportRunBtn.disabled = true;
+      setExportStatus("Preparing export…");
+
+      fetch("/import-export/export/" + encodeURIComponent(exportEntity.value), { method: "POST", body: fd })
+        .then(function (r) { return r.json(); })
+        .then(function (data) {
+          if (!data.ok) {
+            exportRunBtn.disabled = false;
+            setExportStatus('<span class="text-danger">' + escapeHtml(data.error || "Export failed.") + "</span>");
+            return;
+          }
+          if (data.mode === "stream") {
+            exportRunBtn.disabled = false;
+            setExportStatus("Downloading " + data.total + " rows…");
+            window.location.href = data.url;
+            return;
+          }
+          pollExportJob(data.job_id);
+        })
+        .catch(function (err) {
+          exportRunBtn.disabled = false;
+          setExportStatus('<span class="text-danger">Network error: ' + escapeHtml(err.message) + "</span>");
+        });
+    });
+  }
 })();
@@ -978,6 +978,9 @@
     params.set("sort_by", field);
     params.set("sort_dir", dir);
     params.delete("page");
+    // Keyset cursors (activity journal) are tied to the previous sort.
+    params.delete("after");
+    params.delete("before");
     var keysToDelete = [];
     params.forEach(function (_, k) {
       if (/_page$/.test(k)) keysToDelete.push(k);
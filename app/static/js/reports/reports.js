@@ -300,6 +300,22 @@
       '<td class="text-end fw-semibold">$' + fmtMoney(row.remaining_balance) + '</td></tr>';
   }
 
+  function renderPartialMarker(consolidated) {
+    var el = document.getElementById("reportPartial");
+    if (!el) return;
+    if (!consolidated || !consolidated.partial) {
+      el.classList.add("d-none");
+      el.textContent = "";
+      return;
+    }
+    var names = (consolidated.missing || []).map(function (m) {
+      return m.shop_name + (m.reason === "timeout" ? " (timed out)" : " (unavailable)");
+    });
+    el.textContent = "Partial result: " + consolidated.shops_ok + " of " + consolidated.shops_total +
+      " shops included. Missing: " + names.join(", ") + ".";
+    el.classList.remove("d-none");
+  }
+
   function loadReportData() {
     var card = document.getElementById("reportCard");
     if (!card) return;
@@ -352,6 +368,7 @@
         var rd = data.report_data || {};
         if (titleEl) titleEl.textContent = rd.title || "Report";
         if (shopEl) shopEl.textContent = "Shop: " + (data.shop_name || "-");
+        renderPartialMarker(data.consolidated || null);
         if (footerEl) footerEl.textContent = "Generated: " + new Date().toLocaleString();
 
         if (rd.summary && Object.keys(rd.summary).length) {
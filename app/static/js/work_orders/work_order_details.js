@@ -867,6 +867,47 @@
       if (!btn) return;
       btn.disabled = blocks.length <= 1;
     });
+
+    if (blocks.length) scheduleTotalsPreview(blocksContainer);
+  }
+
+  // ---------------- server totals preview ----------------
+  // The server prices the WO on save; mirror its grand total / tax while
+  // editing so what the user sees is what gets stored.
+  let totalsPreviewTimer = null;
+  let totalsPreviewSeq = 0;
+
+  function scheduleTotalsPreview(blocksContainer) {
+    if (totalsPreviewTimer) clearTimeout(totalsPreviewTimer);
+    totalsPreviewTimer = setTimeout(() => { requestTotalsPreview(blocksContainer); }, 400);
+  }
+
+  async function requestTotalsPreview(blocksContainer) {
+    const seq = ++totalsPreviewSeq;
+    const created = readJsonScript("workOrderCreatedData", { created: false, id: "" });
+    const totals = serializeTotals(blocksContainer);
+    let data = null;
+    try {
+      data = await apiPostJson("/work_orders/api/totals/preview", {
+        labors: serializeBlocks(blocksContainer),
+        customer_id: String($("customerSelect")?.value || "").trim(),
+        work_order_id: created && created.created ? String(created.id || "") : "",
+        totals: { is_taxable: totals.is_taxable, shop_supply_override: totals.shop_supply_override },
+      });
+    } catch {
+      return;
+    }
+    if (seq !== totalsPreviewSeq || !data || !data.totals) return;
+
+    const serverTotals = data.totals;
+    const grandEl = $("grandTotalDisplay");
+    if (grandEl && Number.isFinite(Number(serverTotals.grand_total))) {
+      grandEl.textContent = `$${money(round2(Number(serverTotals.grand_total)))}`;
+    }
+    const salesTaxEl = $("salesTaxGrandTotalDisplay");
+    if (salesTaxEl && Number.isFinite(Number(serverTotals.sales_tax_total))) {
+      salesTaxEl.textContent = `$${money(round2(Number(serverTotals.sales_tax_total)))}`;
+    }
   }
 
   // ---------------- totals serialization (FRONT -> BACK) ----------------
@@ -963,6 +1004,10 @@
       misc_taxable_total: miscTaxableSum,
       cost_total: round2(partsBaseSum),
       shop_supply_total: round2(supplySum),
+      // null = server applies the shop supply % itself.
+      shop_supply_override: (Number.isFinite(shopSupplyManualOverride) && shopSupplyManualOverride >= 0)
+        ? round2(shopSupplyManualOverride)
+        : null,
       parts_taxable_total: round2(partsBaseSum + miscTaxableSum),
       sales_tax_rate: Number.isFinite(currentSalesTaxRate) ? Number(currentSalesTaxRate.toFixed(6)) : 0,
       sales_tax_total: salesTaxSum,
@@ -0,0 +1,92 @@
+"""Platform-wide counters for the admin dashboard.
+
+`master_db.admin_stats` holds a single document
+
+    {"_id": "global", "tenants_total", "tenants_active", "shops_total",
+     "shops_active", "users_total", "users_active", "updated_at"}
+
+kept current with `$inc` by the code paths that create tenants / shops /
+users or flip their active flag (`record_created`, `record_active_change`),
+so the dashboard reads one document however many tenants exist.
+
+"Active" means tenant `status == "active"` and shop / user
+`is_active is True`, the same filters the dashboard used to count with.
+`rebuild_admin_stats` recounts from scratch (master migration 7, the
+dashboard's Recount button) if the counters drift, e.g. after manual edits
+in the database.
+"""
+from __future__ import annotations
+
+from app.extensions import get_master_db
+from app.utils.counters import bump_counters, write_recount
+
+
+STATS_ID = "global"
+KINDS = ("tenants", "shops", "users")
+COUNTER_FIELDS = tuple(f"{kind}_{suffix}" for kind in KINDS for suffix in ("total", "active"))
+
+# How each collection decides "active" in the recount.
+_ACTIVE_EXPR = {
+    "tenants": {"$eq": ["$status", "active"]},
+    "shops": {"$eq": ["$is_active", True]},
+    "users": {"$eq": ["$is_active", True]},
+}
+
+
+def bump_admin_stats(master=None, **deltas: int) -> None:
+    """`$inc` the given counters (app.utils.counters.bump_counters)."""
+    master = master if master is not None else get_master_db()
+    bump_counters(master.admin_stats, STATS_ID, COUNTER_FIELDS, deltas)
+
+
+def record_created(master, kind: str, *, active: bool, count: int = 1) -> None:
+    bump_admin_stats(master, **{f"{kind}_total": count, f"{kind}_active": count if active else 0})
+
+
+def record_active_change(master, kind: str, was_active: bool, is_active: bool) -> None:
+    if bool(was_active) != bool(is_active):
+        bump_admin_stats(master, **{f"{kind}_active": 1 if is_active else -1})
+
+
+def rebuild_admin_stats(master=None) -> dict:
+    """Recount every counter (one `$group` per collection) and overwrite the document."""
+    master = master if master is not None else get_master_db()
+    doc: dict = {}
+    for kind in KINDS:
+        rows = list(master[kind].aggregate([
+            {"$group": {
+                "_id": None,
+                "total": {"$sum": 1},
+                "active": {"$sum": {"$cond": [_ACTIVE_EXPR[kind], 1, 0]}},
+            }},
+        ]))
+        doc[f"{kind}_total"] = rows[0]["total"] if rows else 0
+        doc[f"{kind}_active"] = rows[0]["active"] if rows else 0
+    return write_recount(master.admin_stats, STATS_ID, doc)
+
+
+def get_admin_stats(master=None) -> dict:
+    """The counters document; recounted on first use."""
+    master = master if master is not None else get_master_db()
+    doc = master.admin_stats.find_one({"_id": STATS_ID})
+    if doc is None:
+        doc = rebuild_admin_stats(master)
+    for field in COUNTER_FIELDS:
+        doc[field] = max(0, int(doc.get(field) or 0))
+    return doc
+
+
+def tenant_member_counts(master, tenant_ids: list) -> dict:
+    """{tenant_id: {"shops_count", "users_count"}} for a page of tenants (one `$group` per collection)."""
+    counts = {tid: {"shops_count": 0, "users_count": 0} for tid in tenant_ids}
+    if not tenant_ids:
+        return counts
+    for collection, field in (("shops", "shops_count"), ("users", "users_count")):
+        rows = master[collection].aggregate([
+            {"$match": {"tenant_id": {"$in": list(tenant_ids)}}},
+            {"$group": {"_id": "$tenant_id", "n": {"$sum": 1}}},
+        ])
+        for row in rows:
+            if row["_id"] in counts:
+                counts[row["_id"]][field] = row["n"]
+    return counts
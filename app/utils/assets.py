@@ -0,0 +1,181 @@
+"""Content-hashed static assets.
+
+`python -m app.scripts.build_assets` copies every file under app/static into
+app/static/dist/ with a content hash in its name (JS/CSS minified when
+rjsmin/rcssmin are installed), writes `.gz` / `.br` siblings for text assets
+and records the mapping in dist/manifest.json:
+
+    {"js/parts/parts.js": "dist/js/parts/parts.3f9a1c2b7d4e.js", ...}
+
+At runtime `url_for('static', filename=...)` resolves to the hashed file when
+it is in the manifest (nginx serves dist/ as immutable). Anything not in the
+manifest — local dev, or a file added since the last build — falls back to
+`?v=<content hash>` of the source file, so the cache-buster still changes
+only when the file does.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from threading import Lock
+
+DIST_DIR = "dist"
+MANIFEST_NAME = "manifest.json"
+HASH_LENGTH = 12
+
+# Text assets get minified (js/css) and precompressed siblings.
+COMPRESSIBLE_EXTENSIONS = {".js", ".css", ".svg", ".json", ".map", ".txt"}
+# Below this size gzip/brotli framing costs more than it saves.
+COMPRESS_MIN_BYTES = 512
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def hashed_filename(rel_path: str, digest: str) -> str:
+    root, ext = os.path.splitext(rel_path)
+    return f"{root}.{digest}{ext}"
+
+
+def _minify(rel_path: str, data: bytes) -> bytes:
+    ext = os.path.splitext(rel_path)[1].lower()
+    try:
+        if ext == ".js":
+            import rjsmin
+            return rjsmin.jsmin(data.decode("utf-8")).encode("utf-8")
+        if ext == ".css":
+            import rcssmin
+            return rcssmin.cssmin(data.decode("utf-8")).encode("utf-8")
+    except ImportError:
+        pass
+    return data
+
+
+def _brotli_available() -> bool:
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _brotli_compress(data: bytes) -> bytes:
+    import brotli
+    return brotli.compress(data, quality=11)
+
+
+def _write_bytes(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+def _iter_source_files(static_dir: str):
+    dist_root = os.path.join(static_dir, DIST_DIR)
+    for root, dirs, files in os.walk(static_dir):
+        if os.path.abspath(root).startswith(os.path.abspath(dist_root)):
+            dirs[:] = []
+            continue
+        dirs.sort()
+        for name in sorted(files):
+            if name.startswith("."):
+                continue
+            path = os.path.join(root, name)
+            yield os.path.relpath(path, static_dir).replace(os.sep, "/"), path
+
+
+def build_assets(static_dir: str, *, minify: bool = True, compress: bool = True, clean: bool = False) -> dict:
+    """
+    Fingerprint every static file into `static_dir/dist` and write the manifest.
+    Returns {"manifest": {...}, "files": n, "bytes_in": n, "bytes_out": n, "brotli": bool}.
+
+    Old hashed files are kept unless `clean` is set, so pages rendered by
+    workers that haven't restarted yet keep resolving during a deploy.
+    """
+    dist_root = os.path.join(static_dir, DIST_DIR)
+    if clean and os.path.isdir(dist_root):
+        shutil.rmtree(dist_root)
+
+    manifest: dict[str, str] = {}
+    use_brotli = compress and _brotli_available()
+    stats = {"files": 0, "bytes_in": 0, "bytes_out": 0, "brotli": use_brotli}
+    for rel_path, src in _iter_source_files(static_dir):
+        with open(src, "rb") as fh:
+            data = fh.read()
+        stats["bytes_in"] += len(data)
+        ext = os.path.splitext(rel_path)[1].lower()
+        if minify:
+            data = _minify(rel_path, data)
+
+        out_rel = f"{DIST_DIR}/{hashed_filename(rel_path, content_hash(data))}"
+        out_path = os.path.join(static_dir, *out_rel.split("/"))
+        manifest[rel_path] = out_rel
+        stats["files"] += 1
+        stats["bytes_out"] += len(data)
+        if os.path.exists(out_path):
+            continue  # same name => same content
+
+        _write_bytes(out_path, data)
+        if compress and ext in COMPRESSIBLE_EXTENSIONS and len(data) >= COMPRESS_MIN_BYTES:
+            # mtime=0 keeps the .gz byte-identical across builds.
+            _write_bytes(f"{out_path}.gz", gzip.compress(data, compresslevel=9, mtime=0))
+            if use_brotli:
+                _write_bytes(f"{out_path}.br", _brotli_compress(data))
+
+    _write_bytes(
+        os.path.join(dist_root, MANIFEST_NAME),
+        json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8"),
+    )
+    stats["manifest"] = manifest
+    return stats
+
+
+class AssetResolver:
+    """Maps static filenames to hashed paths (manifest) or `?v=` source hashes."""
+
+    def __init__(self, static_dir: str):
+        self.static_dir = static_dir
+        self.manifest = self._load_manifest()
+        self._source_hashes: dict[str, tuple[float, str]] = {}
+        self._lock = Lock()
+
+    def _load_manifest(self) -> dict[str, str]:
+        path = os.path.join(self.static_dir, DIST_DIR, MANIFEST_NAME)
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def source_hash(self, filename: str) -> str | None:
+        path = os.path.join(self.static_dir, *filename.split("/"))
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        cached = self._source_hashes.get(filename)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, "rb") as fh:
+            digest = content_hash(fh.read())
+        with self._lock:
+            self._source_hashes[filename] = (mtime, digest)
+        return digest
+
+    def url_defaults(self, values: dict, fallback_version: str) -> None:
+        filename = values.get("filename")
+        if not filename:
+            return
+        hashed = self.manifest.get(filename)
+        if hashed:
+            values["filename"] = hashed
+            values.pop("v", None)  # the name already changes with the content
+            return
+        values["v"] = self.source_hash(filename) or values.get("v") or fallback_version
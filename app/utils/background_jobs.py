@@ -0,0 +1,223 @@
+"""Lightweight background jobs for long-running, user-triggered work.
+
+Jobs run on a small in-process thread pool (per gunicorn worker) and keep
+their state in `master_db.background_jobs`, so any worker can answer a
+progress poll:
+
+    {"_id", "kind", "status": queued|running|done|failed,
+     "tenant_id", "shop_id", "user_id", "params",
+     "progress": {...}, "result": {...}, "error": str,
+     "created_at", "started_at", "finished_at", "updated_at"}
+
+A job target is `fn(job_id, **params)` and runs inside an app context.
+Jobs are not durable across restarts: a worker restart leaves the job in
+"running" and the UI reports it as stale after JOB_STALE_AFTER.
+
+Records expire after JOB_TTL (TTL index, master migration 2); their files in
+`job_work_dir` (uploads, error reports, exports) are removed by
+`sweep_job_files`, which `create_job` runs at most once per
+JOB_FILE_SWEEP_INTERVAL per worker.
+"""
+from __future__ import annotations
+
+import os
+import tempfile
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+
+from bson import ObjectId
+from flask import current_app
+
+from app.extensions import get_master_db
+
+
+JOBS_COLLECTION = "background_jobs"
+JOB_STALE_AFTER = timedelta(minutes=10)
+JOB_TTL = timedelta(days=7)
+JOB_FILE_SWEEP_INTERVAL = timedelta(hours=1)
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = Lock()
+_last_file_sweep: datetime | None = None
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = int(current_app.config.get("BACKGROUND_JOB_WORKERS") or 2)
+            _executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="bg-job")
+        return _executor
+
+
+def get_jobs_collection():
+    return get_master_db()[JOBS_COLLECTION]
+
+
+def job_work_dir() -> str:
+    """Directory for job inputs/outputs (uploads, error reports, exports)."""
+    path = current_app.config.get("BACKGROUND_JOB_DIR") or os.path.join(tempfile.gettempdir(), "roobico_jobs")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def job_file_path(job_id, suffix: str) -> str:
+    return os.path.join(job_work_dir(), f"{job_id}{suffix}")
+
+
+def sweep_job_files() -> int:
+    """
+    Delete files in `job_work_dir` whose job record is gone (TTL-expired) or
+    older than JOB_TTL. Files not named after a job id are left alone.
+    Returns the number of files removed.
+    """
+    work_dir = job_work_dir()
+    by_job: dict[ObjectId, list[str]] = {}
+    for name in os.listdir(work_dir):
+        prefix = name[:24]
+        if ObjectId.is_valid(prefix):
+            by_job.setdefault(ObjectId(prefix), []).append(name)
+    if not by_job:
+        return 0
+
+    live = {d["_id"] for d in get_jobs_collection().find({"_id": {"$in": list(by_job)}}, {"_id": 1})}
+    cutoff = utcnow() - JOB_TTL
+    removed = 0
+    for job_id, names in by_job.items():
+        if job_id in live and job_id.generation_time > cutoff:
+            continue
+        for name in names:
+            try:
+                os.remove(os.path.join(work_dir, name))
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def _maybe_sweep_job_files() -> None:
+    global _last_file_sweep
+    now = utcnow()
+    with _executor_lock:
+        if _last_file_sweep is not None and now - _last_file_sweep < JOB_FILE_SWEEP_INTERVAL:
+            return
+        _last_file_sweep = now
+    try:
+        sweep_job_files()
+    except Exception:
+        current_app.logger.warning("Background job file sweep failed", exc_info=True)
+
+
+def create_job(kind: str, *, tenant_id=None, shop_id=None, user_id=None, params: dict | None = None) -> ObjectId:
+    now = utcnow()
+    doc = {
+        "kind": kind,
+        "status": STATUS_QUEUED,
+        "tenant_id": tenant_id,
+        "shop_id": shop_id,
+        "user_id": user_id,
+        "params": params or {},
+        "progress": {},
+        "result": None,
+        "error": "",
+        "created_at": now,
+        "updated_at": now,
+    }
+    job_id = get_jobs_collection().insert_one(doc).inserted_id
+    _maybe_sweep_job_files()
+    return job_id
+
+
+def submit_job(job_id: ObjectId, target, **kwargs) -> None:
+    """Run `target(job_id, **kwargs)` on the pool inside an app context."""
+    app = current_app._get_current_object()
+
+    def _run():
+        with app.app_context():
+            jobs = get_jobs_collection()
+            jobs.update_one(
+                {"_id": job_id},
+                {"$set": {"status": STATUS_RUNNING, "started_at": utcnow(), "updated_at": utcnow()}},
+            )
+            try:
+                result = target(job_id, **kwargs)
+            except Exception as exc:
+                app.logger.error("[JOB] %s failed: %s\n%s", job_id, exc, traceback.format_exc())
+                jobs.update_one(
+                    {"_id": job_id},
+                    {"$set": {
+                        "status": STATUS_FAILED,
+                        "error": str(exc)[:2000],
+                        "finished_at": utcnow(),
+                        "updated_at": utcnow(),
+                    }},
+                )
+                return
+            jobs.update_one(
+                {"_id": job_id},
+                {"$set": {
+                    "status": STATUS_DONE,
+                    "result": result,
+                    "finished_at": utcnow(),
+                    "updated_at": utcnow(),
+                }},
+            )
+
+    _get_executor().submit(_run)
+
+
+def update_job_progress(job_id: ObjectId, **progress) -> None:
+    get_jobs_collection().update_one(
+        {"_id": job_id},
+        {"$set": {
+            **{f"progress.{k}": v for k, v in progress.items()},
+            "updated_at": utcnow(),
+        }},
+    )
+
+
+def get_job(job_id, *, tenant_id=None, shop_id=None, kind: str | None = None) -> dict | None:
+    try:
+        oid = ObjectId(str(job_id))
+    except Exception:
+        return None
+    query = {"_id": oid}
+    if tenant_id is not None:
+        query["tenant_id"] = tenant_id
+    if shop_id is not None:
+        query["shop_id"] = shop_id
+    if kind:
+        query["kind"] = kind
+    return get_jobs_collection().find_one(query)
+
+
+def serialize_job(job: dict) -> dict:
+    status = job.get("status") or STATUS_QUEUED
+    updated_at = job.get("updated_at")
+    if isinstance(updated_at, datetime) and updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    stale = (
+        status in (STATUS_QUEUED, STATUS_RUNNING)
+        and isinstance(updated_at, datetime)
+        and utcnow() - updated_at > JOB_STALE_AFTER
+    )
+    return {
+        "id": str(job["_id"]),
+        "kind": job.get("kind"),
+        "status": status,
+        "stale": stale,
+        "progress": job.get("progress") or {},
+        "result": job.get("result"),
+        "error": job.get("error") or "",
+    }
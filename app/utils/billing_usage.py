@@ -0,0 +1,95 @@
+"""Per-tenant billable-unit counters for Stripe invoicing.
+
+`master_db.billing_usage` holds one document per tenant
+
+    {"_id": tenant_id, "locations_active", "full_active", "mech_active", "updated_at"}
+
+kept current with `$inc` by the code paths that create shops / users, flip
+their active flag or change a user's role (`record_shop_change`,
+`record_user_change`), so invoicing reads one document instead of scanning
+the tenant's users. Mechanics (MECHANIC_ROLES) are billed at the mechanic
+rate, every other active user as a full user.
+
+`rebuild_billing_usage` recounts (all tenants, or some) with one `$group`
+per collection: master migration 8, `python -m app.scripts.run_billing
+--recount`, and `get_billing_usage` for a tenant that has no document yet.
+"""
+from __future__ import annotations
+
+from app.extensions import get_master_db
+from app.utils.counters import bump_counters, write_recount
+
+
+USAGE_FIELDS = ("locations_active", "full_active", "mech_active")
+MECHANIC_ROLES = frozenset({"mechanic", "senior_mechanic"})
+
+
+def usage_bucket(role) -> str:
+    """Counter an active user with `role` is billed under."""
+    return "mech_active" if str(role or "").strip().lower() in MECHANIC_ROLES else "full_active"
+
+
+def bump_billing_usage(master, tenant_id, **deltas: int) -> None:
+    """`$inc` a tenant's counters (app.utils.counters.bump_counters)."""
+    master = master if master is not None else get_master_db()
+    bump_counters(master.billing_usage, tenant_id, USAGE_FIELDS, deltas)
+
+
+def record_user_change(master, tenant_id, before: dict | None, after: dict | None) -> None:
+    """
+    `before` / `after` are the user's {"is_active", "role"} around a write
+    (None for "didn't exist"). Moves the user between counters as needed.
+    """
+    deltas: dict[str, int] = {}
+    if before and before.get("is_active") is True:
+        bucket = usage_bucket(before.get("role"))
+        deltas[bucket] = deltas.get(bucket, 0) - 1
+    if after and after.get("is_active") is True:
+        bucket = usage_bucket(after.get("role"))
+        deltas[bucket] = deltas.get(bucket, 0) + 1
+    bump_billing_usage(master, tenant_id, **deltas)
+
+
+def record_shop_change(master, tenant_id, was_active: bool, is_active: bool) -> None:
+    if bool(was_active) != bool(is_active):
+        bump_billing_usage(master, tenant_id, locations_active=1 if is_active else -1)
+
+
+def rebuild_billing_usage(master=None, tenant_ids: list | None = None) -> int:
+    """Recount and overwrite the counters of `tenant_ids` (default: every tenant). Returns tenants written."""
+    master = master if master is not None else get_master_db()
+    if tenant_ids is None:
+        tenant_ids = [t["_id"] for t in master.tenants.find({}, {"_id": 1})]
+    if not tenant_ids:
+        return 0
+    counts = {tid: dict.fromkeys(USAGE_FIELDS, 0) for tid in tenant_ids}
+
+    match = {"tenant_id": {"$in": list(tenant_ids)}, "is_active": True}
+    for row in master.shops.aggregate([
+        {"$match": match},
+        {"$group": {"_id": "$tenant_id", "n": {"$sum": 1}}},
+    ]):
+        if row["_id"] in counts:
+            counts[row["_id"]]["locations_active"] = row["n"]
+    # Grouped by role too, so the role -> counter rule stays in usage_bucket.
+    for row in master.users.aggregate([
+        {"$match": match},
+        {"$group": {"_id": {"tenant_id": "$tenant_id", "role": "$role"}, "n": {"$sum": 1}}},
+    ]):
+        tid = row["_id"].get("tenant_id")
+        if tid in counts:
+            counts[tid][usage_bucket(row["_id"].get("role"))] += row["n"]
+
+    for tid, doc in counts.items():
+        write_recount(master.billing_usage, tid, doc)
+    return len(counts)
+
+
+def get_billing_usage(master, tenant_id) -> dict:
+    """{"locations_active", "full_active", "mech_active"} for one tenant; recounted on first use."""
+    master = master if master is not None else get_master_db()
+    doc = master.billing_usage.find_one({"_id": tenant_id})
+    if doc is None:
+        rebuild_billing_usage(master, [tenant_id])
+        doc = master.billing_usage.find_one({"_id": tenant_id}) or {}
+    return {field: max(0, int(doc.get(field) or 0)) for field in USAGE_FIELDS}
@@ -0,0 +1,250 @@
+"""Per-worker TTL/LRU caches with cross-worker invalidation.
+
+    _tz_cache = TTLCache("shop_timezone", maxsize=2048, ttl=600)
+    tz = _tz_cache.get_or_load(key, load_tz, scope=shop_id)
+    ...
+    invalidate_cache("shop_timezone", shop_id)   # after the settings write
+
+Invalidation is by version stamp. `invalidate_cache(namespace, scope)` bumps a
+counter in `master_db.cache_versions`; entries remember the stamps they were
+loaded under and miss once either changes. Other workers re-read stamps at most
+every VERSION_CHECK_INTERVAL seconds (the invalidating worker sees the bump
+immediately). `invalidate_cache(namespace)` without a scope bumps the
+namespace-wide stamp, which drops every scope.
+
+`shared=True` adds a second tier in `master_db.cache_entries`, so a value
+loaded by one worker is reused by the others instead of each running the
+loader. Shared values must be BSON-encodable (string keys, no tuples).
+
+Every cache registers itself for `cache_stats()` (GET /admin/cache/stats).
+"""
+from __future__ import annotations
+
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+
+from pymongo import ReturnDocument
+
+from app.extensions import get_master_db
+
+
+VERSIONS_COLLECTION = "cache_versions"
+SHARED_COLLECTION = "cache_entries"
+VERSION_CHECK_INTERVAL = 5.0
+
+MISSING = object()
+_ALL_SCOPES = "*"
+
+_caches: dict[str, "TTLCache"] = {}
+_stamps: dict[str, tuple[float, int]] = {}
+_stamps_lock = Lock()
+
+
+def _stamp_id(namespace: str, scope) -> str:
+    return f"{namespace}:{_ALL_SCOPES if scope is None else scope}"
+
+
+def _version_token(namespace: str, scope) -> str:
+    """'<namespace stamp>.<scope stamp>', re-read from Mongo when older than the check interval."""
+    keys = [_stamp_id(namespace, None)]
+    if scope is not None:
+        keys.append(_stamp_id(namespace, scope))
+
+    now = time.monotonic()
+    stale = [k for k in keys if k not in _stamps or now - _stamps[k][0] >= VERSION_CHECK_INTERVAL]
+    if stale:
+        try:
+            found = {
+                d["_id"]: int(d.get("version") or 0)
+                for d in get_master_db()[VERSIONS_COLLECTION].find({"_id": {"$in": stale}}, {"version": 1})
+            }
+        except Exception:
+            found = None  # keep serving the last known stamps
+        with _stamps_lock:
+            for k in stale:
+                if found is not None or k not in _stamps:
+                    _stamps[k] = (now, (found or {}).get(k, 0))
+
+    return ".".join(str(_stamps.get(k, (0.0, 0))[1]) for k in keys)
+
+
+def invalidate_cache(namespace: str, scope=None) -> None:
+    """Drop `namespace` entries for `scope` (or all scopes) in every worker."""
+    stamp = _stamp_id(namespace, None if scope is None else str(scope))
+    try:
+        doc = get_master_db()[VERSIONS_COLLECTION].find_one_and_update(
+            {"_id": stamp},
+            {"$inc": {"version": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except Exception:
+        doc = None
+    with _stamps_lock:
+        if doc is not None:
+            _stamps[stamp] = (time.monotonic(), int(doc.get("version") or 0))
+        else:
+            _stamps.pop(stamp, None)
+    cache = _caches.get(namespace)
+    if cache is not None:
+        cache.discard_scope(None if scope is None else str(scope))
+
+
+class TTLCache:
+    """
+    Size-bounded LRU with per-entry TTL. `versioned=False` skips the stamp
+    check for callers that carry their own version (e.g. in the key).
+    """
+
+    def __init__(self, namespace: str, *, maxsize: int = 1024, ttl: float = 300.0,
+                 shared: bool = False, versioned: bool = True):
+        self.namespace = namespace
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = float(ttl)
+        self.shared = shared
+        self.versioned = versioned
+        self._data: "OrderedDict[object, tuple[float, str, object, str | None]]" = OrderedDict()
+        self._lock = Lock()
+        self._counters = dict.fromkeys(
+            ("hits", "misses", "shared_hits", "loads", "evictions", "expirations", "invalidations"), 0
+        )
+        _caches[namespace] = self
+
+    def _token(self, scope) -> str:
+        return _version_token(self.namespace, scope) if self.versioned else ""
+
+    def _count(self, name: str, n: int = 1) -> None:
+        self._counters[name] += n
+
+    def get(self, key, *, scope=None):
+        """Cached value or MISSING."""
+        scope = None if scope is None else str(scope)
+        token = self._token(scope)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, entry_token, value, _ = entry
+                if expires <= time.monotonic():
+                    del self._data[key]
+                    self._count("expirations")
+                elif entry_token != token:
+                    del self._data[key]
+                    self._count("invalidations")
+                else:
+                    self._data.move_to_end(key)
+                    self._count("hits")
+                    return value
+            self._count("misses")
+
+        if self.shared:
+            value = self._shared_get(key, token)
+            if value is not MISSING:
+                with self._lock:
+                    self._count("shared_hits")
+                self._store(key, value, token, scope)
+                return value
+        return MISSING
+
+    def set(self, key, value, *, scope=None) -> None:
+        scope = None if scope is None else str(scope)
+        token = self._token(scope)
+        self._store(key, value, token, scope)
+        if self.shared:
+            self._shared_set(key, value, token)
+
+    def get_or_load(self, key, loader, *, scope=None):
+        """Cached value, else `loader()` (exceptions propagate and nothing is cached)."""
+        value = self.get(key, scope=scope)
+        if value is not MISSING:
+            return value
+        scope = None if scope is None else str(scope)
+        # Stamp taken before loading: an invalidation during the load makes
+        # the stored entry stale right away instead of hiding it.
+        token = self._token(scope)
+        value = loader()
+        with self._lock:
+            self._count("loads")
+        self._store(key, value, token, scope)
+        if self.shared:
+            self._shared_set(key, value, token)
+        return value
+
+    def discard(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def discard_scope(self, scope: str | None) -> None:
+        """Local drop for `scope` (None = everything); other workers catch up via stamps."""
+        with self._lock:
+            if scope is None:
+                self._data.clear()
+                return
+            for key in [k for k, e in self._data.items() if e[3] == scope]:
+                del self._data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def _store(self, key, value, token: str, scope: str | None) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, token, value, scope)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._count("evictions")
+
+    def _shared_id(self, key) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _shared_get(self, key, token: str):
+        try:
+            doc = get_master_db()[SHARED_COLLECTION].find_one(
+                {"_id": self._shared_id(key), "token": token, "expire_at": {"$gt": datetime.now(timezone.utc)}},
+                {"value": 1},
+            )
+        except Exception:
+            return MISSING
+        return doc["value"] if doc and "value" in doc else MISSING
+
+    def _shared_set(self, key, value, token: str) -> None:
+        try:
+            get_master_db()[SHARED_COLLECTION].replace_one(
+                {"_id": self._shared_id(key)},
+                {
+                    "namespace": self.namespace,
+                    "token": token,
+                    "value": value,
+                    "expire_at": datetime.now(timezone.utc) + timedelta(seconds=self.ttl),
+                },
+                upsert=True,
+            )
+        except Exception:
+            pass  # unencodable value or DB hiccup: the local tier still works
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._data)
+        lookups = counters["hits"] + counters["misses"]
+        served = counters["hits"] + counters["shared_hits"]
+        return {
+            "namespace": self.namespace,
+            "size": size,
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "shared": self.shared,
+            **counters,
+            "hit_rate": round(served / lookups, 4) if lookups else None,
+        }
+
+
+def cache_stats() -> dict:
+    """Counters for every cache in this worker process."""
+    return {
+        "pid": os.getpid(),
+        "caches": [c.stats() for c in sorted(_caches.values(), key=lambda c: c.namespace)],
+    }
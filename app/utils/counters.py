@@ -0,0 +1,43 @@
+"""`$inc`-maintained counter documents (app.utils.admin_stats, app.utils.billing_usage).
+
+Writers bump a counter document next to the write that changes what it
+counts; a recount from the source collections (`write_recount`) replaces the
+document when the counters drift or don't exist yet.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+
+from flask import current_app
+
+
+def bump_counters(collection, doc_id, fields: tuple, deltas: dict) -> None:
+    """
+    `$inc` the non-zero `deltas` on `collection[doc_id]` (upserted).
+
+    Raises ValueError for a counter name not in `fields` (a caller bug).
+    Database errors are logged and swallowed: the write that triggered the
+    bump already happened, and a recount fixes the lost increment.
+    """
+    inc = {field: int(value) for field, value in deltas.items() if value}
+    unknown = set(inc) - set(fields)
+    if unknown:
+        raise ValueError(f"Unknown {collection.name} counters: {sorted(unknown)}")
+    if not inc or doc_id is None:
+        return
+    try:
+        collection.update_one(
+            {"_id": doc_id},
+            {"$inc": inc, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+    except Exception:
+        current_app.logger.warning("%s update failed for %s: %r", collection.name, doc_id, inc, exc_info=True)
+
+
+def write_recount(collection, doc_id, counts: dict) -> dict:
+    """Replace `collection[doc_id]` with freshly recounted `counts`; returns the document."""
+    now = datetime.utcnow()
+    doc = {"_id": doc_id, **counts, "updated_at": now, "rebuilt_at": now}
+    collection.replace_one({"_id": doc_id}, doc, upsert=True)
+    return doc
@@ -3,34 +3,17 @@ from __future__ import annotations
 from datetime import date, datetime, time, timezone, timedelta
 from zoneinfo import ZoneInfo
 
-from bson import ObjectId
-from flask import g, has_request_context, session
+from flask import g, has_request_context
 
 from app.extensions import get_master_db, get_mongo_client
+from app.utils.cache import TTLCache
+from app.utils.tenant_context import current_shop_id, current_tenant_id, get_active_shop, shop_db_name
 
 DEFAULT_TIMEZONE = "America/Chicago"
+TIMEZONE_CACHE_NAMESPACE = "shop_timezone"
 
-
-def _oid(value):
-    if not value:
-        return None
-    try:
-        return ObjectId(str(value))
-    except Exception:
-        return None
-
-
-def _tenant_id_variants():
-    raw = session.get("tenant_id")
-    out = set()
-    if raw is None:
-        return []
-    out.add(raw)
-    out.add(str(raw))
-    oid = _oid(raw)
-    if oid:
-        out.add(oid)
-    return list(out)
+# Shared tier: a miss costs up to three queries over two databases.
+_timezone_cache = TTLCache(TIMEZONE_CACHE_NAMESPACE, maxsize=2048, ttl=600, shared=True)
 
 
 def _extract_tz(doc):
@@ -58,17 +41,42 @@ def _safe_tzinfo(tz_name: str):
         return timezone(timedelta(hours=-6))
 
 
-def _get_active_shop(master):
-    shop_id_raw = session.get("shop_id")
-    shop_oid = _oid(shop_id_raw)
-    if not shop_oid:
-        return None
-
-    tenant_variants = _tenant_id_variants()
-    if not tenant_variants:
-        return None
+def _load_active_shop_timezone_name() -> str:
+    """Configured timezone of the session's shop, "" when none is set."""
+    master = get_master_db()
+    shop = get_active_shop(master)
+    if not shop:
+        return ""
 
-    return master.shops.find_one({"_id": shop_oid, "tenant_id": {"$in": tenant_variants}})
+    tz_name = ""
+    shop_oid = shop.get("_id")
+
+    # 1) Active shop DB timezone_location
+    db_name = shop_db_name(shop)
+    if db_name:
+        shop_db = get_mongo_client()[db_name]
+        tz_doc = shop_db.timezone_location.find_one(
+            {
+                "is_active": {"$ne": False},
+                "$or": [
+                    {"shop_id": shop_oid},
+                    {"location_id": shop_oid},
+                ],
+            },
+            {"timezone": 1, "updated_at": 1, "created_at": 1},
+            sort=[("updated_at", -1), ("created_at", -1)],
+        )
+        tz_name = _extract_tz(tz_doc)
+
+    # 2) master DB timezone_location (shop_id must match active shop id)
+    if not tz_name:
+        tz_doc = master.timezone_location.find_one(
+            {"is_active": {"$ne": False}, "shop_id": shop_oid},
+            {"timezone": 1, "updated_at": 1, "created_at": 1},
+            sort=[("updated_at", -1), ("created_at", -1)],
+        )
+        tz_name = _extract_tz(tz_doc)
+    return tz_name
 
 
 def get_active_shop_timezone_name(default: str = DEFAULT_TIMEZONE) -> str:
@@ -79,58 +87,17 @@ def get_active_shop_timezone_name(default: str = DEFAULT_TIMEZONE) -> str:
     if cached:
         return cached
 
-    tz_name = default
-
-    try:
-        master = get_master_db()
-        shop = _get_active_shop(master)
-
-        if shop:
-            shop_oid = shop.get("_id")
-            shop_id_str = str(shop_oid)
-            tenant_id = shop.get("tenant_id")
-
-            # 1) Active shop DB timezone_location
-            db_name = (
-                shop.get("db_name")
-                or shop.get("database")
-                or shop.get("db")
-                or shop.get("mongo_db")
-                or shop.get("shop_db")
-            )
-            if db_name:
-                shop_db = get_mongo_client()[str(db_name)]
-                tz_doc = shop_db.timezone_location.find_one(
-                    {
-                        "is_active": {"$ne": False},
-                        "$or": [
-                            {"shop_id": shop_oid},
-                            {"shop_id": shop_id_str},
-                            {"location_id": shop_oid},
-                            {"location_id": shop_id_str},
-                        ],
-                    },
-                    {"timezone": 1, "updated_at": 1, "created_at": 1},
-                    sort=[("updated_at", -1), ("created_at", -1)],
-                )
-                tz_name = _extract_tz(tz_doc) or tz_name
-
-            # 2) master DB timezone_location (shop_id must match active shop id)
-            if tz_name == default:
-                tz_doc = master.timezone_location.find_one(
-                    {
-                        "is_active": {"$ne": False},
-                        "$or": [
-                            {"shop_id": shop_oid},
-                            {"shop_id": shop_id_str},
-                        ],
-                    },
-                    {"timezone": 1, "updated_at": 1, "created_at": 1},
-                    sort=[("updated_at", -1), ("created_at", -1)],
-                )
-                tz_name = _extract_tz(tz_doc) or tz_name
-    except Exception:
+    tenant_id = current_tenant_id()
+    shop_id = current_shop_id()
+    if tenant_id is None or shop_id is None:
         tz_name = default
+    else:
+        try:
+            tz_name = _timezone_cache.get_or_load(
+                f"{tenant_id}:{shop_id}", _load_active_shop_timezone_name, scope=shop_id
+            ) or default
+        except Exception:
+            tz_name = default
 
     g._active_shop_timezone = tz_name
     return tz_name
@@ -6,6 +6,8 @@ from urllib.request import Request, urlopen
 from urllib.error import HTTPError, URLError
 import json
 
+from app.utils.metrics import track_task
+
 
 def send_email(
     to_address: str | list[str],
@@ -98,7 +100,7 @@ def send_email(
     )
 
     try:
-        with urlopen(req, timeout=30) as resp:
+        with track_task("email"), urlopen(req, timeout=30) as resp:
             resp.read()  # consume response
     except HTTPError as exc:
         body = exc.read().decode("utf-8", errors="replace")
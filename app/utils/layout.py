@@ -1,12 +1,21 @@
 from __future__ import annotations
 
+import hashlib
+
 from bson import ObjectId
-from flask import render_template, session, flash, redirect, url_for
+from flask import g, render_template, session, flash, redirect, url_for
 
 from app.extensions import get_master_db
+from app.utils.cache import TTLCache, invalidate_cache
 from app.utils.display_datetime import get_active_shop_timezone_name
 
 
+# Shop switcher rows; entries are shared between workers and invalidated per
+# tenant through invalidate_shop_switcher().
+SHOP_SWITCHER_CACHE_NAMESPACE = "shop_switcher"
+_shop_switcher_cache = TTLCache(SHOP_SWITCHER_CACHE_NAMESPACE, maxsize=4096, ttl=600, shared=True)
+
+
 def _oid(value):
     if not value:
         return None
@@ -29,6 +38,10 @@ def _unique_str_list(values):
 
 
 def _resolve_user_tenant(master):
+    # load_current_context already loaded and validated both for this request.
+    if getattr(g, "user", None) and getattr(g, "tenant", None):
+        return g.user, g.tenant
+
     user_id = _oid(session.get("user_id"))
     tenant_id = _oid(session.get("tenant_id"))
 
@@ -37,7 +50,41 @@ def _resolve_user_tenant(master):
     return user, tenant
 
 
-def _resolve_shop_context(master, tenant, user):
+def invalidate_shop_switcher(tenant_id) -> None:
+    """Call after a shop is created / renamed / (de)activated or shop access changes."""
+    if tenant_id:
+        invalidate_cache(SHOP_SWITCHER_CACHE_NAMESPACE, tenant_id)
+
+
+def get_shop_switcher_options(tenant: dict, allowed_ids, *, active_only: bool = False) -> list[dict]:
+    """
+    [{id, name}] of `tenant`'s shops among `allowed_ids`, oldest first.
+    Cached per tenant + allowed set, so users with the same access share an entry.
+    """
+    allowed_oids = [oid for oid in (_oid(x) for x in _unique_str_list(allowed_ids)) if oid]
+    if not tenant or not allowed_oids:
+        return []
+    tenant_id = tenant["_id"]
+    digest = hashlib.sha1(",".join(sorted(str(x) for x in allowed_oids)).encode("ascii")).hexdigest()[:16]
+
+    def load():
+        return [
+            {"id": str(s["_id"]), "name": s.get("name") or "—", "is_active": bool(s.get("is_active", True))}
+            for s in get_master_db().shops.find(
+                {"tenant_id": tenant_id, "_id": {"$in": allowed_oids}},
+                {"name": 1, "is_active": 1},
+            ).sort("created_at", 1)
+        ]
+
+    rows = _shop_switcher_cache.get_or_load(f"{tenant_id}:{digest}", load, scope=tenant_id)
+    return [
+        {"id": r["id"], "name": r["name"]}
+        for r in rows
+        if r.get("is_active") or not active_only
+    ]
+
+
+def _resolve_shop_context(tenant, user):
     """
     Source of truth:
       - session["shop_ids"] (fallback -> user["shop_ids"])
@@ -57,19 +104,8 @@ def _resolve_shop_context(master, tenant, user):
         session["shop_ids"] = allowed_ids
         session.modified = True
 
-    # 2) load shop docs (only allowed + tenant)
-    shop_options = []
-    allowed_oids = []
-    for sid in allowed_ids:
-        oid = _oid(sid)
-        if oid:
-            allowed_oids.append(oid)
-
-    if tenant and allowed_oids:
-        for s in master.shops.find(
-            {"tenant_id": tenant["_id"], "_id": {"$in": allowed_oids}}
-        ).sort("created_at", 1):
-            shop_options.append({"id": str(s["_id"]), "name": s.get("name") or "—"})
+    # 2) shop docs (only allowed + tenant)
+    shop_options = get_shop_switcher_options(tenant, allowed_ids)
 
     valid_ids = [x["id"] for x in shop_options]
 
@@ -121,7 +157,7 @@ def build_app_layout_context(nav_items, active_page: str):
     app_user_display = user_name or user_email or "—"
     app_tenant_display = tenant_name or "—"
 
-    shop_options, active_shop_id, app_shop_display = _resolve_shop_context(master, tenant, user)
+    shop_options, active_shop_id, app_shop_display = _resolve_shop_context(tenant, user)
 
     return {
         "ok": True,
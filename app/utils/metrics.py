@@ -0,0 +1,270 @@
+"""Prometheus metrics: requests, Mongo connection pool, audit journal, jobs.
+
+Served by GET /metrics on the admin host (admin_panel). Gunicorn workers are
+aggregated through prometheus_client's multiprocess mode: set
+METRICS_MULTIPROC_DIR (or PROMETHEUS_MULTIPROC_DIR) to a directory that is
+emptied before gunicorn starts, and run gunicorn with
+`-c deploy/gunicorn.conf.py` so exited workers' live gauges are dropped.
+
+Metrics are off when prometheus_client isn't installed or METRICS_ENABLED is
+false; the observe_* helpers are no-ops then.
+
+Email sending and PDF rendering are synchronous, so their "queue depth" is
+the number in progress across workers; background job depth comes from
+`master_db.background_jobs` at scrape time.
+"""
+from __future__ import annotations
+
+import os
+import time
+from contextlib import contextmanager
+
+from flask import g, request
+from pymongo import monitoring
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+_m: dict = {}  # metric objects, filled by init_metrics()
+
+
+def metrics_enabled() -> bool:
+    return bool(_m)
+
+
+def _address(address) -> str:
+    try:
+        host, port = address
+        return f"{host}:{port}"
+    except Exception:
+        return str(address)
+
+
+def _create_metrics() -> None:
+    from prometheus_client import Counter, Gauge, Histogram
+
+    _m.update(
+        request_latency=Histogram(
+            "roobico_http_request_duration_seconds", "Request latency.",
+            ["blueprint", "endpoint", "method", "status"], buckets=LATENCY_BUCKETS,
+        ),
+        in_flight=Gauge(
+            "roobico_http_requests_in_flight", "Requests being handled.",
+            multiprocess_mode="livesum",
+        ),
+        pool_connections=Gauge(
+            "roobico_mongo_pool_connections", "Open pooled connections.",
+            ["address"], multiprocess_mode="livesum",
+        ),
+        pool_checked_out=Gauge(
+            "roobico_mongo_pool_checked_out", "Connections currently checked out.",
+            ["address"], multiprocess_mode="livesum",
+        ),
+        pool_max_size=Gauge(
+            "roobico_mongo_pool_max_size", "maxPoolSize per worker.",
+            ["address"], multiprocess_mode="max",
+        ),
+        pool_wait=Histogram(
+            "roobico_mongo_pool_checkout_wait_seconds", "Time to check a connection out of the pool.",
+            ["address"], buckets=POOL_WAIT_BUCKETS,
+        ),
+        pool_checkout_failures=Counter(
+            "roobico_mongo_pool_checkout_failures_total", "Failed checkouts (timeout = pool saturated).",
+            ["address", "reason"],
+        ),
+        pool_cleared=Counter(
+            "roobico_mongo_pool_cleared_total", "Pool clears after network errors / failovers.",
+            ["address"],
+        ),
+        audit_write=Histogram(
+            "roobico_audit_journal_write_seconds", "Audit journal insert time.",
+            buckets=LATENCY_BUCKETS,
+        ),
+        audit_lag=Histogram(
+            "roobico_audit_journal_lag_seconds", "Request start to audit journal write.",
+            buckets=LATENCY_BUCKETS,
+        ),
+        audit_failures=Counter(
+            "roobico_audit_journal_write_failures_total", "Audit journal inserts that raised.",
+        ),
+        task_in_progress=Gauge(
+            "roobico_task_in_progress", "Email sends / PDF renders in progress.",
+            ["task"], multiprocess_mode="livesum",
+        ),
+        task_duration=Histogram(
+            "roobico_task_duration_seconds", "Email send / PDF render time.",
+            ["task", "outcome"], buckets=LATENCY_BUCKETS,
+        ),
+    )
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Feeds pymongo CMAP events into the pool metrics."""
+
+    def pool_created(self, event):
+        max_size = (event.options or {}).get("maxPoolSize")
+        if max_size:
+            _m["pool_max_size"].labels(_address(event.address)).set(max_size)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        _m["pool_cleared"].labels(_address(event.address)).inc()
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        _m["pool_connections"].labels(_address(event.address)).inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        _m["pool_connections"].labels(_address(event.address)).dec()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        address = _address(event.address)
+        _m["pool_checkout_failures"].labels(address, str(event.reason)).inc()
+        _m["pool_wait"].labels(address).observe(getattr(event, "duration", 0) or 0)
+
+    def connection_checked_out(self, event):
+        address = _address(event.address)
+        _m["pool_checked_out"].labels(address).inc()
+        _m["pool_wait"].labels(address).observe(getattr(event, "duration", 0) or 0)
+
+    def connection_checked_in(self, event):
+        _m["pool_checked_out"].labels(_address(event.address)).dec()
+
+
+def init_metrics(app) -> PoolMetricsListener | None:
+    """
+    Create the metrics and request hooks; returns the pool listener for the
+    MongoClient (None when metrics are off). Call before init_mongo.
+    """
+    if not app.config.get("METRICS_ENABLED", True):
+        return None
+
+    multiproc_dir = app.config.get("METRICS_MULTIPROC_DIR") or os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if multiproc_dir:
+        # prometheus_client picks its storage from this at import time.
+        os.makedirs(multiproc_dir, exist_ok=True)
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = multiproc_dir
+    try:
+        _create_metrics()
+    except ImportError:
+        app.logger.warning("prometheus_client is not installed; /metrics is disabled.")
+        return None
+    except ValueError:
+        pass  # already registered (second create_app in one process)
+
+    @app.before_request
+    def _metrics_request_start():
+        g._metrics_start = time.perf_counter()
+        _m["in_flight"].inc()
+
+    @app.after_request
+    def _metrics_request_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _metrics_request_end(exc):
+        start = getattr(g, "_metrics_start", None)
+        if start is None:
+            return
+        g._metrics_start = None
+        _m["in_flight"].dec()
+        status = getattr(g, "_metrics_status", 500)
+        _m["request_latency"].labels(
+            request.blueprint or "",
+            request.endpoint or "<unmatched>",
+            request.method,
+            f"{status // 100}xx",
+        ).observe(time.perf_counter() - start)
+
+    return PoolMetricsListener()
+
+
+def observe_audit_write(seconds: float, lag_seconds: float | None, ok: bool) -> None:
+    if not _m:
+        return
+    if ok:
+        _m["audit_write"].observe(seconds)
+        if lag_seconds is not None:
+            _m["audit_lag"].observe(lag_seconds)
+    else:
+        _m["audit_failures"].inc()
+
+
+@contextmanager
+def track_task(task: str):
+    """Wrap an email send / PDF render: in-progress gauge plus duration by outcome."""
+    if not _m:
+        yield
+        return
+    gauge = _m["task_in_progress"].labels(task)
+    gauge.inc()
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        gauge.dec()
+        _m["task_duration"].labels(task, outcome).observe(time.perf_counter() - start)
+
+
+class _JobQueueCollector:
+    """Queued / running background jobs by kind, read when scraped."""
+
+    def collect(self):
+        from prometheus_client.core import GaugeMetricFamily
+
+        from app.utils.background_jobs import STATUS_QUEUED, STATUS_RUNNING, get_jobs_collection
+
+        family = GaugeMetricFamily(
+            "roobico_background_jobs", "Background jobs by kind and status.", labels=["kind", "status"]
+        )
+        try:
+            rows = get_jobs_collection().aggregate([
+                {"$match": {"status": {"$in": [STATUS_QUEUED, STATUS_RUNNING]}}},
+                {"$group": {"_id": {"kind": "$kind", "status": "$status"}, "n": {"$sum": 1}}},
+            ])
+            for row in rows:
+                family.add_metric([str(row["_id"].get("kind") or ""), str(row["_id"].get("status") or "")], row["n"])
+        except Exception:
+            pass
+        yield family
+
+
+class _ProcessRegistryCollector:
+    def collect(self):
+        from prometheus_client import REGISTRY
+        yield from REGISTRY.collect()
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """(body, content type) of the exposition for all workers."""
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest
+
+    registry = CollectorRegistry()
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry.register(_ProcessRegistryCollector())
+    registry.register(_JobQueueCollector())
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead(pid: int) -> None:
+    """gunicorn `child_exit` hook: drop the exited worker's live gauges."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
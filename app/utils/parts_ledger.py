@@ -0,0 +1,298 @@
+"""Materialized parts-order totals and per-vendor running balances.
+
+Every parts order carries its own totals, kept current by `sync_parts_order`
+after each create / edit / receive / payment / delete:
+
+    order_total, paid_total (+ legacy paid_amount), remaining_balance,
+    payment_status, items_count,
+    ledger: {vendor_id, active, received, order_total, paid_total, remaining_balance}
+
+`ledger` is what the order currently contributes to
+`shop_db.vendor_balances` (one doc per vendor, `_id` = vendor id):
+
+    {"_id", "shop_id", "orders", "received", "not_received",
+     "order_total", "paid_total", "remaining_balance", "updated_at"}
+
+The order update returns the previous `ledger` atomically and the difference
+is `$inc`-ed into the vendor docs, so vendor_balances always equals the sum of
+the orders' `ledger` fields. Anything that writes orders or payments outside
+these paths (or a crash between the two writes) shows up as drift in
+`verify_parts_ledger`; `python -m app.scripts.verify_parts_ledger --repair`
+fixes it.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from pymongo import ReturnDocument, UpdateOne
+
+
+VENDOR_BALANCES_COLLECTION = "vendor_balances"
+DRIFT_TOLERANCE = 0.005
+_BATCH_SIZE = 500
+
+_COUNTERS = ("orders", "received", "not_received", "order_total", "paid_total", "remaining_balance")
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _to_int(value) -> int:
+    try:
+        return int(str(value).strip())
+    except Exception:
+        return 0
+
+
+def _to_float(value) -> float:
+    try:
+        return float(str(value).strip())
+    except Exception:
+        return 0.0
+
+
+def order_amounts(order_doc: dict) -> dict:
+    """Items (qty * (price + core charge)) plus non-inventory lines."""
+    items_amount = 0.0
+    for item in (order_doc.get("items") or []):
+        if not isinstance(item, dict):
+            continue
+        qty = max(0, _to_int(item.get("quantity")))
+        price = max(0.0, _to_float(item.get("price")))
+        core = max(0.0, _to_float(item.get("core_charge")))
+        items_amount += qty * (price + core)
+
+    non_inventory_amount = 0.0
+    for line in (order_doc.get("non_inventory_amounts") or []):
+        if not isinstance(line, dict):
+            continue
+        non_inventory_amount += max(0.0, _to_float(line.get("amount")))
+
+    return {
+        "items_amount": float(items_amount),
+        "non_inventory_amount": float(non_inventory_amount),
+        "total_amount": float(items_amount + non_inventory_amount),
+    }
+
+
+def payment_status(total_amount: float, paid_amount: float) -> str:
+    if total_amount <= 0:
+        return "paid"
+    if paid_amount <= 0:
+        return "unpaid"
+    if paid_amount + 0.01 >= total_amount:
+        return "paid"
+    return "partially_paid"
+
+
+def paid_totals(shop_db, order_ids: list) -> dict:
+    """{order_id: sum of active payments}."""
+    if not order_ids:
+        return {}
+    out = {}
+    for row in shop_db.parts_order_payments.aggregate([
+        {"$match": {"parts_order_id": {"$in": list(order_ids)}, "is_active": True}},
+        {"$group": {"_id": "$parts_order_id", "total": {"$sum": {"$ifNull": ["$amount", 0]}}}},
+    ]):
+        out[row["_id"]] = _to_float(row.get("total"))
+    return out
+
+
+def computed_fields(order_doc: dict, paid: float) -> dict:
+    """Materialized fields for `order_doc` given its active payments total."""
+    total = round(order_amounts(order_doc)["total_amount"], 2)
+    paid = round(max(0.0, paid), 2)
+    remaining = round(max(0.0, total - paid), 2)
+    active = order_doc.get("is_active") is not False
+    received = (order_doc.get("status") or "").strip().lower() == "received"
+    return {
+        "order_total": total,
+        "paid_total": paid,
+        "paid_amount": paid,
+        "remaining_balance": remaining,
+        "payment_status": payment_status(total, paid),
+        "items_count": len(order_doc.get("items") or []),
+        "ledger": {
+            "vendor_id": order_doc.get("vendor_id"),
+            "active": active,
+            "received": received,
+            "order_total": total,
+            "paid_total": paid,
+            "remaining_balance": remaining,
+        },
+    }
+
+
+def _contribution(ledger: dict | None) -> tuple:
+    """(vendor_id, {counter: value}) an order's ledger adds to its vendor doc."""
+    if not isinstance(ledger, dict) or not ledger.get("active") or not ledger.get("vendor_id"):
+        return None, {}
+    received = bool(ledger.get("received"))
+    return ledger["vendor_id"], {
+        "orders": 1,
+        "received": int(received),
+        "not_received": int(not received),
+        "order_total": _to_float(ledger.get("order_total")),
+        "paid_total": _to_float(ledger.get("paid_total")),
+        "remaining_balance": _to_float(ledger.get("remaining_balance")),
+    }
+
+
+def _apply_ledger_delta(shop_db, shop_id, before: dict | None, after: dict | None, now) -> None:
+    deltas: dict = {}
+    for sign, ledger in ((-1, before), (1, after)):
+        vendor_id, values = _contribution(ledger)
+        if vendor_id is None:
+            continue
+        bucket = deltas.setdefault(vendor_id, dict.fromkeys(_COUNTERS, 0))
+        for key, value in values.items():
+            bucket[key] += sign * value
+
+    for vendor_id, inc in deltas.items():
+        inc = {k: v for k, v in inc.items() if abs(v) > 1e-9}
+        if not inc:
+            continue
+        shop_db[VENDOR_BALANCES_COLLECTION].update_one(
+            {"_id": vendor_id},
+            {"$inc": inc, "$set": {"shop_id": shop_id, "updated_at": now}},
+            upsert=True,
+        )
+
+
+def sync_parts_order(shop_db, order_id, *, user_oid=None, now=None) -> dict | None:
+    """
+    Recompute `order_id`'s totals from its items and active payments and move
+    the difference into vendor_balances. Returns the new fields (None if the
+    order doesn't exist).
+    """
+    if shop_db is None or not order_id:
+        return None
+    order = shop_db.parts_orders.find_one({"_id": order_id})
+    if not order:
+        return None
+    now = now or _utcnow()
+    fields = computed_fields(order, paid_totals(shop_db, [order_id]).get(order_id, 0.0))
+    update = {**fields, "updated_at": now}
+    if user_oid is not None:
+        update["updated_by"] = user_oid
+
+    before = shop_db.parts_orders.find_one_and_update(
+        {"_id": order_id},
+        {"$set": update},
+        projection={"ledger": 1, "shop_id": 1},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if before is None:
+        return None
+    _apply_ledger_delta(shop_db, order.get("shop_id"), before.get("ledger"), fields["ledger"], now)
+    return fields
+
+
+def get_vendor_balances(shop_db, shop_id, vendor_ids: list) -> dict:
+    """{vendor_id: balance doc} for the given vendors (missing = no orders)."""
+    if not vendor_ids:
+        return {}
+    return {
+        d["_id"]: d
+        for d in shop_db[VENDOR_BALANCES_COLLECTION].find({"_id": {"$in": list(vendor_ids)}, "shop_id": shop_id})
+    }
+
+
+def _expected_vendor_balances(shop_db) -> dict:
+    """vendor_balances as they should be, summed from the orders' `ledger`."""
+    out = {}
+    for row in shop_db.parts_orders.aggregate([
+        {"$match": {"ledger.active": True, "ledger.vendor_id": {"$ne": None}}},
+        {"$group": {
+            "_id": "$ledger.vendor_id",
+            "shop_id": {"$first": "$shop_id"},
+            "orders": {"$sum": 1},
+            "received": {"$sum": {"$cond": ["$ledger.received", 1, 0]}},
+            "order_total": {"$sum": "$ledger.order_total"},
+            "paid_total": {"$sum": "$ledger.paid_total"},
+            "remaining_balance": {"$sum": "$ledger.remaining_balance"},
+        }},
+    ]):
+        row["not_received"] = row["orders"] - row["received"]
+        out[row["_id"]] = row
+    return out
+
+
+def _drifted(a: dict, b: dict, keys=_COUNTERS) -> bool:
+    for key in keys:
+        if abs(_to_float(a.get(key)) - _to_float(b.get(key))) > DRIFT_TOLERANCE:
+            return True
+    return False
+
+
+def verify_parts_ledger(shop_db, *, repair: bool = False) -> dict:
+    """
+    Recompute every order's totals and every vendor balance from source and
+    compare with what is stored. With `repair`, rewrite drifted orders and
+    rebuild vendor_balances from the (repaired) order ledgers.
+    """
+    now = _utcnow()
+    report = {"orders": 0, "orders_drifted": 0, "vendors": 0, "vendors_drifted": 0, "examples": []}
+
+    ops = []
+    cursor = shop_db.parts_orders.find(
+        {},
+        {"items": 1, "non_inventory_amounts": 1, "status": 1, "is_active": 1, "vendor_id": 1,
+         "order_total": 1, "paid_total": 1, "remaining_balance": 1, "ledger": 1},
+    ).batch_size(_BATCH_SIZE)
+    batch = []
+
+    def flush():
+        paid = paid_totals(shop_db, [o["_id"] for o in batch])
+        for order in batch:
+            report["orders"] += 1
+            fields = computed_fields(order, paid.get(order["_id"], 0.0))
+            stored_ledger = order.get("ledger") or {}
+            drift = (
+                _drifted(order, fields, ("order_total", "paid_total", "remaining_balance"))
+                or stored_ledger != fields["ledger"]
+            )
+            if not drift:
+                continue
+            report["orders_drifted"] += 1
+            if len(report["examples"]) < 20:
+                report["examples"].append({
+                    "order_id": str(order["_id"]),
+                    "stored": {k: order.get(k) for k in ("order_total", "paid_total", "remaining_balance")},
+                    "expected": {k: fields[k] for k in ("order_total", "paid_total", "remaining_balance")},
+                })
+            if repair:
+                ops.append(UpdateOne({"_id": order["_id"]}, {"$set": {**fields, "ledger_repaired_at": now}}))
+        batch.clear()
+        if len(ops) >= _BATCH_SIZE:
+            shop_db.parts_orders.bulk_write(ops, ordered=False)
+            ops.clear()
+
+    for order in cursor:
+        batch.append(order)
+        if len(batch) >= _BATCH_SIZE:
+            flush()
+    if batch:
+        flush()
+    if ops:
+        shop_db.parts_orders.bulk_write(ops, ordered=False)
+
+    expected = _expected_vendor_balances(shop_db)
+    stored = {d["_id"]: d for d in shop_db[VENDOR_BALANCES_COLLECTION].find({})}
+    for vendor_id in set(expected) | set(stored):
+        report["vendors"] += 1
+        want = expected.get(vendor_id) or {"shop_id": (stored.get(vendor_id) or {}).get("shop_id")}
+        have = stored.get(vendor_id) or {}
+        if not _drifted(have, want):
+            continue
+        report["vendors_drifted"] += 1
+        if repair:
+            doc = {k: want.get(k, 0) for k in _COUNTERS}
+            doc.update({k: round(_to_float(doc[k]), 2) for k in ("order_total", "paid_total", "remaining_balance")})
+            shop_db[VENDOR_BALANCES_COLLECTION].replace_one(
+                {"_id": vendor_id},
+                {**doc, "shop_id": want.get("shop_id"), "updated_at": now},
+                upsert=True,
+            )
+    return report
@@ -3,13 +3,16 @@ from __future__ import annotations
 import base64
 from io import BytesIO
 
+from app.utils.metrics import track_task
+
 
 def render_html_to_pdf(html: str) -> bytes:
     """Convert an HTML string to PDF bytes using xhtml2pdf."""
     from xhtml2pdf import pisa
 
     buf = BytesIO()
-    result = pisa.CreatePDF(html.encode("utf-8"), dest=buf, encoding="utf-8")
+    with track_task("pdf"):
+        result = pisa.CreatePDF(html.encode("utf-8"), dest=buf, encoding="utf-8")
     if result.err:
         raise RuntimeError(f"PDF generation failed (error code {result.err})")
     return buf.getvalue()
@@ -39,6 +39,9 @@ def get_tenant_db():
 
 
 def _load_master_user(user_id=None):
+    # Current user: load_current_context already loaded it for this request.
+    if user_id is None and getattr(g, "user", None):
+        return g.user
     master = get_master_db()
     user_oid = _maybe_object_id(user_id or session.get(SESSION_USER_ID))
     if not user_oid:
@@ -0,0 +1,342 @@
+"""Per-request Mongo query accounting and sampled cProfile capture.
+
+A pymongo CommandListener (registered on the MongoClient by `init_mongo`)
+attributes every command issued while a request is being handled to that
+request: count, total server time, documents returned, the slowest command
+with its filter shape, and how often the same (collection, shape) repeats —
+a shape repeated dozens of times in one request is an N+1.
+
+Finished requests are folded into per-endpoint aggregates (wall-time and
+query-count histograms) kept in memory per worker and served by
+GET /admin/profiling. With PROFILE_SAMPLE_RATE > 0 a sample of requests also
+runs under cProfile; captures of requests slower than PROFILE_THRESHOLD_MS are
+kept (last PROFILE_CAPTURES_KEPT).
+
+Commands run outside a request (background jobs, CLIs) are not attributed.
+"""
+from __future__ import annotations
+
+import cProfile
+import io
+import os
+import pstats
+import random
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from threading import Lock
+
+from flask import g, request
+from pymongo import monitoring
+
+
+WALL_MS_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+PROFILE_CAPTURES_KEPT = 20
+PROFILE_STATS_LINES = 40
+TOP_SHAPES_PER_ENDPOINT = 5
+
+# Handshake / session housekeeping; not issued by application code.
+_IGNORED_COMMANDS = frozenset({
+    "hello", "ismaster", "isMaster", "ping", "buildInfo", "buildinfo", "endSessions",
+    "saslStart", "saslContinue", "authenticate", "getnonce", "killCursors",
+})
+_MAX_SHAPE_DEPTH = 6
+
+_current: ContextVar["RequestProfile | None"] = ContextVar("query_profile", default=None)
+
+
+def filter_shape(value, depth: int = 0):
+    """`value` with literals replaced by "?" (keys and operators kept)."""
+    if depth >= _MAX_SHAPE_DEPTH:
+        return "…"
+    if isinstance(value, dict):
+        return {k: filter_shape(v, depth + 1) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        if any(isinstance(v, (dict, list, tuple)) for v in value):
+            return [filter_shape(v, depth + 1) for v in value]
+        return ["?"] if value else []
+    return "?"
+
+
+def _command_target(command_name: str, command) -> tuple[str, object]:
+    """(collection, filter) of a command document."""
+    if command_name == "getMore":
+        return str(command.get("collection") or ""), None
+    collection = command.get(command_name)
+    collection = collection if isinstance(collection, str) else ""
+    if command_name == "find":
+        return collection, command.get("filter")
+    if command_name in ("count", "distinct", "findAndModify"):
+        return collection, command.get("query")
+    if command_name == "aggregate":
+        pipeline = command.get("pipeline") or []
+        first = pipeline[0] if pipeline and isinstance(pipeline[0], dict) else {}
+        # Only a leading $match selects by index; otherwise record the stage names.
+        return collection, {"$match": first["$match"]} if "$match" in first else {k: None for k in first}
+    if command_name in ("update", "delete"):
+        ops = command.get("updates" if command_name == "update" else "deletes") or []
+        return collection, ops[0].get("q") if ops and isinstance(ops[0], dict) else None
+    return collection, None
+
+
+def _returned_docs(reply) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        batch = cursor.get("firstBatch", cursor.get("nextBatch"))
+        return len(batch) if isinstance(batch, list) else 0
+    if isinstance(reply.get("values"), list):
+        return len(reply["values"])
+    if "value" in reply:  # findAndModify
+        return 1 if reply.get("value") else 0
+    n = reply.get("n")
+    return int(n) if isinstance(n, (int, float)) else 0
+
+
+class RequestProfile:
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.count = 0
+        self.db_ms = 0.0
+        self.docs = 0
+        self.slowest: dict | None = None
+        self.shapes: Counter = Counter()
+        self._pending: dict[tuple, tuple[str, str, str]] = {}
+
+    def started_command(self, event) -> None:
+        collection, flt = _command_target(event.command_name, event.command)
+        shape = repr(filter_shape(flt)) if flt is not None else ""
+        self._pending[(event.connection_id, event.request_id)] = (event.command_name, collection, shape)
+
+    def finished_command(self, event, reply=None) -> None:
+        name, collection, shape = self._pending.pop(
+            (event.connection_id, event.request_id), (event.command_name, "", "")
+        )
+        ms = event.duration_micros / 1000.0
+        self.count += 1
+        self.db_ms += ms
+        if reply is not None:
+            self.docs += _returned_docs(reply)
+        self.shapes[(name, f"{event.database_name}.{collection}", shape)] += 1
+        if self.slowest is None or ms > self.slowest["ms"]:
+            self.slowest = {
+                "command": name,
+                "namespace": f"{event.database_name}.{collection}",
+                "shape": shape,
+                "ms": round(ms, 3),
+            }
+
+    def summary(self) -> str:
+        return f"{self.count} queries, {self.db_ms:.0f}ms db"
+
+
+class QueryProfiler(monitoring.CommandListener):
+    """Forwards command events to the RequestProfile of the current context."""
+
+    def started(self, event):
+        profile = _current.get()
+        if profile is not None and event.command_name not in _IGNORED_COMMANDS:
+            profile.started_command(event)
+
+    def succeeded(self, event):
+        profile = _current.get()
+        if profile is not None and event.command_name not in _IGNORED_COMMANDS:
+            profile.finished_command(event, event.reply)
+
+    def failed(self, event):
+        profile = _current.get()
+        if profile is not None and event.command_name not in _IGNORED_COMMANDS:
+            profile.finished_command(event)
+
+
+def _bucket_index(buckets, value) -> int:
+    for i, edge in enumerate(buckets):
+        if value <= edge:
+            return i
+    return len(buckets)
+
+
+def _histogram(buckets, counts) -> list[dict]:
+    labels = [f"<={b}" for b in buckets] + [f">{buckets[-1]}"]
+    return [{"le": label, "count": n} for label, n in zip(labels, counts)]
+
+
+class _EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.wall_ms = 0.0
+        self.max_wall_ms = 0.0
+        self.queries = 0
+        self.max_queries = 0
+        self.db_ms = 0.0
+        self.docs = 0
+        self.wall_hist = [0] * (len(WALL_MS_BUCKETS) + 1)
+        self.query_hist = [0] * (len(QUERY_COUNT_BUCKETS) + 1)
+        self.slowest: dict | None = None
+        # (command, namespace, shape) -> [total executions, max in one request]
+        self.shapes: dict[tuple, list[int]] = {}
+
+    def add(self, profile: RequestProfile, wall_ms: float, status: int) -> None:
+        self.requests += 1
+        self.errors += status >= 500
+        self.wall_ms += wall_ms
+        self.max_wall_ms = max(self.max_wall_ms, wall_ms)
+        self.queries += profile.count
+        self.max_queries = max(self.max_queries, profile.count)
+        self.db_ms += profile.db_ms
+        self.docs += profile.docs
+        self.wall_hist[_bucket_index(WALL_MS_BUCKETS, wall_ms)] += 1
+        self.query_hist[_bucket_index(QUERY_COUNT_BUCKETS, profile.count)] += 1
+        if profile.slowest and (self.slowest is None or profile.slowest["ms"] > self.slowest["ms"]):
+            self.slowest = {**profile.slowest, "path": request.path}
+        for key, n in profile.shapes.items():
+            entry = self.shapes.setdefault(key, [0, 0])
+            entry[0] += n
+            entry[1] = max(entry[1], n)
+
+    def as_dict(self, endpoint: str) -> dict:
+        n = self.requests or 1
+        top = sorted(self.shapes.items(), key=lambda kv: (kv[1][1], kv[1][0]), reverse=True)
+        return {
+            "endpoint": endpoint,
+            "requests": self.requests,
+            "errors": self.errors,
+            "avg_ms": round(self.wall_ms / n, 2),
+            "max_ms": round(self.max_wall_ms, 2),
+            "avg_queries": round(self.queries / n, 2),
+            "max_queries": self.max_queries,
+            "avg_db_ms": round(self.db_ms / n, 2),
+            "total_db_ms": round(self.db_ms, 2),
+            "avg_docs": round(self.docs / n, 2),
+            "wall_ms_histogram": _histogram(WALL_MS_BUCKETS, self.wall_hist),
+            "queries_histogram": _histogram(QUERY_COUNT_BUCKETS, self.query_hist),
+            "slowest_query": self.slowest,
+            "repeated_shapes": [
+                {"command": c, "namespace": ns, "shape": shape, "executions": total, "max_per_request": peak}
+                for (c, ns, shape), (total, peak) in top[:TOP_SHAPES_PER_ENDPOINT]
+            ],
+        }
+
+
+_stats: dict[str, _EndpointStats] = {}
+_captures: deque = deque(maxlen=PROFILE_CAPTURES_KEPT)
+_stats_lock = Lock()
+_since = datetime.now(timezone.utc)
+
+
+def _finish_request(status: int) -> None:
+    profile = getattr(g, "_query_profile", None)
+    if profile is None or getattr(g, "_query_profile_done", False):
+        return
+    g._query_profile_done = True
+    _current.set(None)
+    wall_ms = (time.perf_counter() - profile.started) * 1000
+
+    profiler = getattr(g, "_cprofile", None)
+    capture = None
+    if profiler is not None:
+        profiler.disable()
+        threshold = float(getattr(g, "_cprofile_threshold_ms", 0))
+        if wall_ms >= threshold:
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_STATS_LINES)
+            capture = {
+                "endpoint": profile.endpoint,
+                "path": request.path,
+                "method": request.method,
+                "status": status,
+                "ms": round(wall_ms, 2),
+                "queries": profile.count,
+                "db_ms": round(profile.db_ms, 2),
+                "at": datetime.now(timezone.utc).isoformat(),
+                "stats": out.getvalue(),
+            }
+
+    with _stats_lock:
+        _stats.setdefault(profile.endpoint, _EndpointStats()).add(profile, wall_ms, status)
+        if capture is not None:
+            _captures.append(capture)
+
+
+def init_profiling(app) -> QueryProfiler | None:
+    """
+    Register the request hooks; returns the listener for the MongoClient
+    (None when QUERY_PROFILING is off). Call before the other before_request
+    hooks so their queries are attributed too.
+    """
+    if not app.config.get("QUERY_PROFILING", True):
+        return None
+
+    sample_rate = float(app.config.get("PROFILE_SAMPLE_RATE") or 0)
+    threshold_ms = float(app.config.get("PROFILE_THRESHOLD_MS") or 0)
+
+    @app.before_request
+    def _start_query_profile():
+        endpoint = request.endpoint or "<unmatched>"
+        if endpoint == "static" or endpoint.endswith(".static"):
+            return
+        profile = RequestProfile(endpoint)
+        g._query_profile = profile
+        _current.set(profile)
+        if sample_rate > 0 and random.random() < sample_rate:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                return  # another profiler is already active in this thread
+            g._cprofile = profiler
+            g._cprofile_threshold_ms = threshold_ms
+
+    @app.after_request
+    def _finish_query_profile(response):
+        _finish_request(response.status_code)
+        return response
+
+    @app.teardown_request
+    def _teardown_query_profile(exc):
+        # after_request is skipped for unhandled exceptions.
+        _finish_request(500)
+        _current.set(None)
+
+    return QueryProfiler()
+
+
+def current_request_profile() -> RequestProfile | None:
+    return _current.get()
+
+
+# Numeric fields of `_EndpointStats.as_dict` the report can be sorted by.
+REPORT_SORT_KEYS = (
+    "requests", "errors", "avg_ms", "max_ms", "avg_queries", "max_queries",
+    "avg_db_ms", "total_db_ms", "avg_docs",
+)
+
+
+def profiling_report(*, include_captures: bool = False, sort: str = "total_db_ms") -> dict:
+    """Per-endpoint stats of this worker, sorted by `sort` (one of REPORT_SORT_KEYS, else total_db_ms)."""
+    if sort not in REPORT_SORT_KEYS:
+        sort = "total_db_ms"
+    with _stats_lock:
+        endpoints = [s.as_dict(name) for name, s in _stats.items()]
+        captures = list(_captures)
+    endpoints.sort(key=lambda e: e.get(sort) or 0, reverse=True)
+    report = {
+        "pid": os.getpid(),
+        "since": _since.isoformat(),
+        "endpoints": endpoints,
+        "captures": len(captures),
+    }
+    if include_captures:
+        report["captures"] = list(reversed(captures))
+    return report
+
+
+def reset_profiling() -> None:
+    global _since
+    with _stats_lock:
+        _stats.clear()
+        _captures.clear()
+        _since = datetime.now(timezone.utc)
@@ -0,0 +1,325 @@
+"""Explain-based audit of query shapes and index suggestions.
+
+    spec = QuerySpec("parts_by_number", "parts", {"is_active": True, "part_number": "ABC-1"})
+    audit = audit_query(shop_db, spec)
+    audit.issues        # ["COLLSCAN", "docs examined/returned 480.0"]
+    audit.suggestion    # [("part_number", 1), ("is_active", 1)]
+
+`audit_query` runs `explain` with executionStats verbosity and flags:
+
+- COLLSCAN: no index used at all;
+- in-memory SORT: the sort isn't provided by the index;
+- docs examined / returned above `max_ratio` (index too loose for the filter).
+
+Suggestions follow the equality, sort, range rule: equality fields (shop_id
+first), then the sort keys, then range predicates (`$gt`/`$lt`, `$ne`,
+`$nin`, `$exists`, anchored regexes). `$expr`, `$where`, unanchored regexes
+and `$or` branches can't be served by one compound index; they are listed in
+`unindexable` instead. A suggestion that is a prefix of an existing index is
+dropped.
+
+`harvest_system_profile` turns MongoDB's own profiler output (system.profile,
+`db.setProfilingLevel(1)`) into specs, so real queries with their literals
+can be replayed; the request profiler (app/utils/profiling.py) only keeps
+literal-free shapes.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+
+from app.extensions import _safe_create_index
+from app.utils.profiling import filter_shape
+
+
+DEFAULT_MAX_RATIO = 10.0
+# Below this many examined documents a loose index isn't worth flagging.
+MIN_EXAMINED_FOR_RATIO = 50
+
+_RANGE_OPERATORS = frozenset({"$gt", "$gte", "$lt", "$lte", "$ne", "$nin", "$exists", "$type", "$size", "$mod"})
+_EQUALITY_OPERATORS = frozenset({"$eq", "$in", "$all", "$elemMatch"})
+_UNINDEXABLE_TOP = frozenset({"$expr", "$where", "$text", "$jsonSchema"})
+
+
+@dataclass(frozen=True)
+class QuerySpec:
+    name: str
+    collection: str
+    filter: dict
+    sort: list[tuple[str, int]] | None = None
+    limit: int | None = None
+    projection: dict | None = None
+    # Pipeline stages after the leading {"$match": filter} for aggregations.
+    pipeline: list[dict] | None = None
+    source: str = ""
+    # Issues accepted for this shape (e.g. the $expr numeric search); not reported as failures.
+    expected: tuple[str, ...] = ()
+
+
+@dataclass
+class PlanAudit:
+    spec: QuerySpec
+    plan: str = ""
+    indexes_used: list[str] = field(default_factory=list)
+    collscan: bool = False
+    in_memory_sort: bool = False
+    docs_examined: int = 0
+    keys_examined: int = 0
+    returned: int = 0
+    millis: int = 0
+    issues: list[str] = field(default_factory=list)
+    unindexable: list[str] = field(default_factory=list)
+    suggestion: list[tuple[str, int]] | None = None
+    covered_by: str = ""
+    error: str = ""
+
+    @property
+    def unexpected_issues(self) -> list[str]:
+        return [i for i in self.issues if i.split()[0] not in self.spec.expected]
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.spec.name,
+            "collection": self.spec.collection,
+            "source": self.spec.source,
+            "shape": repr(filter_shape(self.spec.filter)),
+            "plan": self.plan,
+            "indexes_used": self.indexes_used,
+            "docs_examined": self.docs_examined,
+            "keys_examined": self.keys_examined,
+            "returned": self.returned,
+            "millis": self.millis,
+            "issues": self.issues,
+            "expected": list(self.spec.expected),
+            "unindexable": self.unindexable,
+            "suggestion": [list(k) for k in self.suggestion] if self.suggestion else None,
+            "covered_by": self.covered_by,
+            "error": self.error,
+        }
+
+
+# ── explain ──────────────────────────────────────────────────
+
+
+def _explain_command(spec: QuerySpec) -> dict:
+    if spec.pipeline is not None:
+        return {"aggregate": spec.collection, "pipeline": [{"$match": spec.filter}, *spec.pipeline], "cursor": {}}
+    cmd: dict = {"find": spec.collection, "filter": spec.filter}
+    if spec.sort:
+        cmd["sort"] = {k: d for k, d in spec.sort}
+    if spec.projection:
+        cmd["projection"] = spec.projection
+    if spec.limit:
+        cmd["limit"] = spec.limit
+    return cmd
+
+
+def _find_section(doc, key: str):
+    """First value under `key` anywhere in an explain document (aggregations nest it under $cursor)."""
+    if isinstance(doc, dict):
+        if key in doc:
+            return doc[key]
+        values = doc.values()
+    elif isinstance(doc, list):
+        values = doc
+    else:
+        return None
+    for value in values:
+        found = _find_section(value, key)
+        if found is not None:
+            return found
+    return None
+
+
+def _plan_stages(plan) -> list[dict]:
+    out, stack = [], [plan]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, dict):
+            continue
+        if "queryPlan" in node:  # slot-based engine wraps the classic tree
+            stack.append(node["queryPlan"])
+            continue
+        if "stage" in node:
+            out.append(node)
+        for key in ("inputStage", "outerStage", "innerStage"):
+            stack.append(node.get(key))
+        stack.extend(node.get("inputStages") or [])
+    return out
+
+
+def explain(db, spec: QuerySpec) -> dict:
+    return db.command({"explain": _explain_command(spec), "verbosity": "executionStats"})
+
+
+# ── index suggestion ─────────────────────────────────────────
+
+
+def _is_unanchored(pattern, options: str = "") -> bool:
+    text = pattern.pattern if hasattr(pattern, "pattern") else str(pattern)
+    flags = options or getattr(pattern, "flags", "")
+    case_insensitive = "i" in str(flags) or (isinstance(flags, int) and flags & re.IGNORECASE)
+    return not text.startswith("^") or bool(case_insensitive)
+
+
+def _classify(flt: dict, equality: list, ranges: list, unindexable: list) -> None:
+    for key, value in (flt or {}).items():
+        if key == "$and":
+            for part in value or []:
+                _classify(part, equality, ranges, unindexable)
+        elif key in ("$or", "$nor"):
+            unindexable.append(f"{key} ({len(value or [])} branches; each needs its own index)")
+        elif key in _UNINDEXABLE_TOP:
+            unindexable.append(key)
+        elif key.startswith("$"):
+            continue
+        elif isinstance(value, dict) and any(k.startswith("$") for k in value):
+            ops = set(value)
+            if "$regex" in ops:
+                if _is_unanchored(value["$regex"], value.get("$options", "")):
+                    unindexable.append(f"unanchored/case-insensitive $regex on {key}")
+                else:
+                    ranges.append(key)
+            elif "$not" in ops:
+                unindexable.append(f"$not on {key}")
+            elif ops & _RANGE_OPERATORS:
+                ranges.append(key)
+            elif ops & _EQUALITY_OPERATORS:
+                equality.append(key)
+        elif hasattr(value, "pattern"):
+            if _is_unanchored(value):
+                unindexable.append(f"unanchored/case-insensitive regex on {key}")
+            else:
+                ranges.append(key)
+        else:
+            equality.append(key)
+
+
+def suggest_index(flt: dict, sort: list[tuple[str, int]] | None = None) -> tuple[list[tuple[str, int]], list[str]]:
+    """(suggested keys, unindexable predicates) for a filter + sort."""
+    equality: list[str] = []
+    ranges: list[str] = []
+    unindexable: list[str] = []
+    _classify(flt, equality, ranges, unindexable)
+
+    equality.sort(key=lambda f: f != "shop_id")
+    keys: list[tuple[str, int]] = []
+    seen: set[str] = set()
+    for name in equality:
+        if name not in seen:
+            keys.append((name, 1))
+            seen.add(name)
+    for name, direction in sort or []:
+        if name not in seen:
+            keys.append((name, int(direction)))
+            seen.add(name)
+    for name in ranges:
+        if name not in seen:
+            keys.append((name, 1))
+            seen.add(name)
+    return keys, unindexable
+
+
+def _index_keys(info: dict) -> list[tuple[str, int]]:
+    return [(k, int(d) if isinstance(d, (int, float)) else d) for k, d in info.get("key") or []]
+
+
+def covering_index(collection, keys: list[tuple[str, int]]) -> str:
+    """Name of an existing index whose leading keys are `keys` (or all reversed), else ""."""
+    if not keys:
+        return ""
+    reversed_keys = [(k, -d) for k, d in keys]
+    for name, info in collection.index_information().items():
+        existing = _index_keys(info)[:len(keys)]
+        if existing == keys or existing == reversed_keys:
+            return name
+    return ""
+
+
+def index_name(collection_name: str, keys: list[tuple[str, int]]) -> str:
+    parts = [k.replace(".", "_") + ("_desc" if d == -1 else "") for k, d in keys]
+    return f"idx_{collection_name}_{'_'.join(parts)}"
+
+
+def create_suggested_index(db, audit: PlanAudit) -> str:
+    name = index_name(audit.spec.collection, audit.suggestion)
+    _safe_create_index(db[audit.spec.collection], audit.suggestion, name=name)
+    return name
+
+
+# ── audit ────────────────────────────────────────────────────
+
+
+def audit_query(db, spec: QuerySpec, *, max_ratio: float = DEFAULT_MAX_RATIO) -> PlanAudit:
+    audit = PlanAudit(spec=spec)
+    try:
+        result = explain(db, spec)
+    except Exception as exc:
+        audit.error = str(exc)[:500]
+        return audit
+
+    planner = _find_section(result, "queryPlanner") or {}
+    stats = _find_section(result, "executionStats") or {}
+    stages = _plan_stages(planner.get("winningPlan") or {})
+    names = [str(s.get("stage") or "").upper() for s in stages]
+
+    audit.plan = " <- ".join(names)
+    audit.indexes_used = sorted({s["indexName"] for s in stages if s.get("indexName")})
+    audit.collscan = "COLLSCAN" in names
+    audit.in_memory_sort = "SORT" in names
+    audit.docs_examined = int(stats.get("totalDocsExamined") or 0)
+    audit.keys_examined = int(stats.get("totalKeysExamined") or 0)
+    audit.returned = int(stats.get("nReturned") or 0)
+    audit.millis = int(stats.get("executionTimeMillis") or 0)
+
+    if audit.collscan:
+        audit.issues.append("COLLSCAN")
+    if audit.in_memory_sort:
+        audit.issues.append("SORT in memory")
+    ratio = audit.docs_examined / max(audit.returned, 1)
+    if audit.docs_examined >= MIN_EXAMINED_FOR_RATIO and ratio > max_ratio:
+        audit.issues.append(f"RATIO docs examined/returned {ratio:.1f}")
+
+    keys, audit.unindexable = suggest_index(spec.filter, spec.sort)
+    if audit.issues and keys and keys != [("_id", 1)]:
+        audit.covered_by = covering_index(db[spec.collection], keys)
+        if not audit.covered_by:
+            audit.suggestion = keys
+    return audit
+
+
+def harvest_system_profile(db, *, limit: int = 200) -> list[QuerySpec]:
+    """Distinct find / aggregate shapes from `db.system.profile`, newest first."""
+    specs: list[QuerySpec] = []
+    seen: set[tuple] = set()
+    rows = db["system.profile"].find(
+        {"op": {"$in": ["query", "command"]}, "command": {"$exists": True}},
+        {"ns": 1, "command": 1, "millis": 1},
+    ).sort("ts", -1).limit(limit * 5)
+    for row in rows:
+        cmd = row.get("command") or {}
+        collection = str(row.get("ns") or "").split(".", 1)[-1]
+        if "find" in cmd:
+            flt, sort, pipeline = cmd.get("filter") or {}, list((cmd.get("sort") or {}).items()), None
+        elif "aggregate" in cmd and cmd.get("pipeline") and "$match" in cmd["pipeline"][0]:
+            flt, sort, pipeline = cmd["pipeline"][0]["$match"], None, cmd["pipeline"][1:]
+        else:
+            continue
+        if not collection or collection.startswith("system."):
+            continue
+        shape = (collection, repr(filter_shape(flt)), repr(sort), pipeline is not None)
+        if shape in seen:
+            continue
+        seen.add(shape)
+        specs.append(QuerySpec(
+            name=f"profile:{collection}:{len(specs) + 1}",
+            collection=collection,
+            filter=flt,
+            sort=sort or None,
+            limit=cmd.get("limit"),
+            pipeline=pipeline,
+            source=f"system.profile ({row.get('millis')} ms)",
+        ))
+        if len(specs) >= limit:
+            break
+    return specs
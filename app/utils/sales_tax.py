@@ -6,9 +6,16 @@ from datetime import datetime, timezone
 from bson import ObjectId
 from pymongo.database import Database
 
+from app.utils.cache import TTLCache, invalidate_cache
+
 
 US_ZIP_REGEX = re.compile(r"\b(\d{5})(?:-\d{4})?\b")
 
+# Resolved rates per shop; invalidated per shop on address / custom-rate
+# changes and namespace-wide when a ZIP rate is refreshed.
+SALES_TAX_CACHE_NAMESPACE = "sales_tax"
+_sales_tax_cache = TTLCache(SALES_TAX_CACHE_NAMESPACE, maxsize=2048, ttl=600)
+
 
 def extract_us_zip(value: str | None) -> str:
     text = str(value or "").strip()
@@ -86,19 +93,25 @@ def resolve_active_shop_sales_tax_rate(master_db, shop_id: str | ObjectId | None
         except Exception:
             return None
 
-    # Check custom shop settings first
-    if shop_db is not None:
-        custom = get_custom_shop_sales_tax_settings(shop_db)
-        if custom is not None and custom.get("combined_rate") is not None:
-            return {**custom, "source": "custom"}
-    
-    # Fallback to ZIP code lookup
-    shop = master_db.shops.find_one({"_id": shop_oid})
-    zip_code = get_shop_zip_code(shop)
-    if not zip_code:
-        return None
+    def load():
+        # Check custom shop settings first
+        if shop_db is not None:
+            custom = get_custom_shop_sales_tax_settings(shop_db)
+            if custom is not None and custom.get("combined_rate") is not None:
+                return {**custom, "source": "custom"}
+
+        # Fallback to ZIP code lookup
+        shop = master_db.shops.find_one({"_id": shop_oid})
+        zip_code = get_shop_zip_code(shop)
+        if not zip_code:
+            return None
 
-    return get_zip_sales_tax_rate(master_db, zip_code)
+        return get_zip_sales_tax_rate(master_db, zip_code)
+
+    # Without a shop DB the custom rate isn't consulted, so key on that too.
+    key = f"{shop_oid}:{'custom' if shop_db is not None else 'zip'}"
+    rate = _sales_tax_cache.get_or_load(key, load, scope=shop_oid)
+    return dict(rate) if rate is not None else None
 
 
 def utcnow() -> datetime:
@@ -142,6 +155,7 @@ def refresh_zip_tax_rate(master_db, address_or_zip: str | None) -> dict | None:
                     },
                     upsert=True,
                 )
+                invalidate_cache(SALES_TAX_CACHE_NAMESPACE)
         except Exception:
             # Network/API errors must never break the calling request.
             pass
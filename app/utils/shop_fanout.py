@@ -0,0 +1,222 @@
+"""Run a per-shop computation over several shop databases concurrently.
+
+    result = fan_out_shops(get_accessible_shops(), lambda shop_db, shop: compute(shop_db, shop["_id"]))
+    for shop, value in result.ok: ...
+    result.marker()   # {"shops_total", "shops_ok", "partial", "missing": [...]} for the UI
+
+Tasks share one bounded thread pool per worker process (SHOP_FANOUT_WORKERS),
+so a report over ten shops costs about as much as its slowest shop. Each task
+runs under `pymongo.timeout(SHOP_FANOUT_TIMEOUT_SECONDS)`, which cuts the
+shop's queries off server-side, and the caller stops waiting at the same
+deadline; shops that time out or fail are reported as missing instead of
+failing the whole report.
+
+The partial results are combined with the merge helpers below (sums, counts,
+keyed rows, heap-merged sorted rows, chart series).
+"""
+from __future__ import annotations
+
+import contextvars
+import heapq
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from threading import Lock
+
+import pymongo
+from flask import current_app
+from pymongo.errors import PyMongoError
+
+from app.extensions import get_mongo_client
+from app.utils.tenant_context import shop_db_name
+
+
+# Extra wait beyond the per-shop timeout for the task to notice it and return.
+_DEADLINE_GRACE_SECONDS = 1.0
+
+# time.monotonic() deadline of the fan-out task running in this context.
+_task_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar("shop_fanout_deadline", default=None)
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = int(current_app.config.get("SHOP_FANOUT_WORKERS") or 8)
+            _executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="shop-fanout")
+        return _executor
+
+
+@dataclass
+class FanoutResult:
+    ok: list = field(default_factory=list)        # [(shop, value)] in input order
+    missing: list = field(default_factory=list)   # [{"shop_id", "shop_name", "reason"}]
+    shops_total: int = 0
+    elapsed_ms: float = 0.0
+
+    @property
+    def values(self) -> list:
+        return [value for _, value in self.ok]
+
+    @property
+    def partial(self) -> bool:
+        return bool(self.missing)
+
+    def marker(self) -> dict:
+        return {
+            "shops_total": self.shops_total,
+            "shops_ok": len(self.ok),
+            "partial": self.partial,
+            "missing": list(self.missing),
+            "elapsed_ms": round(self.elapsed_ms, 1),
+        }
+
+
+def _run_shop_task(app, task, shop_db, shop, timeout: float):
+    token = _task_deadline.set(time.monotonic() + timeout)
+    try:
+        with app.app_context(), pymongo.timeout(timeout):
+            return task(shop_db, shop)
+    finally:
+        _task_deadline.reset(token)
+
+
+def fanout_seconds_left() -> float | None:
+    """Seconds left before the current `fan_out_shops` task times out; None outside one."""
+    deadline = _task_deadline.get()
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+def _missing(shop: dict, reason: str) -> dict:
+    return {"shop_id": str(shop.get("_id") or ""), "shop_name": str(shop.get("name") or "-"), "reason": reason}
+
+
+def fan_out_shops(shops: list[dict], task, *, timeout: float | None = None) -> FanoutResult:
+    """
+    `task(shop_db, shop)` for every shop, concurrently. Exceptions and
+    timeouts are logged and land in `missing`; they never propagate.
+    """
+    app = current_app._get_current_object()
+    if timeout is None:
+        timeout = float(app.config.get("SHOP_FANOUT_TIMEOUT_SECONDS") or 20)
+    client = get_mongo_client()
+    executor = _get_executor()
+    started = time.perf_counter()
+
+    result = FanoutResult(shops_total=len(shops))
+    futures = []
+    for shop in shops:
+        db_name = shop_db_name(shop)
+        if not db_name:
+            futures.append((shop, None))
+            continue
+        # Each task gets its own copy of the request's context vars, so its
+        # queries still count toward the request's query profile.
+        ctx = contextvars.copy_context()
+        futures.append((shop, executor.submit(ctx.run, _run_shop_task, app, task, client[db_name], shop, timeout)))
+
+    pending = [f for _, f in futures if f is not None]
+    if pending:
+        wait(pending, timeout=timeout + _DEADLINE_GRACE_SECONDS)
+
+    for shop, future in futures:
+        if future is None:
+            result.missing.append(_missing(shop, "no_database"))
+        elif not future.done():
+            future.cancel()
+            result.missing.append(_missing(shop, "timeout"))
+        elif future.exception() is not None:
+            exc = future.exception()
+            is_timeout = isinstance(exc, PyMongoError) and exc.timeout
+            if not is_timeout:
+                app.logger.warning("Shop fan-out task failed for shop %s: %r", shop.get("_id"), exc)
+            result.missing.append(_missing(shop, "timeout" if is_timeout else "error"))
+        else:
+            result.ok.append((shop, future.result()))
+
+    result.elapsed_ms = (time.perf_counter() - started) * 1000
+    return result
+
+
+# ── Merge helpers ─────────────────────────────────────────────────────────
+
+
+def _round2(value) -> float:
+    try:
+        return round(float(value or 0) + 1e-12, 2)
+    except Exception:
+        return 0.0
+
+
+def sum_fields(parts: list[dict], keys) -> dict:
+    """{key: sum over parts}; ints stay ints, everything else is rounded to cents."""
+    out = {}
+    for key in keys:
+        values = [0 if p.get(key) is None else p.get(key) for p in parts]
+        if all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+            out[key] = sum(values)
+        else:
+            out[key] = _round2(sum(float(v) for v in values))
+    return out
+
+
+def ratio(numerator, denominator, scale: float = 1.0) -> float:
+    return (float(numerator) / float(denominator) * scale) if denominator else 0.0
+
+
+def merge_keyed_rows(row_lists: list[list[dict]], key, sum_keys) -> list[dict]:
+    """
+    Rows with the same `key(row)` collapse into one (first row's other fields
+    kept, `sum_keys` added up); first-seen order.
+    """
+    merged: dict = {}
+    for rows in row_lists:
+        for row in rows or []:
+            k = key(row)
+            if k not in merged:
+                merged[k] = dict(row)
+                continue
+            target = merged[k]
+            target.update(sum_fields([target, row], sum_keys))
+    return list(merged.values())
+
+
+def merge_sorted_rows(row_lists: list[list[dict]], sort_key: str) -> list[dict]:
+    """k-way heap merge of row lists that are each sorted by `sort_key` descending."""
+    return list(heapq.merge(*row_lists, key=lambda r: float(r.get(sort_key) or 0), reverse=True))
+
+
+def merge_chart_data(charts: list[dict | None], fill_labels=None) -> dict | None:
+    """
+    Sum chart.js-style `{labels, datasets: [{label, data}]}` series by label.
+    `fill_labels(buckets_dict)` re-fills gaps between the shops' label ranges.
+    """
+    charts = [c for c in charts if isinstance(c, dict) and c.get("labels") is not None]
+    if not charts:
+        return None
+
+    totals: dict[str, dict[str, float]] = {}   # dataset label -> bucket -> value
+    dataset_meta: dict[str, dict] = {}
+    buckets: dict[str, bool] = {}
+    for chart in charts:
+        labels = chart.get("labels") or []
+        for label in labels:
+            buckets[label] = True
+        for ds in chart.get("datasets") or []:
+            name = ds.get("label")
+            dataset_meta.setdefault(name, {k: v for k, v in ds.items() if k != "data"})
+            series = totals.setdefault(name, {})
+            for label, value in zip(labels, ds.get("data") or []):
+                series[label] = series.get(label, 0.0) + float(value or 0)
+
+    labels = fill_labels(buckets) if fill_labels else sorted(buckets)
+    merged = {k: v for k, v in charts[0].items() if k not in ("labels", "datasets")}
+    merged["labels"] = labels
+    merged["datasets"] = [
+        {**dataset_meta[name], "data": [_round2(series.get(label, 0.0)) for label in labels]}
+        for name, series in totals.items()
+    ]
+    return merged
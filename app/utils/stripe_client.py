@@ -16,18 +16,23 @@ Architecture:
   * Stripe Tax computes US sales tax on the invoice automatically.
 
 This module is intentionally thin: route handlers and cron call into
-`get_or_create_customer`, `create_billing_invoice`, etc.
+`get_or_create_customer`, `create_billing_invoice`, etc. Those take an
+optional `client` (anything shaped like the `stripe` module, e.g. a stub in
+tests) and an `idempotency_key` prefix, so a retried call never creates a
+second customer / invoice item / invoice (the monthly batch run,
+app/blueprints/billing/batch.py, relies on this).
 """
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Optional
+from typing import Callable, Optional
 
 from flask import current_app
 
 import stripe
 
 from app.extensions import get_master_db
+from app.utils.billing_usage import get_billing_usage
 
 
 # ---------------------------------------------------------------------------
@@ -78,30 +83,10 @@ def dashboard_url(path: str) -> str:
 
 def count_billable(tenant_id) -> dict:
     """
-    Returns active counts for the given tenant_id from master DB.
+    Returns active counts for the given tenant_id, read from the
+    maintained counters (app.utils.billing_usage).
     """
-    master = get_master_db()
-    MECHANIC_ROLES = {"mechanic", "senior_mechanic"}
-
-    locations_active = master.shops.count_documents(
-        {"tenant_id": tenant_id, "is_active": True}
-    )
-    users = list(master.users.find(
-        {"tenant_id": tenant_id, "is_active": True},
-        {"role": 1},
-    ))
-    full_active = mech_active = 0
-    for u in users:
-        role = (u.get("role") or "").strip().lower()
-        if role in MECHANIC_ROLES:
-            mech_active += 1
-        else:
-            full_active += 1
-    return {
-        "locations_active": locations_active,
-        "full_active": full_active,
-        "mech_active": mech_active,
-    }
+    return get_billing_usage(get_master_db(), tenant_id)
 
 
 def compute_amount_cents(counts: dict) -> int:
@@ -127,12 +112,17 @@ def describe_breakdown(counts: dict) -> str:
 # Customer.
 # ---------------------------------------------------------------------------
 
-def get_or_create_customer(tenant: dict) -> str:
+def _idem(prefix: Optional[str], step: str) -> dict:
+    """Request options carrying a per-step idempotency key (none without a prefix)."""
+    return {"idempotency_key": f"{prefix}:{step}"} if prefix else {}
+
+
+def get_or_create_customer(tenant: dict, *, client=None, idempotency_key: Optional[str] = None) -> str:
     """
     Returns the Stripe customer id for `tenant`, creating it if missing.
     Persists `stripe_customer_id` on the tenant doc.
     """
-    s = _stripe()
+    s = client or _stripe()
     master = get_master_db()
 
     cid = (tenant.get("stripe_customer_id") or "").strip()
@@ -147,6 +137,7 @@ def get_or_create_customer(tenant: dict) -> str:
             "tenant_id": str(tenant["_id"]),
             "tenant_slug": tenant.get("slug") or "",
         },
+        **_idem(idempotency_key, "customer"),
     )
     master.tenants.update_one(
         {"_id": tenant["_id"]},
@@ -172,37 +163,72 @@ def create_billing_invoice(
     auto_charge: bool,
     period_label: str = "30 days",
     days_until_due: int = 7,
+    counts: Optional[dict] = None,
+    client=None,
+    idempotency_key: Optional[str] = None,
+    resume: Optional[dict] = None,
+    on_progress: Optional[Callable[[dict], None]] = None,
 ) -> dict:
     """
     Create + finalize a one-shot invoice for the tenant's current billable
-    units. If `auto_charge` is True, Stripe attempts to charge the saved
-    default payment method immediately. Otherwise it sends a hosted
-    invoice email.
+    units (or `counts`, e.g. a billing-run snapshot). If `auto_charge` is
+    True, Stripe attempts to charge the saved default payment method
+    immediately. Otherwise it sends a hosted invoice email.
+
+    `on_progress` is called with {"invoice_item_id"} / {"invoice_id"} /
+    {"invoice_sent": True} as each Stripe object is created; passing what
+    it recorded back as `resume` continues from there instead of creating
+    them again (Stripe idempotency keys expire after 24 hours). A resumed
+    pending invoice item whose amount no longer matches is replaced.
 
     Returns: {"invoice_id": "in_...", "amount_cents": int, "hosted_url": str|None,
               "status": "open"|"paid"|...}
     """
-    s = _stripe()
+    s = client or _stripe()
 
-    customer_id = get_or_create_customer(tenant)
-    counts = count_billable(tenant["_id"])
+    customer_id = get_or_create_customer(tenant, client=s, idempotency_key=idempotency_key)
+    if counts is None:
+        counts = count_billable(tenant["_id"])
     amount = compute_amount_cents(counts)
     if amount <= 0:
         raise ValueError("Tenant has no billable units (no active locations/users).")
 
-    # Step 1: pending invoice item attached to the customer.
-    s.InvoiceItem.create(
-        customer=customer_id,
-        amount=amount,
-        currency=BILLING_CURRENCY,
-        description=_line_description(counts, period_label),
-        metadata={
-            "tenant_id": str(tenant["_id"]),
-            "locations_active": str(counts["locations_active"]),
-            "full_active": str(counts["full_active"]),
-            "mech_active": str(counts["mech_active"]),
-        },
-    )
+    state = dict(resume or {})
+
+    def record(**fields) -> None:
+        state.update(fields)
+        if on_progress is not None:
+            on_progress(fields)
+
+    # Step 1: pending invoice item attached to the customer (reused when resuming).
+    item_id = state.get("invoice_item_id")
+    if item_id and not state.get("invoice_id"):
+        try:
+            item = s.InvoiceItem.retrieve(item_id)
+        except stripe.error.InvalidRequestError:
+            item = {"deleted": True}
+        if item.get("invoice"):
+            # Consumed by an invoice we created but never got to record.
+            record(invoice_id=item["invoice"])
+        elif item.get("deleted") or item.get("amount") != amount:
+            if not item.get("deleted"):
+                s.InvoiceItem.delete(item_id)
+            item_id = None
+    if not item_id and not state.get("invoice_id"):
+        item = s.InvoiceItem.create(
+            customer=customer_id,
+            amount=amount,
+            currency=BILLING_CURRENCY,
+            description=_line_description(counts, period_label),
+            metadata={
+                "tenant_id": str(tenant["_id"]),
+                "locations_active": str(counts["locations_active"]),
+                "full_active": str(counts["full_active"]),
+                "mech_active": str(counts["mech_active"]),
+            },
+            **_idem(idempotency_key, "item"),
+        )
+        record(invoice_item_id=item.id)
 
     # Step 2: invoice that consumes pending items.
     # NOTE: automatic_tax is intentionally OFF for now — Stripe Tax requires
@@ -231,14 +257,20 @@ def create_billing_invoice(
         invoice_kwargs["collection_method"] = "send_invoice"
         invoice_kwargs["days_until_due"] = days_until_due
 
-    inv = s.Invoice.create(**invoice_kwargs)
-    # Finalize so it gets a hosted_invoice_url and number.
-    inv = s.Invoice.finalize_invoice(inv.id)
+    if state.get("invoice_id"):
+        inv = s.Invoice.retrieve(state["invoice_id"])
+    else:
+        inv = s.Invoice.create(**invoice_kwargs, **_idem(idempotency_key, "invoice"))
+        record(invoice_id=inv.id)
+    # Finalize so it gets a hosted_invoice_url and number (auto_advance may have done it already).
+    if getattr(inv, "status", "draft") == "draft":
+        inv = s.Invoice.finalize_invoice(inv.id, **_idem(idempotency_key, "finalize"))
 
-    if not auto_charge:
+    if not auto_charge and not state.get("invoice_sent"):
         # Trigger Stripe to email the tenant the hosted invoice link.
         try:
-            s.Invoice.send_invoice(inv.id)
+            s.Invoice.send_invoice(inv.id, **_idem(idempotency_key, "send"))
+            record(invoice_sent=True)
         except stripe.error.StripeError:
             # Not fatal — admin can resend manually from Stripe dashboard.
             current_app.logger.exception("Failed to send Stripe invoice email")
@@ -252,14 +284,23 @@ def create_billing_invoice(
     }
 
 
-def charge_saved_card(tenant: dict, period_label: str = "30 days") -> dict:
+def charge_saved_card(
+    tenant: dict,
+    period_label: str = "30 days",
+    *,
+    counts: Optional[dict] = None,
+    client=None,
+    idempotency_key: Optional[str] = None,
+    resume: Optional[dict] = None,
+    on_progress: Optional[Callable[[dict], None]] = None,
+) -> dict:
     """
     Convenience wrapper for the renewal path: create an invoice with
     `charge_automatically` so Stripe immediately bills the saved card.
     Raises if no default payment method is on file.
     """
-    s = _stripe()
-    customer_id = get_or_create_customer(tenant)
+    s = client or _stripe()
+    customer_id = get_or_create_customer(tenant, client=s, idempotency_key=idempotency_key)
     cust = s.Customer.retrieve(customer_id)
     default_pm = (
         (cust.get("invoice_settings") or {}).get("default_payment_method")
@@ -270,4 +311,13 @@ def charge_saved_card(tenant: dict, period_label: str = "30 days") -> dict:
             "Tenant has no saved payment method. Send an invoice first so "
             "the customer can add a card on the hosted page."
         )
-    return create_billing_invoice(tenant, auto_charge=True, period_label=period_label)
+    return create_billing_invoice(
+        {**tenant, "stripe_customer_id": customer_id},
+        auto_charge=True,
+        period_label=period_label,
+        counts=counts,
+        client=s,
+        idempotency_key=idempotency_key,
+        resume=resume,
+        on_progress=on_progress,
+    )
@@ -0,0 +1,92 @@
+"""Active tenant / shop resolution shared by the blueprints.
+
+`tenant_id`, `shop_id` and `shop_ids` are stored as ObjectId in both the
+master and shop databases (legacy string values were converted by master
+migration 5 / shop migration 4), so every lookup here is a single-value
+match instead of an `$in` over str/ObjectId variants.
+"""
+from __future__ import annotations
+
+from bson import ObjectId
+from flask import session
+
+from app.extensions import get_master_db, get_mongo_client
+from app.utils.auth import SESSION_SHOP_ID, SESSION_SHOP_IDS, SESSION_TENANT_ID
+
+
+# Older shop docs used different keys for the database name.
+_SHOP_DB_NAME_KEYS = ("db_name", "database", "db", "mongo_db", "shop_db")
+
+
+def as_object_id(value) -> ObjectId | None:
+    if not value:
+        return None
+    if isinstance(value, ObjectId):
+        return value
+    try:
+        return ObjectId(str(value))
+    except Exception:
+        return None
+
+
+def current_tenant_id() -> ObjectId | None:
+    return as_object_id(session.get(SESSION_TENANT_ID))
+
+
+def current_shop_id() -> ObjectId | None:
+    return as_object_id(session.get(SESSION_SHOP_ID))
+
+
+def get_active_shop(master=None) -> dict | None:
+    """The session's active shop, only if it belongs to the session's tenant."""
+    tenant_id = current_tenant_id()
+    shop_id = current_shop_id()
+    if tenant_id is None or shop_id is None:
+        return None
+    if master is None:
+        master = get_master_db()
+    return master.shops.find_one({"_id": shop_id, "tenant_id": tenant_id})
+
+
+def get_accessible_shops(master=None, projection=None) -> list[dict]:
+    """Active shops of the session's tenant that the user may open, oldest first."""
+    tenant_id = current_tenant_id()
+    allowed = [oid for oid in (as_object_id(x) for x in (session.get(SESSION_SHOP_IDS) or [])) if oid]
+    if tenant_id is None or not allowed:
+        return []
+    if master is None:
+        master = get_master_db()
+    return list(
+        master.shops.find(
+            {"tenant_id": tenant_id, "_id": {"$in": allowed}, "is_active": {"$ne": False}},
+            projection,
+        ).sort("created_at", 1)
+    )
+
+
+def shop_db_name(shop: dict | None) -> str | None:
+    for key in _SHOP_DB_NAME_KEYS:
+        value = (shop or {}).get(key)
+        if value:
+            return str(value)
+    return None
+
+
+def get_active_shop_db(master=None):
+    """(shop_db, shop) for the session; (None, shop) when the shop has no DB name."""
+    shop = get_active_shop(master)
+    if not shop:
+        return None, None
+    db_name = shop_db_name(shop)
+    if not db_name:
+        return None, shop
+    return get_mongo_client()[db_name], shop
+
+
+def shop_members_filter(shop: dict) -> dict:
+    """Users of `shop`'s tenant assigned to it (`shop_ids`, or legacy single `shop_id`)."""
+    shop_id = shop.get("_id")
+    return {
+        "tenant_id": shop.get("tenant_id"),
+        "$or": [{"shop_ids": shop_id}, {"shop_id": shop_id}],
+    }
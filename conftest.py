@@ -0,0 +1 @@
+# Makes the `app` package importable when running `pytest` from the project root.
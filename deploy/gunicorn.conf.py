@@ -0,0 +1,20 @@
+"""gunicorn settings hooks: `gunicorn -c deploy/gunicorn.conf.py ...`.
+
+Only the Prometheus multiprocess bookkeeping lives here; bind / workers stay
+on the command line (or in the service unit) as before.
+"""
+import glob
+import os
+
+
+def on_starting(server):
+    # Stale files from the previous master would be summed into the new one.
+    multiproc_dir = os.environ.get("METRICS_MULTIPROC_DIR") or os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if multiproc_dir and os.path.isdir(multiproc_dir):
+        for path in glob.glob(os.path.join(multiproc_dir, "*.db")):
+            os.remove(path)
+
+
+def child_exit(server, worker):
+    from app.utils.metrics import mark_worker_dead
+    mark_worker_dead(worker.pid)
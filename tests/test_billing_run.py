@@ -0,0 +1,179 @@
+"""The billing run sends each tenant exactly one invoice per billing period, however often it is re-run."""
+from __future__ import annotations
+
+import types
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from flask import Flask
+
+mongomock = pytest.importorskip("mongomock")
+stripe = pytest.importorskip("stripe")
+
+from app.blueprints.billing.batch import ITEMS_COLLECTION, run_billing  # noqa: E402
+from app.utils.billing_usage import bump_billing_usage, rebuild_billing_usage  # noqa: E402
+
+
+RUN = "2026-10"
+PERIOD_END = datetime(2026, 10, 31)
+DUE_BEFORE = datetime(2026, 11, 3)
+# One active location ($100) + one full user ($50).
+AMOUNT_CENTS = 150_00
+
+
+class _Obj(dict):
+    __getattr__ = dict.get
+
+
+class _StubStripe:
+    """The parts of the `stripe` module the billing run uses, replaying idempotency keys like Stripe."""
+
+    def __init__(self):
+        self.objects: dict[str, _Obj] = {}
+        self.replies: dict[str, _Obj] = {}
+        # Steps that fail once: "invoice" before it is created, "invoice_response"
+        # after it is created (response lost), "finalize".
+        self.fail_once: set[str] = set()
+        self.sent: list[str] = []
+        self.Customer = types.SimpleNamespace(create=self._create_customer)
+        self.InvoiceItem = types.SimpleNamespace(
+            create=self._create_item, retrieve=self._retrieve_item, delete=self._delete_item,
+        )
+        self.Invoice = types.SimpleNamespace(
+            create=self._create_invoice,
+            retrieve=lambda invoice_id: self.objects[invoice_id],
+            finalize_invoice=self._finalize_invoice,
+            send_invoice=lambda invoice_id, **_: self.sent.append(invoice_id),
+        )
+
+    def invoices(self) -> list[_Obj]:
+        return [o for o in self.objects.values() if o.id.startswith("in_")]
+
+    def live_items(self) -> list[_Obj]:
+        return [o for o in self.objects.values() if o.id.startswith("ii_") and not o.deleted]
+
+    def _fail(self, step: str) -> None:
+        if step in self.fail_once:
+            self.fail_once.discard(step)
+            raise RuntimeError(f"stripe down at {step}")
+
+    def _create(self, prefix: str, idempotency_key=None, **fields) -> _Obj:
+        if idempotency_key in self.replies:
+            return self.replies[idempotency_key]
+        obj = _Obj(id=f"{prefix}_{len(self.objects) + 1}", **fields)
+        self.objects[obj.id] = obj
+        if idempotency_key:
+            self.replies[idempotency_key] = obj
+        return obj
+
+    def _create_customer(self, idempotency_key=None, **fields):
+        return self._create("cus", idempotency_key, **fields)
+
+    def _create_item(self, customer, amount, idempotency_key=None, **fields):
+        return self._create("ii", idempotency_key, customer=customer, amount=amount, invoice=None, deleted=False)
+
+    def _retrieve_item(self, item_id):
+        item = self.objects[item_id]
+        if item.deleted:
+            raise stripe.error.InvalidRequestError(f"No such invoiceitem: '{item_id}'", "id")
+        return item
+
+    def _delete_item(self, item_id):
+        self.objects[item_id]["deleted"] = True
+
+    def _create_invoice(self, customer, idempotency_key=None, **fields):
+        self._fail("invoice")
+        replay = idempotency_key in self.replies
+        invoice = self._create("in", idempotency_key, customer=customer, status="draft", amount_due=0)
+        if not replay:
+            for item in self.live_items():
+                if item.customer == customer and item.invoice is None:
+                    item["invoice"] = invoice.id
+                    invoice["amount_due"] += item.amount
+        self._fail("invoice_response")
+        return invoice
+
+    def _finalize_invoice(self, invoice_id, idempotency_key=None):
+        self._fail("finalize")
+        invoice = self.objects[invoice_id]
+        invoice.update(status="open", hosted_invoice_url=f"https://invoice.test/{invoice_id}")
+        return invoice
+
+
+@pytest.fixture()
+def master():
+    client = mongomock.MongoClient()
+    master = client["master"]
+    tenant_id = ObjectId()
+    master.tenants.insert_one({"_id": tenant_id, "name": "Fleet Co", "status": "active", "subscription_until": PERIOD_END})
+    master.shops.insert_one({"tenant_id": tenant_id, "is_active": True})
+    master.users.insert_one({"tenant_id": tenant_id, "is_active": True, "role": "owner"})
+
+    app = Flask(__name__)
+    app.config.update(MASTER_DB_NAME="master", TESTING=True)
+    app.extensions["mongo_client"] = client
+    with app.app_context():
+        rebuild_billing_usage(master)
+        yield master
+
+
+def _assert_one_invoice(stub: _StubStripe, amount_cents: int) -> None:
+    invoices = stub.invoices()
+    assert len(invoices) == 1, invoices
+    assert invoices[0].amount_due == amount_cents
+    assert invoices[0].status == "open"
+    assert stub.sent == [invoices[0].id]
+    assert [i.invoice for i in stub.live_items()] == [invoices[0].id]
+
+
+@pytest.mark.parametrize("step", ["invoice", "invoice_response", "finalize"])
+def test_failed_run_resumes_without_second_invoice(master, step):
+    stub = _StubStripe()
+    stub.fail_once.add(step)
+
+    first = run_billing(RUN, client=stub, due_before=DUE_BEFORE)
+    assert first["outcomes"]["failed"] == 1
+
+    second = run_billing(RUN, client=stub, due_before=DUE_BEFORE)
+    assert second["outcomes"]["invoiced"] == 1
+    _assert_one_invoice(stub, AMOUNT_CENTS)
+    item = master[ITEMS_COLLECTION].find_one({})
+    assert item["status"] == "invoiced" and item["attempts"] == 2
+
+
+def test_resnapshot_replaces_stale_pending_item(master):
+    stub = _StubStripe()
+    stub.fail_once.add("invoice")
+    run_billing(RUN, client=stub, due_before=DUE_BEFORE)
+
+    # A mechanic added before the retry is billed: the $150 item is replaced.
+    bump_billing_usage(master, master.tenants.find_one({})["_id"], mech_active=1)
+    run_billing(RUN, client=stub, due_before=DUE_BEFORE)
+    _assert_one_invoice(stub, AMOUNT_CENTS + 25_00)
+
+
+def test_resnapshot_keeps_counts_once_invoice_exists(master):
+    stub = _StubStripe()
+    stub.fail_once.add("finalize")
+    run_billing(RUN, client=stub, due_before=DUE_BEFORE)
+
+    # The invoice already holds the $150 item; the retry finishes it unchanged.
+    bump_billing_usage(master, master.tenants.find_one({})["_id"], mech_active=1)
+    run_billing(RUN, client=stub, due_before=DUE_BEFORE)
+    _assert_one_invoice(stub, AMOUNT_CENTS)
+    assert master[ITEMS_COLLECTION].find_one({})["amount_cents"] == AMOUNT_CENTS
+
+
+def test_rerunning_invoiced_period_sends_nothing(master):
+    stub = _StubStripe()
+    assert run_billing(RUN, client=stub, due_before=DUE_BEFORE)["outcomes"]["invoiced"] == 1
+
+    again = run_billing(RUN, client=stub, due_before=DUE_BEFORE)
+    assert again["snapshot"]["already_invoiced"] == 1
+    assert again["outcomes"] == {"invoiced": 0, "failed": 0, "skipped": 0}
+
+    # Next month's run while the invoice is still unpaid (subscription_until unchanged).
+    next_month = run_billing("2026-11", client=stub, due_before=datetime(2026, 11, 4))
+    assert next_month["outcomes"] == {"invoiced": 0, "failed": 0, "skipped": 0}
+    _assert_one_invoice(stub, AMOUNT_CENTS)
@@ -0,0 +1,161 @@
+"""Customer portal tabs issue a fixed number of DB calls however much data the customer has."""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from bson import ObjectId
+from flask import Flask
+
+mongomock = pytest.importorskip("mongomock")
+
+from app.blueprints.customer_portal import cache as portal_cache  # noqa: E402
+from app.blueprints.customer_portal import customer_portal_bp  # noqa: E402
+from app.blueprints.work_orders.maintenance_history import rebuild_maintenance_history  # noqa: E402
+
+
+TOKEN = "t" * 32
+# Token resolution: portal token, shop, customer.
+RESOLVE_CALLS = 3
+# Calls a tab makes on a cache miss, on top of RESOLVE_CALLS.
+TAB_CALLS = {
+    "units": 1,             # units
+    "work-orders": 3,       # work orders page, their units, paid totals
+    "payments": 1,          # payments joined to work orders
+    "authorizations": 1,    # work orders with authorizations
+    "maintenance": 2,       # units, last service per unit
+}
+
+
+class _Counter:
+    def __init__(self):
+        self.calls = []
+
+
+class _CountingCollection:
+    _COUNTED = {
+        "find", "find_one", "aggregate", "count_documents", "distinct",
+        "insert_one", "insert_many", "update_one", "update_many", "replace_one",
+        "delete_one", "delete_many", "bulk_write", "find_one_and_update",
+    }
+
+    def __init__(self, collection, counter):
+        self._collection = collection
+        self._counter = counter
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name in self._COUNTED:
+            def call(*args, **kwargs):
+                self._counter.calls.append(f"{self._collection.full_name}.{name}")
+                return attr(*args, **kwargs)
+            return call
+        return attr
+
+
+class _CountingDatabase:
+    def __init__(self, db, counter):
+        self._db = db
+        self._counter = counter
+
+    def __getitem__(self, name):
+        return _CountingCollection(self._db[name], self._counter)
+
+    def __getattr__(self, name):
+        if name.startswith("_") or name in ("name", "client", "list_collection_names"):
+            return getattr(self._db, name)
+        return self[name]
+
+
+class _CountingClient:
+    def __init__(self, client, counter):
+        self._client = client
+        self._counter = counter
+
+    def __getitem__(self, name):
+        return _CountingDatabase(self._client[name], self._counter)
+
+
+@pytest.fixture()
+def portal():
+    portal_cache._cache.clear()
+    raw = mongomock.MongoClient()
+    master, shop_db = raw["master"], raw["shop_test"]
+    now = datetime.utcnow()
+
+    shop_id, customer_id = ObjectId(), ObjectId()
+    master.shops.insert_one({"_id": shop_id, "name": "Shop", "db_name": "shop_test"})
+    master.customer_portal_tokens.insert_one({
+        "token": TOKEN, "shop_id": shop_id, "customer_id": customer_id,
+        "expires_at": now + timedelta(days=1), "last_used_at": now,
+    })
+    shop_db.customers.insert_one({"_id": customer_id, "shop_id": shop_id, "company_name": "Fleet", "is_active": True})
+
+    # Enough rows that any per-row query would blow the budget.
+    unit_ids = [ObjectId() for _ in range(5)]
+    shop_db.units.insert_many([
+        {"_id": uid, "customer_id": customer_id, "shop_id": shop_id, "unit_number": str(i), "mileage": 1000 * i, "is_active": True}
+        for i, uid in enumerate(unit_ids)
+    ])
+    for i in range(40):
+        wo_id = ObjectId()
+        shop_db.work_orders.insert_one({
+            "_id": wo_id, "shop_id": shop_id, "customer_id": customer_id, "unit_id": unit_ids[i % 5],
+            "wo_number": 1000 + i, "status": "open", "is_active": True,
+            "work_order_date": now - timedelta(days=i), "mileage": 50_000 + i,
+            "labors": [{"labor": {"description": f"Service {i}", "hours": "1"}, "parts": []}],
+            "totals": {"grand_total": 100.0 + i, "labors": [{"labor_full_total": 100.0 + i}]},
+            "authorizations": [{"scope": "work_order", "status": "approved", "responded_at": now}],
+        })
+        shop_db.work_order_payments.insert_one({
+            "work_order_id": wo_id, "customer_id": customer_id, "amount": 10.0,
+            "payment_date": now - timedelta(days=i), "is_active": True,
+        })
+
+    app = Flask(__name__, template_folder=str(Path(__file__).resolve().parents[1] / "app" / "templates"))
+    app.config.update(MASTER_DB_NAME="master", TESTING=True)
+    app.register_blueprint(customer_portal_bp)
+    with app.app_context():
+        rebuild_maintenance_history(shop_db)
+
+    counter = _Counter()
+    app.extensions["mongo_client"] = _CountingClient(raw, counter)
+    return app, counter, unit_ids
+
+
+@pytest.mark.parametrize("tab", sorted(TAB_CALLS))
+def test_tab_query_count_is_fixed(portal, tab):
+    app, counter, _unit_ids = portal
+    client = app.test_client()
+
+    resp = client.get(f"/portal/{TOKEN}/tab/{tab}")
+    assert resp.status_code == 200
+    assert len(counter.calls) == RESOLVE_CALLS + TAB_CALLS[tab], counter.calls
+
+    # Same customer data version: served from the fragment cache.
+    counter.calls.clear()
+    resp = client.get(f"/portal/{TOKEN}/tab/{tab}")
+    assert resp.status_code == 200
+    assert len(counter.calls) == RESOLVE_CALLS, counter.calls
+
+
+@pytest.mark.parametrize("tab", ["work-orders", "payments", "authorizations"])
+def test_unit_filter_adds_one_label_lookup(portal, tab):
+    app, counter, unit_ids = portal
+    resp = app.test_client().get(f"/portal/{TOKEN}/tab/{tab}?unit_id={unit_ids[0]}")
+    assert resp.status_code == 200
+    assert len(counter.calls) == RESOLVE_CALLS + TAB_CALLS[tab] + 1, counter.calls
+
+
+def test_maintenance_pdf_rows_query_count(portal):
+    from app.blueprints.customer_portal.routes import _maintenance_rows
+
+    app, counter, unit_ids = portal
+    with app.app_context():
+        db = app.extensions["mongo_client"]["shop_test"]
+        customer_id = db.customers.find_one({})["_id"]
+        counter.calls.clear()
+        rows, total = _maintenance_rows(db, customer_id, unit_ids[0], datetime.utcnow().year, (datetime.utcnow().month - 1) // 3 + 1)
+    assert len(counter.calls) == 1, counter.calls
+    assert total == round(sum(r["cost"] for r in rows), 2)